@@ -0,0 +1,286 @@
+"""Réponses Francis en flux : mise en forme incrémentale et trames NDJSON.
+
+La mise en forme (tableaux ASCII → Markdown, espacement des titres et des
+exemples, nettoyage des blancs) s'appliquait par expressions régulières sur
+la réponse complète : il fallait attendre la fin de la génération avant
+d'afficher quoi que ce soit. `ResponseFormatter` applique les mêmes règles
+token par token et ne retient que le strict nécessaire :
+- une ligne de tableau (jusqu'à sa fin, pour la convertir en ligne Markdown) ;
+- les blancs de fin (pour ne pas émettre d'espaces ou de lignes vides finales) ;
+- un début possible de « Par exemple », « Voici »… (quelques caractères).
+Le reste du texte sort dès qu'il arrive : le premier token visible suit le
+premier token du LLM.
+
+Protocole des endpoints en flux (une trame JSON par ligne) :
+    {"type": "token", "content": "..."}      texte mis en forme, à concaténer
+    {"type": "sources", "sources": [...], "confidence": 0.8, ...}   trame finale
+    {"type": "error", "message": "..."}      en cas d'échec en cours de flux
+"""
+import inspect
+import json
+import re
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional
+
+from tracing import record
+
+_BOX_CHARS = "┌┐└┘├┤┬┴┼│─"
+_EXAMPLE_MARKERS = ("Pour illustrer", "Par exemple", "Voici")
+_EXAMPLE_RE = re.compile("|".join(re.escape(m) for m in _EXAMPLE_MARKERS))
+_MARKER_PREFIXES = {m[:i] for m in _EXAMPLE_MARKERS for i in range(1, len(m))}
+
+
+def _held_suffix(text: str) -> int:
+    """Longueur de la fin de `text` à retenir : blancs, ou début possible d'un marqueur d'exemple
+    (avec les blancs qui le précèdent, supprimés s'il passe à la ligne)."""
+    stripped = text.rstrip()
+    for size in range(min(len(stripped), max(map(len, _MARKER_PREFIXES))), 0, -1):
+        if stripped[-size:] in _MARKER_PREFIXES:
+            return len(text) - len(stripped[:-size].rstrip())
+    return len(text) - len(stripped)
+
+
+class ResponseFormatter:
+    """Mise en forme Markdown d'une réponse reçue par morceaux.
+
+    `feed(morceau)` renvoie le texte prêt à afficher (éventuellement vide),
+    `close()` le reste en fin de flux. Le résultat ne dépend pas du découpage
+    en morceaux : `format_francis_response` l'utilise sur le texte complet.
+    """
+
+    def __init__(self):
+        self._started = False    # du texte a déjà été émis
+        self._newlines = 0       # sauts de ligne reçus, pas encore émis
+        self._blank_before = False  # une ligne vide est requise avant le prochain contenu
+        self._mode = None        # None (début de ligne), "text", "heading" ou "table"
+        self._line = ""          # début de ligne en attente / ligne de tableau
+        self._held = ""          # fin de ligne de texte retenue (blancs, début de marqueur)
+        self._line_has_text = False
+        self._table_rows = 0
+
+    def feed(self, chunk: str) -> str:
+        out = []
+        for piece in re.split(r"(\n)", chunk or ""):
+            if piece == "\n":
+                out.append(self._end_line())
+            elif piece:
+                out.append(self._add(piece))
+        return "".join(out)
+
+    def close(self) -> str:
+        if self._mode == "table":
+            return self._end_line()
+        if self._mode in ("text", "heading") and self._held.strip():
+            return self._held.rstrip()
+        return ""
+
+    # -- lignes ----------------------------------------------------------
+
+    def _open_line(self, blank_before: bool = False) -> str:
+        """Sauts de ligne à émettre avant le premier contenu d'une ligne."""
+        if not self._started:
+            self._started = True
+            count = 0
+        else:
+            count = min(self._newlines, 2)
+            if blank_before or self._blank_before:
+                count = 2
+        self._newlines = 0
+        self._blank_before = False
+        return "\n" * count
+
+    def _add(self, piece: str) -> str:
+        if self._mode == "table":
+            self._line += piece
+            return ""
+        if self._mode is None:
+            self._line += piece
+            stripped = self._line.lstrip()
+            if not stripped:
+                return ""
+            if stripped[0] in _BOX_CHARS:
+                self._mode = "table"
+                return ""
+            self._mode = "heading" if stripped[0] == "#" else "text"
+            self._line_has_text = False
+            piece = self._line if self._started else stripped
+            self._line = ""
+            # Ligne vide avant un titre, et après un tableau (sinon la ligne s'y rattacherait)
+            prefix = self._open_line(blank_before=self._mode == "heading" or self._table_rows > 0)
+            self._table_rows = 0
+            return prefix + self._text(piece)
+        return self._text(piece)
+
+    def _text(self, piece: str) -> str:
+        text = self._held + piece
+        self._held = ""
+        out = []
+        position = 0
+        for match in _EXAMPLE_RE.finditer(text):
+            before = text[position:match.start()]
+            if before.strip() or self._line_has_text:
+                # Exemple annoncé en milieu de ligne : il passe à la ligne suivante
+                out.append(self._emit(before.rstrip()))
+                self._end_text_line()
+                out.append(self._open_line())
+            else:
+                out.append(self._emit(before))
+            out.append(self._emit(match.group()))
+            position = match.end()
+        rest = text[position:]
+        held = _held_suffix(rest)
+        out.append(self._emit(rest[:len(rest) - held]))
+        self._held = rest[len(rest) - held:]
+        return "".join(out)
+
+    def _emit(self, text: str) -> str:
+        if text.strip():
+            self._line_has_text = True
+        return text
+
+    def _end_text_line(self) -> None:
+        if self._mode == "heading":
+            self._blank_before = True
+        self._mode = "text"
+        self._newlines = 1
+        self._held = ""
+        self._line_has_text = False
+
+    def _end_line(self) -> str:
+        mode = self._mode
+        if mode is None:
+            self._line = ""
+            self._newlines += 1
+            return ""
+        if mode == "table":
+            line, self._line = self._line, ""
+            self._mode = None
+            row = self._table_row(line)
+            if row is None:
+                return ""
+            if self._table_rows > 1:
+                self._newlines = min(self._newlines, 1)  # pas de ligne vide au milieu du tableau
+            out = self._open_line(blank_before=self._table_rows == 1) + row
+            self._newlines = 1
+            return out
+        out = self._held.rstrip() if self._held.strip() else ""
+        self._end_text_line()
+        self._mode = None
+        return out
+
+    def _table_row(self, line: str) -> Optional[str]:
+        """Ligne Markdown pour une ligne de tableau ASCII ; None pour les bordures."""
+        if "│" in line and not any(c in line for c in "┌├└┬┴┼"):
+            cells = [cell.strip() for cell in line.split("│") if cell.strip()]
+            if len(cells) < 2:
+                return None
+            row = "| " + " | ".join(cells) + " |"
+            self._table_rows += 1
+            if self._table_rows == 1:
+                # Première ligne = en-tête : Markdown exige la ligne de séparation
+                row += "\n|" + "|".join(" --- " for _ in cells) + "|"
+            return row
+        if "┌" in line and self._table_rows:
+            self._table_rows = 0  # nouveau tableau : nouvel en-tête
+            self._blank_before = True
+        return None
+
+
+def format_francis_response(text: str) -> str:
+    """Améliore le formatage des réponses Francis pour une meilleure UX web"""
+    if not text:
+        return text
+    formatter = ResponseFormatter()
+    return formatter.feed(text) + formatter.close()
+
+
+async def format_stream(tokens: AsyncIterable[str]) -> AsyncIterator[str]:
+    """Texte mis en forme au fil de l'eau (flux texte brut, sans trames)."""
+    formatter = ResponseFormatter()
+    async for token in tokens:
+        chunk = formatter.feed(token)
+        if chunk:
+            yield chunk
+    tail = formatter.close()
+    if tail:
+        yield tail
+
+
+def frame(kind: str, **data: Any) -> str:
+    return json.dumps({"type": kind, **data}, ensure_ascii=False) + "\n"
+
+
+def token_frame(content: str) -> str:
+    return frame("token", content=content)
+
+
+def sources_frame(sources: List[str], confidence: Optional[float] = None, **extra: Any) -> str:
+    return frame("sources", sources=list(sources or []), confidence=confidence, **extra)
+
+
+def error_frame(message: str) -> str:
+    return frame("error", message=message)
+
+
+async def _notify(callback: Callable[[Any], Any], arg: Any) -> None:
+    result = callback(arg)
+    if inspect.isawaitable(result):
+        await result
+
+
+class AnswerStream:
+    """Réponse en cours de génération : tokens mis en forme, puis sources en trame finale.
+
+    `frames()` alimente une StreamingResponse NDJSON ; `collect()` renvoie le
+    texte complet pour les endpoints JSON. Dans les deux cas `on_complete`
+    reçoit le flux terminé (texte, sources) et `on_error` l'exception ; les
+    deux peuvent être des coroutines (attendues avant de poursuivre).
+    Les attributs `sources`, `confidence` et `extra` peuvent être modifiés
+    tant que la trame finale n'est pas partie.
+    """
+
+    def __init__(self, tokens: AsyncIterable[str], sources: Optional[List[str]] = None,
+                 confidence: Optional[float] = None,
+                 on_complete: Optional[Callable[["AnswerStream"], Any]] = None,
+                 on_error: Optional[Callable[[Exception], Any]] = None, **extra: Any):
+        self.tokens = tokens
+        self.sources = list(sources or [])
+        self.confidence = confidence
+        self.extra: Dict[str, Any] = extra
+        self.text = ""
+        self.on_complete = on_complete
+        self.on_error = on_error
+
+    async def chunks(self) -> AsyncIterator[str]:
+        started_at = time.perf_counter()
+        first = True
+        async for chunk in format_stream(self.tokens):
+            if first:
+                first = False
+                record("first_token", time.perf_counter() - started_at, started_at)
+            self.text += chunk
+            yield chunk
+        if self.on_complete:
+            await _notify(self.on_complete, self)
+
+    async def collect(self) -> str:
+        try:
+            async for _ in self.chunks():
+                pass
+        except Exception as e:
+            if self.on_error:
+                await _notify(self.on_error, e)
+            raise
+        return self.text
+
+    async def frames(self) -> AsyncIterator[str]:
+        try:
+            async for chunk in self.chunks():
+                yield token_frame(chunk)
+        except Exception as e:
+            print(f"[WARN] Réponse en flux interrompue : {e}")
+            if self.on_error:
+                await _notify(self.on_error, e)
+            yield error_frame(f"Erreur lors de la génération de la réponse : {str(e)[:100]}")
+            return
+        yield sources_frame(self.sources, self.confidence, **self.extra)
@@ -9,7 +9,7 @@ from mistralai.models.chat_completion import ChatMessage
 
 # Imports pour les embeddings
 try:
-    from mistral_cgi_embeddings import load_embeddings, search_similar_articles  # type: ignore
+    from mistral_cgi_embeddings import load_embeddings, search_similar_articles, search_similar_articles_batch  # type: ignore
     from mistral_embeddings import search_similar_bofip_chunks  # type: ignore
     from rag_swiss import SwissRAGSystem  # type: ignore
     CGI_EMBEDDINGS_AVAILABLE = True
@@ -40,6 +40,10 @@ if not client and not groq_client:
 
 # PII sanitizer
 from pii_sanitizer import sanitize_text
+from query_classifier import classify, register_vocabulary
+from tracing import span, traced
+from prompt_budget import ContextChunk, PromptBuilder
+from answer_stream import ResponseFormatter, error_frame, sources_frame, token_frame
 
 # Sources officielles autorisées UNIQUEMENT
 OFFICIAL_SOURCES = {
@@ -79,6 +83,32 @@ def validate_official_source(source_info: Dict) -> bool:
     
     return False
 
+def _format_cgi_results(similar_articles_raw: List[Tuple[Dict, float]], top_k: int) -> List[Dict]:
+    """Filtre STRICTEMENT les articles CGI pertinents et les formate pour le reste du code."""
+    filtered_articles = []
+    for article_tuple in similar_articles_raw:
+        if isinstance(article_tuple, tuple) and len(article_tuple) == 2:
+            article_data, similarity_score = article_tuple
+
+            # VALIDATION STRICTE : Doit être du CGI ET avoir une bonne similarité
+            if (similarity_score >= 0.65 and
+                validate_official_source({'type': 'CGI', 'path': 'cgi_chunks'})):
+                filtered_articles.append(article_data)
+        else:
+            # Gérer le cas où le format n'est pas celui attendu
+            pass
+
+    # Formater pour la compatibilité avec le reste du code
+    results = []
+    for article_data in filtered_articles[:top_k]:
+        results.append({
+            'content': article_data.get('text', ''),
+            'source': f"CGI Article {article_data.get('article_number', 'N/A')}",
+            'article_id': article_data.get('article_number', 'N/A')
+        })
+    return results
+
+@traced("cgi_scan")
 def search_similar_cgi_articles(query: str, top_k: int = 3) -> List[Dict]:
     """Recherche les articles du CGI les plus similaires à la requête EXCLUSIVEMENT."""
     try:
@@ -91,35 +121,31 @@ def search_similar_cgi_articles(query: str, top_k: int = 3) -> List[Dict]:
             return []
         
         similar_articles_raw = search_similar_articles(query, embeddings, top_k=top_k*2)
-        
-        # Filtrer STRICTEMENT les articles CGI pertinents et officiels
-        filtered_articles = []
-        for article_tuple in similar_articles_raw:
-            if isinstance(article_tuple, tuple) and len(article_tuple) == 2:
-                article_data, similarity_score = article_tuple
-                
-                # VALIDATION STRICTE : Doit être du CGI ET avoir une bonne similarité
-                if (similarity_score >= 0.65 and 
-                    validate_official_source({'type': 'CGI', 'path': 'cgi_chunks'})):
-                    filtered_articles.append(article_data)
-            else:
-                # Gérer le cas où le format n'est pas celui attendu
-                pass 
-        
-        # Formater pour la compatibilité avec le reste du code
-        results = []
-        for article_data in filtered_articles[:top_k]: 
-            results.append({
-                'content': article_data.get('text', ''),
-                'source': f"CGI Article {article_data.get('article_number', 'N/A')}",
-                'article_id': article_data.get('article_number', 'N/A')
-            })
-        
-        return results
+        return _format_cgi_results(similar_articles_raw, top_k)
     except Exception as e:
         print(f"Erreur recherche CGI: {e}")
         return []
 
+@traced("cgi_scan")
+def search_similar_cgi_articles_batch(queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+    """Variante groupée : un seul appel d'embedding et un seul parcours du CGI pour toutes les requêtes."""
+    try:
+        if not CGI_EMBEDDINGS_AVAILABLE or not queries:
+            return [[] for _ in queries]
+
+        embeddings = load_embeddings()
+        if not embeddings:
+            return [[] for _ in queries]
+
+        raw_by_query = search_similar_articles_batch(queries, embeddings, top_k=top_k*2)
+        return [_format_cgi_results(raw, top_k) for raw in raw_by_query]
+    except Exception as e:
+        print(f"Erreur recherche CGI groupée: {e}")
+        return [[] for _ in queries]
+
+# Les appelants qui ne connaissent que la recherche unitaire retrouvent sa variante groupée ici
+search_similar_cgi_articles.batch = search_similar_cgi_articles_batch
+
 def search_similar_bofip_chunks_filtered(query: str, top_k: int = 3) -> List[Dict]:
     """Recherche les chunks BOFiP avec validation stricte."""
     try:
@@ -169,48 +195,39 @@ def search_swiss_fiscal_knowledge(query: str, top_k: int = 3) -> Dict:
         print(f"Erreur recherche fiscalité suisse: {e}")
         return {}
 
+SWISS_KEYWORDS = [
+    'suisse', 'swiss', 'canton', 'cantonal', 'communal',
+    'pilier 3a', 'lpp', 'avs', 'ai', 'afc', 'chf',
+    'genève', 'zurich', 'vaud', 'valais', 'berne',
+    'fédéral', 'confédération', 'impôt à la source',
+    'prévoyance', 'cotisations sociales', 'frontalier'
+]
+register_vocabulary("jurisdiction", {"CH": SWISS_KEYWORDS})
+
 def is_swiss_fiscal_question(query: str) -> bool:
     """Détermine si une question concerne la fiscalité suisse."""
-    swiss_keywords = [
-        'suisse', 'swiss', 'canton', 'cantonal', 'communal',
-        'pilier 3a', 'lpp', 'avs', 'ai', 'afc', 'chf',
-        'genève', 'zurich', 'vaud', 'valais', 'berne',
-        'fédéral', 'confédération', 'impôt à la source',
-        'prévoyance', 'cotisations sociales', 'frontalier'
-    ]
-    
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in swiss_keywords)
+    return classify(query).has("jurisdiction", "CH")
 
-def create_prompt(query: str, cgi_articles: List[Dict], bofip_chunks: List[Dict], swiss_result: Dict = None, conversation_history: List[Dict] = None) -> str:
-    """Crée un prompt basé EXCLUSIVEMENT sur les sources officielles."""
-    
-    # Construction du contexte officiel UNIQUEMENT
-    context = ""
-    
-    if cgi_articles:
-        context += "=== CODE GÉNÉRAL DES IMPÔTS (CGI) - SOURCES OFFICIELLES ===\n\n"
-        for article in cgi_articles:
-            context += f"{article['source']}:\n{article['content']}\n\n"
-        context += "="*60 + "\n\n"
+@traced("prompt_build")
+def create_prompt(query: str, cgi_articles: List[Dict], bofip_chunks: List[Dict], swiss_result: Dict = None, conversation_history: List[Dict] = None, model: str = "mistral-large-latest") -> str:
+    """Crée un prompt basé EXCLUSIVEMENT sur les sources officielles, dans le budget de tokens du modèle."""
     
-    if bofip_chunks:
-        context += "=== BULLETIN OFFICIEL DES FINANCES PUBLIQUES (BOFiP) - SOURCES OFFICIELLES ===\n\n"
-        for chunk in bofip_chunks:
-            context += f"{chunk['reference']}:\n{chunk['text'][:1500]}\n\n"
-        context += "="*60 + "\n\n"
+    # Contexte officiel UNIQUEMENT, ajusté au budget par PromptBuilder (doublons retirés, extraits pertinents)
+    builder = PromptBuilder(query, model=model)
+    builder.add_section("CODE GÉNÉRAL DES IMPÔTS (CGI) - SOURCES OFFICIELLES",
+                        [ContextChunk(article['source'], article['content']) for article in cgi_articles or []])
+    builder.add_section("BULLETIN OFFICIEL DES FINANCES PUBLIQUES (BOFiP) - SOURCES OFFICIELLES",
+                        [ContextChunk(chunk['reference'], chunk['text']) for chunk in bofip_chunks or []])
     
     if swiss_result and swiss_result.get('answer'):
-        context += "=== FISCALITÉ SUISSE - SOURCES OFFICIELLES ===\n\n"
-        context += f"Réponse spécialisée fiscalité suisse:\n{swiss_result['answer']}\n\n"
+        swiss_text = swiss_result['answer']
         if swiss_result.get('sources'):
-            context += "Sources consultées:\n"
-            for source in swiss_result['sources']:
-                context += f"- {source.get('chunk_id', 'N/A')} (similarité: {source.get('similarity', 0):.3f})\n"
-        context += "="*60 + "\n\n"
-    
-    if not context:
-        context = "AUCUNE SOURCE OFFICIELLE TROUVÉE pour cette question.\n\n"
+            swiss_text += "\n\nSources consultées:\n" + "".join(
+                f"- {source.get('chunk_id', 'N/A')} (similarité: {source.get('similarity', 0):.3f})\n"
+                for source in swiss_result['sources'])
+        builder.add_section("FISCALITÉ SUISSE - SOURCES OFFICIELLES",
+                            [ContextChunk("Réponse spécialisée fiscalité suisse", swiss_text)])
+    builder.set_history(conversation_history)
     
     # Système de prompt adapté
     if swiss_result and swiss_result.get('answer'):
@@ -239,14 +256,11 @@ RÈGLES IMPÉRATIVES :
 SOURCES OFFICIELLES DISPONIBLES :
 """
 
-    # Historique de conversation (limité)
-    history_context = ""
-    if conversation_history:
-        recent_history = conversation_history[-2:]  # 2 derniers échanges max
-        for msg in recent_history:
-            if msg.get('role') and msg.get('content'):
-                history_context += f"{msg['role'].upper()}: {msg['content'][:200]}...\n"
+    built = builder.build(system_prompt)
+    context = built.context or "AUCUNE SOURCE OFFICIELLE TROUVÉE pour cette question.\n\n"
     
+    # Historique de conversation : derniers messages + résumé des plus anciens, dans le budget
+    history_context = built.history_text
     if history_context:
         history_context = f"\n=== CONTEXTE DE CONVERSATION ===\n{history_context}\n"
     
@@ -313,12 +327,13 @@ def get_fiscal_response(query: str, conversation_history: List[Dict] = None) ->
         
         # Appel à Mistral pour chat/RAG (besoin embeddings)
         messages = [ChatMessage(role="user", content=prompt)]
-        response = client.chat(
-            model="mistral-large-latest",
-            messages=messages,
-            temperature=0.15,  # Très bas pour privilégier la précision
-            max_tokens=1000
-        )
+        with span("llm_total"):
+            response = client.chat(
+                model="mistral-large-latest",
+                messages=messages,
+                temperature=0.15,  # Très bas pour privilégier la précision
+                max_tokens=1000
+            )
         
         answer = response.choices[0].message.content.strip()
         
@@ -384,12 +399,13 @@ def get_francis_vocal_response(query: str, conversation_history: List[Dict] = No
                 messages.insert(-1, msg)
         
         # Appel à Groq pour Francis vocal
-        response = groq_client.chat.completions.create(
-            model="llama3-8b-8192",  # Modèle Groq gratuit et performant
-            messages=messages,
-            temperature=0.15,  # Bas pour précision extraction
-            max_tokens=1024
-        )
+        with span("llm_total"):
+            response = groq_client.chat.completions.create(
+                model="llama3-8b-8192",  # Modèle Groq gratuit et performant
+                messages=messages,
+                temperature=0.15,  # Bas pour précision extraction
+                max_tokens=1024
+            )
         
         answer = response.choices[0].message.content.strip()
         
@@ -408,7 +424,11 @@ def get_francis_vocal_response(query: str, conversation_history: List[Dict] = No
         return ("Erreur lors de l'extraction vocale Francis. Veuillez réessayer.", [], 0.0)
 
 def get_fiscal_response_stream(query: str, conversation_history: List[Dict] = None):
-    """Version streaming qui utilise EXCLUSIVEMENT les sources officielles."""
+    """Version streaming qui utilise EXCLUSIVEMENT les sources officielles.
+
+    Trames de statut pendant la recherche, puis tokens de la réponse mis en
+    forme au fil de l'eau et sources en trame finale (voir answer_stream).
+    """
     try:
         # Envoyer le statut initial
         yield json.dumps({
@@ -447,13 +467,8 @@ def get_fiscal_response_stream(query: str, conversation_history: List[Dict] = No
                     sources = [f"Fiscalité Suisse - {source.get('chunk_id', 'N/A')}" 
                               for source in swiss_result.get('sources', [])]
                     
-                    yield json.dumps({
-                        "type": "complete",
-                        "content": swiss_result['answer'],
-                        "sources": sources,
-                        "confidence": swiss_result['confidence'],
-                        "progress": 100
-                    }) + "\n"
+                    yield token_frame(swiss_result['answer'])
+                    yield sources_frame(sources, swiss_result['confidence'], progress=100)
                     return
                     
             except Exception as e:
@@ -506,13 +521,8 @@ def get_fiscal_response_stream(query: str, conversation_history: List[Dict] = No
 
         # Vérification qu'on a des sources officielles
         if not similar_cgi_articles and not similar_bofip_chunks and not swiss_result:
-            yield json.dumps({
-                "type": "complete",
-                "content": "Je ne trouve aucune information dans les sources officielles (CGI, BOFiP et fiscalité suisse) pour répondre à votre question. Pourriez-vous reformuler ou être plus spécifique ?",
-                "sources": ["Sources officielles consultées mais aucun résultat pertinent"],
-                "confidence": 0.3,
-                "progress": 100
-            }) + "\n"
+            yield token_frame("Je ne trouve aucune information dans les sources officielles (CGI, BOFiP et fiscalité suisse) pour répondre à votre question. Pourriez-vous reformuler ou être plus spécifique ?")
+            yield sources_frame(["Sources officielles consultées mais aucun résultat pertinent"], 0.3, progress=100)
             return
 
         # === PRÉPARATION DU PROMPT OFFICIEL ===
@@ -531,43 +541,31 @@ def get_fiscal_response_stream(query: str, conversation_history: List[Dict] = No
             "progress": 80
         }) + "\n"
 
-        # === GÉNÉRATION DE LA RÉPONSE ===
+        # === GÉNÉRATION DE LA RÉPONSE (tokens transmis dès leur arrivée) ===
         try:
-            signal.alarm(10)  # 10 secondes pour Mistral
-            
             messages = [ChatMessage(role="user", content=prompt)]
-            response = client.chat(
-                model="mistral-large-latest",
-                messages=messages,
-                temperature=0.15,
-                max_tokens=1000
-            )
+            formatter = ResponseFormatter()
+            with span("llm_total"):
+                for chunk in client.chat_stream(
+                    model="mistral-large-latest",
+                    messages=messages,
+                    temperature=0.15,
+                    max_tokens=1000
+                ):
+                    token = chunk.choices[0].delta.content if chunk.choices else None
+                    text = formatter.feed(token or "")
+                    if text:
+                        yield token_frame(text)
+            tail = formatter.close()
+            if tail:
+                yield token_frame(tail)
+
+            # Sources officielles en trame finale
+            yield sources_frame(all_sources, confidence_score, progress=100)
             
-            signal.alarm(0)
-            answer = response.choices[0].message.content.strip()
-            
-            # Ajouter disclaimer sur sources officielles
-            if all_sources:
-                disclaimer = f"\n\n📚 Sources officielles : {', '.join(all_sources[:3])}"
-                if len(all_sources) > 3:
-                    disclaimer += f" et {len(all_sources) - 3} autres"
-                answer += disclaimer
-            
-            # Finaliser avec les sources officielles
-            yield json.dumps({
-                "type": "complete",
-                "content": answer,
-                "sources": all_sources,
-                "confidence": confidence_score,
-                "progress": 100
-            }) + "\n"
-            
-        except (TimeoutError, Exception) as e:
+        except Exception as e:
             print(f"Erreur génération: {e}")
-            yield json.dumps({
-                "type": "error",
-                "message": f"Erreur lors de la génération de la réponse basée sur les sources officielles : {str(e)[:100]}"
-            }) + "\n"
+            yield error_frame(f"Erreur lors de la génération de la réponse basée sur les sources officielles : {str(e)[:100]}")
             
     except Exception as e:
         yield json.dumps({
@@ -1,9 +1,16 @@
 import os
 import json
+import asyncio
 from typing import List, Dict, Tuple, AsyncGenerator, Optional, Literal
 import typing
 from pathlib import Path
 import re
+import time
+
+from query_classifier import classify, register_vocabulary
+from tracing import record, span, traced
+from prompt_budget import ContextChunk, PromptBuilder
+from answer_stream import AnswerStream, error_frame
 
 # Imports pour les embeddings CGI
 try:
@@ -196,21 +203,22 @@ def get_quick_answer(query: str) -> tuple[str, bool]:
     """Retourne toujours une réponse vide pour forcer une recherche approfondie dans les sources officielles."""
     return "", False
 
-def get_fiscal_response(query: str, conversation_history: List[Dict] = None, user_profile_context: Optional[Dict[str, typing.Any]] = None, jurisdiction: Literal["FR", "AD", "CH", "LU"] = "FR"):
-    """
-    Génère une réponse fiscale en utilisant RAG avec les sources officielles.
+def _build_fiscal_prompt(query: str, conversation_history: List[Dict] = None, user_profile_context: Optional[Dict[str, typing.Any]] = None, jurisdiction: Literal["FR", "AD", "CH", "LU"] = "FR"):
+    """Recherche RAG et prompt complet ; renvoie (prompt, BuiltPrompt, sources officielles).
+
+    Partagé par get_fiscal_response et sa version en flux, qui ne diffèrent
+    que par l'appel au LLM.
     """
-    if not client and not USE_LOCAL_LLM:
-        return ("Service Mistral non disponible et aucun backend local détecté. Configurez MISTRAL_API_KEY ou LLM_ENDPOINT.", [], 0.0)
-    
     # Construction du contexte utilisateur si fourni
     user_context_str = ""
     if user_profile_context:
         user_context_str = f"\n\nContexte utilisateur:\n{json.dumps(user_profile_context, indent=2, ensure_ascii=False)}"
+
+    # Les sources sont collectées ici puis ajustées au budget de tokens du modèle (prompt_budget)
+    builder = PromptBuilder(query, model="local" if USE_LOCAL_LLM else "mistral-large-latest")
     
     # Si juridiction = AD (Andorre), on utilise les embeddings andorrans
     if jurisdiction == "AD":
-        context_from_sources = ""
         official_sources = []
 
         try:
@@ -220,13 +228,10 @@ def get_fiscal_response(query: str, conversation_history: List[Dict] = None, use
                 print(f"📄 Chunks Andorre trouvés: {len(andorra_chunks)}")
 
                 if andorra_chunks:
-                    context_from_sources += "=== LÉGISLATION FISCALE ANDORRANE ===\n\n"
                     for chunk in andorra_chunks:
-                        chunk_content = chunk.get('text', '')[:2000]
                         chunk_source = chunk.get('file', 'Texte Andorran')
-                        context_from_sources += f"{chunk_source}:\n{chunk_content}\n\n"
+                        builder.add_source("LÉGISLATION FISCALE ANDORRANE", chunk_source, chunk.get('text', ''))
                         official_sources.append(chunk_source)
-                    context_from_sources += "\n" + "="*60 + "\n\n"
                 else:
                     print("⚠️ Aucun chunk Andorran trouvé")
             else:
@@ -236,7 +241,6 @@ def get_fiscal_response(query: str, conversation_history: List[Dict] = None, use
 
     # Si juridiction = LU (Luxembourg), on utilise les embeddings de base Luxembourg
     elif jurisdiction == "LU":
-        context_from_sources = ""
         official_sources = []
         
         # Tentative de récupération depuis les embeddings Luxembourg
@@ -247,13 +251,10 @@ def get_fiscal_response(query: str, conversation_history: List[Dict] = None, use
                 print(f"📄 Chunks Luxembourg trouvés: {len(lux_chunks)}")
 
                 if lux_chunks:
-                    context_from_sources += "=== LÉGISLATION FISCALE LUXEMBOURGEOISE ===\n\n"
                     for chunk in lux_chunks:
-                        chunk_content = chunk.get('text', '')[:2000]
                         chunk_source = chunk.get('file', 'Texte Luxembourg')
-                        context_from_sources += f"{chunk_source}:\n{chunk_content}\n\n"
+                        builder.add_source("LÉGISLATION FISCALE LUXEMBOURGEOISE", chunk_source, chunk.get('text', ''))
                         official_sources.append(chunk_source)
-                    context_from_sources += "\n" + "="*60 + "\n\n"
                 else:
                     print("⚠️ Aucun chunk Luxembourg trouvé")
             else:
@@ -294,16 +295,15 @@ La TVA est collectée par les entreprises et reversée à l'État.""",
         query_lower = query.lower()
         if any(term in query_lower for term in ['impôt', 'impot', 'revenu', 'ir', 'barème', 'tranche']):
             base = BASE_EMBEDDINGS_LU['ir']
-            context_from_sources += "=== FISCALITÉ LUXEMBOURGEOISE – IR ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ LUXEMBOURGEOISE – IR", base['source'], base['content'])
             official_sources.append(base['source'])
         elif any(term in query_lower for term in ['tva', 'taxe', 'consommation']):
             base = BASE_EMBEDDINGS_LU['tva']
-            context_from_sources += "=== FISCALITÉ LUXEMBOURGEOISE – TVA ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ LUXEMBOURGEOISE – TVA", base['source'], base['content'])
             official_sources.append(base['source'])
 
     # Si juridiction = CH (Suisse), on utilise les embeddings suisses
     elif jurisdiction == "CH":
-        context_from_sources = ""
         official_sources = []
         
         # Embeddings de base pour Suisse
@@ -339,16 +339,15 @@ La TVA est collectée par les entreprises et reversée à la Confédération."""
         query_lower = query.lower()
         if any(term in query_lower for term in ['impôt', 'impot', 'revenu', 'fédéral', 'cantonal']):
             base = BASE_EMBEDDINGS_CH['ir']
-            context_from_sources += "=== FISCALITÉ SUISSE – IR ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ SUISSE – IR", base['source'], base['content'])
             official_sources.append(base['source'])
         elif any(term in query_lower for term in ['tva', 'taxe', 'consommation']):
             base = BASE_EMBEDDINGS_CH['tva']
-            context_from_sources += "=== FISCALITÉ SUISSE – TVA ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ SUISSE – TVA", base['source'], base['content'])
             official_sources.append(base['source'])
 
     else:
         # France (FR) - logique enrichie avec système multi-profils
-        context_from_sources = ""
         official_sources = []
         
         # 🎯 DÉTECTION DE PROFIL UTILISATEUR
@@ -375,18 +374,17 @@ La TVA est collectée par les entreprises et reversée à la Confédération."""
                     )
                     
                     if profile_results:
-                        context_from_sources += "=== EXPERTISE FRANCIS - CONNAISSANCES SPÉCIALISÉES ===\n\n"
                         for result in profile_results:
                             chunk = result['chunk']
                             score = result['weighted_score']
-                            context_from_sources += f"📋 {chunk.profile.value} - {chunk.theme.value} (Score: {score:.3f})\n"
-                            context_from_sources += f"{chunk.content}\n"
+                            chunk_text = chunk.content
                             if chunk.examples:
-                                context_from_sources += f"💡 Exemple: {chunk.examples[0]}\n"
-                            context_from_sources += f"🔖 Tags: {', '.join(chunk.tags)}\n\n"
+                                chunk_text += f"\n💡 Exemple: {chunk.examples[0]}"
+                            chunk_text += f"\n🔖 Tags: {', '.join(chunk.tags)}"
+                            builder.add_source("EXPERTISE FRANCIS - CONNAISSANCES SPÉCIALISÉES",
+                                               f"📋 {chunk.profile.value} - {chunk.theme.value} (Score: {score:.3f})", chunk_text)
                             
                         official_sources.append("Expertise Francis - Base de connaissances multi-profils")
-                        context_from_sources += "\n" + "="*60 + "\n\n"
                         
                         # Contexte pour le prompt
                         profile_context = f"\n\n=== CONTEXTE PROFIL UTILISATEUR ===\nProfil principal: {profile_type.value}\nConfiance: {confidence:.2f}\nMots-clés détectés: {', '.join(detected_keywords)}\n"
@@ -407,13 +405,10 @@ La TVA est collectée par les entreprises et reversée à la Confédération."""
                 print(f"📄 Chunks CGI trouvés: {len(cgi_chunks)}")
 
                 if cgi_chunks:
-                    context_from_sources += "=== CODE GÉNÉRAL DES IMPÔTS (CGI) ===\n\n"
                     for chunk in cgi_chunks:
-                        chunk_content = chunk.get('content', '')[:(1500 if USE_LOCAL_LLM else 3000)]
                         chunk_source = chunk.get('source', 'CGI Article N/A')
-                        context_from_sources += f"{chunk_source}:\n{chunk_content}\n\n"
+                        builder.add_source("CODE GÉNÉRAL DES IMPÔTS (CGI)", chunk_source, chunk.get('content', ''))
                         official_sources.append(chunk_source)
-                    context_from_sources += "\n" + "="*60 + "\n\n"
                 else:
                     print("⚠️ Aucun chunk CGI trouvé")
         except Exception as e:
@@ -428,61 +423,54 @@ La TVA est collectée par les entreprises et reversée à la Confédération."""
                 print(f"📄 Chunks BOFiP trouvés: {len(bofip_chunks)}")
 
                 if bofip_chunks:
-                    context_from_sources += "=== BULLETIN OFFICIEL DES FINANCES PUBLIQUES (BOFiP) ===\n\n"
                     for chunk in bofip_chunks:
                         if validate_official_source({'type': 'BOFIP', 'path': 'bofip_chunks'}):
-                            chunk_content = chunk.get('text', '')[:(1200 if USE_LOCAL_LLM else 2000)]
                             chunk_source = f"BOFiP - {chunk.get('file', 'Chunk N/A')}"
-                            context_from_sources += f"{chunk_source}:\n{chunk_content}\n\n"
+                            builder.add_source("BULLETIN OFFICIEL DES FINANCES PUBLIQUES (BOFiP)", chunk_source, chunk.get('text', ''))
                             official_sources.append(chunk_source)
-                    context_from_sources += "\n" + "="*60 + "\n\n"
                 else:
                     print("⚠️ Aucun chunk BOFiP trouvé")
         except Exception as e:
             print(f"❌ Erreur lors de la recherche BOFiP: {e}")
     
     # 3. Fallback vers les embeddings de base si aucune source trouvée
-    if jurisdiction == "AD" and not context_from_sources:
+    if jurisdiction == "AD" and not builder.has_context():
         print("🔄 Fallback Andorre simplifié…")
         query_lower = query.lower()
         if any(term in query_lower for term in ['irpf', 'impôt sur le revenu', 'impot sur le revenu']):
             base = BASE_EMBEDDINGS_AD['irpf']
-            context_from_sources += "=== FISCALITÉ ANDORRANE – IRPF ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ ANDORRANE – IRPF", base['source'], base['content'])
             official_sources.append(base['source'])
         elif any(term in query_lower for term in ['igi', 'tva', 'taxe', 'indirect']):
             base = BASE_EMBEDDINGS_AD['igi']
-            context_from_sources += "=== FISCALITÉ ANDORRANE – IGI ===\n\n" + f"{base['source']}:\n{base['content']}\n\n"
+            builder.add_source("FISCALITÉ ANDORRANE – IGI", base['source'], base['content'])
             official_sources.append(base['source'])
 
-    if jurisdiction == "FR" and not context_from_sources:
+    if jurisdiction == "FR" and not builder.has_context():
         print("🔄 Utilisation des embeddings de base...")
         query_lower = query.lower()
         if any(term in query_lower for term in ['tmi', 'taux marginal', 'tranche', 'impôt', 'impot']):
             base_embedding = BASE_EMBEDDINGS_FR['tmi']
-            context_from_sources += "=== CODE GÉNÉRAL DES IMPÔTS (CGI) ===\n\n"
-            context_from_sources += f"{base_embedding['source']}:\n{base_embedding['content']}\n\n"
+            builder.add_source("CODE GÉNÉRAL DES IMPÔTS (CGI)", base_embedding['source'], base_embedding['content'])
             official_sources.append(base_embedding['source'])
-            context_from_sources += "\n" + "="*60 + "\n\n"
         elif any(term in query_lower for term in ['tva', 'taxe valeur ajoutée']):
             base_embedding = BASE_EMBEDDINGS_FR['tva']
-            context_from_sources += "=== CODE GÉNÉRAL DES IMPÔTS (CGI) ===\n\n"
-            context_from_sources += f"{base_embedding['source']}:\n{base_embedding['content']}\n\n"
+            builder.add_source("CODE GÉNÉRAL DES IMPÔTS (CGI)", base_embedding['source'], base_embedding['content'])
             official_sources.append(base_embedding['source'])
-            context_from_sources += "\n" + "="*60 + "\n\n"
         elif any(term in query_lower for term in ['plus-value', 'plusvalue', 'plus value']):
             base_embedding = BASE_EMBEDDINGS_FR['plus_value']
-            context_from_sources += "=== CODE GÉNÉRAL DES IMPÔTS (CGI) ===\n\n"
-            context_from_sources += f"{base_embedding['source']}:\n{base_embedding['content']}\n\n"
+            builder.add_source("CODE GÉNÉRAL DES IMPÔTS (CGI)", base_embedding['source'], base_embedding['content'])
             official_sources.append(base_embedding['source'])
-            context_from_sources += "\n" + "="*60 + "\n\n"
     
-    if not context_from_sources:
+    context_from_sources = ""
+    if not builder.has_context():
         # Fallback : répondre tout de même en mode "expert conseil" sans citation précise
         print(f"⚠️ Aucune source officielle trouvée pour : {query} – utilisation du mode conseil générique")
         context_from_sources = "=== EXPERTISE FISCALE GÉNÉRALE ===\n\n" \
                              + "Les informations suivantes reposent sur les principes généraux du droit fiscal français, " \
                              + "les pratiques courantes de planification patrimoniale et l'expérience de Francis en tant que conseiller CGP.\n\n"
     
+    prompt_started = time.perf_counter()
     # Adapter le message système selon la juridiction
     if jurisdiction == "AD":
         system_message = """Tu es Francis, LE spécialiste absolu de la fiscalité andorrane. Tu es un expert fiscal senior avec 20 ans d'expérience exclusive sur le système fiscal andorran.
@@ -600,35 +588,54 @@ RÈGLES DE RÉPONSE EXCELLENCE :
 SOURCES OFFICIELLES ET SPÉCIALISÉES DISPONIBLES :
 """
         
+    # Sources et historique ajustés au budget de tokens (les derniers messages tels quels, les anciens résumés)
+    builder.set_history(conversation_history, keep_last=4)
+    built = builder.build(system_message, user_context_str)
+    context_from_sources = built.context or context_from_sources
+    print(f"🧮 Prompt : {built.usage.describe()}")
+    history_summary = f"=== CONTEXTE DE CONVERSATION ===\n{built.history_summary}\n\n" if built.history_summary else ""
+
     full_prompt = f"""{system_message}
 {context_from_sources}
-{user_context_str}QUESTION DE L'UTILISATEUR :
+{history_summary}{user_context_str}QUESTION DE L'UTILISATEUR :
 {query}
 
 RÉPONSE (basée UNIQUEMENT sur les sources officielles et le contexte utilisateur pour l'interprétation) :
 """
+    record("prompt_build", time.perf_counter() - prompt_started, prompt_started)
+    return full_prompt, built, official_sources
+
+
+def _local_prompt(full_prompt: str, built) -> str:
+    """Prompt final pour un modèle local simple type chat-instruct, historique récent en tête."""
+    history_str = "".join(f"{msg['role'].capitalize()}: {msg['content']}\n" for msg in built.recent_history)
+    fast_prefix = (
+        "MODE RÉPONSE RAPIDE : Réponds de façon CONCISE (<= 12 lignes). "
+        "Utilise des TABLEAUX quand c'est pertinent. Cite les sources UNIQUEMENT si nécessaire. "
+        "Va droit au but."
+    )
+    fast_prompt = f"{fast_prefix}\n\n{full_prompt}"
+    return f"{history_str}Utilisateur: {fast_prompt}\nAssistant:"  # On reste cohérent en français
+
+
+def _confidence_score(official_sources: List[str]) -> float:
+    """Score de confiance basé sur la qualité des sources officielles."""
+    return min(1.0, len(official_sources) / 2.0) if official_sources else 0.1
+
+
+def get_fiscal_response(query: str, conversation_history: List[Dict] = None, user_profile_context: Optional[Dict[str, typing.Any]] = None, jurisdiction: Literal["FR", "AD", "CH", "LU"] = "FR"):
+    """
+    Génère une réponse fiscale en utilisant RAG avec les sources officielles.
+    """
+    if not client and not USE_LOCAL_LLM:
+        return ("Service Mistral non disponible et aucun backend local détecté. Configurez MISTRAL_API_KEY ou LLM_ENDPOINT.", [], 0.0)
+
+    full_prompt, built, official_sources = _build_fiscal_prompt(query, conversation_history, user_profile_context, jurisdiction)
 
-    # Construire l'historique de conversation si disponible
     if USE_LOCAL_LLM:
-        history_str = ""
-        if conversation_history:
-            for msg in conversation_history[-4:]:
-                role = msg.get("role", "user").capitalize()
-                content = msg.get("content", "")[:200]
-                history_str += f"{role}: {content}\n"
-        # Prompt final pour un modèle simple type chat-instruct
-        fast_prefix = (
-            "MODE RÉPONSE RAPIDE : Réponds de façon CONCISE (<= 12 lignes). "
-            "Utilise des TABLEAUX quand c'est pertinent. Cite les sources UNIQUEMENT si nécessaire. "
-            "Va droit au but."
-        )
-        fast_prompt = f"{fast_prefix}\n\n{full_prompt}"
-        local_prompt = (
-            f"{history_str}Utilisateur: {fast_prompt}\nAssistant:"  # On reste cohérent en français
-        )
         try:
             answer = _local_generate(
-                local_prompt,
+                _local_prompt(full_prompt, built),
                 model=os.getenv("LLM_LOCAL_MODEL", "mistral"),
                 max_tokens=350,
                 temperature=0.1,
@@ -642,12 +649,13 @@ RÉPONSE (basée UNIQUEMENT sur les sources officielles et le contexte utilisate
 
                     _client_fallback = MistralClient(api_key=MISTRAL_API_KEY)
                     messages_fallback = [_ChatMessage(role="user", content=full_prompt)]
-                    response_fb = _client_fallback.chat(
-                        model="mistral-large-latest",
-                        messages=messages_fallback,
-                        temperature=0.1,
-                        max_tokens=1000,
-                    )
+                    with span("llm_total"):
+                        response_fb = _client_fallback.chat(
+                            model="mistral-large-latest",
+                            messages=messages_fallback,
+                            temperature=0.1,
+                            max_tokens=1000,
+                        )
                     answer = response_fb.choices[0].message.content.strip()
                 except Exception as e2:
                     return (f"Erreur LLM local puis fallback API Mistral : {e} / {e2}", [], 0.0)
@@ -658,11 +666,9 @@ RÉPONSE (basée UNIQUEMENT sur les sources officielles et le contexte utilisate
         # Appel API Mistral
         # --------------------
         messages_for_api = []
-        if conversation_history and ChatMessage is not None:
-            for msg in conversation_history[-10:]:
-                if msg.get("role") and msg.get("content"):
-                    truncated_content = msg["content"][:400]
-                    messages_for_api.append(ChatMessage(role=msg["role"], content=truncated_content))
+        if ChatMessage is not None:
+            for msg in built.recent_history:
+                messages_for_api.append(ChatMessage(role=msg["role"], content=msg["content"]))
 
         if ChatMessage is not None:
             messages_for_api.append(ChatMessage(role="user", content=full_prompt))
@@ -670,22 +676,18 @@ RÉPONSE (basée UNIQUEMENT sur les sources officielles et le contexte utilisate
         if not client:
             return ("Service Mistral non disponible. Configurez MISTRAL_API_KEY ou un LLM local.", [], 0.0)
 
-        response = client.chat(
-            model="mistral-large-latest",
-            messages=messages_for_api,
-            temperature=0.1,
-            max_tokens=1000,
-        )
+        with span("llm_total"):
+            response = client.chat(
+                model="mistral-large-latest",
+                messages=messages_for_api,
+                temperature=0.1,
+                max_tokens=1000,
+            )
 
         answer = response.choices[0].message.content.strip()
 
     # Supprimer la logique d'ajout du disclaimer. Francis gère les citations.
-    final_answer = answer
-    
-    # Score de confiance basé sur la qualité des sources officielles
-    confidence_score = min(1.0, len(official_sources) / 2.0) if official_sources else 0.1
-    
-    return final_answer, list(set(official_sources)), confidence_score
+    return answer, list(set(official_sources)), _confidence_score(official_sources)
 
 def search_bofip_embeddings(query: str, max_results: int = 3) -> List[Dict]:
     """Recherche dans les embeddings BOFiP (source officielle)."""
@@ -728,6 +730,52 @@ def search_bofip_embeddings(query: str, max_results: int = 3) -> List[Dict]:
             print(f"Erreur fallback BOFiP local: {e2}")
             return []
 
+# Sujets CGI : termes reconnus dans la question → requête enrichie et mots-clés de filtrage
+TOPIC_MAP = [
+    {
+        "match": ['tmi', 'tranche', 'marginal', 'imposition', 'barème', 'impôt sur le revenu', 'ir', 'impôt', 'impots', 'payer', 'quotient', 'part'],
+        "enhanced": "article 197 CGI impôt sur le revenu barème progressif tranches marginales taux imposition",
+        "keywords": ['197', 'barème', 'tranche', 'taux', 'impôt', 'revenu', 'quotient', 'part']
+    },
+    {
+        "match": ['tva', 'taxe valeur ajoutée', 'taux tva'],
+        "enhanced": "article 278 279 CGI TVA taux normal réduit super-réduit taxe valeur ajoutée",
+        "keywords": ['278', '279', 'tva', 'taux', 'taxe']
+    },
+    {
+        "match": ['réduction', 'crédit', 'déduction', 'avantage fiscal', 'credit d\'impôt', 'crédit d\'impot'],
+        "enhanced": "article 199 200 CGI réduction crédit impôt déduction fiscale avantage",
+        "keywords": ['199', '200', 'réduction', 'crédit', 'déduction']
+    },
+    {
+        "match": ['plus-value', 'plus value', 'cession', 'vente', 'pv', 'plusvalues'],
+        "enhanced": "article 150 CGI plus-value cession vente immobilier actions",
+        "keywords": ['150', 'plus-value', 'cession', 'vente']
+    },
+    {
+        "match": ['sci', 'société civile', 'immobilier', 'sci familiale'],
+        "enhanced": "CGI société civile immobilière SCI régime fiscal imposition",
+        "keywords": ['sci', 'société', 'civile', 'immobilière']
+    },
+    {
+        "match": ['is', 'impôt sur les sociétés', 'impot sur les societes', 'bénéfice imposable', 'resultat fiscal'],
+        "enhanced": "article 209 CGI impôt sur les sociétés base imposable taux",
+        "keywords": ['209', 'impôt', 'sociétés', 'is', 'taux']
+    },
+    {
+        "match": ['ifi', 'fortune', 'immobilière', 'impôt sur la fortune immobilière'],
+        "enhanced": "article 964 CGI impôt sur la fortune immobilière assiette exonérations",
+        "keywords": ['964', 'ifi', 'fortune', 'immobilière']
+    },
+    {
+        "match": ['cvae', 'cfe', 'cotisation foncière', 'cotisation sur la valeur ajoutée'],
+        "enhanced": "article 1586 CGI cfe cvae cotisation locale valeur ajoutée entreprises",
+        "keywords": ['1586', 'cfe', 'cvae', 'cotisation']
+    }
+]
+register_vocabulary("cgi.topic", {i: topic["match"] for i, topic in enumerate(TOPIC_MAP)})
+
+@traced("cgi_scan")
 def search_cgi_embeddings(query: str, max_results: int = 3) -> List[Dict]:
     """Recherche intelligente dans les embeddings CGI UNIQUEMENT - CHARGEMENT À LA DEMANDE."""
     global _embeddings_cache, _cache_loaded
@@ -750,58 +798,14 @@ def search_cgi_embeddings(query: str, max_results: int = 3) -> List[Dict]:
         query_lower = query.lower().strip()
         
         # ----------------------
-        # Détection du sujet
+        # Détection du sujet (premier sujet de TOPIC_MAP reconnu)
         # ----------------------
-        TOPIC_MAP = [
-            {
-                "match": ['tmi', 'tranche', 'marginal', 'imposition', 'barème', 'impôt sur le revenu', 'ir', 'impôt', 'impots', 'payer', 'quotient', 'part'],
-                "enhanced": "article 197 CGI impôt sur le revenu barème progressif tranches marginales taux imposition",
-                "keywords": ['197', 'barème', 'tranche', 'taux', 'impôt', 'revenu', 'quotient', 'part']
-            },
-            {
-                "match": ['tva', 'taxe valeur ajoutée', 'taux tva'],
-                "enhanced": "article 278 279 CGI TVA taux normal réduit super-réduit taxe valeur ajoutée",
-                "keywords": ['278', '279', 'tva', 'taux', 'taxe']
-            },
-            {
-                "match": ['réduction', 'crédit', 'déduction', 'avantage fiscal', 'credit d\'impôt', 'crédit d\'impot'],
-                "enhanced": "article 199 200 CGI réduction crédit impôt déduction fiscale avantage",
-                "keywords": ['199', '200', 'réduction', 'crédit', 'déduction']
-            },
-            {
-                "match": ['plus-value', 'plus value', 'cession', 'vente', 'pv', 'plusvalues'],
-                "enhanced": "article 150 CGI plus-value cession vente immobilier actions",
-                "keywords": ['150', 'plus-value', 'cession', 'vente']
-            },
-            {
-                "match": ['sci', 'société civile', 'immobilier', 'sci familiale'],
-                "enhanced": "CGI société civile immobilière SCI régime fiscal imposition",
-                "keywords": ['sci', 'société', 'civile', 'immobilière']
-            },
-            {
-                "match": ['is', 'impôt sur les sociétés', 'impot sur les societes', 'bénéfice imposable', 'resultat fiscal'],
-                "enhanced": "article 209 CGI impôt sur les sociétés base imposable taux",
-                "keywords": ['209', 'impôt', 'sociétés', 'is', 'taux']
-            },
-            {
-                "match": ['ifi', 'fortune', 'immobilière', 'impôt sur la fortune immobilière'],
-                "enhanced": "article 964 CGI impôt sur la fortune immobilière assiette exonérations",
-                "keywords": ['964', 'ifi', 'fortune', 'immobilière']
-            },
-            {
-                "match": ['cvae', 'cfe', 'cotisation foncière', 'cotisation sur la valeur ajoutée'],
-                "enhanced": "article 1586 CGI cfe cvae cotisation locale valeur ajoutée entreprises",
-                "keywords": ['1586', 'cfe', 'cvae', 'cotisation']
-            }
-        ]
-
         enhanced_query = None
         keywords = []
-        for topic in TOPIC_MAP:
-            if any(term in query_lower for term in topic["match"]):
-                enhanced_query = topic["enhanced"]
-                keywords = topic["keywords"]
-                break
+        topic_index = classify(query_lower).first("cgi.topic")
+        if topic_index is not None:
+            enhanced_query = TOPIC_MAP[topic_index]["enhanced"]
+            keywords = TOPIC_MAP[topic_index]["keywords"]
 
         # Fallback générique
         if enhanced_query is None:
@@ -867,27 +871,10 @@ def search_cgi_embeddings(query: str, max_results: int = 3) -> List[Dict]:
         # Trier par score final et prendre les meilleurs
         scored_articles.sort(key=lambda x: x['final_score'], reverse=True)
         
-        # Formatage des résultats avec plus de contexte
+        # Texte complet : la réduction aux paragraphes pertinents se fait dans le budget du prompt (prompt_budget)
         results = []
-        for i, article_data in enumerate(scored_articles[:max_results]):
-            # Pour les 3 premiers articles, prendre TOUT le texte
-            if i < 3:
-                text = article_data.get('text', '')  # Texte complet sans limitation
-            else:
-                # Pour les articles suivants, extraire la partie pertinente
-                text = article_data.get('text', '')
-                if len(text) > 3000:
-                    # Chercher les paragraphes contenant les mots-clés
-                    paragraphs = text.split('\n')
-                    relevant_paragraphs = []
-                    for para in paragraphs:
-                        if any(keyword in para.lower() for keyword in keywords):
-                            relevant_paragraphs.append(para)
-                    
-                    if relevant_paragraphs:
-                        text = '\n'.join(relevant_paragraphs[:5])[:3000]
-                    else:
-                        text = text[:3000]
+        for article_data in scored_articles[:max_results]:
+            text = article_data.get('text', '')
             
             # print(f"📄 Article trouvé : {article_data.get('article_number', 'N/A')} avec score {article_data.get('final_score', 0)}") # Supprimé car trop verbeux
             results.append({
@@ -923,29 +910,54 @@ def get_relevant_context(query: str) -> str:
     return context if context else "Aucune source officielle trouvée pour cette question."
 
 # NOUVELLE FONCTION STREAMING
+async def _answer_tokens(full_prompt: str, built) -> AsyncGenerator[str, None]:
+    """Tokens de la réponse : LLM local si configuré (bascule vers Mistral avant le premier token), sinon API Mistral."""
+    from llm_completion import mistral_stream
+
+    if USE_LOCAL_LLM:
+        from ollama_client import LLMUnavailable, get_local_llm
+
+        started = False
+        try:
+            async for token in get_local_llm(model=os.getenv("LLM_LOCAL_MODEL", "mistral")).stream(
+                    _local_prompt(full_prompt, built), options={"num_predict": 350, "temperature": 0.1}):
+                started = True
+                yield token
+            return
+        except LLMUnavailable as e:
+            if started or not MISTRAL_API_KEY:
+                raise
+            print(f"[WARN] LLM local indisponible, bascule sur l'API Mistral : {e}")
+        messages = [{"role": "user", "content": full_prompt}]
+    else:
+        messages = [{"role": msg["role"], "content": msg["content"]} for msg in built.recent_history]
+        messages.append({"role": "user", "content": full_prompt})
+    async for token in mistral_stream(messages, "mistral-large-latest", max_tokens=1000, temperature=0.1):
+        yield token
+
+
 async def get_fiscal_response_stream(query: str, conversation_history: List[Dict] = None, user_profile_context: Optional[Dict[str, typing.Any]] = None, jurisdiction: Literal["FR", "AD", "CH", "LU"] = "FR") -> AsyncGenerator[str, None]:
-    """Génère une réponse fiscale en streaming (actuellement, une seule réponse complète)."""
+    """Génère une réponse fiscale en streaming : tokens mis en forme au fil de l'eau, sources en trame finale.
+
+    Trames NDJSON décrites dans answer_stream.
+    """
+    if not client and not USE_LOCAL_LLM:
+        yield error_frame("Service Mistral non disponible et aucun backend local détecté. Configurez MISTRAL_API_KEY ou LLM_ENDPOINT.")
+        return
     try:
-        answer, sources, confidence = get_fiscal_response(query, conversation_history, user_profile_context, jurisdiction)
-        
-        response_data = {
-            "type": "full_response",
-            "answer": answer,
-            "sources": sources,
-            "confidence": confidence,
-            "status": "success"
-        }
-        yield json.dumps(response_data) + "\n"
-        
+        full_prompt, built, official_sources = await asyncio.to_thread(
+            _build_fiscal_prompt, query, conversation_history, user_profile_context, jurisdiction
+        )
     except Exception as e:
         error_message = f"Erreur lors du traitement de la question en streaming: {str(e)}"
         print(error_message)
-        error_response = {
-            "type": "error",
-            "message": error_message,
-            "status": "error"
-        }
-        yield json.dumps(error_response) + "\n"
+        yield error_frame(error_message)
+        return
+
+    stream = AnswerStream(_answer_tokens(full_prompt, built), list(set(official_sources)),
+                          _confidence_score(official_sources))
+    async for frame in stream.frames():
+        yield frame
 
 def main():
     """Test principal pour développement local."""
@@ -6,6 +6,7 @@ première estimation ; elles ne remplacent pas un calcul complet intégrant tous
 les régimes spéciaux et plafonnements.
 """
 from typing import Literal, Dict, Optional, List
+import numpy as np
 from tax_data_loader import get_tax_data
 from income_utils import compute_revenu_net_imposable
 from credits_impot import calculate_credits
@@ -571,4 +572,115 @@ def _calculate_cehr(revenu_imposable: float) -> float:
             total += (min(revenu_imposable, sup) - inf) * tr["taux"]
         else:
             break
-    return total 
\ No newline at end of file
+    return total 
+
+
+# ---------------------------------------------------------------
+# Variantes vectorisées (numpy) – calcul d'un portefeuille entier
+# ---------------------------------------------------------------
+
+def _apply_bareme_ir_vectorise(quotients: np.ndarray, bareme: Optional[List[tuple]] = None) -> np.ndarray:
+    """Équivalent de `_apply_bareme_ir` sur un tableau de quotients familiaux."""
+    if bareme is None:
+        bareme = _BAREME_IR_DYNAMIC
+    impots = np.zeros_like(quotients, dtype=float)
+    for limite_inf, limite_sup, taux in bareme:
+        impots += np.clip(quotients - limite_inf, 0.0, limite_sup - limite_inf) * taux
+    return impots
+
+
+def _tmi_vectorise(quotients: np.ndarray, bareme: Optional[List[tuple]] = None) -> np.ndarray:
+    """Taux marginal (0.11, 0.30…) atteint par chaque quotient familial."""
+    if bareme is None:
+        bareme = _BAREME_IR_DYNAMIC
+    tmi = np.zeros_like(quotients, dtype=float)
+    for limite_inf, _limite_sup, taux in bareme:
+        tmi = np.where(quotients > limite_inf, taux, tmi)
+    return tmi
+
+
+def compute_irpp_vectorise(revenus: np.ndarray, parts: np.ndarray, bareme: Optional[List[tuple]] = None) -> np.ndarray:
+    """Version vectorisée de `compute_irpp_simple` (un élément par foyer)."""
+    revenus = np.asarray(revenus, dtype=float)
+    parts = np.asarray(parts, dtype=float)
+    quotients = np.divide(revenus, parts, out=np.zeros_like(revenus), where=parts != 0)
+    return _apply_bareme_ir_vectorise(quotients, bareme) * parts
+
+
+def impot_revenu_net_vectorise(revenus: np.ndarray, parts: np.ndarray) -> np.ndarray:
+    """Version vectorisée de `impot_revenu_net` (même barème, arrondi au centime)."""
+    revenus = np.asarray(revenus, dtype=float)
+    parts = np.broadcast_to(np.asarray(parts, dtype=float), revenus.shape)
+    if np.any(parts <= 0):
+        raise ValueError("Le nombre de parts doit être positif.")
+    quotients = revenus / parts
+    impots = np.zeros_like(quotients)
+    for i, (seuil, taux) in enumerate(_BAREME_IR_COMPAT):
+        plafond = _BAREME_IR_COMPAT[i + 1][0] if i + 1 < len(_BAREME_IR_COMPAT) else float("inf")
+        impots += np.clip(quotients - seuil, 0.0, plafond - seuil) * taux
+    return np.round(impots * parts, 2)
+
+
+def impot_revenu_vectorise(revenus: np.ndarray, parts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Calcule IR brut, plafonnement QF, décote et TMI pour N foyers en une passe.
+
+    Les règles sont strictement celles de `_apply_plafond_qf` et `_apply_decote`,
+    appliquées élément par élément.
+    """
+    revenus = np.asarray(revenus, dtype=float)
+    parts = np.asarray(parts, dtype=float)
+
+    impot_brut = compute_irpp_vectorise(revenus, parts)
+
+    # Plafonnement du quotient familial (comparaison à un couple sans enfants)
+    impot_base_couple = compute_irpp_vectorise(revenus, np.full_like(parts, 2.0))
+    avantage_max = QF_CAP_HALF * (parts - 2)
+    plafonne = (parts > 2) & ((impot_base_couple - impot_brut) > avantage_max)
+    impot_qf = np.where(plafonne, impot_base_couple - avantage_max, impot_brut)
+
+    # Décote
+    seuil = np.where(parts >= 2, DECOTE_COUP, DECOTE_CEL)
+    impot_net = np.where(impot_qf < seuil, np.maximum(0.0, 2 * impot_qf - seuil), impot_qf)
+
+    quotients = np.divide(revenus, parts, out=np.zeros_like(revenus), where=parts != 0)
+    return {
+        "impot_brut": impot_brut,
+        "impot_net": impot_net,
+        "tmi": _tmi_vectorise(quotients),
+    }
+
+
+def simulate_tax_scenario_vectorise(
+    revenus: np.ndarray,
+    parts: np.ndarray,
+    per_versement: float = 0.0,
+    lmnp_revenus_brut: float = 0.0,
+    pinel_investissement: float = 0.0,
+) -> Dict[str, np.ndarray]:
+    """Applique un même scénario PER / LMNP / Pinel+ à N foyers.
+
+    Reprend les étapes 2 à 8 de `simulate_tax_scenario` (sans crédits ni
+    revenus détaillés) et retourne l'IR après optimisation pour chaque foyer.
+    """
+    tax_cfg = _TAX_DATA
+    revenus = np.asarray(revenus, dtype=float)
+    parts = np.asarray(parts, dtype=float)
+
+    plafond_per = tax_cfg.get("plafond_per", per_versement)
+    revenu_post = np.maximum(0.0, revenus - min(per_versement, plafond_per))
+
+    if lmnp_revenus_brut > 0:
+        seuil_micro = tax_cfg.get("lmnp_micro_seuil", float("inf"))
+        abattement = tax_cfg.get("lmnp_micro_abattement", 0.5)
+        if lmnp_revenus_brut <= seuil_micro:
+            revenu_post = revenu_post + lmnp_revenus_brut * (1 - abattement)
+        else:
+            revenu_post = revenu_post + lmnp_revenus_brut
+
+    reduction_pinel = min(pinel_investissement, tax_cfg.get("plafond_pinel_plus", 300000)) * 0.02
+    ir = impot_revenu_vectorise(revenu_post, parts)
+    return {
+        "revenu_imposable": revenu_post,
+        "ir_apres": np.maximum(0.0, ir["impot_net"] - reduction_pinel),
+        "tmi": ir["tmi"],
+    }
@@ -0,0 +1,71 @@
+"""Identifiants de chunks adressés par contenu et calcul de différentiel d'index.
+
+L'empreinte d'un chunk dépend de son texte normalisé et de son document
+d'origine (article CGI, fichier source…), pas de son rang : un découpage qui
+décale les numéros de chunks ne change aucune empreinte, seuls les chunks
+réellement modifiés doivent être recalculés.
+"""
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+HASH_LENGTH = 24
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Forme canonique d'un texte : NFKC, espaces fusionnés, bords supprimés."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def chunk_hash(source: str, text: str) -> str:
+    digest = hashlib.sha256(f"{source}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return digest[:HASH_LENGTH]
+
+
+@dataclass
+class IndexDiff:
+    """Différentiel entre les chunks à indexer et l'index courant (au niveau des empreintes)."""
+
+    added: List[str] = field(default_factory=list)      # empreintes absentes de l'index : à calculer
+    removed: List[str] = field(default_factory=list)    # empreintes de l'index qui disparaissent
+    unchanged: List[str] = field(default_factory=list)  # empreintes réutilisées telles quelles
+    changed_ids: List[str] = field(default_factory=list)  # identifiants présents des deux côtés, contenu modifié
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.added and not self.removed
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "unchanged": len(self.unchanged),
+            "changed": len(self.changed_ids),
+        }
+
+
+def diff_index(
+    new_ids: Sequence[str],
+    new_hashes: Sequence[str],
+    current_ids: Sequence[str],
+    current_hashes: Optional[Sequence[str]],
+) -> IndexDiff:
+    """Compare les chunks à indexer à l'index courant (current_hashes None : index sans empreintes)."""
+    current = set(current_hashes or ())
+    new = set(new_hashes)
+    diff = IndexDiff(
+        added=[h for h in dict.fromkeys(new_hashes) if h not in current],
+        removed=[h for h in dict.fromkeys(current_hashes or ()) if h not in new],
+        unchanged=[h for h in dict.fromkeys(new_hashes) if h in current],
+    )
+    if current_hashes:
+        previous = dict(zip(current_ids, current_hashes))
+        diff.changed_ids = [
+            chunk_id for chunk_id, h in zip(new_ids, new_hashes)
+            if chunk_id in previous and previous[chunk_id] != h
+        ]
+    return diff
@@ -0,0 +1,163 @@
+"""Conversations Francis Particulier : une session par conversation, expirée après inactivité.
+
+L'instance globale de Francis gardait l'historique, le profil fusionné et
+les analytics de tous les utilisateurs : le contexte d'un utilisateur
+fuyait dans les réponses d'un autre, un verrou global sérialisait les
+requêtes et l'objet grossissait sans limite. Le moteur est désormais sans
+état ; chaque conversation est rangée ici, sous son identifiant :
+- `exchanges` : tampon circulaire des derniers échanges, sous forme compacte
+  (question tronquée, type de réponse, quelques champs de l'analyse) ;
+- `user_profile` : profil fusionné au fil de la conversation.
+
+Les sessions sont des documents du backend partagé de rate_counters (SQLite
+dès que plusieurs workers tournent) : une conversation se poursuit quel que
+soit le worker qui reçoit la question suivante. Une requête travaille sur une
+copie (`get` / `get_or_create`) puis `save` n'ajoute au document que ses
+propres échanges, en une écriture atomique : deux requêtes d'une même
+conversation ne s'écrasent pas. Chaque enregistrement repousse l'expiration.
+
+Les identifiants sont toujours émis par le serveur (uuid4) et chaque session
+appartient à l'utilisateur authentifié qui l'a ouverte : un identifiant
+inconnu, expiré ou appartenant à un autre utilisateur ne donne accès à rien
+(`get` renvoie None, `get_or_create` ouvre une nouvelle session).
+"""
+import os
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, MutableSequence, Optional
+
+from rate_counters import CounterBackend, get_counter_backend
+
+CONVERSATION_SESSION_TTL_SECONDS = float(os.getenv("CONVERSATION_SESSION_TTL_SECONDS", str(2 * 3600)))
+CONVERSATION_MAX_EXCHANGES = int(os.getenv("CONVERSATION_MAX_EXCHANGES", "20"))
+_QUERY_CHARS = 500
+# Champs de l'analyse utiles au contexte et aux résumés de conversation
+_ANALYSIS_KEYS = ("query_type", "countries_mentioned", "amounts_mentioned", "analysis_method", "confidence")
+
+
+def compact_exchange(query: str, response_type: str, analysis: Dict[str, Any],
+                     timestamp: Optional[float] = None) -> Dict[str, Any]:
+    """Échange tel qu'il est conservé dans l'historique d'une conversation."""
+    return {
+        "query": query[:_QUERY_CHARS],
+        "response_type": response_type,
+        "timestamp": time.time() if timestamp is None else timestamp,
+        "analysis": {k: analysis[k] for k in _ANALYSIS_KEYS if k in analysis},
+    }
+
+
+def remember(history: MutableSequence[Dict[str, Any]], query: str, response_type: str,
+             analysis: Dict[str, Any]) -> None:
+    """Ajoute un échange à `history` (tampon d'une session, ou liste fournie par le client)."""
+    history.append(compact_exchange(query, response_type, analysis))
+    if isinstance(history, list):
+        del history[:-CONVERSATION_MAX_EXCHANGES]  # une deque bornée s'en charge seule
+
+
+@dataclass
+class ConversationSession:
+    session_id: str
+    owner: str = ""  # user_id de l'utilisateur authentifié
+    exchanges: Deque[Dict[str, Any]] = field(default_factory=lambda: deque(maxlen=CONVERSATION_MAX_EXCHANGES))
+    user_profile: Dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+    # Échanges lus depuis le backend : tout autre élément du tampon a été ajouté par cette requête
+    _loaded: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+
+    def merge_profile(self, profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Profil de la conversation complété par `profile` (nouveau dict : les lecteurs en cours gardent le leur)."""
+        if profile:
+            self.user_profile = {**self.user_profile, **profile}
+        return self.user_profile
+
+    def seed(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Reprend l'historique renvoyé par un client (ancien protocole) dans une session encore vide."""
+        if self.exchanges:
+            return
+        for entry in entries:
+            self.exchanges.append(compact_exchange(entry.get("query", ""), entry.get("response_type", "unknown"),
+                                                   entry.get("analysis") or {}, entry.get("timestamp")))
+
+    def history(self) -> List[Dict[str, Any]]:
+        return list(self.exchanges)
+
+    def added(self) -> List[Dict[str, Any]]:
+        """Échanges ajoutés depuis la lecture de la session."""
+        loaded = {id(entry) for entry in self._loaded}
+        return [entry for entry in self.exchanges if id(entry) not in loaded]
+
+    def _reset(self, data: Dict[str, Any]) -> None:
+        # Sur place : l'appelant garde une référence au tampon
+        self.exchanges.clear()
+        self.exchanges.extend(data["exchanges"])
+        self.user_profile = data["user_profile"]
+        self.started_at = data["started_at"]
+        self._loaded = list(self.exchanges)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "owner": self.owner, "exchanges": list(self.exchanges),
+                "user_profile": self.user_profile, "started_at": self.started_at}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationSession":
+        session = cls(session_id=data["session_id"], owner=data["owner"])
+        session._reset(data)
+        return session
+
+
+class ConversationSessionStore:
+    """Sessions du backend partagé, expirées après `ttl` secondes sans nouvel échange."""
+
+    def __init__(self, ttl: float = CONVERSATION_SESSION_TTL_SECONDS, backend: Optional[CounterBackend] = None):
+        self.ttl = ttl
+        self._backend = backend
+
+    @property
+    def backend(self) -> CounterBackend:
+        return self._backend or get_counter_backend()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"francis_conversation:{session_id}"
+
+    async def get(self, session_id: Optional[str], owner: str) -> Optional[ConversationSession]:
+        """Copie de la session `session_id` si elle existe et appartient à `owner`."""
+        data = await self.backend.aget_document(self._key(session_id)) if session_id else None
+        if data is None or data.get("owner") != owner:
+            return None
+        return ConversationSession.from_dict(data)
+
+    async def get_or_create(self, session_id: Optional[str], owner: str) -> ConversationSession:
+        """Session existante de `owner`, sinon une nouvelle session sous un identifiant émis ici
+        (enregistrée au premier `save`)."""
+        session = await self.get(session_id, owner)
+        if session is None:
+            session = ConversationSession(session_id=uuid.uuid4().hex, owner=owner)
+        return session
+
+    async def save(self, session: ConversationSession) -> None:
+        """Ajoute au document les échanges et le profil de cette requête, puis recharge la copie."""
+        added, profile = session.added(), session.user_profile
+
+        def merge(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if data is None:
+                data = {**session.to_dict(), "exchanges": []}
+            elif data.get("owner") != session.owner:
+                return None
+            return {**data, "exchanges": (data["exchanges"] + added)[-CONVERSATION_MAX_EXCHANGES:],
+                    "user_profile": {**data["user_profile"], **profile}}
+
+        stored = await self.backend.aupdate_document(self._key(session.session_id), merge, self.ttl)
+        if stored is not None and stored.get("owner") == session.owner:
+            session._reset(stored)
+
+    async def close(self, session_id: str, owner: str) -> bool:
+        """Supprime la session si elle appartient à `owner` ; False sinon."""
+        if await self.get(session_id, owner) is None:
+            return False
+        return await self.backend.adelete_document(self._key(session_id))
+
+
+conversation_sessions = ConversationSessionStore()
@@ -0,0 +1,190 @@
+"""Fichier « bundle » d'un corpus : embeddings et textes dans un seul fichier versionné.
+
+Disposition (entiers little-endian) :
+
+    en-tête fixe   : MAGIC (8 octets), version du format (u32), taille de l'en-tête JSON (u32)
+    en-tête JSON   : lignes, dimension, dtype, identifiants, empreintes, position des blocs
+    (alignement sur 64 octets)
+    embeddings     : matrice lignes × dimension, float32 ou float16
+    offsets        : lignes + 1 entiers u64, bornes de chaque enregistrement dans le bloc texte
+    textes         : un enregistrement JSON compressé (zlib) par ligne
+
+Le fichier est ouvert par mmap : la matrice est une vue sur le fichier et un
+enregistrement n'est décompressé qu'à la demande (accès direct par ligne).
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MAGIC = b"FISCBNDL"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+COMPRESSION_LEVEL = 6
+SUPPORTED_DTYPES = ("float32", "float16")
+
+_PREAMBLE = struct.Struct("<8sII")
+
+PathLike = Union[str, Path]
+
+
+def _align(position: int) -> int:
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_bundle(
+    path: PathLike,
+    ids: Sequence[str],
+    matrix: np.ndarray,
+    records: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    hashes: Optional[Sequence[str]] = None,
+    dtype: str = "float32",
+) -> Path:
+    """Écrit un bundle (fichier temporaire puis os.replace : jamais de bundle partiel).
+
+    `records[i]` est l'enregistrement (texte, métadonnées) de la ligne i ; None = pas d'enregistrement.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype non supporté : {dtype}")
+    path = Path(path)
+    rows = len(ids)
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if rows == 0:
+        matrix = matrix.reshape(0, matrix.shape[1] if matrix.ndim == 2 else 0)
+    if matrix.shape[0] != rows or (hashes is not None and len(hashes) != rows) \
+            or (records is not None and len(records) != rows):
+        raise ValueError(f"{rows} identifiants pour {matrix.shape[0]} lignes")
+
+    blobs = [
+        zlib.compress(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL)
+        if record is not None else b""
+        for record in (records if records is not None else [None] * rows)
+    ]
+    offsets = np.zeros(rows + 1, dtype="<u8")
+    if blobs:
+        np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+
+    # Positions relatives au début des données (après l'en-tête aligné)
+    embeddings_size = matrix.nbytes
+    offsets_start = _align(embeddings_size)
+    text_start = offsets_start + offsets.nbytes
+    header = {
+        "rows": rows,
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "compression": "zlib",
+        "embeddings": [0, embeddings_size],
+        "offsets": [offsets_start, int(offsets.nbytes)],
+        "text": [text_start, int(offsets[-1])],
+        "ids": list(ids),
+        "hashes": list(hashes) if hashes is not None else None,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        f.write(matrix.tobytes())
+        f.write(b"\0" * (data_start + offsets_start - f.tell()))
+        f.write(offsets.tobytes())
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return path
+
+
+class CorpusBundle:
+    """Bundle ouvert en lecture par mmap."""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} n'est pas un bundle de corpus")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{self.path} : version de format {version} non supportée (max {FORMAT_VERSION})")
+        header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + header_len].decode("utf-8"))
+        data_start = _align(_PREAMBLE.size + header_len)
+
+        self.version = version
+        self.ids: List[str] = header["ids"]
+        self.hashes: Optional[List[str]] = header.get("hashes")
+        self.dtype = header["dtype"]
+        rows, dim = header["rows"], header["dim"]
+        self.embeddings = np.frombuffer(
+            self._mm, dtype=np.dtype(self.dtype).newbyteorder("<"), count=rows * dim,
+            offset=data_start + header["embeddings"][0],
+        ).reshape(rows, dim)
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=rows + 1, offset=data_start + header["offsets"][0])
+        self._text_start = data_start + header["text"][0]
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        if self._rows is None:
+            self._rows = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        return self._rows.get(chunk_id)
+
+    def record(self, row: int) -> Optional[Dict[str, Any]]:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        if start == end:
+            return None
+        raw = self._mm[self._text_start + start:self._text_start + end]
+        return json.loads(zlib.decompress(raw).decode("utf-8"))
+
+    def text(self, row: int) -> str:
+        record = self.record(row)
+        return (record or {}).get("text", "")
+
+    def get(self, chunk_id: str, default: Any = None) -> Any:
+        row = self.row_of(chunk_id)
+        if row is None:
+            return default
+        record = self.record(row)
+        return default if record is None else record
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self.ids)):
+            record = self.record(row)
+            if record is not None:
+                yield record
+
+
+_open_cache: Dict[str, Tuple[int, CorpusBundle]] = {}
+_open_lock = threading.Lock()
+
+
+def open_bundle(path: PathLike) -> CorpusBundle:
+    """Bundle ouvert, partagé entre appelants tant que le fichier n'est pas remplacé."""
+    path = Path(path)
+    key = str(path.resolve())
+    stamp = path.stat().st_mtime_ns
+    with _open_lock:
+        cached = _open_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        bundle = CorpusBundle(path)
+        _open_cache[key] = (stamp, bundle)
+        return bundle
+
+
+def is_bundle(path: PathLike) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
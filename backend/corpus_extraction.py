@@ -0,0 +1,206 @@
+"""Extraction parallèle des PDF sources et fichiers corpus JSONL.
+
+Un PDF est découpé en plages de pages traitées dans un pool de processus ;
+les résultats sont restitués dans l'ordre des pages avec au plus
+2 × workers plages en mémoire. Les extracteurs (CGI, BOFiP, Andorre, Suisse)
+écrivent un seul fichier corpus (une ligne JSON par article ou chunk, ou
+Parquet si pyarrow est installé) au lieu d'un fichier par chunk.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_RANGE = 20
+PARQUET_BATCH_SIZE = 1000
+
+CORPUS_FILES = {
+    "cgi": "data/cgi_corpus.jsonl",
+    "andorra": "data/andorra_corpus.jsonl",
+    "swiss": "data/swiss_corpus.jsonl",
+}
+
+PathLike = Union[str, Path]
+
+
+# -------------------------
+# PDF par plages de pages
+# -------------------------
+
+def count_pages(pdf_path: PathLike) -> int:
+    import PyPDF2
+
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def page_ranges(total_pages: int, pages_per_range: int = PAGES_PER_RANGE) -> List[Tuple[int, int]]:
+    """Plages [début, fin[ couvrant toutes les pages."""
+    return [(start, min(start + pages_per_range, total_pages)) for start in range(0, total_pages, pages_per_range)]
+
+
+def extract_pages(pdf_path: PathLike, start: int, end: int) -> List[str]:
+    """Texte des pages [start, end[ (exécuté dans un worker ; chaque worker ouvre son lecteur)."""
+    import PyPDF2
+
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def iter_range_results(
+    pdf_path: PathLike,
+    range_fn: Callable[[str, int, int], Any],
+    workers: Optional[int] = None,
+    pages_per_range: int = PAGES_PER_RANGE,
+) -> Iterator[Any]:
+    """Applique `range_fn(pdf_path, début, fin)` à chaque plage dans un pool, résultats dans l'ordre."""
+    workers = workers or PDF_EXTRACTION_WORKERS
+    ranges = page_ranges(count_pages(pdf_path), pages_per_range)
+    if workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield range_fn(str(pdf_path), start, end)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for start, end in ranges:
+            pending.append(pool.submit(range_fn, str(pdf_path), start, end))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def iter_pdf_pages(pdf_path: PathLike, workers: Optional[int] = None) -> Iterator[str]:
+    """Texte de chaque page, dans l'ordre, extrait en parallèle."""
+    for pages in iter_range_results(pdf_path, extract_pages, workers):
+        yield from pages
+
+
+# -------------------------
+# Fichiers corpus
+# -------------------------
+
+class CorpusWriter:
+    """Écrit un corpus ligne à ligne (JSONL, ou Parquet selon l'extension).
+
+    En mode 'w' le fichier est écrit à côté puis substitué à la fin (os.replace) :
+    les lecteurs ne voient jamais un corpus partiel. Le mode 'a' (JSONL) ajoute.
+    """
+
+    def __init__(self, path: PathLike, mode: str = "w"):
+        self.path = Path(path)
+        self.mode = mode
+        self.count = 0
+        self.parquet = self.path.suffix == ".parquet"
+        if self.parquet and mode != "w":
+            raise ValueError("Le format Parquet ne supporte que l'écriture complète")
+        self._target = self.path if mode == "a" else self.path.with_name(self.path.name + ".tmp")
+        self._file = None
+        self._batch: List[Dict[str, Any]] = []
+        self._parquet_writer = None
+
+    def __enter__(self) -> "CorpusWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.parquet:
+            self._file = open(self._target, self.mode, encoding="utf-8")
+        return self
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.count += 1
+        if self.parquet:
+            self._batch.append(record)
+            if len(self._batch) >= PARQUET_BATCH_SIZE:
+                self._flush_parquet()
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write_all(self, records: Iterable[Dict[str, Any]]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def _flush_parquet(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._batch:
+            return
+        # Les colonnes imbriquées (sections…) sont stockées en JSON pour garder un schéma stable
+        rows = [{k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                 for k, v in record.items()} for record in self._batch]
+        table = pa.Table.from_pylist(rows)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self._target, table.schema, compression="zstd")
+        self._parquet_writer.write_table(table)
+        self._batch = []
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.parquet:
+            if exc_type is None:
+                self._flush_parquet()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        else:
+            self._file.close()
+        if self._target != self.path:
+            if exc_type is None and self._target.exists():
+                os.replace(self._target, self.path)
+            elif self._target.exists():
+                self._target.unlink()
+
+
+def iter_corpus(path: PathLike) -> Iterator[Dict[str, Any]]:
+    """Relit un corpus enregistrement par enregistrement."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_corpus_records(path: PathLike) -> int:
+    """Nombre d'enregistrements du corpus (0 s'il n'existe pas encore)."""
+    path = Path(path)
+    if not path.exists():
+        return 0
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows  # lu dans le pied de page, sans décompresser
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+_index_cache: Dict[str, Tuple[int, Dict[str, Dict[str, Any]]]] = {}
+_index_lock = threading.Lock()
+
+
+def load_corpus_index(path: PathLike, key: str = "id") -> Dict[str, Dict[str, Any]]:
+    """Enregistrements indexés par `key`, mis en cache tant que le fichier n'est pas remplacé.
+
+    En cas de doublon, le dernier enregistrement l'emporte.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    stamp = path.stat().st_mtime_ns
+    cache_key = f"{path.resolve()}:{key}"
+    with _index_lock:
+        cached = _index_cache.get(cache_key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    index = {record[key]: record for record in iter_corpus(path)}
+    with _index_lock:
+        _index_cache[cache_key] = (stamp, index)
+    return index
@@ -6,6 +6,8 @@ from passlib.context import CryptContext
 import os
 from datetime import datetime, timedelta
 
+from user_context import UserContext, user_contexts
+
 # Configuration
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key") # MODIFIÉ pour correspondre à main.py
 JWT_ALGORITHM = "HS256" # Assurez-vous que c'est le même
@@ -73,4 +75,9 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security_be
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalide ou expiré.")
     except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erreur interne lors de la vérification du token.") 
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Erreur interne lors de la vérification du token.")
+
+
+def get_user_context(user_id: str = Depends(verify_token)) -> UserContext:
+    """Profil de l'utilisateur authentifié, lu une fois par requête et mis en cache (voir user_context)."""
+    return user_contexts.load(supabase, user_id)
@@ -0,0 +1,448 @@
+"""Pipeline d'ingestion des embeddings pour tous les corpus (CGI, BOFiP, Suisse, Andorre, Luxembourg).
+
+- plusieurs textes par requête mistral-embed, jusqu'à MAX_BATCH_TOKENS ;
+- un nombre borné de requêtes concurrentes, réduit de moitié à chaque 429
+  puis ré-augmenté progressivement (AIMD) ;
+- chaque lot terminé est écrit dans un fragment .npy et consigné dans un
+  manifeste : une exécution interrompue reprend là où elle s'était arrêtée ;
+- mise à jour incrémentale : chaque chunk est identifié par l'empreinte de
+  son contenu (voir chunk_store), seules les empreintes absentes de l'index
+  courant sont recalculées ;
+- le résultat final est une nouvelle version de l'index, un seul fichier
+  bundle (embeddings + textes, voir corpus_bundle) lu par la recherche et
+  activé atomiquement (voir packed_embeddings).
+
+Usage :
+    python embedding_pipeline.py cgi bofip swiss andorra luxembourg [--concurrency 4] [--restart] [--dry-run]
+    python embedding_pipeline.py cgi --convert [--remove-legacy]   # index existant -> bundle, sans API
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from corpus_extraction import CORPUS_FILES, iter_corpus, load_corpus_index
+from chunk_store import IndexDiff, chunk_hash, diff_index
+from packed_embeddings import load_corpus_bundle, load_index, write_packed_embeddings
+
+MISTRAL_API_URL = "https://api.mistral.ai/v1/embeddings"
+MODEL_NAME = "mistral-embed"
+
+# Limites de l'API mistral-embed (estimation prudente : ~3 caractères par token en français)
+MAX_BATCH_TOKENS = 15000
+MAX_BATCH_ITEMS = 128
+MAX_INPUT_TOKENS = 8000
+CHARS_PER_TOKEN = 3
+
+DEFAULT_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+MAX_RETRIES = 6
+WORK_DIR_NAME = ".pipeline"
+MANIFEST_FILE = "manifest.json"
+
+Chunk = Tuple[str, str]  # (identifiant, texte)
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+# -------------------------
+# Sources des corpus
+# -------------------------
+
+def _load_cgi_records() -> Dict[str, Dict]:
+    from mistral_embeddings import CHUNKS_DIR
+
+    if Path(CORPUS_FILES["cgi"]).exists():
+        return load_corpus_index(CORPUS_FILES["cgi"])
+    records = {}
+    for path in sorted(Path(CHUNKS_DIR).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            records[path.stem] = json.load(f)
+    return records
+
+
+def _load_cgi_chunks() -> List[Chunk]:
+    from mistral_embeddings import format_article_for_display
+
+    return [(code, format_article_for_display(record)) for code, record in _load_cgi_records().items()]
+
+
+def _load_bofip_chunks() -> List[Chunk]:
+    """Chunks BOFiP découpés en mémoire, sans rien écrire.
+
+    Les textes sont publiés dans le bundle de la nouvelle version de l'index,
+    activé en même temps que ses vecteurs ; les fichiers bofip_chunk_*.txt ne
+    servent plus que de repli à un index sans bundle, dont ils restent l'état
+    cohérent : les réécrire ici les désynchroniserait de ses vecteurs.
+    """
+    from generate_bofip_embeddings import SOURCE_TEXT_FILE, chunk_text_by_paragraph
+
+    with open(SOURCE_TEXT_FILE, "r", encoding="utf-8") as f:
+        texts = chunk_text_by_paragraph(f.read(), min_chunk_size=100, max_chunk_size=1500)
+    return [(f"bofip_chunk_{i:04d}", text) for i, text in enumerate(texts)]
+
+
+def _text_dir_loader(directory: str, pattern: str, corpus_file: Optional[str] = None) -> Callable[[], List[Chunk]]:
+    def _load() -> List[Chunk]:
+        if corpus_file and Path(corpus_file).exists():
+            return [(record["id"], record["text"]) for record in iter_corpus(corpus_file)]
+        if not Path(directory).exists():
+            raise FileNotFoundError(f"Dossier chunks introuvable : {directory}")
+        return [(p.stem, p.read_text(encoding="utf-8")) for p in sorted(Path(directory).glob(pattern))]
+    return _load
+
+
+@dataclass
+class CorpusSpec:
+    name: str
+    embeddings_dir: str
+    load_chunks: Callable[[], List[Chunk]]
+    # Document d'origine d'un chunk, pris en compte dans son empreinte (par défaut : le corpus)
+    source_of: Optional[Callable[[str], str]] = field(default=None)
+    # Enregistrements stockés dans le bundle, par identifiant (par défaut : {"id", "text"})
+    load_records: Optional[Callable[[], Dict[str, Dict]]] = field(default=None)
+
+    def source(self, chunk_id: str) -> str:
+        return self.source_of(chunk_id) if self.source_of else self.name
+
+    def records(self, chunks: Sequence[Chunk]) -> Dict[str, Dict]:
+        if self.load_records:
+            return self.load_records()
+        return {chunk_id: {"id": chunk_id, "text": text} for chunk_id, text in chunks}
+
+
+CORPORA: Dict[str, CorpusSpec] = {
+    "cgi": CorpusSpec("cgi", "data/embeddings", _load_cgi_chunks, source_of=lambda chunk_id: chunk_id,
+                      load_records=_load_cgi_records),
+    "bofip": CorpusSpec("bofip", "data/bofip_embeddings", _load_bofip_chunks),
+    "swiss": CorpusSpec("swiss", "data/swiss_embeddings", _text_dir_loader("data/swiss_chunks_text", "swiss_chunk_*.txt", CORPUS_FILES["swiss"])),
+    "andorra": CorpusSpec("andorra", "data/andorra_embeddings", _text_dir_loader("data/andorra_chunks_text", "andorra_chunk_*.txt", CORPUS_FILES["andorra"])),
+    "luxembourg": CorpusSpec("luxembourg", "data/luxembourg_embeddings", _text_dir_loader("data/lu_chunks_text", "*.txt")),
+}
+
+
+# -------------------------
+# Découpage en lots
+# -------------------------
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_batches(
+    chunks: Sequence[Chunk],
+    max_tokens: Optional[int] = None,
+    max_items: Optional[int] = None,
+) -> List[List[Chunk]]:
+    """Regroupe les chunks (dans l'ordre) en lots respectant la limite de tokens de l'API."""
+    max_tokens = max_tokens or MAX_BATCH_TOKENS
+    max_items = max_items or MAX_BATCH_ITEMS
+    max_chars = MAX_INPUT_TOKENS * CHARS_PER_TOKEN
+    batches: List[List[Chunk]] = []
+    current: List[Chunk] = []
+    current_tokens = 0
+    for chunk_id, text in chunks:
+        text = text[:max_chars]
+        tokens = estimate_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append((chunk_id, text))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# -------------------------
+# Limitation adaptative
+# -------------------------
+
+class AdaptiveLimiter:
+    """Concurrence AIMD : divisée par deux sur 429, +1 après `limit` succès consécutifs."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self._successes = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, success: bool) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            if success:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def throttle(self, retry_after: float) -> None:
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+        self.pause_until = max(self.pause_until, time.monotonic() + retry_after)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"429, nouvel essai dans {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+async def _mistral_embed(client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+    response = await client.post(MISTRAL_API_URL, json={"model": MODEL_NAME, "input": texts})
+    if response.status_code == 429:
+        raise RateLimited(float(response.headers.get("retry-after", "2")))
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda d: d["index"])
+    return [d["embedding"] for d in data]
+
+
+# -------------------------
+# Manifeste et fragments
+# -------------------------
+
+class Checkpoint:
+    """Fragments .npy par lot + manifeste JSON réécrit atomiquement après chaque lot."""
+
+    def __init__(self, embeddings_dir: Path, corpus: str, restart: bool = False, model: str = MODEL_NAME):
+        self.work_dir = embeddings_dir / WORK_DIR_NAME
+        if restart and self.work_dir.exists():
+            shutil.rmtree(self.work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.work_dir / MANIFEST_FILE
+        self.manifest = {"corpus": corpus, "model": model, "shards": []}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous.get("model") == model:
+                self.manifest = previous
+
+    def done_keys(self) -> set:
+        return {key for shard in self.manifest["shards"] for key in shard["ids"]}
+
+    def add_shard(self, ids: List[str], vectors: np.ndarray) -> None:
+        name = f"shard_{len(self.manifest['shards']):05d}.npy"
+        np.save(self.work_dir / name, vectors.astype(np.float32, copy=False))
+        self.manifest["shards"].append({"file": name, "ids": ids})
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.path)
+
+    def vectors_by_key(self) -> Dict[str, np.ndarray]:
+        vectors = {}
+        for shard in self.manifest["shards"]:
+            matrix = np.load(self.work_dir / shard["file"])
+            vectors.update(zip(shard["ids"], matrix))
+        return vectors
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+# -------------------------
+# Exécution
+# -------------------------
+
+async def embed_batches(
+    batches: List[List[Chunk]],
+    on_batch_done: Callable[[List[str], np.ndarray], None],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    embed_fn: Optional[EmbedFn] = None,
+) -> int:
+    """Envoie les lots en parallèle ; retourne le nombre de lots en échec définitif."""
+    limiter = AdaptiveLimiter(concurrency)
+    failures = 0
+    client = None
+    if embed_fn is None:
+        api_key = os.getenv("MISTRAL_API_KEY")
+        if not api_key:
+            raise ValueError("MISTRAL_API_KEY doit être définie pour générer les embeddings")
+        client = httpx.AsyncClient(headers={"Authorization": f"Bearer {api_key}"}, timeout=60.0)
+
+    async def _run(batch: List[Chunk]) -> None:
+        nonlocal failures
+        texts = [text for _, text in batch]
+        for attempt in range(MAX_RETRIES):
+            await limiter.acquire()
+            try:
+                if embed_fn is not None:
+                    vectors = await asyncio.to_thread(embed_fn, texts)
+                else:
+                    vectors = await _mistral_embed(client, texts)
+            except RateLimited as e:
+                await limiter.release(False)
+                limiter.throttle(e.retry_after)
+                print(f"[ATTENTE] Limite de taux atteinte, concurrence réduite à {limiter.limit}")
+                continue
+            except Exception as e:
+                await limiter.release(False)
+                if attempt == MAX_RETRIES - 1:
+                    print(f"[ERREUR] Lot {batch[0][0]}…{batch[-1][0]} abandonné : {e}")
+                    failures += 1
+                    return
+                await asyncio.sleep(min(30.0, 2 ** attempt) + random.random())
+                continue
+            await limiter.release(True)
+            on_batch_done([chunk_id for chunk_id, _ in batch], np.asarray(vectors, dtype=np.float32))
+            return
+        print(f"[ERREUR] Lot {batch[0][0]}…{batch[-1][0]} abandonné après {MAX_RETRIES} limitations de taux")
+        failures += 1
+
+    try:
+        await asyncio.gather(*(_run(batch) for batch in batches))
+    finally:
+        if client is not None:
+            await client.aclose()
+    return failures
+
+
+def _reusable_vectors(
+    ids: Sequence[str],
+    hashes: Sequence[str],
+    current_ids: Sequence[str],
+    current_matrix: np.ndarray,
+    current_hashes: Optional[Sequence[str]],
+) -> Dict[str, np.ndarray]:
+    """Vecteurs de l'index courant réutilisables, par empreinte.
+
+    Un index sans empreintes (format précédent) est repris par identifiant, une
+    seule fois : la version écrite ensuite porte les empreintes.
+    """
+    if current_hashes is not None:
+        rows = {h: i for i, h in enumerate(current_hashes)}
+        return {h: current_matrix[rows[h]] for h in hashes if h in rows}
+    rows = {chunk_id: i for i, chunk_id in enumerate(current_ids)}
+    return {h: current_matrix[rows[chunk_id]] for chunk_id, h in zip(ids, hashes) if chunk_id in rows}
+
+
+def embed_corpus(
+    corpus: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    restart: bool = False,
+    embed_fn: Optional[EmbedFn] = None,
+    model: str = MODEL_NAME,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Met à jour la matrice empaquetée d'un corpus en ne calculant que le différentiel.
+
+    `embed_fn` remplace l'appel à l'API Mistral (backend local) ; `model` doit alors
+    le décrire pour qu'un manifeste d'un autre modèle ne soit pas repris.
+    `restart` ignore l'index courant et le manifeste ; `dry_run` calcule seulement le différentiel.
+    """
+    spec = CORPORA[corpus]
+    embeddings_dir = Path(spec.embeddings_dir)
+    chunks = [(chunk_id, text) for chunk_id, text in spec.load_chunks() if text.strip()]
+    ids = [chunk_id for chunk_id, _ in chunks]
+    hashes = [chunk_hash(spec.source(chunk_id), text) for chunk_id, text in chunks]
+    stats = {"chunks": len(ids), "embedded": 0, "missing": 0, "failed_batches": 0}
+    if not ids:
+        print(f"[{corpus}] Aucun chunk à traiter")
+        return stats
+
+    if restart:
+        current_ids, current_matrix, current_hashes = [], np.zeros((0, 0), dtype=np.float32), None
+    else:
+        current_ids, current_matrix, current_hashes = load_index(embeddings_dir)
+    diff: IndexDiff = diff_index(ids, hashes, current_ids, current_hashes)
+    reused = _reusable_vectors(ids, hashes, current_ids, current_matrix, current_hashes)
+    stats.update(diff.summary())
+    print(f"[{corpus}] {len(ids)} chunks : {diff.summary()}")
+    if dry_run:
+        return stats
+    if current_hashes is not None and diff.is_empty and list(current_ids) == ids \
+            and load_corpus_bundle(embeddings_dir) is not None:
+        print(f"[{corpus}] Index à jour")
+        return stats
+
+    # Le manifeste est indexé par empreinte : la reprise survit à un décalage des identifiants
+    checkpoint = Checkpoint(embeddings_dir, corpus, restart=restart, model=model)
+    done = checkpoint.done_keys()
+    texts_by_hash = dict(zip(hashes, (text for _, text in chunks)))
+    pending = [(h, texts_by_hash[h]) for h in dict.fromkeys(hashes) if h not in reused and h not in done]
+    batches = pack_batches(pending)
+    print(f"[{corpus}] {len(reused)} réutilisés, {len(done)} en reprise, "
+          f"{len(pending)} à calculer en {len(batches)} lots")
+
+    stats["failed_batches"] = asyncio.run(embed_batches(batches, checkpoint.add_shard, concurrency, embed_fn)) if batches else 0
+
+    vectors = checkpoint.vectors_by_key()
+    stats["embedded"] = len(vectors)
+    vectors.update(reused)
+    missing = [h for h in dict.fromkeys(hashes) if h not in vectors]
+    if missing:
+        stats["missing"] = len(missing)
+        print(f"[{corpus}] {len(missing)} chunks sans embedding : relancez la commande pour reprendre")
+        return stats
+
+    records = spec.records(chunks)
+    version_dir = write_packed_embeddings(embeddings_dir, ids, np.vstack([vectors[h] for h in hashes]), hashes,
+                                          records=[records.get(chunk_id) for chunk_id in ids])
+    checkpoint.cleanup()
+    print(f"[{corpus}] Index {version_dir.name} activé : {len(ids)} × {vectors[hashes[0]].shape[0]}")
+    return stats
+
+
+def convert_corpus(corpus: str, remove_legacy: bool = False) -> Dict[str, int]:
+    """Convertit l'index existant d'un corpus (tout format) en bundle, sans appel à l'API.
+
+    Seuls les chunks ayant déjà un embedding sont repris ; `remove_legacy` supprime
+    ensuite les fichiers <id>.npy et la matrice à la racine du dossier d'embeddings.
+    """
+    spec = CORPORA[corpus]
+    embeddings_dir = Path(spec.embeddings_dir)
+    current_ids, current_matrix, current_hashes = load_index(embeddings_dir)
+    chunks = [(chunk_id, text) for chunk_id, text in spec.load_chunks() if text.strip()]
+    texts = dict(chunks)
+    records = spec.records(chunks)
+    rows = [i for i, chunk_id in enumerate(current_ids) if chunk_id in texts]
+    stats = {"indexed": len(current_ids), "converted": len(rows), "without_text": len(current_ids) - len(rows)}
+    if not rows:
+        print(f"[{corpus}] Rien à convertir")
+        return stats
+
+    ids = [current_ids[i] for i in rows]
+    hashes = [chunk_hash(spec.source(chunk_id), texts[chunk_id]) for chunk_id in ids]
+    version_dir = write_packed_embeddings(embeddings_dir, ids, current_matrix[rows], hashes,
+                                          records=[records.get(chunk_id) for chunk_id in ids])
+    if remove_legacy:
+        for path in embeddings_dir.glob("*.npy"):
+            path.unlink()
+        for name in ("index_ids.json", "index_hashes.json"):
+            (embeddings_dir / name).unlink(missing_ok=True)
+    print(f"[{corpus}] Bundle {version_dir.name} activé : {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génération des embeddings de tous les corpus")
+    parser.add_argument("corpora", nargs="*", default=list(CORPORA), choices=list(CORPORA))
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--restart", action="store_true", help="Ignore l'index courant et le manifeste")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche le différentiel sans rien calculer")
+    parser.add_argument("--convert", action="store_true", help="Convertit l'index existant en bundle sans recalcul")
+    parser.add_argument("--remove-legacy", action="store_true", help="Avec --convert : supprime les anciens fichiers .npy")
+    args = parser.parse_args()
+    for name in args.corpora:
+        if args.convert:
+            convert_corpus(name, remove_legacy=args.remove_legacy)
+            continue
+        embed_corpus(name, concurrency=args.concurrency, restart=args.restart, dry_run=args.dry_run)
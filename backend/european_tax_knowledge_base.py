@@ -12,16 +12,28 @@ Fonctionnalités :
 - Optimisation fiscale cross-border
 - Mise à jour automatique des taux
 - Support multilingue (FR, EN, DE, ES, IT)
+
+La base est construite au build de l'image (`python knowledge_store.py`) et
+sérialisée dans data/european_tax_kb.kb ; à l'exécution, chaque thème et chaque
+pays est lu dans ce fichier au premier accès (voir knowledge_store).
 """
 
 import json
 import os
-from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from dataclasses import asdict, dataclass
 from datetime import datetime
+from pathlib import Path
 import re
 
-@dataclass
+from knowledge_store import DATA_DIR, open_store, source_hash, write_store
+
+KB_FILE = DATA_DIR / "european_tax_kb.kb"
+COUNTRY_SECTION_PREFIX = "country:"
+
+@dataclass(slots=True)
 class TaxBracket:
     """Tranche d'imposition"""
     min_income: float
@@ -29,7 +41,7 @@ class TaxBracket:
     rate: float
     description: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class CountryTaxData:
     """Données fiscales complètes d'un pays"""
     country_code: str
@@ -57,14 +69,107 @@ class CountryTaxData:
     last_updated: str = ""
     eu_member: bool = True
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountryTaxData":
+        brackets = [TaxBracket(**bracket) for bracket in data["income_tax_brackets"]]
+        return cls(**{**data, "income_tax_brackets": brackets})
+
+
+class CountryTable(MutableMapping):
+    """countries_data adossé au fichier de la base : un pays n'est décodé qu'au premier accès"""
+
+    def __init__(self, knowledge_base: "EuropeanTaxKnowledgeBase"):
+        self._knowledge_base = knowledge_base
+        self._loaded: Dict[str, CountryTaxData] = {}
+        self._removed: set = set()
+
+    def _stored_codes(self) -> List[str]:
+        store = self._knowledge_base._knowledge_store()
+        if store is None:
+            return []
+        return [name[len(COUNTRY_SECTION_PREFIX):] for name in store.names(COUNTRY_SECTION_PREFIX)]
+
+    def __getitem__(self, code: str) -> CountryTaxData:
+        country = self._loaded.get(code)
+        if country is not None:
+            return country
+        store = self._knowledge_base._knowledge_store()
+        section = COUNTRY_SECTION_PREFIX + str(code)
+        if store is None or code in self._removed or section not in store:
+            raise KeyError(code)
+        country = CountryTaxData.from_dict(store.section(section))
+        self._loaded[code] = country
+        return country
+
+    def __contains__(self, code: object) -> bool:
+        if code in self._loaded:
+            return True
+        if code in self._removed:
+            return False
+        store = self._knowledge_base._knowledge_store()
+        return store is not None and COUNTRY_SECTION_PREFIX + str(code) in store
+
+    def __setitem__(self, code: str, country: CountryTaxData) -> None:
+        self._loaded[code] = country
+        self._removed.discard(code)
+
+    def __delitem__(self, code: str) -> None:
+        if code not in self:
+            raise KeyError(code)
+        self._loaded.pop(code, None)
+        self._removed.add(code)
+
+    def __iter__(self) -> Iterator[str]:
+        codes = dict.fromkeys(self._stored_codes())
+        codes.update(dict.fromkeys(self._loaded))
+        return (code for code in codes if code not in self._removed)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
 class EuropeanTaxKnowledgeBase:
     """
     Base de connaissance fiscale européenne indépendante
+    
+    Par défaut, les données sont lues à la demande dans le fichier construit au
+    build (store_path) ; sans fichier valide, ou avec store_path=None, la base
+    est construite en mémoire depuis le code comme auparavant.
     """
     
-    def __init__(self):
-        self.countries_data: Dict[str, CountryTaxData] = {}
-        self.load_european_tax_data()
+    def __init__(self, store_path: Optional[Path] = KB_FILE):
+        self._store_path = store_path
+        self._store = None
+        self._store_checked = store_path is None
+        self._store_lock = threading.RLock()
+        if store_path is None:
+            self.countries_data: Dict[str, CountryTaxData] = {}
+            self.load_european_tax_data()
+        else:
+            self.countries_data = CountryTable(self)
+    
+    def _knowledge_store(self):
+        """Fichier de la base, ouvert au premier accès (None : base construite depuis le code)"""
+        with self._store_lock:
+            if not self._store_checked:
+                self._store_checked = True
+                self._store = open_store(self._store_path, __file__)
+                if self._store is None:
+                    self.load_european_tax_data()
+            return self._store
+    
+    def __getattr__(self, name: str) -> Any:
+        # Thèmes (inheritance_tax_rules, crypto_taxation…) lus dans le fichier au premier accès
+        if name.startswith("_"):
+            raise AttributeError(name)
+        store = self._knowledge_store()
+        if name in self.__dict__:
+            return self.__dict__[name]  # construit depuis le code par _knowledge_store
+        if store is None or name not in store:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = store.section(name)
+        setattr(self, name, value)
+        return value
     
     def load_european_tax_data(self):
         """Charge les données fiscales européennes 2025"""
@@ -3328,7 +3433,18 @@ class EuropeanTaxKnowledgeBase:
         results.sort(key=lambda x: x["relevance"], reverse=True)
         return results[:10]  # Top 10 résultats
 
-# Instance globale
+def build_knowledge_file(path: Path = KB_FILE) -> Path:
+    """Construit la base depuis le code et la sérialise (un thème ou un pays par section)"""
+    kb = EuropeanTaxKnowledgeBase(store_path=None)
+    sections = [(name, value) for name, value in vars(kb).items()
+                if not name.startswith("_") and name != "countries_data"]
+    sections += [(COUNTRY_SECTION_PREFIX + code, asdict(country)) for code, country in kb.countries_data.items()]
+    for name, value in sections:
+        if json.loads(json.dumps(value)) != value:
+            raise ValueError(f"Section {name} non sérialisable en JSON sans perte")
+    return write_store(path, sections, source_hash(__file__))
+
+# Instance globale (aucune donnée chargée avant le premier accès)
 european_tax_kb = EuropeanTaxKnowledgeBase()
 
 def get_european_tax_response(query: str, user_profile: Optional[Dict] = None) -> Dict[str, Any]:
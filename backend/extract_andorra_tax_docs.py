@@ -1,13 +1,14 @@
 import os
 from pathlib import Path
 from typing import List, Optional
-import PyPDF2
 import textwrap
 import requests
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 import urllib.parse as _uparse
 
+from corpus_extraction import CORPUS_FILES, CorpusWriter, count_corpus_records, iter_pdf_pages
+
 """
 Extract Andorran fiscal laws (PDF) and split them into manageable text chunks
 compatible avec la pipeline Mistral.
@@ -15,15 +16,16 @@ compatible avec la pipeline Mistral.
 Étapes :
 1. Placer les PDF récents (2025) dans backend/data/andorra_docs/
 2. Exécuter ce script : python extract_andorra_tax_docs.py
-   → Génère des fichiers texte dans backend/data/andorra_chunks_text/
-     (andorra_chunk_0000.txt, etc.)
+   → Ajoute les chunks au corpus backend/data/andorra_corpus.jsonl
+     (une ligne par chunk : andorra_chunk_0000, etc.)
 3. Lancer ensuite generate_andorra_embeddings.py pour créer les embeddings.
 
 Les chunks sont de 1 000 caractères max, sans chevauchement pour la simplicité.
 """
 
 PDF_DIR = Path('data/andorra_docs')
-CHUNKS_DIR = Path('data/andorra_chunks_text')
+CHUNKS_DIR = Path('data/andorra_chunks_text')  # ancien format, un fichier par chunk
+CORPUS_PATH = Path(CORPUS_FILES["andorra"])
 CHUNK_SIZE = 1000  # caractères
 
 PDF_SOURCES = {
@@ -151,16 +153,12 @@ def search_pdf_duckduckgo_scrapfly(query: str, max_links: int = 10) -> List[str]
 
 
 def extract_text_from_pdf(pdf_path: Path) -> str:
-    """Return full extracted text from a PDF (UTF-8)."""
-    text = ""
+    """Return full extracted text from a PDF (UTF-8), pages extracted in parallel."""
     try:
-        with pdf_path.open('rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() or ""
+        return "".join(iter_pdf_pages(pdf_path))
     except Exception as e:
         print(f"❌ Erreur extraction {pdf_path.name}: {e}")
-    return text
+        return ""
 
 
 def chunk_text(text: str, size: int = CHUNK_SIZE) -> List[str]:
@@ -169,13 +167,17 @@ def chunk_text(text: str, size: int = CHUNK_SIZE) -> List[str]:
     return textwrap.wrap(text, width=size, break_long_words=False, break_on_hyphens=False)
 
 
-def save_chunks(chunks: List[str]):
-    CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
-    existing = list(CHUNKS_DIR.glob('andorra_chunk_*.txt'))
-    start_idx = len(existing)
-    for i, chunk in enumerate(chunks, start=start_idx):
-        filename = CHUNKS_DIR / f"andorra_chunk_{i:04d}.txt"
-        filename.write_text(chunk, encoding='utf-8')
+def save_chunks(chunks: List[str], source: str = ""):
+    """Ajoute les chunks au corpus andorran (une ligne JSON par chunk, numérotation continue)."""
+    if not CORPUS_PATH.exists() and CHUNKS_DIR.exists():
+        # Première écriture : reprise des chunks déjà extraits dans l'ancien format
+        with CorpusWriter(CORPUS_PATH) as writer:
+            for txt_file in sorted(CHUNKS_DIR.glob('andorra_chunk_*.txt')):
+                writer.write({"id": txt_file.stem, "source": "", "text": txt_file.read_text(encoding='utf-8')})
+    start_idx = count_corpus_records(CORPUS_PATH)
+    with CorpusWriter(CORPUS_PATH, mode="a") as writer:
+        for i, chunk in enumerate(chunks, start=start_idx):
+            writer.write({"id": f"andorra_chunk_{i:04d}", "source": source, "text": chunk})
 
 
 def attempt_fallback_download(url: str, dest: Path) -> bool:
@@ -274,7 +276,7 @@ def crawl_bopa_for_pdfs(max_pdfs: int = 20):
 
 def process_pdfs(target_files: List[Path]):
     """Extrait le texte et enregistre les chunks pour chaque PDF fourni."""
-    all_chunks: List[str] = []
+    total = 0
     for pdf_file in target_files:
         if not pdf_file.exists():
             print(f"⚠️ Fichier introuvable : {pdf_file}")
@@ -286,10 +288,10 @@ def process_pdfs(target_files: List[Path]):
             continue
         chunks = chunk_text(text)
         print(f"   → {len(chunks)} chunks créés")
-        all_chunks.extend(chunks)
-    if all_chunks:
-        save_chunks(all_chunks)
-        print(f"✅ {len(all_chunks)} chunks enregistrés dans {CHUNKS_DIR}")
+        save_chunks(chunks, source=pdf_file.name)
+        total += len(chunks)
+    if total:
+        print(f"✅ {total} chunks enregistrés dans {CORPUS_PATH}")
     else:
         print("⚠️ Aucun chunk généré.")
 
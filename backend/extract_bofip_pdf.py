@@ -1,22 +1,20 @@
-import PyPDF2
 import os
 
+from corpus_extraction import iter_pdf_pages
+
 def extract_text_from_pdf(pdf_path, output_txt_path):
     """
     Extrait le texte d'un fichier PDF et le sauvegarde dans un fichier texte.
+    Les pages sont extraites en parallèle et écrites au fil de l'eau, dans l'ordre.
     """
     try:
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() or "" # Ajouter or "" pour gérer les pages sans texte extrayable
-            
-            with open(output_txt_path, 'w', encoding='utf-8') as txt_file:
-                txt_file.write(text)
-            print(f"Texte extrait avec succès de {pdf_path} et sauvegardé dans {output_txt_path}")
-            return True
+        tmp_path = output_txt_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as txt_file:
+            for page_text in iter_pdf_pages(pdf_path):
+                txt_file.write(page_text)
+        os.replace(tmp_path, output_txt_path)
+        print(f"Texte extrait avec succès de {pdf_path} et sauvegardé dans {output_txt_path}")
+        return True
     except FileNotFoundError:
         print(f"Erreur : Le fichier PDF {pdf_path} n'a pas été trouvé.")
         return False
@@ -1,10 +1,10 @@
-import PyPDF2
 import re
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
-from collections import defaultdict
+
+from corpus_extraction import CORPUS_FILES, CorpusWriter, extract_pages, iter_range_results
 
 @dataclass
 class ArticleSection:
@@ -48,104 +48,108 @@ def parse_section(text: str) -> ArticleSection:
     
     return current_section
 
+ARTICLE_REGEX = re.compile(r'Article\s+((\d{1,4}(?:-[0-9A-Z]+)?(?:\s*(?:bis|ter|quater|quinquies|sexies|septies|octies|nonies|decies|A|B|C|D|E|F|G|H|I|J|K|L|M|N|O|P|Q|R|S|T|U|V|W|X|Y|Z))*)\b)', re.IGNORECASE)
+
+def split_articles_in_range(pdf_path: str, start: int, end: int) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """Découpe les pages [start, end[ en articles (exécuté dans un worker).
+
+    Retourne (lignes précédant le premier en-tête d'article, [(numéro, lignes)]).
+    Les premières lignes appartiennent à l'article ouvert dans la plage précédente
+    et le dernier article peut se poursuivre dans la plage suivante.
+    """
+    prefix: List[str] = []
+    segments: List[Tuple[str, List[str]]] = []
+    for text in extract_pages(pdf_path, start, end):
+        if not text or not text.strip():
+            continue
+        for line in text.split('\n'):
+            article_match = ARTICLE_REGEX.match(line)
+            if article_match:
+                segments.append((article_match.group(1).replace('  ', ' ').strip(), [line]))
+            elif segments:
+                segments[-1][1].append(line)
+            else:
+                prefix.append(line)
+    return prefix, segments
+
+def build_article(number: str, lines: List[str]) -> Article:
+    full_text = '\n'.join(lines).strip()
+    return Article(
+        number=number,
+        title=lines[0] if lines else "",
+        sections=[parse_section(full_text)],
+        references=extract_references(full_text),
+        full_text=full_text
+    )
+
+def iter_articles_from_pdf(pdf_path: str, workers: Optional[int] = None) -> Iterator[Article]:
+    """Extrait les articles du PDF du CGI par plages de pages en parallèle, dans l'ordre du document.
+
+    Un article à cheval sur deux plages est recousu : les lignes de tête d'une
+    plage complètent l'article resté ouvert à la fin de la précédente.
+    """
+    open_article: Optional[Tuple[str, List[str]]] = None
+    for prefix, segments in iter_range_results(pdf_path, split_articles_in_range, workers):
+        if open_article:
+            open_article[1].extend(prefix)
+        for segment in segments:
+            if open_article:
+                yield build_article(*open_article)
+            open_article = segment
+    if open_article:
+        yield build_article(*open_article)
+
 def extract_articles_from_pdf(pdf_path: str) -> Dict[str, Article]:
     """Extrait les articles du PDF du CGI avec leur structure hiérarchique."""
-    articles = {}
-    current_article = None
-    current_text = []
-    
-    article_regex = re.compile(r'Article\s+((\d{1,4}(?:-[0-9A-Z]+)?(?:\s*(?:bis|ter|quater|quinquies|sexies|septies|octies|nonies|decies|A|B|C|D|E|F|G|H|I|J|K|L|M|N|O|P|Q|R|S|T|U|V|W|X|Y|Z))*)\b)', re.IGNORECASE)
-
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        total_pages = len(reader.pages)
-        print(f"Nombre total de pages dans le PDF : {total_pages}")
-        
-        for page_num, page in enumerate(reader.pages, 1):
-            print(f"Traitement de la page {page_num}/{total_pages}")
-            text = page.extract_text()
-            if not text or not text.strip():
-                print(f"Page {page_num} est vide")
-                continue
-                
-            lines = text.split('\n')
-            
-            for line in lines:
-                article_match = article_regex.match(line)
-                if article_match:
-                    if current_article:
-                        full_text = '\n'.join(current_text).strip()
-                        sections = parse_section(full_text)
-                        articles[current_article] = Article(
-                            number=current_article,
-                            title=current_text[0] if current_text else "",
-                            sections=[sections],
-                            references=extract_references(full_text),
-                            full_text=full_text
-                        )
-                        print(f"Article {current_article} extrait")
-                    
-                    current_article = article_match.group(1).replace('  ', ' ').strip()
-                    current_text = [line]
-                    print(f"Nouvel article détecté : {current_article}")
-                elif current_article:
-                    current_text.append(line)
-    
-    if current_article:
-        full_text = '\n'.join(current_text).strip()
-        sections = parse_section(full_text)
-        articles[current_article] = Article(
-            number=current_article,
-            title=current_text[0] if current_text else "",
-            sections=[sections],
-            references=extract_references(full_text),
-            full_text=full_text
-        )
-        print(f"Dernier article extrait : {current_article}")
-    
-    return articles
+    return {article.number: article for article in iter_articles_from_pdf(pdf_path)}
+
+def article_to_record(article: Article) -> Dict:
+    clean_number = article.number.replace(' ', '_').replace('-', '_')
+    return {
+        'id': f'CGI_{clean_number}',
+        'code': f'CGI_{clean_number}',
+        'article_number': article.number,
+        'title': article.title,
+        'sections': [
+            {
+                'title': section.title,
+                'content': section.content,
+                'references': section.references
+            }
+            for section in article.sections
+        ],
+        'references': article.references,
+        'chunks': [article.full_text],
+        'full_text': article.full_text
+    }
+
+def save_articles_to_corpus(articles: Iterable[Article], corpus_path: str = CORPUS_FILES["cgi"]) -> int:
+    """Écrit les articles au fil de l'eau dans un corpus unique (JSONL ou Parquet)."""
+    with CorpusWriter(corpus_path) as writer:
+        for article in articles:
+            writer.write(article_to_record(article))
+    return writer.count
 
 def save_articles_to_json(articles: Dict[str, Article], output_dir: str):
-    """Sauvegarde les articles dans des fichiers JSON séparés avec leur structure."""
+    """Sauvegarde les articles dans des fichiers JSON séparés (ancien format, un fichier par article)."""
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    for article_number, article in articles.items():
-        clean_number = article_number.replace(' ', '_').replace('-', '_')
-        
-        article_json = {
-            'code': f'CGI_{clean_number}',
-            'article_number': article.number,
-            'title': article.title,
-            'sections': [
-                {
-                    'title': section.title,
-                    'content': section.content,
-                    'references': section.references
-                }
-                for section in article.sections
-            ],
-            'references': article.references,
-            'full_text': article.full_text
-        }
-        
-        with open(output_path / f'CGI_{clean_number}.json', 'w', encoding='utf-8') as f:
-            json.dump(article_json, f, ensure_ascii=False, indent=2)
-        print(f"Article {article_number} sauvegardé")
+    for article in articles.values():
+        record = article_to_record(article)
+        with open(output_path / f"{record['code']}.json", 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+
+def extract_all_articles(pdf_path: str = 'CGI.pdf', corpus_path: str = CORPUS_FILES["cgi"]) -> int:
+    """Extrait tout le CGI vers le corpus ; retourne le nombre d'articles écrits."""
+    return save_articles_to_corpus(iter_articles_from_pdf(pdf_path), corpus_path)
 
 def main():
-    pdf_path = 'CGI.pdf'
-    output_dir = 'data/cgi_chunks'
-    
     print("Extraction des articles du CGI...")
-    articles = extract_articles_from_pdf(pdf_path)
-    
-    print(f"Nombre d'articles extraits : {len(articles)}")
-    
-    print("Sauvegarde des articles en JSON...")
-    save_articles_to_json(articles, output_dir)
+    count = extract_all_articles()
+    print(f"Nombre d'articles extraits : {count} → {CORPUS_FILES['cgi']}")
     
     print("Terminé !")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
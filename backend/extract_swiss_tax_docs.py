@@ -9,6 +9,8 @@ import re
 from typing import List
 import logging
 
+from corpus_extraction import CORPUS_FILES, CorpusWriter
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,11 +58,10 @@ def extract_swiss_fiscal_docs():
     
     # Chemins des fichiers
     swiss_docs_dir = "data/swiss_fiscal_docs"
-    chunks_dir = "data/swiss_chunks_text"
+    corpus_path = CORPUS_FILES["swiss"]
     
     # Créer les répertoires s'ils n'existent pas
     os.makedirs(swiss_docs_dir, exist_ok=True)
-    os.makedirs(chunks_dir, exist_ok=True)
     
     # Fichiers à traiter
     doc_files = [
@@ -70,36 +71,33 @@ def extract_swiss_fiscal_docs():
     all_chunks = []
     chunk_counter = 0
     
-    for doc_file in doc_files:
-        doc_path = os.path.join(swiss_docs_dir, doc_file)
-        
-        if not os.path.exists(doc_path):
-            logger.warning(f"Fichier non trouvé: {doc_path}")
-            continue
+    # Tous les chunks vont dans un seul corpus JSONL (remplacé atomiquement en fin d'écriture)
+    with CorpusWriter(corpus_path) as writer:
+        for doc_file in doc_files:
+            doc_path = os.path.join(swiss_docs_dir, doc_file)
             
-        logger.info(f"Traitement du fichier: {doc_file}")
-        
-        # Lire le fichier
-        with open(doc_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Nettoyer le texte
-        cleaned_content = clean_text(content)
-        
-        # Chunker le texte
-        chunks = chunk_text(cleaned_content, max_chunk_size=800, overlap=50)
-        
-        # Sauvegarder les chunks
-        for chunk in chunks:
-            if len(chunk.strip()) > 100:  # Ignorer les chunks trop petits
-                chunk_filename = f"swiss_chunk_{chunk_counter:04d}.txt"
-                chunk_path = os.path.join(chunks_dir, chunk_filename)
+            if not os.path.exists(doc_path):
+                logger.warning(f"Fichier non trouvé: {doc_path}")
+                continue
                 
-                with open(chunk_path, 'w', encoding='utf-8') as f:
-                    f.write(chunk)
-                
-                all_chunks.append(chunk)
-                chunk_counter += 1
+            logger.info(f"Traitement du fichier: {doc_file}")
+            
+            # Lire le fichier
+            with open(doc_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # Nettoyer le texte
+            cleaned_content = clean_text(content)
+            
+            # Chunker le texte
+            chunks = chunk_text(cleaned_content, max_chunk_size=800, overlap=50)
+            
+            # Sauvegarder les chunks
+            for chunk in chunks:
+                if len(chunk.strip()) > 100:  # Ignorer les chunks trop petits
+                    writer.write({"id": f"swiss_chunk_{chunk_counter:04d}", "source": doc_file, "text": chunk})
+                    all_chunks.append(chunk)
+                    chunk_counter += 1
     
     logger.info(f"Extraction terminée: {len(all_chunks)} chunks créés")
     return all_chunks
@@ -7,6 +7,8 @@ from typing import List, Dict, AsyncGenerator, Optional
 import httpx
 from datetime import datetime
 
+from query_classifier import classify, register_vocabulary
+
 # Base de connaissances fiscales andorranes exhaustive
 ANDORRA_TAX_KNOWLEDGE = {
     "IGI": {
@@ -1064,24 +1066,22 @@ ANDORRA_TAX_KNOWLEDGE = {
 }
 
 
+# Mots-clés fiscaux importants
+ANDORRA_TAX_KEYWORDS = [
+    "igi", "tva", "impost general", "taxe",
+    "irpf", "impôt revenu", "salaire", "renda",
+    "is", "societat", "société", "empresa",
+    "itp", "transmission", "immobilier", "patrimonial",
+    "résidence", "residència", "fiscal",
+    "holding", "dividende", "convention", "cdi"
+]
+register_vocabulary("andorra.keywords", {"tax": ANDORRA_TAX_KEYWORDS})
+
+
 def extract_keywords(query: str) -> List[str]:
     """Extrait les mots-clés pertinents d'une question"""
-    keywords = []
     query_lower = query.lower()
-    
-    # Mots-clés fiscaux importants
-    tax_keywords = {
-        "igi", "tva", "impost general", "taxe",
-        "irpf", "impôt revenu", "salaire", "renda",
-        "is", "societat", "société", "empresa",
-        "itp", "transmission", "immobilier", "patrimonial",
-        "résidence", "residència", "fiscal",
-        "holding", "dividende", "convention", "cdi"
-    }
-    
-    for keyword in tax_keywords:
-        if keyword in query_lower:
-            keywords.append(keyword)
+    keywords = classify(query_lower).matched("andorra.keywords", "tax")
     
     # Détection des montants et pourcentages
     import re
@@ -16,16 +16,20 @@ Fonctionnalités :
 import os
 import json
 import re
-import requests
 import time
 import hashlib
-from typing import Dict, List, Optional, Tuple, Any, AsyncGenerator
+from typing import Dict, List, Optional, Tuple, Any, AsyncGenerator, Callable, MutableSequence, Sequence
 from datetime import datetime, timedelta
 import asyncio
-from functools import lru_cache
-import threading
 from collections import defaultdict
 
+import write_behind
+from ollama_client import LLMUnavailable, get_local_llm
+from query_classifier import classify, register_vocabulary
+from conversation_sessions import remember
+from tracing import registry, traced
+from ttl_cache import TTLCache, cached_method
+
 # Import de la base de connaissance européenne
 from european_tax_knowledge_base import (
     european_tax_kb, 
@@ -33,6 +37,27 @@ from european_tax_knowledge_base import (
     EuropeanTaxKnowledgeBase
 )
 
+# Noms de pays reconnus dans les questions (code ISO → noms FR/EN)
+COUNTRY_NAMES = {
+    "FR": ["france"], "DE": ["allemagne", "germany"], "CH": ["suisse", "switzerland"],
+    "AD": ["andorre", "andorra"], "LU": ["luxembourg"], "DK": ["danemark", "denmark"],
+    "HU": ["hongrie", "hungary"], "EE": ["estonie", "estonia"], "IT": ["italie", "italy"],
+    "ES": ["espagne", "spain"], "PT": ["portugal"], "BE": ["belgique", "belgium"],
+    "NL": ["pays-bas", "netherlands"], "AT": ["autriche", "austria"]
+}
+register_vocabulary("particulier.country", COUNTRY_NAMES)
+
+# Enrichissement LLM retenu seulement au-delà de cette longueur (sinon la réponse calculée)
+MIN_ENRICHMENT_CHARS = 100
+
+# Analytics : métriques du registre (sûres entre threads, exposées sur /metrics)
+FRANCIS_QUERIES = registry.counter(
+    "francis_particulier_queries_total", "Questions traitées par type", ("query_type",))
+FRANCIS_COUNTRIES = registry.counter(
+    "francis_particulier_countries_total", "Pays mentionnés dans les questions", ("country",))
+FRANCIS_RESPONSE_SECONDS = registry.histogram(
+    "francis_particulier_response_seconds", "Durée de génération des réponses (hors cache)")
+
 class OllamaClient:
     """Client avancé pour communiquer avec Ollama en local"""
     
@@ -44,7 +69,9 @@ class OllamaClient:
             env_endpoint = "http://localhost:11434"
         self.base_url = base_url or env_endpoint
         self.model = model
-        self.models_cache = {}
+        # Client partagé : santé rafraîchie en tâche de fond, disjoncteur, pool httpx
+        self.llm = get_local_llm(self.base_url, model)
+        self.llm.start_monitor()
         self.performance_stats = {
             "requests_count": 0,
             "avg_response_time": 0,
@@ -52,28 +79,32 @@ class OllamaClient:
             "errors": []
         }
     
+    @property
+    def models_cache(self) -> Dict[str, Any]:
+        return self.llm.models
+    
     def is_available(self) -> bool:
-        """Vérifie si Ollama est disponible avec cache intelligent"""
-        try:
-            start_time = time.time()
-            response = requests.get(f"{self.base_url}/api/tags", timeout=3)
-            response_time = time.time() - start_time
-            
-            if response.status_code == 200:
-                # Cache des modèles disponibles
-                try:
-                    self.models_cache = {m['name']: m for m in response.json().get('models', [])}
-                except:
-                    pass
-                return True
-            return False
-        except Exception as e:
-            self.performance_stats["errors"].append({
-                "timestamp": time.time(),
-                "error": str(e),
-                "type": "availability_check"
-            })
-            return False
+        """Disponibilité d'Ollama depuis l'état en cache (aucune requête réseau)"""
+        return self.llm.is_available()
+    
+    def _options(self, temperature: float) -> Dict[str, Any]:
+        return {
+            "temperature": temperature,
+            "top_p": 0.9,
+            "num_ctx": 8192,  # Contexte élargi
+            "num_predict": 2048,
+            "repeat_penalty": 1.1,
+            "stop": ["\n\n\n", "---", "###"]
+        }
+    
+    def _record_error(self, error: Exception, error_type: str, prompt: str) -> None:
+        self.performance_stats["errors"].append({
+            "timestamp": time.time(),
+            "error": str(error),
+            "type": error_type,
+            "prompt_length": len(prompt)
+        })
+        self.performance_stats["errors"] = self.performance_stats["errors"][-50:]
     
     def generate_response(self, prompt: str, system_prompt: str = "", temperature: float = 0.3) -> str:
         """Génère une réponse avec Ollama avec monitoring avancé"""
@@ -82,51 +113,30 @@ class OllamaClient:
         
         try:
             # Optimisation du prompt pour de meilleures performances
-            optimized_prompt = self._optimize_prompt(prompt)
-            
-            payload = {
-                "model": self.model,
-                "prompt": optimized_prompt,
-                "system": system_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "top_p": 0.9,
-                    "num_ctx": 8192,  # Contexte élargi
-                    "num_predict": 2048,
-                    "repeat_penalty": 1.1,
-                    "stop": ["\n\n\n", "---", "###"]
-                }
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=45
-            )
-            
-            response_time = time.time() - start_time
-            self._update_performance_stats(response_time, True)
-            
-            if response.status_code == 200:
-                result = response.json().get("response", "")
-                return self._post_process_response(result)
-            else:
-                self._update_performance_stats(response_time, False)
-                return ""
-                
+            result = self.llm.generate(self._optimize_prompt(prompt), system_prompt,
+                                       self._options(temperature), timeout=45)
+            self._update_performance_stats(time.time() - start_time, True)
+            return self._post_process_response(result)
         except Exception as e:
-            response_time = time.time() - start_time
-            self._update_performance_stats(response_time, False)
-            self.performance_stats["errors"].append({
-                "timestamp": time.time(),
-                "error": str(e),
-                "type": "generation",
-                "prompt_length": len(prompt)
-            })
+            # Disjoncteur ouvert : échec immédiat, sans attendre de timeout
+            self._update_performance_stats(time.time() - start_time, False)
+            self._record_error(e, "generation", prompt)
             print(f"Erreur Ollama: {e}")
             return ""
     
+    async def stream_response(self, prompt: str, system_prompt: str = "", temperature: float = 0.3) -> AsyncGenerator[str, None]:
+        """Tokens de la réponse au fil de la génération (LLMUnavailable si Ollama est coupé)"""
+        start_time = time.time()
+        self.performance_stats["requests_count"] += 1
+        try:
+            async for token in self.llm.stream(self._optimize_prompt(prompt), system_prompt, self._options(temperature)):
+                yield token
+        except Exception as e:
+            self._update_performance_stats(time.time() - start_time, False)
+            self._record_error(e, "stream", prompt)
+            raise
+        self._update_performance_stats(time.time() - start_time, True)
+    
     def _optimize_prompt(self, prompt: str) -> str:
         """Optimise le prompt pour de meilleures performances"""
         # Nettoyage et optimisation du prompt
@@ -174,6 +184,8 @@ class OllamaClient:
             **self.performance_stats,
             "models_available": len(self.models_cache),
             "current_model": self.model,
+            "circuit_state": self.llm.breaker.state,
+            "last_health_check": self.llm.last_check,
             "recent_errors": self.performance_stats["errors"][-5:]  # 5 dernières erreurs
         }
 
@@ -181,28 +193,19 @@ class FrancisParticulierIndependent:
     """
     Francis Particulier - Assistant fiscal européen 100% indépendant
     Version améliorée avec cache intelligent, analytics et optimisations
+
+    Sans état propre à un utilisateur : l'historique et le profil d'une
+    conversation sont passés à chaque appel (voir conversation_sessions).
     """
     
     def __init__(self):
         self.knowledge_base = european_tax_kb
-        self.conversation_history = []
-        self.user_profile = {}
         self.ollama_client = OllamaClient()
         
-        # Cache intelligent pour les réponses
-        self.response_cache = {}
+        # Cache intelligent pour les réponses (LRU à expiration, voir ttl_cache)
         self.cache_ttl = 3600  # 1 heure
-        
-        # Analytics et métriques
-        self.analytics = {
-            "queries_processed": 0,
-            "countries_queried": defaultdict(int),
-            "query_types": defaultdict(int),
-            "response_times": [],
-            "user_satisfaction": [],
-            "cache_hits": 0,
-            "cache_misses": 0
-        }
+        self.response_cache = TTLCache("francis_responses", max_entries=500, ttl=self.cache_ttl,
+                                       max_bytes=16 * 1024 * 1024)
         
         # Configuration avancée
         self.config = {
@@ -214,9 +217,6 @@ class FrancisParticulierIndependent:
             "response_quality_threshold": 0.8
         }
         
-        # Thread lock pour la sécurité
-        self._lock = threading.Lock()
-        
         # Patterns de reconnaissance des questions fiscales (améliorés)
         self.tax_patterns = {
             "income_tax": [
@@ -259,6 +259,7 @@ class FrancisParticulierIndependent:
                 r"auto.*entrepreneur", r"micro.*entreprise", r"tva.*intracommunautaire"
             ]
         }
+        register_vocabulary("particulier.tax_topic", self.tax_patterns, regex=True)
     
     def _generate_cache_key(self, query: str, user_profile: Optional[Dict] = None) -> str:
         """Génère une clé de cache unique pour la requête"""
@@ -266,59 +267,43 @@ class FrancisParticulierIndependent:
         combined = f"{query.lower().strip()}|{profile_str}"
         return hashlib.md5(combined.encode()).hexdigest()
     
-    def _is_cache_valid(self, timestamp: float) -> bool:
-        """Vérifie si l'entrée de cache est encore valide"""
-        return time.time() - timestamp < self.cache_ttl
-    
     def _update_analytics(self, query: str, analysis: Dict, response_time: float):
         """Met à jour les analytics de performance"""
         if not self.config["enable_analytics"]:
             return
-            
-        with self._lock:
-            self.analytics["queries_processed"] += 1
-            self.analytics["response_times"].append(response_time)
-            
-            # Garde seulement les 1000 derniers temps de réponse
-            if len(self.analytics["response_times"]) > 1000:
-                self.analytics["response_times"] = self.analytics["response_times"][-1000:]
-            
-            # Statistiques par type de requête
-            query_type = analysis.get("query_type", "general")
-            self.analytics["query_types"][query_type] += 1
-            
-            # Statistiques par pays
-            for country in analysis.get("countries_mentioned", []):
-                self.analytics["countries_queried"][country] += 1
+        
+        query_type = analysis.get("query_type", "general")
+        FRANCIS_QUERIES.inc(query_type=query_type)
+        FRANCIS_RESPONSE_SECONDS.observe(response_time)
+        for country in analysis.get("countries_mentioned", []):
+            FRANCIS_COUNTRIES.inc(country=country)
+        
+        # Persistance différée par lots (no-op si aucune file n'est enregistrée)
+        write_behind.enqueue("francis_analytics", {
+            "query_type": query_type,
+            "countries": analysis.get("countries_mentioned", []),
+            "analysis_method": analysis.get("analysis_method", "basic"),
+            "response_time_ms": round(response_time * 1000, 2),
+            "created_at": datetime.utcnow().isoformat()
+        })
     
     def get_analytics_summary(self) -> Dict[str, Any]:
         """Retourne un résumé des analytics"""
-        with self._lock:
-            response_times = self.analytics["response_times"]
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            
-            return {
-                "total_queries": self.analytics["queries_processed"],
-                "avg_response_time_ms": round(avg_response_time * 1000, 2),
-                "cache_hit_rate": (
-                    self.analytics["cache_hits"] / 
-                    (self.analytics["cache_hits"] + self.analytics["cache_misses"]) * 100
-                    if (self.analytics["cache_hits"] + self.analytics["cache_misses"]) > 0 else 0
-                ),
-                "top_countries": dict(sorted(
-                    self.analytics["countries_queried"].items(), 
-                    key=lambda x: x[1], 
-                    reverse=True
-                )[:10]),
-                "top_query_types": dict(sorted(
-                    self.analytics["query_types"].items(), 
-                    key=lambda x: x[1], 
-                    reverse=True
-                )),
-                "ollama_stats": self.ollama_client.get_performance_stats()
-            }
+        query_types = {key[0]: int(value) for key, value in FRANCIS_QUERIES.series().items()}
+        countries = {key[0]: int(value) for key, value in FRANCIS_COUNTRIES.series().items()}
+        timed = FRANCIS_RESPONSE_SECONDS.count()
+        avg_response_time = FRANCIS_RESPONSE_SECONDS.sum() / timed if timed else 0
+        
+        return {
+            "total_queries": sum(query_types.values()),
+            "avg_response_time_ms": round(avg_response_time * 1000, 2),
+            "cache_hit_rate": self.response_cache.info()["hit_rate"] * 100,
+            "top_countries": dict(sorted(countries.items(), key=lambda x: x[1], reverse=True)[:10]),
+            "top_query_types": dict(sorted(query_types.items(), key=lambda x: x[1], reverse=True)),
+            "ollama_stats": self.ollama_client.get_performance_stats()
+        }
     
-    @lru_cache(maxsize=128)
+    @cached_method(max_entries=128)
     def _get_smart_suggestions(self, query_type: str, countries: tuple) -> List[str]:
         """Génère des suggestions intelligentes basées sur le contexte"""
         suggestions = []
@@ -344,6 +329,7 @@ class FrancisParticulierIndependent:
         
         return suggestions[:3]  # Limite à 3 suggestions
     
+    @traced("query_analysis")
     def analyze_query(self, query: str) -> Dict[str, Any]:
         """Analyse la requête utilisateur pour déterminer le type de question fiscale"""
         
@@ -371,26 +357,15 @@ class FrancisParticulierIndependent:
             "confidence": 0.0
         }
         
-        # Détection des sujets fiscaux
-        for topic, patterns in self.tax_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    analysis["tax_topics"].append(topic)
-                    analysis["confidence"] += 0.2
-        
-        # Détection des pays mentionnés
-        country_patterns = {
-            "france": "FR", "allemagne": "DE", "germany": "DE", "suisse": "CH", 
-            "switzerland": "CH", "andorre": "AD", "andorra": "AD", 
-            "luxembourg": "LU", "danemark": "DK", "denmark": "DK",
-            "hongrie": "HU", "hungary": "HU", "estonie": "EE", "estonia": "EE",
-            "italie": "IT", "italy": "IT", "espagne": "ES", "spain": "ES",
-            "portugal": "PT", "belgique": "BE", "belgium": "BE",
-            "pays-bas": "NL", "netherlands": "NL", "autriche": "AT", "austria": "AT"
-        }
+        # Détection des sujets fiscaux et des pays en une seule passe
+        hits = classify(query_lower)
+        for topic, patterns in hits.categories("particulier.tax_topic").items():
+            for _ in patterns:
+                analysis["tax_topics"].append(topic)
+                analysis["confidence"] += 0.2
         
-        for country_name, country_code in country_patterns.items():
-            if country_name in query_lower:
+        for country_code, names in hits.categories("particulier.country").items():
+            for _ in names:
                 analysis["countries_mentioned"].append(country_code)
                 analysis["confidence"] += 0.1
         
@@ -499,13 +474,20 @@ Sois précis dans l'extraction des montants et des pays."""
         
         return merged
     
-    def generate_response(self, query: str, user_profile: Optional[Dict] = None) -> Dict[str, Any]:
+    def generate_response(self, query: str, user_profile: Optional[Dict] = None,
+                          enrich_with_llm: bool = True, analysis: Optional[Dict] = None,
+                          conversation: Optional[MutableSequence[Dict]] = None) -> Dict[str, Any]:
         """
         Génère une réponse fiscale complète et personnalisée avec cache intelligent
         
         Args:
             query: Question de l'utilisateur
             user_profile: Profil utilisateur optionnel
+            enrich_with_llm: False pour laisser l'appelant enrichir la réponse (streaming) ;
+                la réponse n'est alors pas mise en cache
+            analysis: analyse déjà calculée par l'appelant (sinon analyze_query)
+            conversation: historique de la conversation, complété sur place (tampon d'une
+                session ou liste fournie par le client) ; None pour une question sans mémoire
         
         Returns:
             Réponse structurée avec conseils fiscaux
@@ -514,30 +496,19 @@ Sois précis dans l'extraction des montants et des pays."""
         
         # Vérification du cache
         cache_key = self._generate_cache_key(query, user_profile)
-        if self.config["enable_cache"] and cache_key in self.response_cache:
-            cached_entry = self.response_cache[cache_key]
-            if self._is_cache_valid(cached_entry["timestamp"]):
-                self.analytics["cache_hits"] += 1
-                cached_response = cached_entry["response"].copy()
-                cached_response["from_cache"] = True
-                cached_response["cache_age_seconds"] = int(time.time() - cached_entry["timestamp"])
-                return cached_response
-            else:
-                # Cache expiré, suppression
-                del self.response_cache[cache_key]
-        
-        self.analytics["cache_misses"] += 1
+        cached_response = self._cached_response(cache_key)
+        if cached_response is not None:
+            return cached_response
         
         # Analyse de la requête
-        analysis = self.analyze_query(query)
+        if analysis is None:
+            analysis = self.analyze_query(query)
         
-        # Mise à jour du profil utilisateur avec mémoire contextuelle
-        if user_profile:
-            self.user_profile.update(user_profile)
+        history = conversation if self.config["enable_context_memory"] else None
         
         # Ajout du contexte de conversation si activé
-        if self.config["enable_context_memory"] and self.conversation_history:
-            analysis["conversation_context"] = self.conversation_history[-3:]  # 3 derniers échanges
+        if history:
+            analysis["conversation_context"] = list(history)[-3:]  # 3 derniers échanges
         
         # Génération de la réponse selon le type de requête
         if analysis["query_type"] == "income_tax":
@@ -545,7 +516,7 @@ Sois précis dans l'extraction des montants et des pays."""
         elif analysis["query_type"] == "comparison":
             base_response = self._handle_comparison_query(query, analysis)
         elif analysis["query_type"] == "optimization":
-            base_response = self._handle_optimization_query(query, analysis)
+            base_response = self._handle_optimization_query(query, analysis, user_profile)
         elif analysis["query_type"] == "vat":
             base_response = self._handle_vat_query(query, analysis)
         elif analysis["query_type"] == "inheritance_tax":
@@ -556,7 +527,7 @@ Sois précis dans l'extraction des montants et des pays."""
             base_response = self._handle_general_query(query, analysis)
         
         # Enrichissement avec LLM local si disponible
-        if self.ollama_client.is_available() and analysis.get("analysis_method") == "hybrid":
+        if enrich_with_llm and self.ollama_client.is_available() and analysis.get("analysis_method") == "hybrid":
             base_response = self._enrich_response_with_llm(query, base_response, analysis)
         
         # Ajout des suggestions intelligentes
@@ -569,37 +540,16 @@ Sois précis dans l'extraction des montants et des pays."""
             base_response["truncated"] = True
         
         # Mise en cache de la réponse
-        if self.config["enable_cache"]:
-            self.response_cache[cache_key] = {
-                "response": base_response.copy(),
-                "timestamp": time.time()
-            }
-            
-            # Nettoyage du cache si trop volumineux
-            if len(self.response_cache) > 500:
-                oldest_keys = sorted(
-                    self.response_cache.keys(),
-                    key=lambda k: self.response_cache[k]["timestamp"]
-                )[:100]
-                for key in oldest_keys:
-                    del self.response_cache[key]
+        if enrich_with_llm:
+            self._cache_response(cache_key, base_response)
         
         # Mise à jour des analytics
         response_time = time.time() - start_time
         self._update_analytics(query, analysis, response_time)
         
-        # Ajout à l'historique de conversation
-        if self.config["enable_context_memory"]:
-            self.conversation_history.append({
-                "query": query,
-                "response_type": base_response.get("type", "unknown"),
-                "timestamp": time.time(),
-                "analysis": analysis
-            })
-            
-            # Limitation de l'historique
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
+        # Ajout à l'historique de conversation (forme compacte, taille bornée)
+        if history is not None:
+            remember(history, query, base_response.get("type", "unknown"), analysis)
         
         # Métadonnées de performance
         base_response["performance"] = {
@@ -611,8 +561,26 @@ Sois précis dans l'extraction des montants et des pays."""
         
         return base_response
     
-    def _enrich_response_with_llm(self, query: str, base_response: Dict, analysis: Dict) -> Dict[str, Any]:
-        """Enrichit la réponse avec des explications personnalisées du LLM local"""
+    def _cached_response(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Copie de la réponse en cache sous `cache_key`, ou None"""
+        cached_entry = self.response_cache.get(cache_key) if self.config["enable_cache"] else None
+        if cached_entry is None:
+            return None
+        cached_response = cached_entry["response"].copy()
+        cached_response["from_cache"] = True
+        cached_response["cache_age_seconds"] = int(time.time() - cached_entry["timestamp"])
+        return cached_response
+    
+    def _cache_response(self, cache_key: str, response: Dict) -> None:
+        if not self.config["enable_cache"]:
+            return
+        self.response_cache.set(cache_key, {
+            "response": response.copy(),
+            "timestamp": time.time()
+        })
+    
+    def _build_enrichment_prompt(self, query: str, base_response: Dict, analysis: Dict) -> Tuple[str, str]:
+        """Prompt (et prompt système) d'enrichissement d'une réponse technique par le LLM local"""
         
         system_prompt = """Tu es Francis, expert fiscal européen. Tu dois enrichir une réponse fiscale technique avec des explications claires et personnalisées.
 
@@ -642,10 +610,10 @@ Enrichis cette réponse avec :
 
 Garde TOUS les calculs, tableaux et données existants.
 """
-        
-        enriched_text = self.ollama_client.generate_response(prompt, system_prompt)
-        
-        if enriched_text and len(enriched_text) > 100:
+        return prompt, system_prompt
+    
+    def _apply_enrichment(self, base_response: Dict, enriched_text: str) -> Dict[str, Any]:
+        if enriched_text and len(enriched_text) > MIN_ENRICHMENT_CHARS:
             base_response["response"] = enriched_text
             base_response["enriched_by_llm"] = True
         else:
@@ -653,6 +621,11 @@ Garde TOUS les calculs, tableaux et données existants.
         
         return base_response
     
+    def _enrich_response_with_llm(self, query: str, base_response: Dict, analysis: Dict) -> Dict[str, Any]:
+        """Enrichit la réponse avec des explications personnalisées du LLM local"""
+        prompt, system_prompt = self._build_enrichment_prompt(query, base_response, analysis)
+        return self._apply_enrichment(base_response, self.ollama_client.generate_response(prompt, system_prompt))
+    
     def _handle_income_tax_query(self, query: str, analysis: Dict) -> Dict[str, Any]:
         """Traite les questions sur l'impôt sur le revenu"""
         
@@ -662,6 +635,21 @@ Garde TOUS les calculs, tableaux et données existants.
         
         # Calcul de l'impôt
         tax_calculation = self.knowledge_base.calculate_income_tax(country, income)
+        if "error" in tax_calculation:
+            return {
+                "response": f"""
+## 💰 Calcul de l'impôt sur le revenu
+
+Le calcul détaillé n'est pas disponible : {tax_calculation['error']}.
+
+### 💡 Pour avancer :
+- Précisez un autre pays européen couvert par la base
+- Ou demandez une comparaison entre plusieurs pays
+""",
+                "calculation": tax_calculation,
+                "type": "income_tax_unavailable",
+                "confidence": 0.3
+            }
         
         # Génération de la réponse
         response = f"""
@@ -741,11 +729,12 @@ En déménageant de {comparison["countries_comparison"][comparison["worst_countr
             "confidence": 0.9
         }
     
-    def _handle_optimization_query(self, query: str, analysis: Dict) -> Dict[str, Any]:
+    def _handle_optimization_query(self, query: str, analysis: Dict,
+                                   user_profile: Optional[Dict] = None) -> Dict[str, Any]:
         """Traite les questions d'optimisation fiscale"""
         
         # Profil par défaut ou utilisateur
-        profile = self.user_profile or {
+        profile = user_profile or {
             "annual_income": analysis["amounts_mentioned"][0] if analysis["amounts_mentioned"] else 80000,
             "country": analysis["countries_mentioned"][0] if analysis["countries_mentioned"] else "FR",
             "objectives": ["reduce_tax", "optimize_wealth"]
@@ -1033,87 +1022,167 @@ Aucun résultat spécifique trouvé. Voici quelques suggestions :
         }
         return flags.get(country_code, "🏳️")
     
-    async def generate_response_stream(self, query: str, user_profile: Optional[Dict] = None) -> AsyncGenerator[str, None]:
-        """Génère une réponse en streaming pour l'interface utilisateur"""
+    async def generate_response_stream(self, query: str, user_profile: Optional[Dict] = None,
+                                       conversation: Optional[MutableSequence[Dict]] = None) -> AsyncGenerator[str, None]:
+        """Génère une réponse en streaming pour l'interface utilisateur
+        
+        Les étapes synchrones (analyse, calculs, appels LLM bloquants) s'exécutent dans un
+        thread pour ne pas bloquer la boucle d'événements ; chaque étape est émise dès
+        qu'elle est terminée.
+        """
         
         # Analyse initiale
         yield json.dumps({"type": "analysis", "status": "Analyse de votre question..."}) + "\n"
-        await asyncio.sleep(0.1)
         
-        analysis = self.analyze_query(query)
+        analysis = await asyncio.to_thread(self.analyze_query, query)
         
         yield json.dumps({"type": "analysis", "status": f"Question identifiée : {analysis['query_type']}"}) + "\n"
-        await asyncio.sleep(0.1)
         
         # Génération de la réponse
         yield json.dumps({"type": "processing", "status": "Calcul des données fiscales..."}) + "\n"
-        await asyncio.sleep(0.2)
         
-        response_data = self.generate_response(query, user_profile)
+        response_data = await asyncio.to_thread(
+            self.generate_response, query, user_profile,
+            enrich_with_llm=False, analysis=analysis, conversation=conversation
+        )
+        
+        # Enrichissement par le LLM local streamé token par token
+        if (not response_data.get("from_cache") and self.ollama_client.is_available()
+                and analysis.get("analysis_method") == "hybrid"):
+            prompt, system_prompt = self._build_enrichment_prompt(query, response_data, analysis)
+            tokens = []
+            try:
+                async for token in self.ollama_client.stream_response(prompt, system_prompt):
+                    tokens.append(token)
+                    yield json.dumps({"type": "token", "content": token}) + "\n"
+            except LLMUnavailable as e:
+                print(f"[WARN] Enrichissement LLM interrompu : {e}")
+            self._apply_enrichment(response_data, self.ollama_client._post_process_response("".join(tokens)))
+            response_data["performance"]["llm_enriched"] = response_data["enriched_by_llm"]
         
         yield json.dumps({"type": "response", "data": response_data}) + "\n"
     
+    async def stream_answer(self, query: str, user_profile: Optional[Dict] = None,
+                            conversation: Optional[MutableSequence[Dict]] = None,
+                            on_response: Optional[Callable[[Dict], Any]] = None) -> AsyncGenerator[str, None]:
+        """Texte de la réponse au fil de l'eau, sans trames de statut (endpoints /ask, /test-francis)
+        
+        La réponse calculée (barèmes, tableaux…) est transmise d'un bloc dès qu'elle est prête ;
+        si le LLM local l'enrichit, ses tokens sont transmis à la place. Les premiers sont
+        retenus jusqu'à MIN_ENRICHMENT_CHARS, comme pour _apply_enrichment : un enrichissement
+        trop court est abandonné au profit de la réponse calculée.
+        Le cache de réponses est consulté avant l'analyse (qui peut appeler le LLM local) ;
+        la réponse finale, enrichie ou non, y est rangée.
+        `on_response` reçoit les données complètes de la réponse en fin de flux.
+        """
+        cache_key = self._generate_cache_key(query, user_profile)
+        cached_response = self._cached_response(cache_key)
+        if cached_response is not None:
+            yield cached_response.get("response", "")
+            if on_response:
+                on_response(cached_response)
+            return
+        
+        try:
+            analysis = await asyncio.to_thread(self.analyze_query, query)
+            response_data = await asyncio.to_thread(
+                self.generate_response, query, user_profile,
+                enrich_with_llm=False, analysis=analysis, conversation=conversation
+            )
+        except Exception as e:
+            # Même repli que get_francis_particulier_response : une réponse d'erreur lisible
+            print(f"[WARN] Francis Particulier : échec de la génération : {e}")
+            yield _error_response(e)
+            return
+        
+        tokens = []
+        emitted = False  # texte d'enrichissement déjà transmis : il fait foi
+        if (not response_data.get("from_cache") and self.ollama_client.is_available()
+                and analysis.get("analysis_method") == "hybrid"):
+            prompt, system_prompt = self._build_enrichment_prompt(query, response_data, analysis)
+            try:
+                async for token in self.ollama_client.stream_response(prompt, system_prompt):
+                    tokens.append(token)
+                    if emitted:
+                        yield token
+                    elif len("".join(tokens).strip()) > MIN_ENRICHMENT_CHARS:
+                        emitted = True
+                        yield "".join(tokens)
+            except LLMUnavailable as e:
+                if emitted:
+                    raise
+                print(f"[WARN] Enrichissement LLM indisponible : {e}")
+        
+        if emitted:
+            response_data["response"] = "".join(tokens).strip()
+            response_data["enriched_by_llm"] = True
+            response_data["performance"]["llm_enriched"] = True
+        else:
+            yield response_data.get("response", "")
+        self._cache_response(cache_key, response_data)
+        
+        if on_response:
+            on_response(response_data)
+    
     def clear_cache(self):
         """Vide le cache de réponses"""
-        with self._lock:
-            self.response_cache.clear()
-            print("Cache vidé avec succès")
+        self.response_cache.clear()
+        print("Cache vidé avec succès")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Retourne les statistiques du cache"""
-        with self._lock:
-            return {
-                "cache_size": len(self.response_cache),
-                "cache_hit_rate": (
-                    self.analytics["cache_hits"] / 
-                    (self.analytics["cache_hits"] + self.analytics["cache_misses"]) * 100
-                    if (self.analytics["cache_hits"] + self.analytics["cache_misses"]) > 0 else 0
-                ),
-                "oldest_entry_age": (
-                    time.time() - min([entry["timestamp"] for entry in self.response_cache.values()])
-                    if self.response_cache else 0
-                )
-            }
+        timestamps = [entry["timestamp"] for _, entry in self.response_cache.items()]
+        info = self.response_cache.info()
+        return {
+            "cache_size": info["entries"],
+            "cache_bytes": info["bytes"],
+            "cache_hit_rate": info["hit_rate"] * 100,
+            "cache_evictions": info["evictions"],
+            "oldest_entry_age": time.time() - min(timestamps) if timestamps else 0
+        }
     
     def update_config(self, new_config: Dict[str, Any]):
         """Met à jour la configuration de Francis"""
-        with self._lock:
-            self.config.update(new_config)
-            print(f"Configuration mise à jour : {new_config}")
+        # Nouveau dict : les requêtes en cours gardent une configuration cohérente, sans verrou
+        self.config = {**self.config, **new_config}
+        print(f"Configuration mise à jour : {new_config}")
     
-    def get_conversation_summary(self) -> Dict[str, Any]:
-        """Retourne un résumé de la conversation actuelle"""
-        if not self.conversation_history:
+    def get_conversation_summary(self, conversation: Optional[Sequence[Dict]] = None) -> Dict[str, Any]:
+        """Retourne un résumé de la conversation fournie"""
+        history = list(conversation or [])
+        if not history:
             return {"status": "no_conversation"}
         
         query_types = defaultdict(int)
         countries_discussed = defaultdict(int)
         
-        for entry in self.conversation_history:
+        for entry in history:
             analysis = entry.get("analysis", {})
             query_types[analysis.get("query_type", "unknown")] += 1
             for country in analysis.get("countries_mentioned", []):
                 countries_discussed[country] += 1
         
         return {
-            "total_exchanges": len(self.conversation_history),
+            "total_exchanges": len(history),
             "duration_minutes": (
-                (self.conversation_history[-1]["timestamp"] - self.conversation_history[0]["timestamp"]) / 60
-                if len(self.conversation_history) > 1 else 0
+                (history[-1]["timestamp"] - history[0]["timestamp"]) / 60
+                if len(history) > 1 else 0
             ),
             "main_topics": dict(sorted(query_types.items(), key=lambda x: x[1], reverse=True)),
             "countries_discussed": dict(sorted(countries_discussed.items(), key=lambda x: x[1], reverse=True)),
-            "last_query_time": datetime.fromtimestamp(self.conversation_history[-1]["timestamp"]).isoformat()
+            "last_query_time": datetime.fromtimestamp(history[-1]["timestamp"]).isoformat()
         }
     
-    def export_conversation(self) -> str:
-        """Exporte la conversation au format JSON"""
+    def export_conversation(self, conversation: Optional[Sequence[Dict]] = None,
+                            user_profile: Optional[Dict] = None) -> str:
+        """Exporte la conversation fournie au format JSON"""
+        history = list(conversation or [])
         export_data = {
             "export_timestamp": datetime.now().isoformat(),
-            "conversation_summary": self.get_conversation_summary(),
+            "conversation_summary": self.get_conversation_summary(history),
             "analytics_summary": self.get_analytics_summary(),
-            "conversation_history": self.conversation_history,
-            "user_profile": self.user_profile,
+            "conversation_history": history,
+            "user_profile": user_profile or {},
             "config": self.config
         }
         return json.dumps(export_data, indent=2, ensure_ascii=False)
@@ -1198,10 +1267,14 @@ def get_francis_particulier_response(query: str, user_profile: Optional[Dict] =
         response_data = francis_particulier.generate_response(query, user_profile)
         return response_data["response"]
     except Exception as e:
-        return f"""
+        return _error_response(e)
+
+def _error_response(error: Exception) -> str:
+    """Réponse affichée quand Francis Particulier ne peut pas traiter la question"""
+    return f"""
 ## ❌ Erreur dans le traitement de votre question
 
-Une erreur s'est produite : {str(e)}
+Une erreur s'est produite : {str(error)}
 
 ### 💡 Suggestions :
 - Reformulez votre question
@@ -1,18 +1,17 @@
 import os, time
 import numpy as np
 from pathlib import Path
-from tqdm import tqdm
 
 """
 Génération d'embeddings Mistral pour les chunks de fiscalité andorrane.
-Réutilise la logique de generate_bofip_embeddings.py.
+S'appuie sur embedding_pipeline.py (lots, concurrence, reprise).
 Usage :
     python generate_andorra_embeddings.py
 Pré-requis :
-    • Les chunks texte doivent être présents dans backend/data/andorra_chunks_text/
+    • Les chunks texte doivent être présents dans backend/data/andorra_corpus.jsonl ou backend/data/andorra_chunks_text/
       (fichiers andorra_chunk_XXXX.txt)
     • La variable d'environnement MISTRAL_API_KEY doit être définie.
-Les embeddings sont créés dans backend/data/andorra_embeddings/
+Les embeddings sont créés dans backend/data/andorra_embeddings/ (bundle corpus.bundle)
 """
 
 # Choix dynamique du backend embeddings : Ollama (local) ou API Mistral
@@ -54,30 +53,21 @@ def get_embedding(text: str, retries: int = 3, delay: float = 1.0) -> np.ndarray
     raise RuntimeError("Impossible d'obtenir l'embedding après plusieurs tentatives")
 
 
+def _embed_local_batch(texts):
+    return embed_local(texts)
+
+
 def generate_embeddings():
+    """Lots concurrents et reprise sur interruption : voir embedding_pipeline."""
+    from embedding_pipeline import embed_corpus
+
     if not CHUNKS_DIR.exists():
         raise FileNotFoundError(f"Dossier chunks introuvable : {CHUNKS_DIR}. Exécutez d'abord extract_andorra_tax_docs.py")
-    EMBEDDINGS_DIR.mkdir(parents=True, exist_ok=True)
-
-    chunk_files = sorted(CHUNKS_DIR.glob('andorra_chunk_*.txt'))
-    processed, errors = 0, 0
-    for txt_file in tqdm(chunk_files, desc="Embeddings Andorre"):
-        emb_file = EMBEDDINGS_DIR / txt_file.with_suffix('.npy').name
-        if emb_file.exists():
-            continue  # Skip existing
-        text = txt_file.read_text(encoding='utf-8')
-        if not text.strip():
-            print(f"⚠️ Chunk vide : {txt_file.name}")
-            continue
-        try:
-            emb = get_embedding(text)
-            np.save(emb_file, emb)
-            processed += 1
-            time.sleep(0.3)
-        except Exception as e:
-            print(f"❌ Erreur embedding {txt_file.name}: {e}")
-            errors += 1
-    print(f"✅ Embeddings créés : {processed} | Erreurs : {errors}")
+    if USE_LOCAL:
+        stats = embed_corpus("andorra", embed_fn=_embed_local_batch, model=MODEL_NAME)
+    else:
+        stats = embed_corpus("andorra")
+    print(f"✅ Embeddings créés : {stats['embedded']} | Manquants : {stats['missing']}")
 
 
 if __name__ == '__main__':
@@ -1,20 +1,12 @@
 import os
 import numpy as np
-from tqdm import tqdm
 import time
 import re
 from mistralai.client import MistralClient
 
 # Configuration
+# ⚠️ Pas de raise à l'import : chunk_text_by_paragraph est utilisé par embedding_pipeline
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY") 
-if not MISTRAL_API_KEY:
-    # Tenter de récupérer la clé depuis le script original si non définie en variable d'env
-    # Ceci est une solution de repli temporaire et devrait être géré proprement avec des variables d'env
-    print("Avertissement: MISTRAL_API_KEY non définie dans l'environnement. Tentative de récupération alternative...")
-    # MISTRAL_API_KEY = "8SZTNsTAi2JUAxdj7wDXa3rCxf7Txcod" # Clé du script original, à supprimer à terme
-    # if not MISTRAL_API_KEY: # Si toujours pas de clé après la tentative de repli
-    raise ValueError("La variable d'environnement MISTRAL_API_KEY doit être définie. "
-                     "Elle n'a pas été trouvée dans l'environnement ni en fallback.")
 
 MODEL_NAME = "mistral-embed"
 
@@ -22,10 +14,19 @@ SOURCE_TEXT_FILE = os.path.join("data", "bofip_extracted_text.txt")
 BOFIP_CHUNKS_TEXT_DIR = os.path.join("data", "bofip_chunks_text")
 BOFIP_EMBEDDINGS_DIR = os.path.join("data", "bofip_embeddings")
 
-client = MistralClient(api_key=MISTRAL_API_KEY)
+_client = None
+
+def _get_client() -> MistralClient:
+    global _client
+    if _client is None:
+        if not MISTRAL_API_KEY:
+            raise ValueError("La variable d'environnement MISTRAL_API_KEY doit être définie.")
+        _client = MistralClient(api_key=MISTRAL_API_KEY)
+    return _client
 
 def get_embedding_mistral(text_chunk: str, max_retries: int = 3, delay: float = 1.0) -> np.ndarray:
     """Obtient l'embedding d'un morceau de texte via l'API Mistral en utilisant le client officiel."""
+    client = _get_client()
     for attempt in range(max_retries):
         try:
             embeddings_batch_response = client.embeddings(
@@ -104,65 +105,13 @@ def chunk_text_by_paragraph(text: str, min_chunk_size: int = 50, max_chunk_size:
     return final_chunks
 
 def generate_bofip_embeddings():
-    """Génère les embeddings pour le texte du BOFIP découpé en chunks."""
-    os.makedirs(BOFIP_CHUNKS_TEXT_DIR, exist_ok=True)
-    os.makedirs(BOFIP_EMBEDDINGS_DIR, exist_ok=True)
+    """Génère les embeddings pour le texte du BOFIP découpé en chunks (voir embedding_pipeline)."""
+    from embedding_pipeline import embed_corpus
 
-    try:
-        with open(SOURCE_TEXT_FILE, 'r', encoding='utf-8') as f:
-            bofip_text = f.read()
-    except FileNotFoundError:
+    if not os.path.exists(SOURCE_TEXT_FILE):
         print(f"Erreur : Le fichier texte source {SOURCE_TEXT_FILE} n'a pas été trouvé.")
         return
-
-    chunks = chunk_text_by_paragraph(bofip_text, min_chunk_size=100, max_chunk_size=1500) # Ajustement des tailles
-    
-    processed_count = 0
-    error_count = 0
-
-    # Filtrer les chunks déjà traités
-    existing_embeddings_files = os.listdir(BOFIP_EMBEDDINGS_DIR)
-    chunks_to_process = []
-    for i, chunk in enumerate(chunks):
-        chunk_filename_base = f"bofip_chunk_{i:04d}"
-        embedding_chunk_path = os.path.join(BOFIP_EMBEDDINGS_DIR, f"{chunk_filename_base}.npy")
-        if not os.path.exists(embedding_chunk_path):
-            chunks_to_process.append((i, chunk))
-        else:
-            # Sauvegarder aussi le fichier texte si l'embedding existe déjà (pour complétude)
-            text_chunk_path = os.path.join(BOFIP_CHUNKS_TEXT_DIR, f"{chunk_filename_base}.txt")
-            if not os.path.exists(text_chunk_path):
-                 with open(text_chunk_path, 'w', encoding='utf-8') as f_text:
-                    f_text.write(chunk)
-
-    if not chunks_to_process:
-        print("Aucun nouveau chunk à traiter. Tous les embeddings semblent déjà générés.")
-        return
-    
-    print(f"{len(chunks_to_process)} nouveaux chunks à traiter.")
-
-    for i, chunk in tqdm(chunks_to_process, desc="Génération des embeddings BOFIP"):
-        original_index = i # Garder l'index original pour le nommage du fichier
-        chunk_filename_base = f"bofip_chunk_{original_index:04d}"
-        text_chunk_path = os.path.join(BOFIP_CHUNKS_TEXT_DIR, f"{chunk_filename_base}.txt")
-        embedding_chunk_path = os.path.join(BOFIP_EMBEDDINGS_DIR, f"{chunk_filename_base}.npy")
-
-        # Sauvegarder le chunk texte (même si l'embedding échoue, pour analyse)
-        with open(text_chunk_path, 'w', encoding='utf-8') as f_text:
-            f_text.write(chunk)
-        
-        try:
-            embedding = get_embedding_mistral(chunk)
-            np.save(embedding_chunk_path, embedding)
-            processed_count += 1
-            time.sleep(0.3) # Délai légèrement augmenté
-        except Exception as e:
-            print(f"[ERREUR] Impossible de générer l'embedding pour {chunk_filename_base}: {e}")
-            error_count += 1
-    
-    print(f"\nTraitement terminé. {processed_count} nouveaux embeddings BOFIP générés.")
-    if error_count > 0:
-        print(f"{error_count} erreurs rencontrées durant la génération des embeddings.")
+    return embed_corpus("bofip")
 
 if __name__ == "__main__":
     print("Démarrage de la génération des embeddings pour le BOFIP...")
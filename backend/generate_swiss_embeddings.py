@@ -10,7 +10,6 @@ from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
 import logging
 from typing import List
-import time
 from dotenv import load_dotenv
 
 # Charger les variables d'environnement
@@ -80,72 +79,30 @@ class SwissEmbeddingsGenerator:
             logger.error(f"Erreur lors de la génération d'embedding: {e}")
             raise
     
-    def generate_all_embeddings(self, batch_size: int = 10, delay: float = 1.0):
-        """Génère tous les embeddings pour les chunks suisses"""
-        chunks = self.load_text_chunks()
-        
-        if not chunks:
-            logger.error("Aucun chunk trouvé")
-            return
-        
-        logger.info(f"Génération des embeddings pour {len(chunks)} chunks")
+    def generate_all_embeddings(self, concurrency: int = 4):
+        """Génère tous les embeddings pour les chunks suisses (voir embedding_pipeline)"""
+        from embedding_pipeline import embed_corpus
         
-        for i, chunk in enumerate(chunks):
-            try:
-                # Nom du fichier d'embedding
-                embedding_filename = f"swiss_chunk_{i:04d}.npy"
-                embedding_path = os.path.join(self.embeddings_dir, embedding_filename)
-                
-                # Vérifier si l'embedding existe déjà
-                if os.path.exists(embedding_path):
-                    logger.info(f"Embedding {i+1}/{len(chunks)} existe déjà: {embedding_filename}")
-                    continue
-                
-                # Générer l'embedding
-                logger.info(f"Génération embedding {i+1}/{len(chunks)}: {embedding_filename}")
-                embedding = self.generate_embedding(chunk)
-                
-                # Sauvegarder l'embedding
-                np.save(embedding_path, embedding)
-                
-                # Délai pour éviter les limites de taux
-                if (i + 1) % batch_size == 0:
-                    logger.info(f"Pause de {delay}s après {i+1} embeddings")
-                    time.sleep(delay)
-                
-            except Exception as e:
-                logger.error(f"Erreur pour le chunk {i}: {e}")
-                continue
-        
-        logger.info("Génération des embeddings terminée")
+        stats = embed_corpus("swiss", concurrency=concurrency)
+        logger.info(f"Génération des embeddings terminée: {stats}")
     
     def verify_embeddings(self):
         """Vérifie que tous les embeddings ont été générés"""
-        chunks = self.load_text_chunks()
-        embeddings_count = 0
-        
-        for i in range(len(chunks)):
-            embedding_filename = f"swiss_chunk_{i:04d}.npy"
-            embedding_path = os.path.join(self.embeddings_dir, embedding_filename)
-            
-            if os.path.exists(embedding_path):
-                embeddings_count += 1
-            else:
-                logger.warning(f"Embedding manquant: {embedding_filename}")
+        from packed_embeddings import load_embedding_matrix
         
-        logger.info(f"Vérification: {embeddings_count}/{len(chunks)} embeddings générés")
-        return embeddings_count == len(chunks)
+        chunks = self.load_text_chunks()
+        ids, _ = load_embedding_matrix(self.embeddings_dir, "swiss_chunk_*.npy")
+        logger.info(f"Vérification: {len(ids)}/{len(chunks)} embeddings générés")
+        return len(ids) == len(chunks)
     
     def test_embedding_quality(self):
         """Test la qualité des embeddings générés"""
         try:
             # Charger quelques embeddings
-            test_embeddings = []
-            for i in range(min(5, len(os.listdir(self.embeddings_dir)))):
-                embedding_path = os.path.join(self.embeddings_dir, f"swiss_chunk_{i:04d}.npy")
-                if os.path.exists(embedding_path):
-                    embedding = np.load(embedding_path)
-                    test_embeddings.append(embedding)
+            from packed_embeddings import load_embedding_matrix
+            
+            _, matrix = load_embedding_matrix(self.embeddings_dir, "swiss_chunk_*.npy")
+            test_embeddings = list(matrix[:5])
             
             if test_embeddings:
                 # Vérifier les dimensions
@@ -173,7 +130,7 @@ def main():
         generator = SwissEmbeddingsGenerator()
         
         # Générer tous les embeddings
-        generator.generate_all_embeddings(batch_size=5, delay=2.0)
+        generator.generate_all_embeddings()
         
         # Vérifier les embeddings
         generator.verify_embeddings()
@@ -8,18 +8,29 @@ dans le dashboard particulier de Francis.
 
 import os
 import json
-import requests
+import time
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import httpx
+from typing import Dict, Iterable, List, Optional, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 
+from ttl_cache import TTLCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration GoCardless
 GOCARDLESS_BASE_URL = "https://bankaccountdata.gocardless.com/api/v2"
 USE_SANDBOX = os.getenv("GOCARDLESS_USE_SANDBOX", "true").lower() == "true"
+GOCARDLESS_TIMEOUT_SECONDS = float(os.getenv("GOCARDLESS_TIMEOUT_SECONDS", "30"))
+# L'API limite le nombre d'appels par compte et par jour : les transactions sont gardées en cache
+TRANSACTIONS_CACHE_TTL_SECONDS = float(os.getenv("GOCARDLESS_TRANSACTIONS_TTL", "21600"))
+# Cache borné : comptes les moins récemment consultés évincés, comptes inactifs oubliés
+TRANSACTIONS_CACHE_MAX_ACCOUNTS = int(os.getenv("GOCARDLESS_TRANSACTIONS_MAX_ACCOUNTS", "1000"))
+TRANSACTIONS_CACHE_RETENTION_SECONDS = float(os.getenv("GOCARDLESS_TRANSACTIONS_RETENTION", str(7 * 24 * 3600)))
+TRANSACTIONS_DEFAULT_DAYS = 90
 
 @dataclass
 class GoCardlessCredentials:
@@ -78,14 +89,81 @@ class Transaction:
     creditor_name: Optional[str] = None
     remittance_info: Optional[str] = None
 
+@dataclass
+class TransactionCacheEntry:
+    """Transactions comptabilisées d'un compte, complétées à chaque synchronisation"""
+    date_from: str
+    transactions: List[Transaction]
+    fetched_at: float
+
+    @property
+    def last_booked(self) -> str:
+        return max((t.booking_date for t in self.transactions if t.booking_date), default=self.date_from)
+
+    def replace_from(self, since: str, transactions: List[Transaction]) -> None:
+        """Remplace les transactions comptabilisées depuis `since` (incluse) par celles de l'API.
+
+        Certaines banques ne renvoient pas d'identifiant : deux achats identiques le même
+        jour sont deux transactions. On ne fusionne donc pas par clé, on remplace la
+        fenêtre redemandée.
+        """
+        kept = [t for t in self.transactions if t.booking_date and t.booking_date < since]
+        self.transactions = kept + [t for t in transactions if not t.booking_date or t.booking_date >= since]
+
+    def between(self, date_from: str, date_to: Optional[str]) -> List[Transaction]:
+        """Transactions de la période, les plus récentes en premier"""
+        selected = [
+            t for t in self.transactions
+            if t.booking_date >= date_from and (not date_to or t.booking_date <= date_to)
+        ]
+        return sorted(selected, key=lambda t: t.booking_date, reverse=True)
+
+@dataclass
+class AccountSnapshot:
+    """Détails, solde et transactions d'un compte récupérés en une fois"""
+    account_id: str
+    details: Optional[BankAccount]
+    balance: Optional[float]
+    transactions: List[Transaction]
+
 class GoCardlessService:
     """Service principal GoCardless pour l'intégration bancaire"""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 transactions_ttl: float = TRANSACTIONS_CACHE_TTL_SECONDS, clock=time.monotonic):
         self.credentials = self._load_credentials()
         self.current_token: Optional[AccessToken] = None
         self.base_url = GOCARDLESS_BASE_URL
-        
+        self.transactions_ttl = transactions_ttl
+        self.transactions_cache = TTLCache("gocardless_transactions", max_entries=TRANSACTIONS_CACHE_MAX_ACCOUNTS,
+                                           ttl=TRANSACTIONS_CACHE_RETENTION_SECONDS, sliding=True, clock=clock)
+        self._clock = clock
+        self._transport = transport
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._account_locks: Dict[str, list] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        """Client HTTP mutualisé (connexions conservées), lié à la boucle d'événements courante"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                timeout=GOCARDLESS_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+            self._async_loop = loop
+            # Les verrous asyncio sont eux aussi liés à la boucle
+            self._token_lock = asyncio.Lock()
+            self._account_locks = {}
+        return self._async_client
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
     def _load_credentials(self) -> GoCardlessCredentials:
         """Charge les credentials depuis les variables d'environnement"""
         secret_id = os.getenv("GOCARDLESS_SECRET_ID")
@@ -113,8 +191,16 @@ class GoCardlessService:
         if self._is_token_valid():
             return self.current_token.access
         
+        # Les appels concurrents (un par compte) attendent un seul renouvellement
+        self._client()
+        async with self._token_lock:
+            if self._is_token_valid():
+                return self.current_token.access
+            return await self._request_token()
+    
+    async def _request_token(self) -> str:
         try:
-            response = requests.post(
+            response = await self._client().post(
                 f"{self.base_url}/token/new/",
                 json={
                     "secret_id": self.credentials.secret_id,
@@ -158,7 +244,7 @@ class GoCardlessService:
                 # Retourner des institutions simulées pour la démo
                 return self._get_demo_institutions()
             
-            response = requests.get(
+            response = await self._client().get(
                 f"{self.base_url}/institutions/",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -296,7 +382,7 @@ class GoCardlessService:
             
             logger.info(f"📝 Création agreement avec payload: {payload}")
             
-            response = requests.post(
+            response = await self._client().post(
                 f"{self.base_url}/agreements/enduser/",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -362,7 +448,7 @@ class GoCardlessService:
             
             logger.info(f"📝 Création requisition avec payload: {payload}")
             
-            response = requests.post(
+            response = await self._client().post(
                 f"{self.base_url}/requisitions/",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -415,7 +501,7 @@ class GoCardlessService:
                     "accounts": [f"DEMO_ACCOUNT_{requisition_id}_1", f"DEMO_ACCOUNT_{requisition_id}_2"]
                 }
             
-            response = requests.get(
+            response = await self._client().get(
                 f"{self.base_url}/requisitions/{requisition_id}/",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -450,7 +536,7 @@ class GoCardlessService:
             
             logger.info(f"📋 Récupération détails compte: {account_id}")
             
-            response = requests.get(
+            response = await self._client().get(
                 f"{self.base_url}/accounts/{account_id}/details/",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -488,7 +574,29 @@ class GoCardlessService:
                 status="READY"
             )
                 
-            balances = data.get("balances", [])
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la récupération des détails: {str(e)}")
+            return None
+    
+    async def get_account_balances(self, account_id: str) -> Optional[float]:
+        """Récupère le solde d'un compte bancaire"""
+        try:
+            token = await self.get_access_token()
+            
+            if token == "DEMO_TOKEN":
+                return 5420.50
+            
+            response = await self._client().get(
+                f"{self.base_url}/accounts/{account_id}/balances/",
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "accept": "application/json"
+                }
+            )
+            response.raise_for_status()
+            
+            data = response.json()
+            balances = data.get("balances", []) if isinstance(data, dict) else None
             
             if not isinstance(balances, list):
                 logger.error(f"❌ Format balances inattendu: {type(balances)}")
@@ -518,8 +626,9 @@ class GoCardlessService:
             logger.error(f"❌ Erreur lors de la récupération des soldes: {str(e)}")
             return None
     
-    async def get_account_transactions(self, account_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Transaction]:
-        """Récupère les transactions d'un compte bancaire"""
+    async def get_account_transactions(self, account_id: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                       use_cache: bool = True) -> List[Transaction]:
+        """Récupère les transactions d'un compte bancaire (cache incrémental par compte)"""
         try:
             token = await self.get_access_token()
             
@@ -527,96 +636,159 @@ class GoCardlessService:
                 # Simuler des transactions pour la démo
                 return self._get_demo_transactions(account_id)
             
-            params = {}
-            if date_from:
-                params["date_from"] = date_from
-            if date_to:
-                params["date_to"] = date_to
-            
-            logger.info(f"💳 Récupération transactions compte: {account_id}")
-            
-            response = requests.get(
-                f"{self.base_url}/accounts/{account_id}/transactions/",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json",
-                    "accept": "application/json"
-                },
-                params=params
-            )
-            
-            logger.info(f"🔍 Response status: {response.status_code}")
-            logger.info(f"🔍 Response text: {response.text[:500]}")
-            
-            response.raise_for_status()  # Lève une exception pour les codes d'erreur HTTP
-            
-            # Parsing JSON robuste
-            try:
-                data = response.json()
-            except ValueError as e:
-                logger.error(f"❌ Erreur parsing JSON transactions: {e}")
-                logger.error(f"❌ Response text: {response.text[:500]}")
-                return self._get_demo_transactions(account_id)
-            
-            # Selon GoCardless, la réponse contient un objet "transactions" avec "booked" et "pending"
-            if not isinstance(data, dict):
-                logger.error(f"❌ Format de réponse inattendu: {type(data)}")
-                return self._get_demo_transactions(account_id)
-            
-            transactions_obj = data.get("transactions", {})
-            if not isinstance(transactions_obj, dict):
-                logger.error(f"❌ Format transactions inattendu: {type(transactions_obj)}")
-                return self._get_demo_transactions(account_id)
-                
-            transactions_data = transactions_obj.get("booked", [])
-            if not isinstance(transactions_data, list):
-                logger.error(f"❌ Format booked transactions inattendu: {type(transactions_data)}")
-                return self._get_demo_transactions(account_id)
-            
-            transactions = []
-            for trans_data in transactions_data:
-                if not isinstance(trans_data, dict):
-                    logger.warning(f"⚠️ Transaction data invalide: {trans_data}")
-                    continue
-                    
-                try:
-                    # Extraire le montant selon le format GoCardless officiel
-                    transaction_amount = trans_data.get("transactionAmount", {})
-                    amount = 0.0
-                    currency = "EUR"
-                    
-                    if isinstance(transaction_amount, dict):
-                        amount_str = transaction_amount.get("amount", "0")
-                        currency = transaction_amount.get("currency", "EUR")
-                        try:
-                            amount = float(amount_str)
-                        except (ValueError, TypeError):
-                            logger.warning(f"⚠️ Impossible de convertir le montant: {amount_str}")
-                            amount = 0.0
-                    
-                    transaction = Transaction(
-                        transaction_id=trans_data.get("transactionId", ""),
-                        amount=amount,
-                        currency=currency,
-                        booking_date=trans_data.get("bookingDate", ""),
-                        value_date=trans_data.get("valueDate", ""),
-                        debtor_name=trans_data.get("debtorName"),
-                        creditor_name=trans_data.get("creditorName"),
-                        remittance_info=trans_data.get("remittanceInformationUnstructured")
-                    )
-                    transactions.append(transaction)
-                    
-                except Exception as trans_error:
-                    logger.warning(f"⚠️ Erreur parsing transaction: {trans_error}")
-                    continue
-            
-            logger.info(f"✅ {len(transactions)} transactions récupérées")
-            return transactions
+            if not use_cache:
+                return await self._fetch_transactions(token, account_id, date_from, date_to)
+            return await self._cached_transactions(token, account_id, date_from, date_to)
                 
         except Exception as e:
             logger.error(f"❌ Erreur lors de la récupération des transactions: {str(e)}")
             return self._get_demo_transactions(account_id)
     
+    async def _cached_transactions(self, token: str, account_id: str, date_from: Optional[str], date_to: Optional[str]) -> List[Transaction]:
+        if not date_from:
+            date_from = (datetime.now() - timedelta(days=TRANSACTIONS_DEFAULT_DAYS)).strftime("%Y-%m-%d")
+        
+        # Un seul appel à la fois par compte : les requêtes simultanées profitent du même résultat
+        self._client()
+        # [verrou, appels en cours] : retiré dès que plus personne ne l'utilise
+        slot = self._account_locks.setdefault(account_id, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                return await self._sync_transactions(token, account_id, date_from, date_to)
+        finally:
+            slot[1] -= 1
+            if not slot[1] and self._account_locks.get(account_id) is slot:
+                del self._account_locks[account_id]
+    
+    async def _sync_transactions(self, token: str, account_id: str, date_from: str, date_to: Optional[str]) -> List[Transaction]:
+        entry = self.transactions_cache.get(account_id)
+        if entry is None or date_from < entry.date_from:
+            transactions = await self._fetch_transactions(token, account_id, date_from, None)
+            entry = TransactionCacheEntry(date_from=date_from, transactions=transactions, fetched_at=self._clock())
+            self.transactions_cache.set(account_id, entry)
+        elif self._clock() - entry.fetched_at >= self.transactions_ttl:
+            # Synchronisation incrémentale depuis la dernière date comptabilisée (incluse)
+            since = entry.last_booked
+            try:
+                transactions = await self._fetch_transactions(token, account_id, since, None)
+            except Exception as e:
+                logger.warning(f"⚠️ Synchronisation du compte {account_id} impossible, cache conservé: {e}")
+            else:
+                entry.replace_from(since, transactions)
+                entry.fetched_at = self._clock()
+        else:
+            logger.info(f"💾 Transactions du compte {account_id} servies depuis le cache")
+        return entry.between(date_from, date_to)
+    
+    def invalidate_transactions(self, account_ids: Optional[Iterable[str]] = None) -> None:
+        """Vide le cache des transactions (tous les comptes par défaut)"""
+        if account_ids is None:
+            self.transactions_cache.clear()
+            return
+        for account_id in account_ids:
+            self.transactions_cache.pop(account_id, None)
+    
+    async def _fetch_transactions(self, token: str, account_id: str, date_from: Optional[str], date_to: Optional[str]) -> List[Transaction]:
+        """Appel à l'API ; lève une exception si la réponse est inexploitable"""
+        params = {}
+        if date_from:
+            params["date_from"] = date_from
+        if date_to:
+            params["date_to"] = date_to
+        
+        logger.info(f"💳 Récupération transactions compte: {account_id}")
+        
+        response = await self._client().get(
+            f"{self.base_url}/accounts/{account_id}/transactions/",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+                "accept": "application/json"
+            },
+            params=params
+        )
+        
+        logger.info(f"🔍 Response status: {response.status_code}")
+        logger.info(f"🔍 Response text: {response.text[:500]}")
+        
+        response.raise_for_status()  # Lève une exception pour les codes d'erreur HTTP
+        
+        # Parsing JSON robuste
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"❌ Erreur parsing JSON transactions: {e}")
+            logger.error(f"❌ Response text: {response.text[:500]}")
+            raise
+        
+        # Selon GoCardless, la réponse contient un objet "transactions" avec "booked" et "pending"
+        if not isinstance(data, dict):
+            raise ValueError(f"Format de réponse inattendu: {type(data)}")
+        
+        transactions_obj = data.get("transactions", {})
+        if not isinstance(transactions_obj, dict):
+            raise ValueError(f"Format transactions inattendu: {type(transactions_obj)}")
+            
+        transactions_data = transactions_obj.get("booked", [])
+        if not isinstance(transactions_data, list):
+            raise ValueError(f"Format booked transactions inattendu: {type(transactions_data)}")
+        
+        transactions = []
+        for trans_data in transactions_data:
+            if not isinstance(trans_data, dict):
+                logger.warning(f"⚠️ Transaction data invalide: {trans_data}")
+                continue
+                
+            try:
+                # Extraire le montant selon le format GoCardless officiel
+                transaction_amount = trans_data.get("transactionAmount", {})
+                amount = 0.0
+                currency = "EUR"
+                
+                if isinstance(transaction_amount, dict):
+                    amount_str = transaction_amount.get("amount", "0")
+                    currency = transaction_amount.get("currency", "EUR")
+                    try:
+                        amount = float(amount_str)
+                    except (ValueError, TypeError):
+                        logger.warning(f"⚠️ Impossible de convertir le montant: {amount_str}")
+                        amount = 0.0
+                
+                transaction = Transaction(
+                    transaction_id=trans_data.get("transactionId") or trans_data.get("internalTransactionId", ""),
+                    amount=amount,
+                    currency=currency,
+                    booking_date=trans_data.get("bookingDate", ""),
+                    value_date=trans_data.get("valueDate", ""),
+                    debtor_name=trans_data.get("debtorName"),
+                    creditor_name=trans_data.get("creditorName"),
+                    remittance_info=trans_data.get("remittanceInformationUnstructured")
+                )
+                transactions.append(transaction)
+                
+            except Exception as trans_error:
+                logger.warning(f"⚠️ Erreur parsing transaction: {trans_error}")
+                continue
+        
+        logger.info(f"✅ {len(transactions)} transactions récupérées")
+        return transactions
+    
+    async def get_account_snapshot(self, account_id: str, date_from: Optional[str] = None) -> AccountSnapshot:
+        """Détails, solde et transactions d'un compte, demandés en parallèle"""
+        details, balance, transactions = await asyncio.gather(
+            self.get_account_details(account_id),
+            self.get_account_balances(account_id),
+            self.get_account_transactions(account_id, date_from=date_from)
+        )
+        return AccountSnapshot(account_id=account_id, details=details, balance=balance, transactions=transactions)
+    
+    async def get_accounts_snapshots(self, account_ids: Iterable[str], date_from: Optional[str] = None) -> List[AccountSnapshot]:
+        """Tous les comptes en un seul lot d'appels concurrents (ordre des comptes conservé)"""
+        return list(await asyncio.gather(
+            *(self.get_account_snapshot(account_id, date_from=date_from) for account_id in account_ids)
+        ))
+    
     def _get_demo_transactions(self, account_id: str) -> List[Transaction]:
         """Retourne des transactions simulées pour la démo"""
         return [
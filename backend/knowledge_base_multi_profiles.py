@@ -12,6 +12,9 @@ Catégories couvertes :
 - Thèmes clés : TVA, URSSAF, dividendes, amortissements, PER, impôt société
 - Cas concrets : Exemples CGP, simulateurs, montages légaux
 - Optimisations : PEA, PER, intégration fiscale, sociétés civiles, etc.
+
+Les chunks sont construits au build de l'image (`python knowledge_store.py`) et
+sérialisés dans data/multi_profile_kb.kb, lu au premier accès à knowledge_chunks.
 """
 
 import os
@@ -21,13 +24,18 @@ from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import requests
-from functools import lru_cache
+from pathlib import Path
 import logging
+import threading
+
+from knowledge_store import DATA_DIR, open_store, source_hash, write_store
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+KB_FILE = DATA_DIR / "multi_profile_kb.kb"
+
 class ProfileType(Enum):
     """Types de profils fiscaux"""
     ENTREPRENEUR_INDIVIDUEL = "entrepreneur_individuel"
@@ -66,7 +74,7 @@ class ThemeFiscal(Enum):
     DEFICITS = "deficits"
     TRANSMISSION = "transmission"
 
-@dataclass
+@dataclass(slots=True)
 class KnowledgeChunk:
     """Chunk de connaissance vectorisé"""
     id: str
@@ -80,21 +88,72 @@ class KnowledgeChunk:
     embedding: Optional[np.ndarray] = None
     similarity_score: float = 0.0
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Forme sérialisée (sans embedding ni score, recalculés à l'exécution)"""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "profile_type": self.profile_type.value,
+            "regime_fiscal": self.regime_fiscal.value,
+            "theme_fiscal": self.theme_fiscal.value,
+            "tags": self.tags,
+            "context": self.context,
+            "examples": self.examples,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KnowledgeChunk":
+        return cls(
+            id=data["id"],
+            content=data["content"],
+            profile_type=ProfileType(data["profile_type"]),
+            regime_fiscal=RegimeFiscal(data["regime_fiscal"]),
+            theme_fiscal=ThemeFiscal(data["theme_fiscal"]),
+            tags=data["tags"],
+            context=data["context"],
+            examples=data["examples"],
+        )
+
 class MultiProfileKnowledgeBase:
-    """Base de connaissances multi-profils vectorisée"""
+    """Base de connaissances multi-profils vectorisée
     
-    def __init__(self):
-        self.knowledge_chunks: List[KnowledgeChunk] = []
+    Les chunks sont lus dans le fichier construit au build au premier accès ; sans
+    fichier valide, ou avec store_path=None, ils sont construits depuis le code.
+    """
+    
+    def __init__(self, store_path: Optional[Path] = KB_FILE):
+        self._knowledge_chunks: Optional[List[KnowledgeChunk]] = None
+        self._store_path = store_path
+        self._chunks_lock = threading.Lock()
         self.embeddings_cache = {}
         self.mistral_api_key = os.getenv('MISTRAL_API_KEY')
         self.mistral_api_url = "https://api.mistral.ai/v1/embeddings"
         
-        # Initialiser avec la base de connaissances
-        self._load_knowledge_base()
+        # Sans fichier : base construite immédiatement depuis le code
+        if store_path is None:
+            self._load_knowledge_base()
+    
+    @property
+    def knowledge_chunks(self) -> List[KnowledgeChunk]:
+        if self._knowledge_chunks is None:
+            with self._chunks_lock:
+                if self._knowledge_chunks is None:
+                    store = open_store(self._store_path, __file__)
+                    if store is None:
+                        self._load_knowledge_base()
+                    else:
+                        self._knowledge_chunks = [KnowledgeChunk.from_dict(chunk)
+                                                  for chunk in store.section("knowledge_chunks")]
+        return self._knowledge_chunks
+    
+    @knowledge_chunks.setter
+    def knowledge_chunks(self, chunks: List[KnowledgeChunk]) -> None:
+        self._knowledge_chunks = chunks
     
     def _load_knowledge_base(self):
         """Charge la base de connaissances complète"""
         logger.info("🔄 Chargement de la base de connaissances multi-profils...")
+        self.knowledge_chunks = []
         
         # Charger toutes les catégories
         self._load_entrepreneur_individuel_knowledge()
@@ -1494,5 +1553,11 @@ class MultiProfileKnowledgeBase:
         ]
         self.knowledge_chunks.extend(chunks)
 
-# Instance globale
+def build_knowledge_file(path: Path = KB_FILE) -> Path:
+    """Construit les chunks depuis le code et les sérialise"""
+    kb = MultiProfileKnowledgeBase(store_path=None)
+    chunks = [chunk.to_dict() for chunk in kb.knowledge_chunks]
+    return write_store(path, [("knowledge_chunks", chunks)], source_hash(__file__))
+
+# Instance globale (chunks chargés au premier accès)
 multi_profile_kb = MultiProfileKnowledgeBase()
@@ -0,0 +1,126 @@
+"""Bases de connaissances sérialisées à la construction de l'image, chargées à la demande.
+
+Les bases (européenne, multi-profils) sont construites en Python au build
+(`python knowledge_store.py`) puis écrites dans un fichier versionné à sections :
+
+    ligne 1  : en-tête JSON (format, version, empreinte du module source,
+               position et taille de chaque section)
+    ensuite  : une valeur JSON compacte par section, concaténées
+
+Seul l'en-tête est lu à l'ouverture ; une section (un thème, un pays) n'est
+décodée qu'au premier accès, avec des clés et des chaînes courtes internées.
+Si le fichier est absent, d'un autre format ou construit depuis une autre
+version du module source, l'appelant reconstruit la base depuis le code.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+STORE_FORMAT = "fiscal-kb"
+STORE_VERSION = 1
+DATA_DIR = Path(__file__).resolve().parent / "data"
+INTERN_MAX_LENGTH = 40
+
+PathLike = Union[str, Path]
+
+
+def source_hash(module_file: PathLike) -> str:
+    """Empreinte du module qui construit la base : un fichier d'une autre version est ignoré."""
+    return hashlib.sha256(Path(module_file).read_bytes()).hexdigest()[:16]
+
+
+def _intern_pairs(pairs) -> Dict[str, Any]:
+    return {
+        sys.intern(key): sys.intern(value) if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH else value
+        for key, value in pairs
+    }
+
+
+def write_store(path: PathLike, sections: Iterable[Tuple[str, Any]], source: str) -> Path:
+    """Écrit les sections (nom, valeur JSON) ; fichier temporaire puis os.replace."""
+    blobs = [(name, json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+             for name, value in sections]
+    index, position = {}, 0
+    for name, blob in blobs:
+        index[name] = [position, len(blob)]
+        position += len(blob)
+    header = {"format": STORE_FORMAT, "version": STORE_VERSION, "source": source, "sections": index}
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        for _, blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+    return path
+
+
+class KnowledgeStore:
+    """Fichier de sections ouvert en lecture ; chaque section est décodée une seule fois."""
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header_line = f.readline()
+        header = json.loads(header_line)
+        if header.get("format") != STORE_FORMAT or header.get("version") != STORE_VERSION:
+            raise ValueError(f"{self.path} : format {header.get('format')} v{header.get('version')} non supporté")
+        self.source: str = header.get("source", "")
+        self._index: Dict[str, Tuple[int, int]] = {name: tuple(span) for name, span in header["sections"].items()}
+        self._data_start = len(header_line)
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def names(self, prefix: str = "") -> Iterator[str]:
+        return (name for name in self._index if name.startswith(prefix))
+
+    def section(self, name: str) -> Any:
+        """Valeur décodée de la section (KeyError si elle n'existe pas)."""
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            offset, size = self._index[name]
+            with open(self.path, "rb") as f:
+                f.seek(self._data_start + offset)
+                value = json.loads(f.read(size).decode("utf-8"), object_pairs_hook=_intern_pairs)
+            self._loaded[name] = value
+            return value
+
+
+def open_store(path: PathLike, module_file: PathLike) -> Optional[KnowledgeStore]:
+    """Fichier de la base s'il existe et correspond au module source, sinon None."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        store = KnowledgeStore(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARN] Base de connaissances {path.name} illisible, reconstruction depuis le code : {e}")
+        return None
+    if store.source != source_hash(module_file):
+        print(f"[WARN] Base de connaissances {path.name} obsolète, reconstruction depuis le code")
+        return None
+    return store
+
+
+def build_all() -> None:
+    """Sérialise toutes les bases (étape de build de l'image)."""
+    from european_tax_knowledge_base import build_knowledge_file as build_european
+    from knowledge_base_multi_profiles import build_knowledge_file as build_multi_profiles
+
+    for build in (build_european, build_multi_profiles):
+        path = build()
+        print(f"✅ {path} ({path.stat().st_size} octets)")
+
+
+if __name__ == "__main__":
+    build_all()
@@ -0,0 +1,92 @@
+"""Complétion brute, sans recherche RAG : LLM local s'il est disponible, sinon API Mistral.
+
+Pour les tâches qui n'ont pas besoin des sources officielles (extraction de
+données, résumés de réunion…) : passer par get_fiscal_response ajouterait
+une recherche CGI/BOFiP et un prompt système de plusieurs kilo-octets.
+
+`mistral_stream` renvoie les tokens de l'API Mistral au fil de l'eau, pour
+les réponses affichées à l'utilisateur pendant la génération.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from ollama_client import LLMUnavailable, get_local_llm
+from tracing import record, span
+
+MISTRAL_COMPLETION_MODEL = os.getenv("MISTRAL_COMPLETION_MODEL", "mistral-small-latest")
+LOCAL_COMPLETION_MODEL = os.getenv("LLM_LOCAL_MODEL", "mistral")
+
+_mistral_client = None
+_mistral_async_client = None
+_mistral_async_loop = None
+
+
+def _mistral_chat(prompt: str, system: str, max_tokens: int, temperature: float) -> str:
+    global _mistral_client
+    from mistralai.client import MistralClient
+    from mistralai.models.chat_completion import ChatMessage
+
+    if _mistral_client is None:
+        api_key = os.getenv("MISTRAL_API_KEY")
+        if not api_key:
+            raise LLMUnavailable("Aucun LLM disponible (LLM local injoignable et MISTRAL_API_KEY absente)")
+        _mistral_client = MistralClient(api_key=api_key)
+    messages = [ChatMessage(role="system", content=system)] if system else []
+    messages.append(ChatMessage(role="user", content=prompt))
+    with span("llm_total"):
+        response = _mistral_client.chat(model=MISTRAL_COMPLETION_MODEL, messages=messages,
+                                        temperature=temperature, max_tokens=max_tokens)
+    return response.choices[0].message.content or ""
+
+
+async def complete(prompt: str, system: str = "", max_tokens: int = 512, temperature: float = 0.0,
+                   model: Optional[str] = None) -> str:
+    """Texte généré pour `prompt` ; LLMUnavailable si aucun LLM n'est joignable."""
+    llm = get_local_llm(model=model or LOCAL_COMPLETION_MODEL)
+    if llm.is_available():
+        try:
+            return await llm.agenerate(prompt, system, {"num_predict": max_tokens, "temperature": temperature})
+        except LLMUnavailable as e:
+            print(f"[WARN] LLM local indisponible, bascule sur l'API Mistral : {e}")
+    return await asyncio.to_thread(_mistral_chat, prompt, system, max_tokens, temperature)
+
+
+def _async_mistral():
+    """Client asynchrone partagé, recréé si la boucle d'événements change (tests, rechargement)."""
+    global _mistral_async_client, _mistral_async_loop
+    from mistralai.async_client import MistralAsyncClient
+
+    loop = asyncio.get_running_loop()
+    if _mistral_async_client is None or _mistral_async_loop is not loop:
+        api_key = os.getenv("MISTRAL_API_KEY")
+        if not api_key:
+            raise LLMUnavailable("Aucun LLM disponible (LLM local injoignable et MISTRAL_API_KEY absente)")
+        _mistral_async_client = MistralAsyncClient(api_key=api_key)
+        _mistral_async_loop = loop
+    return _mistral_async_client
+
+
+async def mistral_stream(messages: List[Dict[str, str]], model: str = MISTRAL_COMPLETION_MODEL,
+                         max_tokens: int = 1000, temperature: float = 0.1) -> AsyncIterator[str]:
+    """Tokens de l'API Mistral au fil de l'eau ; `messages` au format {"role", "content"}."""
+    client = _async_mistral()
+    started_at = time.perf_counter()
+    first_token = True
+    failed = False
+    try:
+        async for chunk in client.chat_stream(model=model, messages=messages,
+                                              temperature=temperature, max_tokens=max_tokens):
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                if first_token:
+                    first_token = False
+                    record("llm_ttft", time.perf_counter() - started_at, started_at)
+                yield token
+    except Exception:
+        failed = True
+        raise
+    finally:
+        record("llm_total", time.perf_counter() - started_at, started_at, failed)
+
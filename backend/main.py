@@ -1,3 +1,10 @@
+# Profilage du démarrage : installé avant tout autre import pour chronométrer chaque module
+try:
+    from startup_profiler import install as install_startup_profiler, startup_profiler
+except ImportError:
+    from backend.startup_profiler import install as install_startup_profiler, startup_profiler
+install_startup_profiler()
+
 from dotenv import load_dotenv
 
 # Set up logging with masking and rotation
@@ -11,7 +18,7 @@ load_dotenv()
 from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, WebSocket, WebSocketDisconnect, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime, timedelta, timezone
@@ -27,7 +34,6 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
-from fastapi.middleware.wsgi import WSGIMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi import APIRouter
 # from elevenlabs_proxy import router as eleven_router  # DÉSACTIVÉ temporairement - problème d'import
@@ -47,11 +53,8 @@ try:
 except Exception:
     HAS_S3 = False
 import base64
-try:
-    import whisper  # type: ignore
-except ImportError:
-    whisper = None  # type: ignore
 import time
+import secrets
 try:
     from pydub import AudioSegment  # type: ignore
 except ImportError:
@@ -82,7 +85,6 @@ try:
     from routers import whisper_fix as whisper_router
     from dependencies import supabase, verify_token, create_access_token, hash_password, verify_password
     from whisper_service import get_whisper_service
-    from routes_francis_particulier import francis_particulier_bp
 except ImportError:
     # Pour le développement local (quand on lance depuis la racine)
     try:
@@ -97,7 +99,6 @@ except ImportError:
         from backend.dependencies import supabase, verify_token, create_access_token, hash_password, verify_password
         from backend.whisper_service import get_whisper_service
         from backend.routes_gocardless import router as gocardless_router
-        from backend.routes_francis_particulier import francis_particulier_bp
     except ImportError:
         # Fallback : imports directs depuis le répertoire courant
         import sys
@@ -115,7 +116,6 @@ except ImportError:
         from dependencies import supabase, verify_token, create_access_token, hash_password, verify_password
         from whisper_service import get_whisper_service
         from routes_gocardless import router as gocardless_router
-        from routes_francis_particulier import francis_particulier_bp
 # --- Fin des imports relatifs corrigés ---
 
 # Configuration
@@ -171,6 +171,17 @@ else:
     mistral_client = None  # type: ignore
 
 from middleware.security import SecurityHeadersMiddleware, RateLimitMiddleware
+from middleware.tracing import TracingMiddleware
+from tracing import render_metrics
+from rate_counters import get_counter_backend, current_period
+import write_behind
+from user_context import UserContext, user_contexts
+from transcript_extraction import profile_extractor
+from answer_stream import AnswerStream, format_francis_response, format_stream
+from conversation_sessions import conversation_sessions
+
+# Compteurs de débit / quotas partagés entre workers (RATE_LIMIT_BACKEND)
+counters = get_counter_backend()
 
 fastapi_kwargs = {}
 if APP_ENV != "development":
@@ -199,6 +210,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Ajouté en dernier, donc le plus externe : englobe tous les autres middlewares (CORS compris) dans la durée mesurée
+app.add_middleware(TracingMiddleware)
+
 # TODO: Mount static files for downloads (temporarily disabled - large files crash Railway)
 # app.mount("/downloads", StaticFiles(directory="public/downloads"), name="downloads")
 
@@ -206,6 +220,17 @@ app.add_middleware(
 async def health():
     return {"status": "ok"}
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Histogrammes et compteurs du worker au format Prometheus (désactivé tant que METRICS_TOKEN n'est pas défini)."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Jeton de métriques invalide")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 api_router = APIRouter(prefix="/api")
 
 @api_router.get("/")
@@ -222,73 +247,6 @@ async def run_with_timeout(func, *args, timeout: int = 10):
     with concurrent.futures.ThreadPoolExecutor() as pool:
         return await asyncio.wait_for(loop.run_in_executor(pool, func, *args), timeout)
 
-def format_francis_response(text: str) -> str:
-    """Améliore le formatage des réponses Francis pour une meilleure UX web"""
-    if not text:
-        return text
-    
-    # Convertir les tableaux ASCII en format Markdown propre
-    text = convert_ascii_tables_to_markdown(text)
-    
-    # Améliorer la structure des réponses
-    text = improve_response_structure(text)
-    
-    return text
-
-def convert_ascii_tables_to_markdown(text: str) -> str:
-    """Convertit les tableaux ASCII en tableaux Markdown pour une meilleure lisibilité"""
-    # Détecter et remplacer les tableaux ASCII par des tableaux Markdown
-    lines = text.split('\n')
-    result_lines = []
-    in_table = False
-    
-    for line in lines:
-        # Détecter le début d'un tableau ASCII
-        if '┌' in line or '│' in line or '├' in line:
-            if not in_table and '┌' in line:
-                # Début de tableau - ignorer la ligne de bordure supérieure
-                in_table = True
-                continue
-            elif '│' in line and not ('┌' in line or '├' in line or '└' in line):
-                # Ligne de données - extraire le contenu
-                cells = [cell.strip() for cell in line.split('│') if cell.strip()]
-                if len(cells) >= 2:
-                    if 'Tranche de revenu' in line or 'TMI' in line:
-                        # Ligne d'en-tête
-                        result_lines.append('| ' + ' | '.join(cells) + ' |')
-                        result_lines.append('|' + '|'.join([' --- ' for _ in cells]) + '|')
-                    else:
-                        # Ligne de données
-                        result_lines.append('| ' + ' | '.join(cells) + ' |')
-                continue
-            elif '├' in line or '└' in line:
-                # Ligne de séparation ou fin de tableau - ignorer
-                if '└' in line:
-                    in_table = False
-                continue
-        else:
-            in_table = False
-            result_lines.append(line)
-    
-    return '\n'.join(result_lines)
-
-def improve_response_structure(text: str) -> str:
-    """Améliore la structure générale des réponses Francis"""
-    # Ajouter des espaces autour des titres
-    text = re.sub(r'(\n|^)(#{1,6}\s+[^\n]+)', r'\1\n\2\n', text)
-    
-    # Améliorer l'espacement des listes
-    text = re.sub(r'(\n|^)([-*+]\s+[^\n]+)', r'\1\2', text)
-    
-    # Ajouter des espaces autour des exemples
-    text = re.sub(r'(Pour illustrer|Par exemple|Voici)', r'\n\1', text)
-    
-    # Nettoyer les espaces multiples tout en préservant la structure
-    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
-    text = re.sub(r'^\s+|\s+$', '', text)
-    
-    return text
-
 @api_router.post("/test-francis")
 async def test_francis(request: dict):
     try:
@@ -305,13 +263,18 @@ async def test_francis(request: dict):
         conversation_history = request.get("conversation_history", None)
         try:
             # Utilisation de Francis Particulier Indépendant avec base européenne
-            from francis_particulier_independent import get_francis_particulier_response
+            from francis_particulier_independent import francis_particulier
             # Conversion du format de l'historique si nécessaire
             user_profile = request.get("user_profile", {})
-            answer = get_francis_particulier_response(question, user_profile)
             sources = ["Base de connaissances fiscales européennes (30+ pays)"]
             confidence = 0.95
-            answer = format_francis_response(answer)
+            stream = AnswerStream(francis_particulier.stream_answer(question, user_profile), sources, confidence,
+                                  memory_active=bool(conversation_history))
+            if request.get("stream"):
+                # Tokens mis en forme au fil de l'eau, sources en trame finale (voir answer_stream)
+                return StreamingResponse(stream.frames(), media_type="application/x-ndjson",
+                                         headers={"Cache-Control": "no-cache"})
+            answer = await stream.collect()
             return {
                 "answer": answer,
                 "sources": sources,
@@ -382,7 +345,7 @@ async def stream_francis_andorre_expert(request: dict):
     use_embeddings = request.get("use_embeddings", True)
     
     return StreamingResponse(
-        generate_francis_andorre_response(question, conversation_history, use_embeddings),
+        format_stream(generate_francis_andorre_response(question, conversation_history, use_embeddings)),
         media_type="text/plain",
         headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
     )
@@ -414,6 +377,11 @@ if SUPABASE_URL:
 else:
     print("❌ ERROR: SUPABASE_URL is not set in main.py. Supabase client not initialized.")
 
+# Historique des questions et analytics écrits en différé, par lots
+if supabase:
+    write_behind.register_queue("questions", write_behind.supabase_insert_sink(supabase, "questions"))
+    write_behind.register_queue("francis_analytics", write_behind.supabase_insert_sink(supabase, "francis_analytics"))
+
 # Models
 class UserCreate(BaseModel):
     email: EmailStr
@@ -440,11 +408,14 @@ class QuestionRequest(BaseModel):
     conversation_history: Optional[List[ChatMessage]] = None
     user_profile_context: Optional[Dict[str, Any]] = None
     jurisdiction: Literal["FR", "AD", "CH", "LU"] = "FR"
+    stream: bool = False  # réponse NDJSON en flux (tokens puis sources) au lieu de QuestionResponse
+    conversation_id: Optional[str] = None  # session de conversation Francis (voir conversation_sessions)
 
 class QuestionResponse(BaseModel):
     response: str  # Changé de 'answer' à 'response' pour correspondre au frontend
     sources: List[str]
     confidence: float
+    conversation_id: Optional[str] = None
 
 class PaymentRequest(BaseModel):
     amount: int
@@ -639,6 +610,10 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     except JWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
 
+def get_user_context(user_id: str = Depends(verify_token)) -> UserContext:
+    """Profil de l'utilisateur authentifié, lu une fois par requête (cache par processus, voir user_context)."""
+    return user_contexts.load(supabase, user_id)
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -704,6 +679,7 @@ async def register(user: UserCreate):
                     # Mais c'est un signe que la DB n'a peut-être pas les bonnes infos.
                 else:
                     print(f"INFO: /auth/register - User {user_id} profile upserted with taper: {final_taper}.")
+                user_contexts.invalidate(user_id)
 
             except Exception as e_profile:
                 print(f"ERROR: /auth/register - Could not upsert profile for user {user_id}: {e_profile}. Taper might not be correctly stored for non-aitor accounts.")
@@ -787,6 +763,7 @@ async def complete_signup(request: CompleteSignupRequest):
                 "taper": "particulier"
             }).execute()
             print(f"DEBUG: /auth/complete-signup - Résultat de l'insertion du profil: {insert_response}")
+            user_contexts.invalidate(auth_user_id)
         else:
             print(f"DEBUG: /auth/complete-signup - Profil existant trouvé: {profile_response.data}")
         
@@ -939,6 +916,7 @@ async def login(user: UserLogin):
                      print(f"WARN: /auth/login - Profile upsert for {user_id} seemed to fail or returned no data. Supabase error: {upsert_response.error}")
                 else:
                     print(f"INFO: /auth/login - User {user_id} profile upserted/verified with taper: {user_taper}.")
+                user_contexts.invalidate(user_id)
 
             except Exception as e_upsert_login:
                 print(f"WARN: /auth/login - Could not upsert profile for {user_email} ({user_id}): {e_upsert_login}")
@@ -974,46 +952,24 @@ async def login(user: UserLogin):
         raise HTTPException(status_code=500, detail="Erreur interne du serveur lors de la connexion.")
 
 @api_router.get("/auth/me", response_model=Dict[str, Any])
-async def get_current_user(user_id: str = Depends(verify_token)):
+async def get_current_user(context: UserContext = Depends(get_user_context)):
+    user_id = context.user_id
     try:
         if not supabase:
             raise HTTPException(status_code=500, detail="Service Supabase non disponible")
 
-        # Récupérer les informations depuis la table profils_utilisateurs
-        # On s'attend à ce que cette table contienne user_id, email, full_name, taper
-        profile_data = None
-        db_email = None
-        db_full_name = None
-        db_taper = "particulier" # Défaut si non trouvé ou partiel
-
-        try:
-            profile_response = (
-                supabase.table("profils_utilisateurs")
-                .select("user_id, email, taper, full_name") # full_name est optionnel ici
-                .eq("user_id", user_id)
-                .maybe_single()
-                .execute()
-            )
-            if profile_response.data:
-                profile_data = profile_response.data
-                db_email = profile_data.get("email") # Crucial
-                db_full_name = profile_data.get("full_name") # Optionnel
-                if profile_data.get("taper"): 
-                    db_taper = profile_data.get("taper") # Crucial
-            else:
-                # Si aucun profil n'est trouvé, cela pourrait être un problème, 
-                # car login/register devraient le créer.
-                # Pour l'instant, on ne lève pas d'erreur mais on logge.
-                # L'email pourrait être récupéré autrement si nécessaire pour la dérogation.
-                print(f"WARN: /api/auth/me - No profile found in 'profils_utilisateurs' for user_id: {user_id}")
-                # Tentative de récupérer l'email pour la dérogation aitorgarcia si db_email est None
-                # Ceci nécessiterait un appel admin ou une autre source fiable pour l'email basé sur user_id.
-                # Pour l'instant, si l'email n'est pas dans profils_utilisateurs, la dérogation basée sur l'email ne fonctionnera pas ici.
-                # Il est crucial que login/register peuplent correctement profils_utilisateurs.
-
-        except Exception as profile_exc:
-            print(f"ERROR: /api/auth/me - Could not fetch from 'profils_utilisateurs' for user_id {user_id}: {profile_exc}. Defaulting taper.")
-            # db_taper reste "particulier"
+        # Profil depuis profils_utilisateurs (user_id, email, full_name, taper), via le cache de contexte
+        db_email = context.email # Crucial
+        db_full_name = context.full_name # Optionnel
+        db_taper = context.taper # "particulier" si non trouvé ou partiel
+        if not context.available:
+            print(f"ERROR: /api/auth/me - Could not fetch from 'profils_utilisateurs' for user_id {user_id}: {context.error}. Defaulting taper.")
+        elif not context.found:
+            # Si aucun profil n'est trouvé, cela pourrait être un problème,
+            # car login/register devraient le créer.
+            # Pour l'instant, si l'email n'est pas dans profils_utilisateurs, la dérogation basée sur l'email ne fonctionnera pas ici.
+            # Il est crucial que login/register peuplent correctement profils_utilisateurs.
+            print(f"WARN: /api/auth/me - No profile found in 'profils_utilisateurs' for user_id: {user_id}")
 
         # Construction de la réponse initiale
         user_data_to_return = {
@@ -1036,8 +992,10 @@ async def get_current_user(user_id: str = Depends(verify_token)):
                     upsert_data["email"] = db_email
                 if db_full_name: # N'écrire full_name que s'il est connu
                      upsert_data["full_name"] = db_full_name
-                supabase.table("profils_utilisateurs").upsert(upsert_data, on_conflict="user_id").execute()
-                print(f"INFO: /api/auth/me - Ensured 'professionnel' profile exists/updated for {db_email} ({user_id})")
+                if context.taper != "professionnel":
+                    supabase.table("profils_utilisateurs").upsert(upsert_data, on_conflict="user_id").execute()
+                    user_contexts.invalidate(user_id)
+                    print(f"INFO: /api/auth/me - Ensured 'professionnel' profile exists/updated for {db_email} ({user_id})")
             except Exception as e_upsert_aitor:
                 print(f"WARN: /api/auth/me - Could not ensure professional profile for {db_email} during /me: {e_upsert_aitor}")
 
@@ -1060,27 +1018,47 @@ async def get_current_user(user_id: str = Depends(verify_token)):
         traceback.print_exc()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erreur interne du serveur: {str(e)}")
 
+QUESTIONS_QUOTA_LIMIT = 30
+
+
+async def _seed_questions_quota(user_id: str, period: str) -> None:
+    """Initialise le compteur mensuel depuis la table questions (une seule fois par période).
+
+    Compteur et requête Supabase sont bloquants : exécutés hors de la boucle d'évènements.
+    """
+    key = f"questions:{user_id}"
+    if await counters.aget_quota(key, period) is not None:
+        return
+    now = datetime.utcnow().replace(tzinfo=timezone.utc)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
+    count_query = supabase.table("questions").select("id", count='exact').eq("user_id", user_id).gte("created_at", month_start)
+    count_resp = await asyncio.to_thread(count_query.execute)
+    await counters.aseed_quota(key, period, count_resp.count or 0)
+
+
 @api_router.post("/ask", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
-    user_id: str = Depends(verify_token)
+    context: UserContext = Depends(get_user_context)
 ):
+    user_id = context.user_id
+    quota_period = None
     try:
         if not MISTRAL_API_KEY:
             raise HTTPException(status_code=500, detail="Service Mistral non disponible")
 
-        # Limite mensuelle gratuite pour les particuliers : 50 questions
+        # Limite mensuelle gratuite pour les particuliers (compteur partagé, voir rate_counters)
         if supabase:
             try:
-                profile_resp = supabase.table("profils_utilisateurs").select("taper").eq("user_id", user_id).single().execute()
-                taper = (profile_resp.data or {}).get("taper", "particulier")
-                if taper == "particulier":
-                    now = datetime.utcnow().replace(tzinfo=timezone.utc)
-                    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
-                    count_resp = supabase.table("questions").select("id", count='exact').eq("user_id", user_id).gte("created_at", month_start).execute()
-                    questions_used = count_resp.count or 0
-                    if questions_used >= 30:
+                if not context.available:
+                    raise RuntimeError(context.error)
+                if context.taper == "particulier":
+                    period = current_period()
+                    await _seed_questions_quota(user_id, period)
+                    allowed, _ = await counters.aconsume_quota(f"questions:{user_id}", period, QUESTIONS_QUOTA_LIMIT)
+                    if not allowed:
                         raise HTTPException(status_code=429, detail="Quota atteint : 30 questions gratuites ce mois-ci. Passez à Francis Pro pour plus d'accès.")
+                    quota_period = period
             except HTTPException:
                 raise
             except Exception as e:
@@ -1094,37 +1072,58 @@ async def ask_question(
             ]
         
         # Utilisation de Francis Particulier Indépendant avec base européenne
-        from francis_particulier_independent import get_francis_particulier_response
-        user_profile = {
+        from francis_particulier_independent import francis_particulier
+        # Session de conversation de l'utilisateur (identifiant inconnu ou d'un autre utilisateur : nouvelle session)
+        session = await conversation_sessions.get_or_create(request.conversation_id, owner=user_id)
+        user_profile = session.merge_profile({
             "context": request.user_profile_context,
             "jurisdiction": request.jurisdiction
-        } if request.user_profile_context or request.jurisdiction else {}
+        } if request.user_profile_context or request.jurisdiction else None)
         
-        answer = get_francis_particulier_response(request.question, user_profile)
         sources = ["Base de connaissances fiscales européennes (30+ pays)"]
         confidence = 0.95
-        answer = format_francis_response(answer)
 
-        if supabase:
-            try:
-                supabase.table("questions").insert({
-                    "user_id": user_id,
-                    "question": request.question,
-                    "answer": answer,
-                    "context": json.dumps(sources) if sources else None, 
-                    "created_at": datetime.utcnow().isoformat()
-                }).execute()
-            except Exception as e:
-                print(f"[Erreur Enregistrement Question] {e}")
+        async def save_answer(stream: AnswerStream):
+            # Écriture différée : la réponse n'attend pas l'insertion en base
+            write_behind.enqueue("questions", {
+                "user_id": user_id,
+                "question": request.question,
+                "answer": stream.text,
+                "context": json.dumps(stream.sources) if stream.sources else None,
+                "created_at": datetime.utcnow().isoformat()
+            })
+            # Échange ajouté par stream_answer : visible des autres workers
+            await conversation_sessions.save(session)
+
+        async def refund_quota(error: Exception):
+            # En flux, l'échec survient après le retour de l'endpoint
+            if quota_period:
+                await counters.arefund_quota(f"questions:{user_id}", quota_period)
+
+        stream = AnswerStream(francis_particulier.stream_answer(request.question, user_profile,
+                                                                conversation=session.exchanges),
+                              sources, confidence, on_complete=save_answer,
+                              on_error=refund_quota if request.stream else None,
+                              conversation_id=session.session_id)
+        if request.stream:
+            # Tokens mis en forme au fil de l'eau, sources en trame finale (voir answer_stream)
+            return StreamingResponse(stream.frames(), media_type="application/x-ndjson",
+                                     headers={"Cache-Control": "no-cache"})
+        answer = await stream.collect()
 
         return QuestionResponse(
             response=answer,  # Changé de 'answer=' à 'response=' pour correspondre au frontend
             sources=sources,
-            confidence=confidence
+            confidence=confidence,
+            conversation_id=session.session_id
         )
     except HTTPException as http_exc:
+        if quota_period:
+            await counters.arefund_quota(f"questions:{user_id}", quota_period)
         raise http_exc
     except Exception as e:
+        if quota_period:
+            await counters.arefund_quota(f"questions:{user_id}", quota_period)
         raise HTTPException(status_code=500, detail=f"Erreur interne du serveur : {str(e)}")
 
 @api_router.get("/questions/history")
@@ -1263,6 +1262,7 @@ async def stripe_webhook(request: dict):
                         "stripe_subscription_id": subscription_id,
                         "updated_at": datetime.utcnow().isoformat()
                     }).eq("email", customer_email).execute()
+                    user_contexts.invalidate(email=customer_email)
                     print(f"✅ Souscription activée pour {customer_email}")
                 except Exception as e:
                     print(f"❌ Erreur mise à jour profil pour {customer_email}: {e}")
@@ -1283,6 +1283,7 @@ async def stripe_webhook(request: dict):
                             "stripe_subscription_id": subscription.get("id"),
                             "updated_at": datetime.utcnow().isoformat()
                         }).eq("email", customer_email).execute()
+                        user_contexts.invalidate(email=customer_email)
                         print(f"✅ Abonnement créé pour {customer_email}")
                 except Exception as e:
                     print(f"❌ Erreur création abonnement: {e}")
@@ -1302,6 +1303,7 @@ async def stripe_webhook(request: dict):
                             "stripe_subscription_id": subscription.get("id"),
                             "updated_at": datetime.utcnow().isoformat()
                         }).eq("email", customer_email).execute()
+                        user_contexts.invalidate(email=customer_email)
                         print(f"✅ Abonnement mis à jour pour {customer_email}")
                 except Exception as e:
                     print(f"❌ Erreur mise à jour abonnement: {e}")
@@ -1321,6 +1323,7 @@ async def stripe_webhook(request: dict):
                             "stripe_subscription_id": None,
                             "updated_at": datetime.utcnow().isoformat()
                         }).eq("email", customer_email).execute()
+                        user_contexts.invalidate(email=customer_email)
                         print(f"✅ Abonnement annulé pour {customer_email}")
                 except Exception as e:
                     print(f"❌ Erreur annulation abonnement: {e}")
@@ -1927,15 +1930,54 @@ async def get_fiscal_insights(request: FiscalInsightsRequest):
 # app.include_router(api_router)
 # app.include_router(pro_clients_router.router)
 
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") != "0"
+
+def warm_up():
+    """Préchauffage en tâche de fond : le worker sert les requêtes pendant le chargement.
+
+    Chaque étape est chronométrée dans le rapport de démarrage ; une requête arrivée
+    avant la fin charge elle-même ce dont elle a besoin à la première utilisation.
+    """
+    with startup_profiler.timed("initialize_embeddings"):
+        initialize_embeddings()
+    try:
+        with startup_profiler.timed("preload_cgi_embeddings"):
+            print("🚀 Préchargement des embeddings CGI...")
+            search_cgi_embeddings("test", max_results=1)
+            print("✅ Embeddings CGI préchargés avec succès!")
+    except Exception as e:
+        print(f"⚠️  Erreur lors du préchargement des embeddings: {e}", file=sys.stderr)
+
+async def _run_warm_up():
+    try:
+        await asyncio.to_thread(warm_up)
+    finally:
+        # Les imports suivants (à la demande) ne sont plus chronométrés
+        startup_profiler.uninstall()
+        startup_profiler.log_summary()
+        startup_profiler.write_report()
+
 @app.on_event("startup")
 async def startup_event():
+    startup_profiler.mark_ready()
+    startup_profiler.log_summary()
+    if WARMUP_ON_STARTUP:
+        app.state.warm_up_task = asyncio.create_task(_run_warm_up())
+    else:
+        startup_profiler.uninstall()
+        startup_profiler.write_report()
+
+@app.on_event("shutdown")
+async def shutdown_event():
     try:
-        print("🚀 Préchargement des embeddings CGI...")
-        search_cgi_embeddings("test", max_results=1)
-        print("✅ Embeddings CGI préchargés avec succès!")
+        await asyncio.to_thread(write_behind.drain_all)
     except Exception as e:
-        print(f"⚠️  Erreur lors du préchargement des embeddings: {e}", file=sys.stderr)
-        pass
+        print(f"⚠️  Erreur lors de la vidange des écritures différées: {e}", file=sys.stderr)
+    try:
+        from pdf_render_service import shutdown_render_pool
+        shutdown_render_pool()
+    except Exception as e:
+        print(f"⚠️  Erreur lors de l'arrêt du pool de rendu PDF: {e}", file=sys.stderr)
 
 print("MAIN_PY_LOG: Tentative de création des tables via Base.metadata.create_all()", file=sys.stderr, flush=True)
 try:
@@ -2397,115 +2439,27 @@ async def analyze_profile_text(request: dict):
         if not text:
             return {"error": "Texte manquant"}
         
-        # Prompt INTELLIGENT pour extraction du profil client complet
-        prompt = f"""
-Tu es un expert fiscal français ultra-intelligent. Analyse ce texte dicté par un utilisateur et extrait TOUTES les informations possibles pour créer son profil client complet.
-
-Texte dicté: "{text}"
-
-Extrais et retourne UNIQUEMENT un JSON avec TOUTES les informations détectées pour le profil client:
-
-{{
-  // I. IDENTITÉ DU CLIENT
-  "civilite_client": "M." ou "Mme" ou "Mlle" ou null,
-  "nom_client": "nom_de_famille" ou null,
-  "prenom_client": "prénom" ou null,
-  "nom_usage_client": "nom_d_usage" ou null,
-  "date_naissance_client": "YYYY-MM-DD" ou null,
-  "lieu_naissance_client": "ville_naissance" ou null,
-  "nationalite_client": "nationalité" ou null,
-  "numero_fiscal_client": "numéro_fiscal" ou null,
-
-  // II. COORDONNÉES DU CLIENT
-  "adresse_postale_client": "adresse_complète" ou null,
-  "code_postal_client": "code_postal" ou null,
-  "ville_client": "ville" ou null,
-  "pays_residence_fiscale_client": "pays" ou null,
-  "email_client": "email@exemple.com" ou null,
-  "telephone_principal_client": "téléphone" ou null,
-  "telephone_secondaire_client": "téléphone_secondaire" ou null,
-
-  // III. SITUATION FAMILIALE & PERSONNELLE
-  "situation_maritale_client": "Célibataire" ou "Marié" ou "PACS" ou "Divorcé" ou "Veuf" ou null,
-  "date_mariage_pacs_client": "YYYY-MM-DD" ou null,
-  "regime_matrimonial_client": "régime_matrimonial" ou null,
-  "nombre_enfants_a_charge_client": nombre_ou_null,
-  "personnes_dependantes_client": "description" ou null,
-
-  // IV. SITUATION PROFESSIONNELLE & REVENUS
-  "profession_client1": "profession" ou null,
-  "statut_professionnel_client1": "CDI" ou "CDD" ou "Fonctionnaire" ou "Indépendant" ou "Retraité" ou null,
-  "nom_employeur_entreprise_client1": "employeur" ou null,
-  "type_contrat_client1": "type_contrat" ou null,
-  "revenu_net_annuel_client1": nombre_ou_null,
-  "profession_client2": "profession_conjoint" ou null,
-  "statut_professionnel_client2": "statut_conjoint" ou null,
-  "nom_employeur_entreprise_client2": "employeur_conjoint" ou null,
-  "type_contrat_client2": "type_contrat_conjoint" ou null,
-  "revenu_net_annuel_client2": nombre_ou_null,
-
-  // V. OBJECTIFS & PROJETS
-  "objectifs_fiscaux_client": "objectifs_fiscaux" ou null,
-  "objectifs_patrimoniaux_client": "objectifs_patrimoniaux" ou null,
-  "notes_objectifs_projets_client": "notes_et_projets" ou null
-}}
-
-INSTRUCTIONS SPÉCIALES:
-1. Sois TRÈS INTELLIGENT et détecte les informations même si elles sont implicites
-2. Si quelqu'un dit "je m'appelle Jean Dupont", détecte "prenom_client: Jean" ET "nom_client: Dupont"
-3. Si quelqu'un dit "je suis à Paris", détecte "ville_client: Paris" ET "pays_residence_fiscale_client: France"
-4. Si quelqu'un dit "je suis marié avec 2 enfants", détecte "situation_maritale_client: Marié" ET "nombre_enfants_a_charge_client: 2"
-5. Si quelqu'un dit "je gagne 50000 euros par an", détecte "revenu_net_annuel_client1: 50000"
-6. Si quelqu'un dit "je suis ingénieur chez Google", détecte "profession_client1: Ingénieur" ET "nom_employeur_entreprise_client1: Google"
-7. Extrais TOUTES les informations possibles, même les coordonnées, l'âge, la situation familiale, etc.
-
-Si une information n'est pas mentionnée, mets null. Sois précis et intelligent dans l'analyse.
-"""
-        
-        # Appel à l'IA Mistral
+        # Règles déterministes d'abord, LLM seulement pour les champs restants
         try:
-            answer, sources, confidence = await run_with_timeout(
-                get_fiscal_response, 
-                prompt, 
-                None, 
-                timeout=30
-            )
-            
-            # Extraire le JSON de la réponse
-            import re
-            json_match = re.search(r'\{.*\}', answer, re.DOTALL)
-            if json_match:
-                import json
-                extracted_data = json.loads(json_match.group())
-                
-                # Nettoyer les données (supprimer les valeurs vides)
-                cleaned_data = {}
-                for key, value in extracted_data.items():
-                    if value is not None and value != "" and value != []:
-                        cleaned_data[key] = value
-                
-                return {
-                    "success": True,
-                    "data": cleaned_data,
-                    "confidence": confidence,
-                    "original_text": text,
-                    "fields_detected": len(cleaned_data),
-                    "ai_response": answer[:200] + "..." if len(answer) > 200 else answer
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": "Impossible d'extraire les données JSON",
-                    "ai_response": answer
-                }
-                
+            result = await asyncio.wait_for(profile_extractor.extract(text), timeout=30)
         except asyncio.TimeoutError:
             return {
                 "success": False,
                 "error": "Timeout de l'IA",
                 "fallback": "Utilisation de l'analyse basique"
             }
-            
+
+        # Nettoyer les données (supprimer les valeurs vides)
+        cleaned_data = {key: value for key, value in result.data.items() if value not in (None, "", [])}
+        return {
+            "success": True,
+            "data": cleaned_data,
+            "confidence": result.confidence,
+            "original_text": text,
+            "fields_detected": len(cleaned_data),
+            "ai_response": f"{len(result.rule_fields)} champ(s) par règles, {result.llm_calls} appel(s) LLM pour {len(result.llm_fields)} champ(s)"
+        }
+
     except Exception as e:
         return {
             "success": False,
@@ -2765,8 +2719,7 @@ def initialize_embeddings():
     except Exception as e:
         print(f"❌ Erreur lors de l'initialisation des embeddings: {e}")
 
-# Appeler l'initialisation au démarrage
-initialize_embeddings()
+# L'initialisation des embeddings est lancée par warm_up() au démarrage, en tâche de fond
 
 app.include_router(api_router)
 app.include_router(api_router, prefix="/api")  # alias pour compatibilité frontend
@@ -2777,46 +2730,36 @@ app.include_router(whisper_router.router, prefix="/api")  # WHISPER LOCAL FONCTI
 app.include_router(pro_clients_router.router)
 app.include_router(teams_assistant_router.router)
 
-# FRANCIS PARTICULIER INDÉPENDANT - ASSISTANT FISCAL EUROPÉEN 100% AUTONOME
+# FRANCIS PARTICULIER INDÉPENDANT - ASSISTANT FISCAL EUROPÉEN 100% AUTONOME (router FastAPI natif)
 try:
-    from flask import Flask
-    flask_app = Flask(__name__)
-    flask_app.register_blueprint(francis_particulier_bp)
-    app.mount("/francis-particulier", WSGIMiddleware(flask_app))
+    from routes_francis_particulier_fastapi import francis_particulier_router
+    app.include_router(francis_particulier_router)
     print("✅ Francis Particulier Indépendant intégré avec succès")
 except Exception as e:
-    print(f"⚠️ Erreur lors de l'intégration de Francis Particulier: {e}")
-    # Fallback: Conversion des routes Flask en FastAPI
-    try:
-        from routes_francis_particulier_fastapi import francis_particulier_router
-        app.include_router(francis_particulier_router)
-        print("✅ Francis Particulier intégré via FastAPI (fallback)")
-    except Exception as e2:
-        print(f"❌ Impossible d'intégrer Francis Particulier: {e2}")
+    print(f"❌ Impossible d'intégrer Francis Particulier: {e}")
 
 @api_router.get("/questions/quota")
-async def get_questions_quota(user_id: str = Depends(verify_token)):
+async def get_questions_quota(context: UserContext = Depends(get_user_context)):
     """Récupère le nombre de questions restantes pour le mois"""
+    user_id = context.user_id
     try:
         if not supabase:
             return {"questions_used": 0, "questions_remaining": 50, "quota_limit": 50}
         
         # Vérifier le type d'utilisateur
-        profile_resp = supabase.table("profils_utilisateurs").select("taper").eq("user_id", user_id).single().execute()
-        taper = (profile_resp.data or {}).get("taper", "particulier")
+        if not context.available:
+            raise RuntimeError(context.error)
         
-        if taper == "professionnel":
+        if context.is_professional:
             # Les pros ont un accès illimité
             return {"questions_used": 0, "questions_remaining": -1, "quota_limit": -1, "unlimited": True}
         
-        # Pour les particuliers, compter les questions du mois
-        now = datetime.utcnow().replace(tzinfo=timezone.utc)
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
-        
-        count_resp = supabase.table("questions").select("id", count='exact').eq("user_id", user_id).gte("created_at", month_start).execute()
-        questions_used = count_resp.count or 0
+        # Pour les particuliers, lire le compteur du mois (initialisé depuis la base au besoin)
+        period = current_period()
+        await _seed_questions_quota(user_id, period)
+        questions_used = await counters.aget_quota(f"questions:{user_id}", period) or 0
         
-        quota_limit = 30  # Limite mensuelle pour les particuliers
+        quota_limit = QUESTIONS_QUOTA_LIMIT  # Limite mensuelle pour les particuliers
         questions_remaining = max(0, quota_limit - questions_used)
         
         return {
@@ -2897,6 +2840,7 @@ async def create_andorre_account(
         else:
             user_profile_data["created_at"] = datetime.utcnow().isoformat()
             supabase.table("profils_utilisateurs").insert(user_profile_data).execute()
+        user_contexts.invalidate(user_id)
         
         print(f" Compte Francis Andorre créé pour {account_data.email} (user_id: {user_id})")
         
@@ -0,0 +1,217 @@
+"""Sessions de réunion (assistant Teams) : résumé glissant + tampon des derniers échanges.
+
+L'extension renvoyait toute la transcription à chaque analyse : la taille du
+prompt (et la latence) croissait avec la durée de la réunion. Une session
+conserve côté serveur :
+- `summary` : résumé compact de tout ce qui a déjà été « replié » ;
+- `pending` : les échanges récents pas encore intégrés au résumé.
+
+Chaque appel n'envoie au LLM que le résumé et les échanges récents. Quand le
+tampon dépasse MEETING_FOLD_CHARS, il est replié dans le résumé par un appel
+dédié, de taille bornée lui aussi. Le résumé final est construit à partir de
+cet état, sans relire la transcription complète.
+
+L'extension peut envoyer soit la transcription cumulée (seul le nouveau
+suffixe est retenu), soit uniquement les nouveaux échanges.
+
+Une session contient des données clients : son identifiant est toujours
+émis par le serveur et elle appartient au professionnel qui l'a ouverte.
+Un identifiant inconnu ou appartenant à un autre professionnel ne donne
+accès à rien (`get` renvoie None, `open` ouvre une nouvelle session).
+
+Les sessions sont rangées dans le backend partagé de rate_counters (SQLite dès
+que plusieurs workers tournent) : l'appel suivant d'une réunion retrouve son
+état quel que soit le worker qui le reçoit. Dans un worker, les appels d'une
+même session sont sérialisés ; entre workers, la dernière écriture l'emporte
+(l'extension attend chaque réponse avant d'envoyer la suite).
+"""
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from rate_counters import CounterBackend, get_counter_backend
+
+MEETING_FOLD_CHARS = int(os.getenv("MEETING_FOLD_CHARS", "4000"))
+MEETING_SESSION_TTL_SECONDS = float(os.getenv("MEETING_SESSION_TTL_SECONDS", str(4 * 3600)))
+SUMMARY_MAX_TOKENS = 450
+_TAIL_CHARS = 200  # fin de la transcription cumulée déjà reçue, pour reconnaître le préfixe
+
+Completion = Callable[..., Awaitable[str]]
+
+FOLD_SYSTEM_PROMPT = (
+    "Tu tiens le résumé de travail d'une réunion entre un conseiller fiscal et son client. "
+    "Intègre les nouveaux échanges au résumé existant sans perdre d'information utile : "
+    "situation du client (famille, revenus, patrimoine), points discutés, décisions, actions, "
+    "questions en suspens. Style télégraphique, 250 mots maximum. Réponds uniquement par le résumé."
+)
+
+
+async def _default_completion(prompt: str, system: str = "", max_tokens: int = 512) -> str:
+    from llm_completion import complete
+    return await complete(prompt, system, max_tokens=max_tokens, temperature=0.2)
+
+
+def _split(text: str, size: int) -> List[str]:
+    """Morceaux d'environ `size` caractères, coupés sur un espace quand c'est possible."""
+    parts = []
+    while len(text) > size:
+        cut = text.rfind(" ", size // 2, size)
+        cut = cut if cut > 0 else size
+        parts.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        parts.append(text.strip())
+    return parts
+
+
+@dataclass
+class MeetingSession:
+    session_id: str
+    owner: str = ""  # user_id du professionnel authentifié
+    topic: Optional[str] = None
+    participants: List[str] = field(default_factory=list)
+    summary: str = ""
+    pending: str = ""
+    received_chars: int = 0  # longueur de la transcription cumulée déjà reçue
+    folds: int = 0
+    llm_calls: int = 0
+    last_analysis: str = ""  # réutilisée tant qu'aucun nouvel échange n'arrive
+    started_at: float = field(default_factory=time.time)
+    _tail: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MeetingSession":
+        return cls(**data)
+
+    def ingest(self, transcription: str) -> str:
+        """Ajoute au tampon la partie nouvelle de `transcription` et la renvoie."""
+        text = (transcription or "").strip()
+        if not text:
+            return ""
+        known = self.received_chars
+        if self._tail and len(text) >= known and text[known - len(self._tail):known] == self._tail:
+            delta = text[known:].strip()  # transcription cumulée : seul le suffixe est nouveau
+            self.received_chars = len(text)
+            self._tail = text[-_TAIL_CHARS:]
+        else:
+            delta = text  # l'extension n'envoie que les nouveaux échanges
+            if not self._tail:
+                self.received_chars = len(text)
+                self._tail = text[-_TAIL_CHARS:]
+        if delta:
+            self.pending = f"{self.pending}\n{delta}".strip()
+        return delta
+
+    async def _fold(self, text: str, completion: Completion) -> None:
+        prompt = (
+            f"Sujet : {self.topic or 'Réunion client'}\n"
+            f"Résumé actuel :\n{self.summary or '(vide)'}\n\n"
+            f"Nouveaux échanges :\n{text}\n\nRésumé mis à jour :"
+        )
+        self.summary = (await completion(prompt, system=FOLD_SYSTEM_PROMPT, max_tokens=SUMMARY_MAX_TOKENS)).strip()
+        self.folds += 1
+        self.llm_calls += 1
+
+    async def compact(self, completion: Completion, keep_recent: bool = True,
+                      fold_chars: int = MEETING_FOLD_CHARS) -> None:
+        """Replie le tampon dans le résumé dès qu'il dépasse `fold_chars`.
+
+        Avec `keep_recent`, le dernier morceau reste tel quel dans le tampon
+        pour que l'analyse voie les échanges récents mot pour mot.
+        """
+        if len(self.pending) <= fold_chars and keep_recent:
+            return
+        parts = _split(self.pending, fold_chars)
+        recent = parts.pop() if keep_recent and parts else ""
+        for part in parts:
+            await self._fold(part, completion)
+        self.pending = recent
+
+    def context_block(self) -> str:
+        """Résumé + échanges récents : tout ce qu'un prompt a besoin de connaître de la réunion."""
+        blocks = []
+        if self.summary:
+            blocks.append(f"Résumé de la réunion jusqu'ici :\n{self.summary}")
+        if self.pending:
+            blocks.append(f"Échanges récents :\n{self.pending}")
+        return "\n\n".join(blocks) or "(aucun échange transcrit)"
+
+
+class MeetingSessionStore:
+    """Sessions du backend partagé, expirées après `ttl` secondes d'inactivité."""
+
+    def __init__(self, ttl: float = MEETING_SESSION_TTL_SECONDS, completion: Optional[Completion] = None,
+                 backend: Optional[CounterBackend] = None):
+        self.ttl = ttl
+        self.completion = completion or _default_completion
+        self._backend = backend
+        self._locks: Dict[str, list] = {}  # session_id -> [verrou, appels en cours]
+
+    @property
+    def backend(self) -> CounterBackend:
+        return self._backend or get_counter_backend()
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"meeting_session:{session_id}"
+
+    async def get(self, session_id: Optional[str], owner: str) -> Optional[MeetingSession]:
+        """Copie de la session `session_id` si elle existe, n'a pas expiré et appartient à `owner`."""
+        data = await self.backend.aget_document(self._key(session_id)) if session_id else None
+        if data is None or data.get("owner") != owner:
+            return None
+        return MeetingSession.from_dict(data)
+
+    async def save(self, session: MeetingSession) -> None:
+        """Enregistre la session et repousse son expiration."""
+        await self.backend.aput_document(self._key(session.session_id), session.to_dict(), self.ttl)
+
+    @asynccontextmanager
+    async def _locked(self, session_id: Optional[str]) -> AsyncIterator[None]:
+        if not session_id:
+            yield
+            return
+        slot = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1] and self._locks.get(session_id) is slot:
+                del self._locks[session_id]
+
+    @asynccontextmanager
+    async def open(self, session_id: Optional[str], owner: str, topic: Optional[str] = None,
+                   participants: Optional[List[str]] = None) -> AsyncIterator[MeetingSession]:
+        """Session de `owner` (nouvelle si `session_id` est inconnu), enregistrée en sortie de bloc.
+
+        En cas d'exception dans le bloc, l'état enregistré reste celui d'avant l'appel.
+        """
+        async with self._locked(session_id):
+            session = await self.get(session_id, owner)
+            if session is None:
+                # Identifiant toujours émis ici, jamais celui proposé par le client
+                session = MeetingSession(session_id=uuid.uuid4().hex, owner=owner)
+            if topic:
+                session.topic = topic
+            if participants:
+                session.participants = list(participants)
+            yield session
+            await self.save(session)
+
+    async def close(self, session_id: str, owner: str) -> bool:
+        """Supprime la session si elle appartient à `owner` ; False sinon."""
+        if await self.get(session_id, owner) is None:
+            return False
+        return await self.backend.adelete_document(self._key(session_id))
+
+
+meeting_sessions = MeetingSessionStore()
@@ -1,13 +1,11 @@
 from __future__ import annotations
 
-import time
-import asyncio
-from typing import Dict, List
-
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
+from rate_counters import get_counter_backend
+
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """Injects common security headers into every response."""
 
@@ -36,31 +34,24 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         return response
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Very simple in-memory rate limiter per client IP.
+    """Sliding-window rate limiter per client IP.
 
-    Not production-grade for multi-replica environments but provides
-    a first line of defense.
+    Counts live in the shared counter backend (see ``rate_counters``), so the
+    limit holds across workers when a SQLite or Redis backend is configured.
     """
 
-    def __init__(self, app, max_requests: int = 60, window_seconds: int = 60):
+    def __init__(self, app, max_requests: int = 60, window_seconds: int = 60, backend=None):
         super().__init__(app)
         self.max_requests = max_requests
         self.window = window_seconds
-        self._store: Dict[str, List[float]] = {}
-        self._lock = asyncio.Lock()
+        self._backend = backend or get_counter_backend()
 
     async def dispatch(self, request: Request, call_next):
         client_ip = request.client.host if request.client else "anonymous"
-        now = time.time()
-        async with self._lock:
-            history = self._store.get(client_ip, [])
-            # Remove timestamps older than window
-            history = [ts for ts in history if now - ts < self.window]
-            history.append(now)
-            self._store[client_ip] = history
-            if len(history) > self.max_requests:
-                return Response(
-                    content="Trop de requêtes, réessayez plus tard.",
-                    status_code=429,
-                )
+        allowed, _ = await self._backend.ahit_sliding_window(f"ip:{client_ip}", self.max_requests, self.window)
+        if not allowed:
+            return Response(
+                content="Trop de requêtes, réessayez plus tard.",
+                status_code=429,
+            )
         return await call_next(request)
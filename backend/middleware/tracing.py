@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.routing import Match
+
+from tracing import TIMING_HEADER, end_trace, observe_request, start_trace, timing_header_enabled
+from ttl_cache import TTLCache
+
+# Chemins bruts distincts mémorisés (LRU) : /items/1, /items/2… occupent chacun une entrée
+ROUTE_TEMPLATE_CACHE_SIZE = 4096
+
+
+def _route_template(request: Request) -> str:
+    """Chemin déclaré de la route (``/api/ask``), pas le chemin brut : cardinalité bornée."""
+    router = getattr(request.app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """Opens a per-request trace, records route latency and, in debug mode, a Server-Timing header."""
+
+    def __init__(self, app, timing_header: bool | None = None):
+        super().__init__(app)
+        self.timing_header = timing_header_enabled() if timing_header is None else timing_header
+        # Les routes sont fixes une fois l'application démarrée : résolution une fois par (méthode, chemin)
+        self._templates = TTLCache("route_templates", max_entries=ROUTE_TEMPLATE_CACHE_SIZE)
+
+    def _route_template(self, request: Request) -> str:
+        key = (request.method, request.scope.get("root_path", ""), request.url.path)
+        return self._templates.get_or_compute(key, lambda: _route_template(request))
+
+    async def dispatch(self, request: Request, call_next):
+        trace, token = start_trace()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            observe_request(request.method, self._route_template(request), status, time.perf_counter() - started)
+            end_trace(token)
+        if self.timing_header:
+            # Réponses streamées : seules les étapes terminées avant l'envoi des en-têtes figurent
+            response.headers[TIMING_HEADER] = trace.server_timing()
+        return response
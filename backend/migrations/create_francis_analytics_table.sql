@@ -0,0 +1,15 @@
+-- Migration pour ajouter la table francis_analytics
+-- Alimentée par lots par la file d'écriture différée (backend/write_behind.py)
+
+CREATE TABLE IF NOT EXISTS francis_analytics (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    query_type TEXT DEFAULT 'general',
+    countries JSONB DEFAULT '[]',
+    analysis_method TEXT DEFAULT 'basic',
+    response_time_ms NUMERIC
+);
+
+-- Index pour optimiser les requêtes
+CREATE INDEX IF NOT EXISTS idx_francis_analytics_created_at ON francis_analytics(created_at);
+CREATE INDEX IF NOT EXISTS idx_francis_analytics_query_type ON francis_analytics(query_type);
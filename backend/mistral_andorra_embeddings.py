@@ -6,6 +6,9 @@ import numpy as np
 from functools import lru_cache
 from mistralai.client import MistralClient
 
+from corpus_extraction import CORPUS_FILES, load_corpus_index
+from packed_embeddings import cosine_scores, load_corpus_bundle, load_embedding_matrix, top_k_indices
+
 """
 Chargement et recherche de similarité pour les textes fiscaux andorrans.
 Les embeddings sont générés à l'aide de generate_andorra_embeddings.py
@@ -38,19 +41,22 @@ def search_similar_chunks(query: str, top_k: int = 5) -> List[Dict]:
         raise FileNotFoundError("Embeddings andorrans introuvables. Lancez generate_andorra_embeddings.py d'abord.")
 
     query_emb = get_query_embedding(query)
-    results: List[Tuple[str, float]] = []
-
-    for emb_path in EMBEDDINGS_DIR.glob('andorra_chunk_*.npy'):
-        emb = np.load(emb_path)
-        sim = cosine_similarity(query_emb, emb)
-        results.append((emb_path.stem, sim))
+    ids, matrix = load_embedding_matrix(EMBEDDINGS_DIR, 'andorra_chunk_*.npy')
+    scores = cosine_scores(query_emb, matrix)
+    results: List[Tuple[str, float]] = [(ids[i], float(scores[i])) for i in top_k_indices(scores, top_k)]
 
-    # top_k trié
-    results.sort(key=lambda x: x[1], reverse=True)
+    bundle = load_corpus_bundle(EMBEDDINGS_DIR)
+    corpus = load_corpus_index(CORPUS_FILES["andorra"]) if bundle is None else {}
     top_results = []
-    for stem, score in results[:top_k]:
-        txt_file = CHUNKS_DIR / f"{stem}.txt"
-        snippet = txt_file.read_text(encoding='utf-8')[:500] if txt_file.exists() else ""
+    for stem, score in results:
+        record = bundle.get(stem) if bundle is not None else None
+        if record is not None:
+            snippet = record["text"][:500]
+        elif stem in corpus:
+            snippet = corpus[stem]["text"][:500]
+        else:
+            txt_file = CHUNKS_DIR / f"{stem}.txt"
+            snippet = txt_file.read_text(encoding='utf-8')[:500] if txt_file.exists() else ""
         top_results.append({
             'chunk': stem,
             'similarity': score,
@@ -1,12 +1,16 @@
 import os
 from pathlib import Path
 import json
-from typing import List, Dict, Tuple
+from typing import List, Dict, Sequence, Tuple
 import numpy as np
 from dotenv import load_dotenv
 from functools import lru_cache
 import hashlib
 
+from corpus_extraction import CORPUS_FILES, load_corpus_index
+from packed_embeddings import has_packed_embeddings, load_corpus_bundle, load_embedding_matrix
+from tracing import traced
+
 load_dotenv()
 
 # Configuration
@@ -17,9 +21,15 @@ if not MISTRAL_API_KEY:
 # Chemins des fichiers
 CHUNKS_DIR = Path('data/cgi_chunks')
 EMBEDDINGS_DIR = Path('data/embeddings')  # Dossier des embeddings existants
+CORPUS_PATH = Path(CORPUS_FILES["cgi"])  # Corpus JSONL produit par extract_cgi_articles
 
 def load_articles() -> List[Dict]:
-    """Charge tous les articles depuis les fichiers JSON ou les extrait si ils ne sont pas présents."""
+    """Charge tous les articles depuis le bundle, le corpus (ou les fichiers JSON) ou les extrait si ils ne sont pas présents."""
+    bundle = load_corpus_bundle(EMBEDDINGS_DIR)
+    if bundle is not None:
+        return list(bundle.iter_records())
+    if CORPUS_PATH.exists():
+        return list(load_corpus_index(CORPUS_PATH).values())
     # Vérifier si les chunks existent
     if not CHUNKS_DIR.exists() or not any(CHUNKS_DIR.glob('*.json')):
         print("⚠️ Aucun chunk CGI trouvé, extraction en cours...")
@@ -27,6 +37,7 @@ def load_articles() -> List[Dict]:
             from extract_cgi_articles import extract_all_articles
             extract_all_articles()
             print("✅ Articles CGI extraits avec succès")
+            return list(load_corpus_index(CORPUS_PATH).values())
         except Exception as e:
             print(f"❌ Erreur lors de l'extraction des articles: {e}")
             return []
@@ -43,7 +54,7 @@ def load_embeddings() -> Dict[str, Dict]:
     embeddings = {}
     
     # Vérifier si les embeddings existent
-    if not EMBEDDINGS_DIR.exists() or not any(EMBEDDINGS_DIR.glob('*.npy')):
+    if not has_packed_embeddings(EMBEDDINGS_DIR) and not any(EMBEDDINGS_DIR.glob('*.npy')):
         print("⚠️ Aucun embedding trouvé, génération en cours...")
         try:
             from mistral_embeddings import generate_all_embeddings
@@ -60,10 +71,10 @@ def load_embeddings() -> Dict[str, Dict]:
         if article_num:
             articles_dict[article_num] = article
     
-    # Charger les embeddings et les associer aux articles
-    for npy_file in EMBEDDINGS_DIR.glob('CGI_*.npy'):
-        article_num = npy_file.stem.replace('CGI_', '')
-        embedding = np.load(npy_file)
+    # Charger les embeddings (matrice empaquetée) et les associer aux articles
+    ids, matrix = load_embedding_matrix(EMBEDDINGS_DIR, 'CGI_*.npy')
+    for chunk_id, embedding in zip(ids, matrix):
+        article_num = chunk_id.replace('CGI_', '')
         
         # Trouver l'article correspondant dans le dictionnaire
         if article_num in articles_dict:
@@ -81,6 +92,7 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     """Calcule la similarité cosinus entre deux vecteurs."""
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
+@traced("query_embedding")
 @lru_cache(maxsize=128)
 def get_query_embedding(query: str) -> List[float]:
     """Génère l'embedding d'une requête avec cache."""
@@ -108,6 +120,37 @@ def search_similar_articles(query: str, embeddings: Dict[str, Dict], top_k: int
 
     return scored_articles[:top_k]
 
+@traced("query_embedding")
+def get_query_embeddings(queries: Sequence[str]) -> np.ndarray:
+    """Embeddings de plusieurs requêtes en un seul appel à l'API (une ligne par requête, dans l'ordre)."""
+    from mistralai.client import MistralClient
+    client = MistralClient(api_key=os.getenv("MISTRAL_API_KEY"))
+    response = client.embeddings(
+        model="mistral-embed",
+        input=list(queries)
+    )
+    return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+def search_similar_articles_batch(queries: Sequence[str], embeddings: Dict[str, Dict], top_k: int = 3) -> List[List[Tuple[Dict, float]]]:
+    """Comme search_similar_articles pour plusieurs requêtes : un seul appel d'embedding et un produit matriciel."""
+    if not queries or not embeddings:
+        return [[] for _ in queries]
+    articles = list(embeddings.values())
+    matrix = _normalize_rows(np.asarray([article['embeddings'] for article in articles], dtype=np.float32))
+    scores = _normalize_rows(get_query_embeddings(queries)) @ matrix.T
+
+    k = min(top_k, len(articles))
+    results: List[List[Tuple[Dict, float]]] = []
+    for row in scores:
+        top = np.argpartition(-row, k - 1)[:k]
+        top = top[np.argsort(-row[top])]
+        results.append([(articles[i], float(row[i])) for i in top])
+    return results
+
 if __name__ == "__main__":
     # Test de chargement des embeddings
     embeddings = load_embeddings()
@@ -2,12 +2,15 @@ import os
 import requests
 import json
 import numpy as np
-from tqdm import tqdm
 from pathlib import Path
 from typing import List, Dict, Tuple
 import argparse
 import time
 
+from corpus_extraction import CORPUS_FILES, load_corpus_index
+from packed_embeddings import cosine_scores, load_corpus_bundle, load_embedding_matrix, top_k_indices
+from tracing import traced
+
 # Charger la clé API depuis les variables d'environnement
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 
@@ -18,6 +21,7 @@ MISTRAL_API_URL = "https://api.mistral.ai/v1/embeddings"
 CHUNKS_DIR = "data/cgi_chunks"
 EMBEDDINGS_DIR = "data/embeddings"
 
+@traced("query_embedding")
 def get_embedding(text: str, max_retries: int = 3, delay: float = 1.0) -> np.ndarray:
     """Obtient l'embedding d'un texte via l'API Mistral avec gestion des erreurs et délai."""
     if not MISTRAL_API_KEY:
@@ -68,28 +72,30 @@ def search_similar_articles(query: str, top_k: int = 5) -> List[Dict]:
     # Obtenir l'embedding de la question
     query_embedding = get_embedding(query)
     
-    # Charger tous les embeddings et calculer les similarités
-    similarities = []
-    for emb_file in Path(EMBEDDINGS_DIR).glob("*.npy"):
-        article_embedding = np.load(emb_file)
-        similarity = cosine_similarity(query_embedding, article_embedding)
-        
-        # Charger le texte de l'article correspondant
-        article_file = Path(CHUNKS_DIR) / (emb_file.stem + '.json')
-        with open(article_file, 'r') as f:
-            article_data = json.load(f)
+    # Similarités calculées en une fois sur la matrice empaquetée
+    ids, matrix = load_embedding_matrix(EMBEDDINGS_DIR)
+    scores = cosine_scores(query_embedding, matrix)
+    
+    bundle = load_corpus_bundle(EMBEDDINGS_DIR)
+    corpus = load_corpus_index(CORPUS_FILES["cgi"]) if bundle is None else {}
+    results = []
+    for i in top_k_indices(scores, top_k):
+        # Charger l'article correspondant (bundle, corpus JSONL, sinon fichier par article)
+        article_file = Path(CHUNKS_DIR) / (ids[i] + '.json')
+        article_data = bundle.get(ids[i]) if bundle is not None else corpus.get(ids[i])
+        if article_data is None:
+            with open(article_file, 'r') as f:
+                article_data = json.load(f)
         
-        similarities.append({
+        results.append({
             'file': article_file.name,
-            'similarity': similarity,
+            'similarity': float(scores[i]),
             'article_data': article_data,
             'formatted_text': format_article_for_display(article_data)
         })
-    
-    # Trier par similarité et retourner les top_k résultats
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
-    return similarities[:top_k]
+    return results
 
+@traced("bofip_scan")
 def search_similar_bofip_chunks(query: str, top_k: int = 3) -> List[Dict]:
     """Recherche les chunks BOFIP les plus similaires à une question."""
     # S'assurer que les chemins sont relatifs au script actuel ou absolus
@@ -107,73 +113,40 @@ def search_similar_bofip_chunks(query: str, top_k: int = 3) -> List[Dict]:
     # et utilise déjà le client Mistral initialisé.
     query_embedding = get_embedding(query)
     
-    similarities = []
     if not bofip_embeddings_dir.exists():
         print(f"Le dossier d'embeddings BOFIP n'existe pas: {bofip_embeddings_dir}")
         return []
 
-    for emb_file in bofip_embeddings_dir.glob("*.npy"):
-        try:
-            chunk_embedding = np.load(emb_file)
-            similarity = cosine_similarity(query_embedding, chunk_embedding)
-            
-            # Charger le texte du chunk correspondant
-            chunk_text_file = bofip_chunks_text_dir / (emb_file.stem + '.txt')
-            if chunk_text_file.exists():
-                with open(chunk_text_file, 'r', encoding='utf-8') as f:
-                    chunk_text = f.read()
-            else:
-                chunk_text = "Contenu du chunk non trouvé."
-                print(f"Attention: Fichier texte manquant pour {emb_file.name}")
-
-            similarities.append({
-                'file': chunk_text_file.name, # Nom du fichier du chunk texte
-                'similarity': similarity,
-                'text': chunk_text
-            })
-        except Exception as e:
-            print(f"Erreur lors du traitement du fichier d'embedding {emb_file.name}: {e}")
-            continue # Passer au fichier suivant en cas d'erreur avec un fichier spécifique
-    
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
-    return similarities[:top_k]
+    ids, matrix = load_embedding_matrix(bofip_embeddings_dir)
+    scores = cosine_scores(query_embedding, matrix)
+
+    bundle = load_corpus_bundle(bofip_embeddings_dir)
+    results = []
+    for i in top_k_indices(scores, top_k):
+        # Charger le texte du chunk correspondant (bundle, sinon fichier texte)
+        chunk_text_file = bofip_chunks_text_dir / (ids[i] + '.txt')
+        record = bundle.get(ids[i]) if bundle is not None else None
+        if record is not None:
+            chunk_text = record["text"]
+        elif chunk_text_file.exists():
+            with open(chunk_text_file, 'r', encoding='utf-8') as f:
+                chunk_text = f.read()
+        else:
+            chunk_text = "Contenu du chunk non trouvé."
+            print(f"Attention: Fichier texte manquant pour {ids[i]}")
+
+        results.append({
+            'file': chunk_text_file.name, # Nom du fichier du chunk texte
+            'similarity': float(scores[i]),
+            'text': chunk_text
+        })
+    return results
 
 def generate_all_embeddings():
-    """Génère les embeddings pour tous les articles avec logs détaillés."""
-    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
-    files = [f for f in os.listdir(CHUNKS_DIR) if f.endswith('.json')]
-    total, saved, skipped = 0, 0, 0
-    
-    # Vérifier les fichiers déjà traités
-    existing_embeddings = set(f.replace('.npy', '.json') for f in os.listdir(EMBEDDINGS_DIR))
-    files_to_process = [f for f in files if f not in existing_embeddings]
-    
-    print(f"\nFichiers déjà traités : {len(existing_embeddings)}")
-    print(f"Fichiers restants à traiter : {len(files_to_process)}")
-    
-    for filename in tqdm(files_to_process, desc="Génération des embeddings"):
-        path = os.path.join(CHUNKS_DIR, filename)
-        with open(path, 'r') as f:
-            data = json.load(f)
-            # Utiliser le texte formaté pour l'embedding
-            text = format_article_for_display(data)
-            total += 1
-            if not text.strip():
-                print(f"[SKIP] {filename} : texte vide.")
-                skipped += 1
-                continue
-            try:
-                print(f"[EMBED] {filename} : {len(text)} caractères.")
-                emb = get_embedding(text)
-                out_path = os.path.join(EMBEDDINGS_DIR, filename.replace('.json', '.npy'))
-                np.save(out_path, emb)
-                print(f"[OK] Embedding sauvegardé : {out_path}")
-                saved += 1
-                time.sleep(0.5)  # Délai entre chaque requête
-            except Exception as e:
-                print(f"[ERREUR] {filename} : {str(e)}")
-    
-    print(f"\nTotal articles : {total} | Embeddings sauvegardés : {saved} | Skipped : {skipped}")
+    """Génère les embeddings de tous les articles (lots concurrents, reprise sur interruption)."""
+    from embedding_pipeline import embed_corpus
+
+    return embed_corpus("cgi")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gestion des embeddings Mistral pour le CGI")
@@ -186,7 +159,7 @@ if __name__ == "__main__":
     if args.mode == "generate":
         print("Génération des embeddings...")
         generate_all_embeddings()
-        print("\nTous les embeddings ont été générés et sauvegardés dans data/embeddings/")
+        print("\nTous les embeddings ont été générés et sauvegardés dans data/embeddings (bundle)")
     elif args.mode == "search":
         if not args.query:
             print("Erreur : --query est requis en mode 'search'")
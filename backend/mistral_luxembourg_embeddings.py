@@ -6,6 +6,8 @@ from functools import lru_cache
 
 from mistralai.client import MistralClient
 
+from packed_embeddings import cosine_scores, load_corpus_bundle, load_embedding_matrix, top_k_indices
+
 """mistral_luxembourg_embeddings.py
 Utilities to load Luxembourg fiscal text chunks and perform similarity search.
 Embeddings are generated via `generate_luxembourg_embeddings.py` and stored in
@@ -48,20 +50,19 @@ def search_similar_chunks(query: str, top_k: int = 5) -> List[Dict]:
         )
 
     query_emb = get_query_embedding(query)
-    results: List[Tuple[str, float]] = []
-
-    for emb_path in EMBEDDINGS_DIR.glob("luxembourg_chunk_*.npy"):
-        emb = np.load(emb_path)
-        sim = cosine_similarity(query_emb, emb)
-        results.append((emb_path.stem, sim))
-
-    # Sort by similarity descending
-    results.sort(key=lambda x: x[1], reverse=True)
+    ids, matrix = load_embedding_matrix(EMBEDDINGS_DIR, "luxembourg_chunk_*.npy")
+    scores = cosine_scores(query_emb, matrix)
+    results: List[Tuple[str, float]] = [(ids[i], float(scores[i])) for i in top_k_indices(scores, top_k)]
 
+    bundle = load_corpus_bundle(EMBEDDINGS_DIR)
     top_results: List[Dict] = []
-    for stem, score in results[:top_k]:
+    for stem, score in results:
         txt_file = CHUNKS_DIR / f"{stem}.txt"
-        snippet = txt_file.read_text(encoding="utf-8")[:500] if txt_file.exists() else ""
+        record = bundle.get(stem) if bundle is not None else None
+        if record is not None:
+            snippet = record["text"][:500]
+        else:
+            snippet = txt_file.read_text(encoding="utf-8")[:500] if txt_file.exists() else ""
         top_results.append({
             "chunk": stem,
             "similarity": score,
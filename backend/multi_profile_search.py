@@ -13,12 +13,13 @@ import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 import requests
 import logging
-from functools import lru_cache
 import pickle
 from datetime import datetime
 
 from knowledge_base_multi_profiles import MultiProfileKnowledgeBase, KnowledgeChunk, ProfileType, RegimeFiscal, ThemeFiscal
 from profile_detector import ProfileDetector, ProfileMatch
+from tracing import traced
+from ttl_cache import cached_method
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,7 @@ class MultiProfileSearch:
         # Charger ou générer les embeddings
         self._load_or_generate_embeddings()
     
+    @traced("multi_profile_scan")
     def search_knowledge(self, question: str, max_results: int = 5) -> List[Dict[str, Any]]:
         """
         Recherche contextuelle dans la base de connaissances
@@ -202,7 +204,8 @@ class MultiProfileSearch:
         except Exception as e:
             logger.error(f"❌ Erreur lors de la sauvegarde du cache : {e}")
     
-    @lru_cache(maxsize=1000)
+    @traced("query_embedding")
+    @cached_method(max_entries=1000, max_bytes=8 * 1024 * 1024, name="multi_profile_embeddings")
     def _get_embedding(self, text: str) -> Optional[np.ndarray]:
         """Génère l'embedding d'un texte via l'API Mistral"""
         
@@ -1,7 +1,285 @@
-import os, requests, json, typing
+"""Client du LLM local (Ollama ou proxy compatible).
+
+- l'état de santé (/api/tags) est rafraîchi en tâche de fond : `is_available()`
+  ne fait aucune requête sur le chemin d'une question ;
+- un disjoncteur coupe les appels après plusieurs échecs consécutifs, puis
+  laisse passer une seule requête de test (semi-ouvert) après RESET_TIMEOUT ;
+- la génération est streamée sur un client httpx asynchrone mutualisé, et
+  chaque appel transmet keep_alive pour garder le modèle chargé en mémoire.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import typing
+
+import httpx
+import requests
+
+from tracing import record, span
 
 OLLAMA_URL = os.getenv("LLM_ENDPOINT", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+HEALTH_REFRESH_SECONDS = float(os.getenv("OLLAMA_HEALTH_REFRESH_SECONDS", "15"))
+HEALTH_TIMEOUT_SECONDS = 2.0
+CONNECT_TIMEOUT_SECONDS = 2.0
+GENERATE_TIMEOUT_SECONDS = 60.0
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT_SECONDS = 30.0
+
+
+class LLMUnavailable(RuntimeError):
+    """Le LLM local est indisponible (disjoncteur ouvert ou service injoignable)."""
+
+
+# -------------------------
+# Disjoncteur
+# -------------------------
+
+class CircuitBreaker:
+    """Disjoncteur fermé / ouvert / semi-ouvert (une seule requête de test à la fois)."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT_SECONDS,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def is_open(self) -> bool:
+        """Vrai tant qu'aucun appel ne doit être tenté (ne consomme pas la requête de test)."""
+        state = self.state
+        return state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """Autorise un appel ; en semi-ouvert, seul le premier appelant passe."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+
+# -------------------------
+# Client
+# -------------------------
+
+class LocalLLMClient:
+    """Client mutualisé du LLM local : santé en cache, disjoncteur, génération streamée."""
+
+    def __init__(self, base_url: typing.Optional[str] = None, model: str = "mistral",
+                 keep_alive: str = OLLAMA_KEEP_ALIVE, refresh_seconds: float = HEALTH_REFRESH_SECONDS,
+                 transport: typing.Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = (base_url or OLLAMA_URL).rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.refresh_seconds = refresh_seconds
+        self.breaker = CircuitBreaker()
+        self.available = False
+        self.models: typing.Dict[str, dict] = {}
+        self.last_check = 0.0
+        self.last_error: typing.Optional[str] = None
+        self._session = requests.Session()
+        self._monitor: typing.Optional[threading.Thread] = None
+        self._monitor_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._async_client: typing.Optional[httpx.AsyncClient] = None
+        self._async_loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._transport = transport
+
+    # --- santé ---
+
+    def refresh_health(self) -> bool:
+        """Interroge /api/tags (appelé par le thread de surveillance)."""
+        was_available = self.available
+        try:
+            response = self._session.get(f"{self.base_url}/api/tags", timeout=HEALTH_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            self.models = {m["name"]: m for m in response.json().get("models", [])}
+            self.available = True
+            self.last_error = None
+        except Exception as e:
+            self.available = False
+            self.last_error = str(e)
+        self.last_check = time.time()
+        if self.available and not was_available:
+            self.warm()
+        return self.available
 
+    def _monitor_loop(self) -> None:
+        while not self._stop.is_set():
+            self.refresh_health()
+            self._stop.wait(self.refresh_seconds)
+
+    def start_monitor(self) -> None:
+        with self._monitor_lock:
+            if self._monitor is None or not self._monitor.is_alive():
+                self._stop.clear()
+                self._monitor = threading.Thread(target=self._monitor_loop, name="ollama-health", daemon=True)
+                self._monitor.start()
+
+    def stop_monitor(self) -> None:
+        self._stop.set()
+
+    def is_available(self) -> bool:
+        """État en cache : aucune requête réseau. Le premier appel démarre la surveillance."""
+        self.start_monitor()
+        return self.available and not self.breaker.is_open()
+
+    def warm(self) -> None:
+        """Charge le modèle en mémoire (requête vide avec keep_alive), sans attendre de réponse utile."""
+        try:
+            self._session.post(f"{self.base_url}/api/generate",
+                               json={"model": self.model, "prompt": "", "keep_alive": self.keep_alive},
+                               timeout=GENERATE_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"[WARN] Préchargement du modèle {self.model} impossible : {e}")
+
+    # --- génération ---
+
+    def _payload(self, prompt: str, system: str, options: typing.Optional[dict], stream: bool,
+                 model: typing.Optional[str]) -> dict:
+        payload = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options or {},
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    def _client(self) -> httpx.AsyncClient:
+        # Un client httpx est lié à la boucle d'événements qui l'a créé
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(GENERATE_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def stream(self, prompt: str, system: str = "", options: typing.Optional[dict] = None,
+                     model: typing.Optional[str] = None) -> typing.AsyncIterator[str]:
+        """Tokens de la réponse au fil de l'eau ; LLMUnavailable si le disjoncteur est ouvert."""
+        if not self.breaker.allow():
+            raise LLMUnavailable("LLM local indisponible (disjoncteur ouvert)")
+        failed = False
+        started_at = time.perf_counter()
+        first_token = True
+        try:
+            async with self._client().stream("POST", "/api/generate",
+                                             json=self._payload(prompt, system, options, True, model)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    token = data.get("response")
+                    if token:
+                        if first_token:
+                            first_token = False
+                            record("llm_ttft", time.perf_counter() - started_at, started_at)
+                        yield token
+                    if data.get("done"):
+                        break
+        except Exception as e:
+            failed = True
+            self.breaker.record_failure()
+            if isinstance(e, (httpx.HTTPError, json.JSONDecodeError)):
+                raise LLMUnavailable(str(e)) from e
+            raise
+        finally:
+            # Un consommateur qui s'arrête en cours de flux n'est pas un échec du service
+            if not failed:
+                self.breaker.record_success()
+            record("llm_total", time.perf_counter() - started_at, started_at, failed)
+
+    async def agenerate(self, prompt: str, system: str = "", options: typing.Optional[dict] = None,
+                        model: typing.Optional[str] = None) -> str:
+        return "".join([token async for token in self.stream(prompt, system, options, model)])
+
+    def generate(self, prompt: str, system: str = "", options: typing.Optional[dict] = None,
+                 model: typing.Optional[str] = None, timeout: float = GENERATE_TIMEOUT_SECONDS) -> str:
+        """Génération synchrone (appelants non asynchrones), protégée par le même disjoncteur."""
+        if not self.breaker.allow():
+            raise LLMUnavailable("LLM local indisponible (disjoncteur ouvert)")
+        try:
+            with span("llm_total"):
+                response = self._session.post(f"{self.base_url}/api/generate",
+                                              json=self._payload(prompt, system, options, False, model),
+                                              timeout=(CONNECT_TIMEOUT_SECONDS, timeout))
+                response.raise_for_status()
+                result = response.json().get("response", "")
+        except Exception as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    async def aclose(self) -> None:
+        self.stop_monitor()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+_clients: typing.Dict[typing.Tuple[str, str], LocalLLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_local_llm(base_url: typing.Optional[str] = None, model: str = "mistral") -> LocalLLMClient:
+    """Client partagé par (URL, modèle) : une seule surveillance et un seul pool de connexions."""
+    key = ((base_url or OLLAMA_URL).rstrip("/"), model)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LocalLLMClient(key[0], model)
+            _clients[key] = client
+        return client
+
+
+# -------------------------
+# Fonctions historiques
+# -------------------------
 
 def _post(endpoint: str, payload: dict, timeout: int = 60) -> dict:
     url = f"{OLLAMA_URL}{endpoint}"
@@ -24,18 +302,18 @@ def _post(endpoint: str, payload: dict, timeout: int = 60) -> dict:
 
 
 def generate(prompt: str, model: str = "mistral", max_tokens: int = 512, temperature: float = 0.2) -> str:
-    """Renvoie la réponse complète (non streamée) du modèle."""
-    data = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "num_predict": max_tokens,
-            "temperature": temperature,
-        },
-    }
-    resp = _post("/api/generate", data)
-    return resp.get("response", "")
+    """Renvoie la réponse complète (non streamée) du modèle.
+
+    Lève LLMUnavailable sans attendre de timeout si le disjoncteur est ouvert.
+    """
+    options = {"num_predict": max_tokens, "temperature": temperature}
+    try:
+        return get_local_llm(model=model).generate(prompt, options=options)
+    except LLMUnavailable:
+        # Fallback automatique : si l'hôte est "llm", retenter sur localhost
+        if "//llm" not in OLLAMA_URL:
+            raise
+        return get_local_llm(OLLAMA_URL.replace("//llm", "//localhost"), model).generate(prompt, options=options)
 
 
 def embed(texts: typing.List[str] | str, model: str = "nomic-embed-text") -> typing.List[typing.List[float]]:
@@ -44,4 +322,4 @@ def embed(texts: typing.List[str] | str, model: str = "nomic-embed-text") -> typ
         texts = [texts]
     payload = {"model": model, "prompt": texts}
     resp = _post("/api/embeddings", payload)
-    return resp.get("embeddings", []) 
\ No newline at end of file
+    return resp.get("embeddings", [])
@@ -0,0 +1,194 @@
+"""Format « matrice empaquetée » des embeddings d'un corpus.
+
+Un index est un dossier de version contenant un seul fichier corpus.bundle
+(voir corpus_bundle) : matrice des N chunks, identifiants, empreintes de
+contenu (voir chunk_store) et enregistrements texte compressés.
+
+Le fichier CURRENT du dossier d'embeddings désigne la version active ; il est
+remplacé par os.replace, la bascule vers un nouvel index est donc atomique
+pour les lecteurs. Les formats précédents restent lisibles : dossier de
+version index.npy / index_ids.json / index_hashes.json, index.npy à la racine
+du dossier, ou un fichier <id>.npy par chunk (empilés au chargement).
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from corpus_bundle import CorpusBundle, open_bundle, write_bundle
+
+BUNDLE_FILE = "corpus.bundle"
+BUNDLE_DTYPE = os.getenv("EMBEDDING_BUNDLE_DTYPE", "float32")
+PACKED_MATRIX_FILE = "index.npy"
+PACKED_IDS_FILE = "index_ids.json"
+PACKED_HASHES_FILE = "index_hashes.json"
+CURRENT_POINTER_FILE = "CURRENT"
+VERSION_PREFIX = "index-v"
+KEEP_VERSIONS = 2  # version active + précédente (lecteurs encore en cours)
+
+PathLike = Union[str, Path]
+
+_cache: Dict[Tuple[str, str], Tuple[Tuple[str, int], List[str], np.ndarray]] = {}
+_cache_lock = threading.Lock()
+
+
+def _prune_versions(embeddings_dir: Path, keep: int = KEEP_VERSIONS) -> None:
+    versions = sorted(p for p in embeddings_dir.glob(f"{VERSION_PREFIX}*") if p.is_dir())
+    for old in versions[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def write_packed_embeddings(
+    embeddings_dir: PathLike,
+    ids: List[str],
+    matrix: np.ndarray,
+    hashes: Optional[List[str]] = None,
+    records: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    dtype: Optional[str] = None,
+) -> Path:
+    """Écrit une nouvelle version de l'index (un bundle) puis bascule CURRENT dessus (atomique)."""
+    embeddings_dir = Path(embeddings_dir)
+    embeddings_dir.mkdir(parents=True, exist_ok=True)
+    if matrix.shape[0] != len(ids) or (hashes is not None and len(hashes) != len(ids)):
+        raise ValueError(f"{len(ids)} identifiants pour {matrix.shape[0]} lignes")
+
+    version_dir = embeddings_dir / f"{VERSION_PREFIX}{time.time_ns()}"
+    version_dir.mkdir()
+    write_bundle(version_dir / BUNDLE_FILE, ids, matrix, records, hashes, dtype=dtype or BUNDLE_DTYPE)
+
+    tmp_pointer = embeddings_dir / (CURRENT_POINTER_FILE + ".tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version_dir.name)
+    os.replace(tmp_pointer, embeddings_dir / CURRENT_POINTER_FILE)
+    _prune_versions(embeddings_dir)
+    return version_dir
+
+
+def _current_index_dir(embeddings_dir: Path) -> Optional[Path]:
+    pointer = embeddings_dir / CURRENT_POINTER_FILE
+    if pointer.exists():
+        version_dir = embeddings_dir / pointer.read_text(encoding="utf-8").strip()
+        if (version_dir / BUNDLE_FILE).exists() or (version_dir / PACKED_MATRIX_FILE).exists():
+            return version_dir
+    if (embeddings_dir / PACKED_MATRIX_FILE).exists() and (embeddings_dir / PACKED_IDS_FILE).exists():
+        return embeddings_dir
+    return None
+
+
+def has_packed_embeddings(embeddings_dir: PathLike) -> bool:
+    return _current_index_dir(Path(embeddings_dir)) is not None
+
+
+def load_corpus_bundle(embeddings_dir: PathLike) -> Optional[CorpusBundle]:
+    """Bundle de la version active, ou None si l'index est dans un format précédent."""
+    embeddings_dir = Path(embeddings_dir)
+    if not embeddings_dir.exists():
+        return None
+    index_dir = _current_index_dir(embeddings_dir)
+    if index_dir is None or not (index_dir / BUNDLE_FILE).exists():
+        return None
+    return open_bundle(index_dir / BUNDLE_FILE)
+
+
+def _load_legacy(embeddings_dir: Path, pattern: str) -> Tuple[List[str], np.ndarray]:
+    files = sorted(p for p in embeddings_dir.glob(pattern) if p.name != PACKED_MATRIX_FILE)
+    if not files:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return [p.stem for p in files], np.vstack([np.load(p).astype(np.float32, copy=False) for p in files])
+
+
+def load_index(embeddings_dir: PathLike) -> Tuple[List[str], np.ndarray, Optional[List[str]]]:
+    """Index courant complet (ids, matrice, empreintes ou None si l'index n'en a pas), sans cache."""
+    embeddings_dir = Path(embeddings_dir)
+    if not embeddings_dir.exists():
+        return [], np.zeros((0, 0), dtype=np.float32), None
+    index_dir = _current_index_dir(embeddings_dir)
+    if index_dir is None:
+        ids, matrix = _load_legacy(embeddings_dir, "*.npy")
+        return ids, matrix, None
+    if (index_dir / BUNDLE_FILE).exists():
+        bundle = open_bundle(index_dir / BUNDLE_FILE)
+        return list(bundle.ids), bundle.embeddings.astype(np.float32), bundle.hashes
+    matrix = np.load(index_dir / PACKED_MATRIX_FILE)
+    with open(index_dir / PACKED_IDS_FILE, "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    hashes = None
+    if (index_dir / PACKED_HASHES_FILE).exists():
+        with open(index_dir / PACKED_HASHES_FILE, "r", encoding="utf-8") as f:
+            hashes = json.load(f)
+    return ids, matrix, hashes
+
+
+def load_embedding_matrix(embeddings_dir: PathLike, pattern: str = "*.npy") -> Tuple[List[str], np.ndarray]:
+    """Retourne (ids, matrice N × D) pour un dossier d'embeddings, avec cache en mémoire.
+
+    Le cache est invalidé dès que CURRENT désigne une autre version de l'index.
+    """
+    embeddings_dir = Path(embeddings_dir)
+    if not embeddings_dir.exists():
+        return [], np.zeros((0, 0), dtype=np.float32)
+
+    key = (str(embeddings_dir.resolve()), pattern)
+    index_dir = _current_index_dir(embeddings_dir)
+    bundle_path = index_dir / BUNDLE_FILE if index_dir is not None else None
+    if bundle_path is not None and bundle_path.exists():
+        stamp = (str(bundle_path), bundle_path.stat().st_mtime_ns)
+    elif index_dir is not None:
+        stamp = (str(index_dir), (index_dir / PACKED_MATRIX_FILE).stat().st_mtime_ns)
+    else:
+        stamp = ("", -1)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1], cached[2]
+
+    if index_dir is not None:
+        if bundle_path.exists():
+            bundle = open_bundle(bundle_path)
+            ids, matrix = bundle.ids, bundle.embeddings
+        else:
+            matrix = np.load(index_dir / PACKED_MATRIX_FILE, mmap_mode="r")
+            with open(index_dir / PACKED_IDS_FILE, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+        prefix = pattern.split("*", 1)[0]
+        if prefix:
+            rows = [i for i, chunk_id in enumerate(ids) if chunk_id.startswith(prefix)]
+            if len(rows) != len(ids):
+                ids = [ids[i] for i in rows]
+                matrix = matrix[rows]
+    else:
+        ids, matrix = _load_legacy(embeddings_dir, pattern)
+
+    with _cache_lock:
+        _cache[key] = (stamp, ids, matrix)
+    return ids, matrix
+
+
+def cosine_scores(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Similarité cosinus entre une requête et toutes les lignes de la matrice."""
+    if matrix.size == 0:
+        return np.zeros(0, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    norms[norms == 0] = 1.0
+    return (matrix @ query) / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> List[int]:
+    """Indices des k meilleurs scores, par score décroissant."""
+    if scores.size == 0 or k <= 0:
+        return []
+    k = min(k, scores.size)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])].tolist()
+
+
+def clear_embedding_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,206 @@
+"""Rendu des rapports PDF hors de la boucle d'évènements.
+
+Les générateurs ReportLab de `pdf_report` sont synchrones et coûteux. Ce
+service les exécute dans un pool de processus (styles construits une fois par
+worker), met en cache les PDF finis par (version du client, type de rapport)
+et expose un itérateur de morceaux pour les StreamingResponse.
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from schemas_pro import AnalysisResultSchema
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+REPORT_TYPES = ("client", "analysis", "irpp")
+
+
+# -------------------------
+# Exécution dans le worker
+# -------------------------
+
+# ReportLab n'est importé que dans les workers du pool, pas au démarrage de l'application
+
+def _init_worker() -> None:
+    from pdf_report import warm_up_report_styles
+    warm_up_report_styles()
+
+
+def _render(report_type: str, client: SimpleNamespace, payload: Optional[Dict[str, Any]]) -> bytes:
+    from pdf_report import generate_analysis_pdf_report, generate_client_pdf_report, generate_irpp_analysis_pdf_report
+
+    buffer = BytesIO()
+    if report_type == "client":
+        generate_client_pdf_report(buffer, client)
+    elif report_type == "analysis":
+        generate_analysis_pdf_report(buffer, client, AnalysisResultSchema(**payload))
+    elif report_type == "irpp":
+        generate_irpp_analysis_pdf_report(buffer, client, SimpleNamespace(**payload))
+    else:
+        raise ValueError(f"Type de rapport inconnu : {report_type}")
+    return buffer.getvalue()
+
+
+# -------------------------
+# Pool de processus
+# -------------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS, initializer=_init_worker)
+        return _pool
+
+
+def shutdown_render_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# -------------------------
+# Cache des PDF finis
+# -------------------------
+
+_cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def client_version(client: Any) -> str:
+    """Identifiant de version d'une fiche : change à chaque mise à jour."""
+    stamp = client.updated_at or client.created_at
+    return f"{client.id}:{stamp.isoformat() if stamp else ''}"
+
+
+def get_cached_report(client: Any, report_type: str) -> Optional[bytes]:
+    key = (client_version(client), report_type)
+    with _cache_lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+        return data
+
+
+def _store_report(key: Tuple[str, str], data: bytes) -> None:
+    global _cache_bytes
+    if len(data) > PDF_CACHE_MAX_BYTES:
+        return
+    with _cache_lock:
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _cache_bytes -= len(previous)
+        _cache[key] = data
+        _cache_bytes += len(data)
+        while _cache_bytes > PDF_CACHE_MAX_BYTES:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def clear_report_cache() -> None:
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+# -------------------------
+# API publique
+# -------------------------
+
+def client_snapshot(client: Any) -> SimpleNamespace:
+    """Copie picklable des colonnes d'un ClientProfile (envoyée au worker)."""
+    return SimpleNamespace(**{col.name: getattr(client, col.name) for col in client.__table__.columns})
+
+
+async def render_report(report_type: str, client: Any, payload: Optional[Dict[str, Any]] = None) -> bytes:
+    """Retourne le PDF demandé, depuis le cache ou rendu dans le pool de processus."""
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Type de rapport inconnu : {report_type}")
+
+    key = (client_version(client), report_type)
+    cached = get_cached_report(client, report_type)
+    if cached is not None:
+        return cached
+
+    snapshot = client_snapshot(client)
+    loop = asyncio.get_running_loop()
+    try:
+        data = await loop.run_in_executor(_get_pool(), _render, report_type, snapshot, payload)
+    except BrokenProcessPool:
+        # Worker tué (OOM…) : on recrée le pool au prochain appel et on rend dans un thread
+        print("[WARN] Pool de rendu PDF indisponible, rendu dans un thread")
+        shutdown_render_pool()
+        data = await asyncio.to_thread(_render, report_type, snapshot, payload)
+
+    _store_report(key, data)
+    return data
+
+
+def iter_rendered_reports(report_type: str, clients: Iterable[Any]) -> Iterator[Tuple[Any, bytes]]:
+    """Rendu synchrone d'un lot de rapports (exports groupés), dans l'ordre d'entrée.
+
+    Au plus 2 × PDF_RENDER_WORKERS rendus sont en vol : la mémoire reste bornée.
+    Les PDF produits ne sont pas mis en cache pour ne pas évincer les exports unitaires.
+    Si le pool casse en cours de lot, les rapports restants sont rendus dans ce processus.
+    """
+    pool: Optional[ProcessPoolExecutor] = _get_pool()
+
+    def pool_broken() -> None:
+        nonlocal pool
+        if pool is not None:
+            print("[WARN] Pool de rendu PDF indisponible, fin du lot rendue dans le processus")
+            pool = None
+            shutdown_render_pool()
+
+    def submit(snapshot: SimpleNamespace):
+        if pool is not None:
+            try:
+                return pool.submit(_render, report_type, snapshot, None)
+            except BrokenProcessPool:
+                pool_broken()
+        return None
+
+    def result(snapshot: SimpleNamespace, future) -> bytes:
+        if future is not None:
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                pool_broken()
+        return _render(report_type, snapshot, None)
+
+    pending = []
+    for client in clients:
+        cached = get_cached_report(client, report_type)
+        if cached is not None:
+            pending.append((client, None, None, cached))
+        else:
+            snapshot = client_snapshot(client)
+            pending.append((client, snapshot, submit(snapshot), None))
+        if len(pending) >= 2 * PDF_RENDER_WORKERS:
+            client_done, snapshot, future, data = pending.pop(0)
+            yield client_done, data if data is not None else result(snapshot, future)
+    for client_done, snapshot, future, data in pending:
+        yield client_done, data if data is not None else result(snapshot, future)
+
+
+def iter_pdf_chunks(data: bytes, chunk_size: int = PDF_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        yield bytes(view[start:start + chunk_size])
@@ -1,4 +1,5 @@
 from typing import List, Dict, Optional, Union, Any
+from functools import lru_cache
 from io import BytesIO
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -293,15 +294,29 @@ def generate_professional_report(
 #     generate_professional_report("rapport_detaille_test.pdf", client_test_name, scenarios_list)
 #     print("Rapport PDF de test généré : rapport_detaille_test.pdf") 
 
-def generate_client_pdf_report(output_target: Union[str, BytesIO], client: ClientProfile) -> None:
-    """Génère un rapport PDF détaillé pour une fiche client complète."""
-    doc = SimpleDocTemplate(output_target, pagesize=A4,
-                            leftMargin=2*cm, rightMargin=2*cm,
-                            topMargin=2*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
+# ======================================================
+# Styles partagés (construits une seule fois par processus)
+# ======================================================
 
-    # Styles personnalisés
+_CLIENT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+])
+
+
+@lru_cache(maxsize=None)
+def _client_report_styles():
+    """Feuille de styles de la fiche client (réutilisée entre les rendus)."""
+    styles = getSampleStyleSheet()
     styles.add(ParagraphStyle(name='CustomMainTitle', parent=styles['h1'], fontSize=20, alignment=TA_CENTER, spaceAfter=0.8*cm))
     styles.add(ParagraphStyle(name='CustomSubTitle', parent=styles['Normal'], fontSize=11, alignment=TA_CENTER, spaceAfter=0.4*cm, textColor=colors.HexColor("#555555")))
     styles.add(ParagraphStyle(name='CustomClientName', parent=styles['Normal'], fontSize=14, alignment=TA_CENTER, spaceAfter=0.4*cm, fontName='Helvetica-Bold'))
@@ -309,9 +324,90 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     styles.add(ParagraphStyle(name='CustomSectionTitle', parent=styles['h3'], fontSize=12, spaceBefore=0.6*cm, spaceAfter=0.2*cm, alignment=TA_LEFT, textColor=colors.HexColor("#2A3952"), fontName='Helvetica-Bold'))
     styles.add(ParagraphStyle(name='CustomBodyText', parent=styles['Normal'], fontSize=10, alignment=TA_JUSTIFY, leading=14, spaceAfter=0.2*cm))
     styles.add(ParagraphStyle(name='CustomListItem', parent=styles['CustomBodyText'], leftIndent=10, bulletIndent=0, spaceBefore=0.1*cm))
+    styles.add(ParagraphStyle(name='CustomFooterText', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER))
     styles.add(ParagraphStyle(name='TableHeader', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=colors.whitesmoke, fontName='Helvetica-Bold'))
     styles.add(ParagraphStyle(name='TableCell', parent=styles['Normal'], fontSize=9, alignment=TA_LEFT, leading=10))
     styles.add(ParagraphStyle(name='TableCellNumber', parent=styles['TableCell'], alignment=TA_RIGHT))
+    return styles
+
+
+@lru_cache(maxsize=None)
+def _analysis_report_styles():
+    """Feuille de styles commune aux rapports d'analyse générale et IRPP."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Title'],
+        fontSize=18,
+        spaceAfter=30,
+        textColor=colors.HexColor("#1A2942"),
+        alignment=1  # Centré
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomSectionTitle',
+        parent=styles['Heading1'],
+        fontSize=14,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor("#1A2942"),
+        borderWidth=0,
+        borderColor=colors.HexColor("#88C0D0"),
+        borderPadding=5,
+        borderRadius=5,
+        backColor=colors.HexColor("#F8F9FA")
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomSubTitle',
+        parent=styles['Heading2'],
+        fontSize=12,
+        spaceAfter=8,
+        spaceBefore=15,
+        textColor=colors.HexColor("#2A3F6C")
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomBodyText',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=6,
+        textColor=colors.HexColor("#2A3F6C")
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomFooterText',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.HexColor("#6C757D"),
+        alignment=1
+    ))
+    return styles
+
+
+def _add_page_numbers_centered(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawCentredString(A4[0]/2, 1.5*cm, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _add_page_numbers_right(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.setFillColor(colors.HexColor("#6C757D"))
+    canvas.drawRightString(doc.pagesize[0] - 2*cm, 1*cm, f"Page {canvas.getPageNumber()}")
+    canvas.restoreState()
+
+
+def warm_up_report_styles() -> None:
+    """Construit les feuilles de styles à l'avance (initialisation d'un worker de rendu)."""
+    _client_report_styles()
+    _analysis_report_styles()
+
+def generate_client_pdf_report(output_target: Union[str, BytesIO], client: ClientProfile) -> None:
+    """Génère un rapport PDF détaillé pour une fiche client complète."""
+    doc = SimpleDocTemplate(output_target, pagesize=A4,
+                            leftMargin=2*cm, rightMargin=2*cm,
+                            topMargin=2*cm, bottomMargin=2*cm)
+    
+    styles = _client_report_styles()
 
     story = []
 
@@ -337,19 +433,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     identite_table = Table(identite_data, colWidths=[4*cm, 10*cm])
-    identite_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    identite_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(identite_table)
     story.append(Spacer(1, 0.5*cm))
 
@@ -369,19 +453,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     contact_table = Table(contact_data, colWidths=[4*cm, 10*cm])
-    contact_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    contact_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(contact_table)
     story.append(Spacer(1, 0.5*cm))
 
@@ -396,19 +468,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     famille_table = Table(famille_data, colWidths=[4*cm, 10*cm])
-    famille_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    famille_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(famille_table)
     story.append(PageBreak())
 
@@ -427,19 +487,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
         ]
         
         revenus1_table = Table(revenus1_data, colWidths=[4*cm, 10*cm])
-        revenus1_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
+        revenus1_table.setStyle(_CLIENT_TABLE_STYLE)
         story.append(revenus1_table)
         story.append(Spacer(1, 0.3*cm))
 
@@ -455,19 +503,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
         ]
         
         revenus2_table = Table(revenus2_data, colWidths=[4*cm, 10*cm])
-        revenus2_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
+        revenus2_table.setStyle(_CLIENT_TABLE_STYLE)
         story.append(revenus2_table)
         story.append(Spacer(1, 0.3*cm))
 
@@ -486,19 +522,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     revenus_foyer_table = Table(revenus_foyer_data, colWidths=[4*cm, 10*cm])
-    revenus_foyer_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    revenus_foyer_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(revenus_foyer_table)
     story.append(PageBreak())
 
@@ -516,19 +540,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     patrimoine_table = Table(patrimoine_data, colWidths=[4*cm, 10*cm])
-    patrimoine_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    patrimoine_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(patrimoine_table)
     story.append(Spacer(1, 0.5*cm))
 
@@ -567,19 +579,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     fiscal_table = Table(fiscal_data, colWidths=[4*cm, 10*cm])
-    fiscal_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    fiscal_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(fiscal_table)
     story.append(Spacer(1, 0.5*cm))
 
@@ -597,19 +597,7 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     ]
     
     suivi_table = Table(suivi_data, colWidths=[4*cm, 10*cm])
-    suivi_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A2942")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#F8F9FA")),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor("#DEE2E6")),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
+    suivi_table.setStyle(_CLIENT_TABLE_STYLE)
     story.append(suivi_table)
     story.append(Spacer(1, 0.5*cm))
 
@@ -622,68 +610,15 @@ def generate_client_pdf_report(output_target: Union[str, BytesIO], client: Clien
     story.append(Paragraph("Rapport généré automatiquement par Francis", styles['CustomFooterText']))
     story.append(Paragraph(f"Date : {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['CustomFooterText']))
 
-    doc.build(story, onFirstPage=_add_page_numbers, onLaterPages=_add_page_numbers) 
+    doc.build(story, onFirstPage=_add_page_numbers_centered, onLaterPages=_add_page_numbers_centered)
 
 def generate_analysis_pdf_report(output_target: Union[str, BytesIO], client: ClientProfile, analysis_result: AnalysisResultSchema) -> None:
     """Génère un rapport PDF pour l'analyse générale d'un client."""
     
     # Créer le document
-    doc = BaseDocTemplate(output_target, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    doc = SimpleDocTemplate(output_target, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
     
-    # Styles
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Title'],
-        fontSize=18,
-        spaceAfter=30,
-        textColor=colors.HexColor("#1A2942"),
-        alignment=1  # Centré
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomSectionTitle',
-        parent=styles['Heading1'],
-        fontSize=14,
-        spaceAfter=12,
-        spaceBefore=20,
-        textColor=colors.HexColor("#1A2942"),
-        borderWidth=0,
-        borderColor=colors.HexColor("#88C0D0"),
-        borderPadding=5,
-        borderRadius=5,
-        backColor=colors.HexColor("#F8F9FA")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomSubTitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=8,
-        spaceBefore=15,
-        textColor=colors.HexColor("#2A3F6C")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomBodyText',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6,
-        textColor=colors.HexColor("#2A3F6C")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomFooterText',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor("#6C757D"),
-        alignment=1
-    ))
-
-    def _add_page_numbers(canvas, doc):
-        canvas.saveState()
-        canvas.setFont('Helvetica', 8)
-        canvas.setFillColor(colors.HexColor("#6C757D"))
-        page_num = canvas.getPageNumber()
-        text = f"Page {page_num}"
-        canvas.drawRightString(doc.pagesize[0] - 2*cm, 1*cm, text)
-        canvas.restoreState()
+    styles = _analysis_report_styles()
 
     story = []
     
@@ -693,6 +628,28 @@ def generate_analysis_pdf_report(output_target: Union[str, BytesIO], client: Cli
     story.append(Paragraph(f"Date d'analyse : {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['CustomBodyText']))
     story.append(Spacer(1, 0.5*cm))
 
+    # Synthèse / recommandations / points d'action (AnalysisResultSchema)
+    if getattr(analysis_result, 'summary', None):
+        story.append(Paragraph("SYNTHÈSE", styles['CustomSectionTitle']))
+        for bloc in analysis_result.summary.split('\n\n'):
+            if bloc.strip():
+                story.append(Paragraph(bloc.strip().replace('\n', '<br/>'), styles['CustomBodyText']))
+        story.append(Spacer(1, 0.3*cm))
+
+    if getattr(analysis_result, 'recommendations', None):
+        story.append(Paragraph("RECOMMANDATIONS", styles['CustomSectionTitle']))
+        for i, rec in enumerate(analysis_result.recommendations, 1):
+            story.append(Paragraph(f"{i}. {rec.title}", styles['CustomBodyText']))
+            if rec.details:
+                story.append(Paragraph(rec.details, styles['CustomBodyText']))
+        story.append(Spacer(1, 0.3*cm))
+
+    if getattr(analysis_result, 'actionPoints', None):
+        story.append(Paragraph("POINTS D'ACTION", styles['CustomSectionTitle']))
+        for i, action in enumerate(analysis_result.actionPoints, 1):
+            story.append(Paragraph(f"{i}. {action}", styles['CustomBodyText']))
+        story.append(Spacer(1, 0.3*cm))
+
     # Score de risque
     if hasattr(analysis_result, 'score_risque') and analysis_result.score_risque:
         story.append(Paragraph("SCORE DE RISQUE", styles['CustomSectionTitle']))
@@ -753,68 +710,15 @@ def generate_analysis_pdf_report(output_target: Union[str, BytesIO], client: Cli
     story.append(Paragraph("Rapport d'analyse généré par Francis", styles['CustomFooterText']))
     story.append(Paragraph(f"Date : {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['CustomFooterText']))
 
-    doc.build(story, onFirstPage=_add_page_numbers, onLaterPages=_add_page_numbers)
+    doc.build(story, onFirstPage=_add_page_numbers_right, onLaterPages=_add_page_numbers_right)
 
 def generate_irpp_analysis_pdf_report(output_target: Union[str, BytesIO], client: ClientProfile, irpp_analysis: Any) -> None:
     """Génère un rapport PDF pour l'analyse IRPP d'un client."""
     
     # Créer le document
-    doc = BaseDocTemplate(output_target, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    doc = SimpleDocTemplate(output_target, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
     
-    # Styles
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Title'],
-        fontSize=18,
-        spaceAfter=30,
-        textColor=colors.HexColor("#1A2942"),
-        alignment=1  # Centré
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomSectionTitle',
-        parent=styles['Heading1'],
-        fontSize=14,
-        spaceAfter=12,
-        spaceBefore=20,
-        textColor=colors.HexColor("#1A2942"),
-        borderWidth=0,
-        borderColor=colors.HexColor("#88C0D0"),
-        borderPadding=5,
-        borderRadius=5,
-        backColor=colors.HexColor("#F8F9FA")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomSubTitle',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceAfter=8,
-        spaceBefore=15,
-        textColor=colors.HexColor("#2A3F6C")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomBodyText',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6,
-        textColor=colors.HexColor("#2A3F6C")
-    ))
-    styles.add(ParagraphStyle(
-        name='CustomFooterText',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor("#6C757D"),
-        alignment=1
-    ))
-
-    def _add_page_numbers(canvas, doc):
-        canvas.saveState()
-        canvas.setFont('Helvetica', 8)
-        canvas.setFillColor(colors.HexColor("#6C757D"))
-        page_num = canvas.getPageNumber()
-        text = f"Page {page_num}"
-        canvas.drawRightString(doc.pagesize[0] - 2*cm, 1*cm, text)
-        canvas.restoreState()
+    styles = _analysis_report_styles()
 
     story = []
     
@@ -866,4 +770,4 @@ def generate_irpp_analysis_pdf_report(output_target: Union[str, BytesIO], client
     story.append(Paragraph("Rapport IRPP généré par Francis", styles['CustomFooterText']))
     story.append(Paragraph(f"Date : {datetime.now().strftime('%d/%m/%Y à %H:%M')}", styles['CustomFooterText']))
 
-    doc.build(story, onFirstPage=_add_page_numbers, onLaterPages=_add_page_numbers) 
\ No newline at end of file
+    doc.build(story, onFirstPage=_add_page_numbers_right, onLaterPages=_add_page_numbers_right)
@@ -0,0 +1,215 @@
+"""Analyse fiscale groupée d'un portefeuille de clients (comptes Pro).
+
+Le conseiller lance une seule tâche pour l'ensemble de ses clients au lieu
+d'appeler `/clients/{id}/simulate` client par client. Les lignes sont chargées
+en une requête, puis l'IR, la TMI et les scénarios standards sont calculés
+de façon vectorisée (numpy) par paquets, avec un suivi de progression.
+"""
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from calculs_fiscaux import impot_revenu_vectorise, simulate_tax_scenario_vectorise
+from rate_counters import get_counter_backend
+from tax_data_loader import get_tax_data
+
+# Colonnes de ClientProfile nécessaires au calcul (chargement partiel)
+PORTFOLIO_COLUMNS = (
+    "id",
+    "nom_client",
+    "prenom_client",
+    "situation_maritale_client",
+    "nombre_enfants_a_charge_client",
+    "revenu_net_annuel_client1",
+    "revenu_net_annuel_client2",
+    "revenus_fonciers_annuels_bruts_foyer",
+    "charges_foncieres_deductibles_foyer",
+)
+
+# Scénarios appliqués par défaut à chaque client du portefeuille
+STANDARD_SCENARIOS: List[Dict[str, Any]] = [
+    {"label": "PER – versement au plafond", "per_versement": get_tax_data().get("plafond_per", 0)},
+    {"label": "Pinel+ – investissement 200 000 €", "pinel_investissement": 200000},
+    {
+        "label": "PER + Pinel+",
+        "per_versement": get_tax_data().get("plafond_per", 0),
+        "pinel_investissement": 200000,
+    },
+]
+
+CHUNK_SIZE = 256
+JOB_TTL_SECONDS = 3600
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def portfolio_arrays(rows: Sequence[Any]) -> Dict[str, np.ndarray]:
+    """Convertit les lignes ClientProfile en tableaux revenus / parts.
+
+    Mêmes règles que `_calculate_revenu_net_global_imposable` et
+    `_calculate_nombre_parts` du routeur pro, sans appel par ligne.
+    """
+    n = len(rows)
+    rev1 = np.fromiter((_to_float(r.revenu_net_annuel_client1) for r in rows), dtype=float, count=n)
+    rev2 = np.fromiter((_to_float(r.revenu_net_annuel_client2) for r in rows), dtype=float, count=n)
+    foncier = np.fromiter((_to_float(r.revenus_fonciers_annuels_bruts_foyer) for r in rows), dtype=float, count=n)
+    charges = np.fromiter((_to_float(r.charges_foncieres_deductibles_foyer) for r in rows), dtype=float, count=n)
+    enfants = np.fromiter((int(r.nombre_enfants_a_charge_client or 0) for r in rows), dtype=float, count=n)
+    en_couple = np.fromiter(
+        (
+            bool(r.situation_maritale_client)
+            and ("Marié" in r.situation_maritale_client or "Pacsé" in r.situation_maritale_client)
+            for r in rows
+        ),
+        dtype=bool,
+        count=n,
+    )
+
+    revenus = np.maximum(0.0, (rev1 + rev2) * 0.9 + (foncier - charges))
+    parts = np.where(en_couple, 2.0, 1.0)
+    parts += np.where(enfants <= 0, 0.0, np.where(enfants == 1, 0.5, np.where(enfants == 2, 1.0, enfants - 1.0)))
+    return {"revenus": revenus, "parts": parts}
+
+
+def analyze_portfolio(
+    rows: Sequence[Any],
+    scenarios: Optional[List[Dict[str, Any]]] = None,
+    top: int = 50,
+    progress_callback=None,
+) -> Dict[str, Any]:
+    """Calcule IR / TMI / économies par scénario pour tout un portefeuille.
+
+    Retourne les clients classés par économie maximale décroissante. L'économie
+    est mesurée par rapport à l'IR actuel calculé avec les mêmes règles
+    (plafonnement QF et décote) que l'IR après optimisation.
+    """
+    scenarios = scenarios or STANDARD_SCENARIOS
+    total = len(rows)
+    opportunities: List[Dict[str, Any]] = []
+    total_ir = 0.0
+
+    for start in range(0, total, CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        arrays = portfolio_arrays(chunk)
+        actuel = impot_revenu_vectorise(arrays["revenus"], arrays["parts"])
+        total_ir += float(actuel["impot_net"].sum())
+
+        economies = np.empty((len(scenarios), len(chunk)))
+        for i, scen in enumerate(scenarios):
+            res = simulate_tax_scenario_vectorise(
+                arrays["revenus"],
+                arrays["parts"],
+                per_versement=scen.get("per_versement", 0.0),
+                lmnp_revenus_brut=scen.get("lmnp_revenus_brut", 0.0),
+                pinel_investissement=scen.get("pinel_investissement", 0.0),
+            )
+            economies[i] = actuel["impot_net"] - res["ir_apres"]
+
+        best = economies.argmax(axis=0)
+        for j, row in enumerate(chunk):
+            opportunities.append({
+                "client_id": row.id,
+                "nom_client": row.nom_client,
+                "prenom_client": row.prenom_client,
+                "revenu_net_imposable": round(float(arrays["revenus"][j]), 2),
+                "nombre_parts": float(arrays["parts"][j]),
+                "ir_actuel": round(float(actuel["impot_net"][j]), 2),
+                "tmi": round(float(actuel["tmi"][j]) * 100, 2),
+                "meilleur_scenario": scenarios[best[j]]["label"],
+                "economie_max": round(float(economies[best[j], j]), 2),
+                "economies": {
+                    scen["label"]: round(float(economies[i, j]), 2) for i, scen in enumerate(scenarios)
+                },
+            })
+
+        if progress_callback:
+            progress_callback(min(start + CHUNK_SIZE, total), total)
+
+    opportunities.sort(key=lambda o: o["economie_max"], reverse=True)
+    return {
+        "nombre_clients": total,
+        "ir_total_portefeuille": round(total_ir, 2),
+        "economie_potentielle_totale": round(sum(o["economie_max"] for o in opportunities), 2),
+        "scenarios": [s["label"] for s in scenarios],
+        "opportunites": opportunities[:top] if top else opportunities,
+    }
+
+
+# -------------------------
+# Suivi des tâches en arrière-plan
+# -------------------------
+
+# État rangé dans le backend partagé (rate_counters) : le worker qui calcule et celui
+# qui reçoit le GET de suivi ne sont pas forcément les mêmes. Une tâche expire
+# JOB_TTL_SECONDS après sa dernière mise à jour.
+
+def _job_key(job_id: str) -> str:
+    return f"portfolio_job:{job_id}"
+
+
+def _new_job(owner_id: str, total: int) -> Dict[str, Any]:
+    return {
+        "job_id": uuid.uuid4().hex,
+        "owner_id": owner_id,
+        "status": "pending",
+        "processed": 0,
+        "total": total,
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+
+
+def create_job(owner_id: str, total: int) -> str:
+    job = _new_job(owner_id, total)
+    get_counter_backend().put_document(_job_key(job["job_id"]), job, JOB_TTL_SECONDS)
+    return job["job_id"]
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_counter_backend().get_document(_job_key(job_id))
+
+
+async def acreate_job(owner_id: str, total: int) -> Dict[str, Any]:
+    """Variante asynchrone de create_job ; renvoie la tâche créée."""
+    job = _new_job(owner_id, total)
+    await get_counter_backend().aput_document(_job_key(job["job_id"]), job, JOB_TTL_SECONDS)
+    return job
+
+
+async def aget_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return await get_counter_backend().aget_document(_job_key(job_id))
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    get_counter_backend().update_document(
+        _job_key(job_id), lambda job: {**job, **fields} if job else None, JOB_TTL_SECONDS)
+
+
+def run_portfolio_job(
+    job_id: str,
+    rows: Sequence[Any],
+    scenarios: Optional[List[Dict[str, Any]]] = None,
+    top: int = 50,
+) -> None:
+    """Point d'entrée exécuté par BackgroundTasks (thread du pool Starlette)."""
+    _update_job(job_id, status="running")
+    try:
+        result = analyze_portfolio(
+            rows,
+            scenarios=scenarios,
+            top=top,
+            progress_callback=lambda done, total: _update_job(job_id, processed=done),
+        )
+        _update_job(job_id, status="completed", processed=len(rows), result=result, finished_at=time.time())
+    except Exception as e:
+        print(f"[ERROR] Analyse de portefeuille {job_id} échouée: {e}")
+        _update_job(job_id, status="failed", error=str(e), finished_at=time.time())
@@ -0,0 +1,141 @@
+"""Export de l'ensemble des fiches clients d'un professionnel (CSV, Excel, ZIP de PDF).
+
+Les générateurs ci-dessous sont consommés par des StreamingResponse : les
+lignes sont lues par paquets via un curseur côté serveur et écrites au fil de
+l'eau, la mémoire reste donc constante quelle que soit la taille du portefeuille.
+Chaque générateur ouvre sa propre session (il s'exécute après la fin de la
+requête, dans le threadpool de Starlette).
+"""
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterator, List
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from models_pro import ClientProfile
+from pdf_render_service import iter_rendered_reports
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS: List[str] = [col.name for col in ClientProfile.__table__.columns]
+
+
+def _export_value(value: Any) -> Any:
+    """Convertit une valeur de colonne en valeur simple pour CSV / Excel."""
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        try:
+            return float(value)
+        except Exception:
+            return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _iter_client_rows(professional_user_id: str) -> Iterator[Any]:
+    """Lignes brutes de client_profiles, lues par paquets (curseur serveur)."""
+    db = SessionLocal()
+    try:
+        stmt = (
+            select(ClientProfile.__table__)
+            .where(ClientProfile.id_professionnel == professional_user_id)
+            .order_by(ClientProfile.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for row in db.execute(stmt):
+            yield row
+    finally:
+        db.close()
+
+
+def iter_portfolio_csv(professional_user_id: str) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in _iter_client_rows(professional_user_id):
+        mapping = row._mapping
+        writer.writerow([_export_value(mapping[col]) for col in EXPORT_COLUMNS])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_portfolio_excel(professional_user_id: str) -> Iterator[bytes]:
+    """Classeur openpyxl en mode write-only, sérialisé dans un fichier temporaire."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Clients")
+    sheet.append(EXPORT_COLUMNS)
+    for row in _iter_client_rows(professional_user_id):
+        mapping = row._mapping
+        sheet.append([_export_value(mapping[col]) for col in EXPORT_COLUMNS])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(EXPORT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Tampon non seekable : zipfile y écrit, le générateur le vide après chaque fichier."""
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._data.extend(b)
+        return len(b)
+
+    def pop(self) -> bytes:
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def iter_portfolio_pdf_zip(professional_user_id: str) -> Iterator[bytes]:
+    """ZIP contenant une fiche PDF par client, rendue à la volée dans le pool PDF."""
+    db = SessionLocal()
+    try:
+        clients = db.execute(
+            select(ClientProfile)
+            .where(ClientProfile.id_professionnel == professional_user_id)
+            .order_by(ClientProfile.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        ).scalars()
+        stream = _ZipStreamBuffer()
+        with zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for client, pdf_bytes in iter_rendered_reports("client", clients):
+                nom = re.sub(r"[^\w-]+", "_", f"{client.nom_client}_{client.prenom_client}")
+                archive.writestr(f"fiche_client_{client.id}_{nom}.pdf", pdf_bytes)
+                yield stream.pop()
+        yield stream.pop()
+    finally:
+        db.close()
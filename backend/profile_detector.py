@@ -14,12 +14,16 @@ from typing import Dict, List, Optional, Tuple
 from enum import Enum
 from dataclasses import dataclass
 from knowledge_base_multi_profiles import ProfileType, RegimeFiscal, ThemeFiscal
+from query_classifier import Classification, classify, register_vocabulary
 import logging
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Poids des mots-clés de profil selon leur niveau
+PROFILE_TIER_WEIGHTS = {"primary": 1.0, "secondary": 0.6, "context": 0.3}
+
 @dataclass
 class ProfileMatch:
     """Résultat de détection de profil"""
@@ -45,6 +49,36 @@ class ProfileDetector:
         self.semantic_indicators = self._build_semantic_indicators()
         self.business_size_indicators = self._build_business_size_indicators()
         self.intent_patterns = self._build_intent_patterns()
+        self._register_vocabularies()
+
+    def _register_vocabularies(self) -> None:
+        """Compile tous les vocabulaires du détecteur dans le classifieur partagé."""
+        for tier in PROFILE_TIER_WEIGHTS:
+            register_vocabulary(f"profile.keywords.{tier}", {
+                profile_type: patterns.get(tier, []) for profile_type, patterns in self.profile_patterns.items()
+            })
+        register_vocabulary("profile.regime", self.regime_patterns)
+        register_vocabulary("profile.theme", self.theme_patterns)
+        register_vocabulary("profile.context", {
+            (profile_type, context_type): indicators
+            for profile_type, contexts in self.context_patterns.items()
+            for context_type, indicators in contexts.items()
+        })
+        register_vocabulary("profile.semantic", {
+            (profile_type, i): [indicator["pattern"]]
+            for profile_type, indicators in self.semantic_indicators.items()
+            for i, indicator in enumerate(indicators)
+        })
+        register_vocabulary("profile.size", {
+            (profile_type, size_category): patterns
+            for profile_type, sizes in self.business_size_indicators.items()
+            for size_category, patterns in sizes.items()
+        })
+        register_vocabulary("profile.intent", {
+            (profile_type, intent_type): patterns
+            for profile_type, intents in self.intent_patterns.items()
+            for intent_type, patterns in intents.items()
+        })
     
     def detect_profile(self, question: str) -> List[ProfileMatch]:
         """
@@ -56,7 +90,8 @@ class ProfileDetector:
         Returns:
             Liste des profils détectés avec scores de confiance et raisonnement
         """
-        question_lower = question.lower()
+        # Une seule passe sur la question : toutes les occurrences, par catégorie
+        hits = classify(question)
         matches = []
         
         logger.info(f"🎯 Analyse sémantique de la question: {question[:100]}...")
@@ -64,16 +99,16 @@ class ProfileDetector:
         # Analyser chaque type de profil avec intelligence sémantique
         for profile_type, patterns in self.profile_patterns.items():
             # Score basique (mots-clés)
-            basic_score, keywords = self._calculate_profile_score(question_lower, patterns)
+            basic_score, keywords = self._calculate_profile_score(hits, profile_type, patterns)
             
             # Score contextuel avancé
-            context_score, semantic_indicators = self._calculate_semantic_score(question_lower, profile_type)
+            context_score, semantic_indicators = self._calculate_semantic_score(hits, profile_type)
             
             # Score de taille d'entreprise
-            size_score = self._calculate_business_size_score(question_lower, profile_type)
+            size_score = self._calculate_business_size_score(hits, profile_type)
             
             # Score d'intention métier
-            intent_score, intent_reasoning = self._calculate_intent_score(question_lower, profile_type)
+            intent_score, intent_reasoning = self._calculate_intent_score(hits, profile_type)
             
             # Score de confiance composite
             confidence_score = self._compute_composite_confidence(
@@ -85,9 +120,9 @@ class ProfileDetector:
             
             if confidence_score > threshold:
                 # Détecter le régime fiscal associé
-                regime = self._detect_regime(question_lower, profile_type)
+                regime = self._detect_regime(hits, profile_type)
                 # Détecter le thème fiscal
-                theme = self._detect_theme(question_lower)
+                theme = self._detect_theme(hits)
                 
                 # Générer le raisonnement
                 reasoning = self._generate_reasoning(
@@ -310,66 +345,35 @@ class ProfileDetector:
             ]
         }
     
-    def _calculate_profile_score(self, question: str, patterns: Dict[str, List[str]]) -> Tuple[float, List[str]]:
+    def _calculate_profile_score(self, hits: Classification, profile_type: ProfileType,
+                                 patterns: Dict[str, List[str]]) -> Tuple[float, List[str]]:
         """Calcule le score de correspondance pour un profil"""
         score = 0.0
         detected_keywords = []
         
-        # Mots-clés primaires (poids fort)
-        for keyword in patterns.get("primary", []):
-            if keyword in question:
-                score += 1.0
-                detected_keywords.append(keyword)
-        
-        # Mots-clés secondaires (poids moyen)
-        for keyword in patterns.get("secondary", []):
-            if keyword in question:
-                score += 0.6
-                detected_keywords.append(keyword)
-        
-        # Mots-clés contextuels (poids faible)
-        for keyword in patterns.get("context", []):
-            if keyword in question:
-                score += 0.3
+        # Mots-clés primaires (poids fort), secondaires (poids moyen), contextuels (poids faible)
+        for tier, weight in PROFILE_TIER_WEIGHTS.items():
+            for keyword in hits.matched(f"profile.keywords.{tier}", profile_type):
+                score += weight
                 detected_keywords.append(keyword)
         
         # Normaliser le score (0-1)
-        max_possible_score = len(patterns.get("primary", [])) * 1.0 + \
-                           len(patterns.get("secondary", [])) * 0.6 + \
-                           len(patterns.get("context", [])) * 0.3
+        max_possible_score = sum(len(patterns.get(tier, [])) * weight for tier, weight in PROFILE_TIER_WEIGHTS.items())
         
         if max_possible_score > 0:
             score = min(score / max_possible_score, 1.0)
         
         return score, detected_keywords
     
-    def _detect_regime(self, question: str, profile_type: ProfileType) -> Optional[RegimeFiscal]:
+    def _detect_regime(self, hits: Classification, profile_type: ProfileType) -> Optional[RegimeFiscal]:
         """Détecte le régime fiscal le plus probable"""
-        best_regime = None
-        best_score = 0
-        
-        for regime, keywords in self.regime_patterns.items():
-            score = sum(1 for keyword in keywords if keyword in question)
-            if score > best_score:
-                best_score = score
-                best_regime = regime
-        
-        return best_regime
+        return hits.best("profile.regime")
     
-    def _detect_theme(self, question: str) -> Optional[ThemeFiscal]:
+    def _detect_theme(self, hits: Classification) -> Optional[ThemeFiscal]:
         """Détecte le thème fiscal principal"""
-        best_theme = None
-        best_score = 0
-        
-        for theme, keywords in self.theme_patterns.items():
-            score = sum(1 for keyword in keywords if keyword in question)
-            if score > best_score:
-                best_score = score
-                best_theme = theme
-        
-        return best_theme
+        return hits.best("profile.theme")
 
-    def _calculate_semantic_score(self, question: str, profile_type: ProfileType) -> Tuple[float, List[str]]:
+    def _calculate_semantic_score(self, hits: Classification, profile_type: ProfileType) -> Tuple[float, List[str]]:
         """Calcul du score sémantique basé sur le contexte métier"""
         semantic_indicators = []
         score = 0.0
@@ -377,44 +381,39 @@ class ProfileDetector:
         # Analyse contextuelle selon le profil
         context_patterns = self.context_patterns.get(profile_type, {})
         
-        for context_type, indicators in context_patterns.items():
-            for indicator in indicators:
-                if indicator in question:
-                    score += self._get_context_weight(context_type)
-                    semantic_indicators.append(f"{context_type}:{indicator}")
+        for context_type in context_patterns:
+            for indicator in hits.matched("profile.context", (profile_type, context_type)):
+                score += self._get_context_weight(context_type)
+                semantic_indicators.append(f"{context_type}:{indicator}")
         
         # Analyse sémantique avancée
         semantic_patterns = self.semantic_indicators.get(profile_type, [])
-        for pattern in semantic_patterns:
-            if pattern["pattern"] in question:
+        for i, pattern in enumerate(semantic_patterns):
+            if hits.has("profile.semantic", (profile_type, i)):
                 score += pattern["weight"]
                 semantic_indicators.append(pattern["indicator"])
         
         return min(score, 1.0), semantic_indicators
     
-    def _calculate_business_size_score(self, question: str, profile_type: ProfileType) -> float:
+    def _calculate_business_size_score(self, hits: Classification, profile_type: ProfileType) -> float:
         """Score basé sur les indicateurs de taille d'entreprise"""
         size_indicators = self.business_size_indicators.get(profile_type, {})
         score = 0.0
         
-        for size_category, patterns in size_indicators.items():
-            for pattern in patterns:
-                if pattern in question:
-                    score += self._get_size_weight(size_category, profile_type)
+        for size_category in size_indicators:
+            for _ in hits.matched("profile.size", (profile_type, size_category)):
+                score += self._get_size_weight(size_category, profile_type)
         
         return min(score, 1.0)
     
-    def _calculate_intent_score(self, question: str, profile_type: ProfileType) -> Tuple[float, str]:
+    def _calculate_intent_score(self, hits: Classification, profile_type: ProfileType) -> Tuple[float, str]:
         """Score basé sur l'intention détectée dans la question"""
         intent_patterns = self.intent_patterns.get(profile_type, {})
         best_score = 0.0
         best_intent = "unknown"
         
-        for intent_type, patterns in intent_patterns.items():
-            intent_score = 0.0
-            for pattern in patterns:
-                if pattern in question:
-                    intent_score += 0.3
+        for intent_type in intent_patterns:
+            intent_score = 0.3 * len(hits.matched("profile.intent", (profile_type, intent_type)))
             
             if intent_score > best_score:
                 best_score = intent_score
@@ -0,0 +1,362 @@
+"""Assemblage du prompt sous budget de tokens (contexte RAG + historique).
+
+Les sources (articles du CGI, extraits BOFiP, connaissances spécialisées…)
+étaient concaténées sans limite globale : quelques articles de plusieurs
+dizaines de kilo-octets suffisaient à envoyer des prompts énormes. Ici :
+
+1. le budget dépend du modèle (PROMPT_TOKEN_BUDGET pour le forcer) ; le
+   prompt système, la question et le contexte utilisateur sont comptés
+   d'abord ;
+2. l'historique reçoit au plus HISTORY_SHARE du reste : les derniers
+   messages sont gardés tels quels, les plus anciens résumés en une ligne ;
+3. les sources en double ou qui se recouvrent sont retirées, puis le budget
+   restant est réparti équitablement entre elles. Une source trop longue
+   est réduite à ses paragraphes les plus proches de la question, une
+   source qui n'obtiendrait presque rien est écartée (la moins prioritaire
+   d'abord).
+
+L'estimation des tokens est la même approximation prudente que
+embedding_pipeline (3 caractères par token). Chaque prompt construit
+alimente l'histogramme `fiscal_prompt_tokens` de /metrics.
+"""
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tracing import registry
+
+CHARS_PER_TOKEN = 3
+MODEL_PROMPT_BUDGETS = {
+    "mistral-large-latest": 6000,
+    "mistral-small-latest": 4000,
+    "llama3-8b-8192": 3000,
+    "local": 2500,
+}
+DEFAULT_PROMPT_BUDGET = 4000
+HISTORY_SHARE = 0.15
+MIN_SOURCE_TOKENS = 120  # en dessous, une source n'apporte plus rien d'exploitable
+SHINGLE_SIZE = 5
+DUPLICATE_OVERLAP = 0.6
+TEMPLATE_OVERHEAD_TOKENS = 60  # consignes et séparateurs du gabarit final
+
+PROMPT_TOKENS = registry.histogram(
+    "fiscal_prompt_tokens", "Tokens estimés du prompt envoyé au LLM, par partie", ("model", "part"),
+    buckets=(100, 250, 500, 1000, 2000, 4000, 6000, 8000, 16000, 32000))
+
+_STOPWORDS = {
+    "avec", "dans", "pour", "plus", "sont", "cette", "ces", "quel", "quelle", "quels", "quelles", "comment",
+    "est-ce", "vous", "nous", "leur", "leurs", "mais", "donc", "elle", "elles", "ils", "une", "des", "les",
+    "aux", "par", "sur", "pas", "que", "qui", "quoi", "dont", "tout", "tous", "toute", "avoir", "etre",
+    "faire", "peut", "puis", "entre", "sans", "sous", "chez", "mon", "mes", "son", "ses", "votre", "vos",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+def prompt_budget_for(model: str) -> int:
+    forced = os.getenv("PROMPT_TOKEN_BUDGET")
+    if forced:
+        return int(forced)
+    return MODEL_PROMPT_BUDGETS.get(model, DEFAULT_PROMPT_BUDGET)
+
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def query_terms(query: str, keywords: Sequence[str] = ()) -> List[str]:
+    """Mots significatifs de la question (sans accents ni mots outils) et mots-clés du sujet."""
+    words = [w for w in re.findall(r"[\w-]+", _normalize(query)) if len(w) > 3 and w not in _STOPWORDS]
+    words.extend(_normalize(k) for k in keywords if k)
+    return list(dict.fromkeys(words))
+
+
+# -------------------------
+# Sources
+# -------------------------
+
+@dataclass
+class ContextChunk:
+    source: str
+    text: str
+
+    def render(self, text: Optional[str] = None) -> str:
+        return f"{self.source}:\n{self.text if text is None else text}\n\n"
+
+
+@dataclass
+class _Section:
+    title: str
+    chunks: List[ContextChunk]
+
+    @property
+    def header(self) -> str:
+        return f"=== {self.title} ===\n\n"
+
+    footer = "=" * 60 + "\n\n"
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", _normalize(text))
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def dedupe_chunks(chunks: Sequence[ContextChunk], threshold: float = DUPLICATE_OVERLAP) -> Tuple[List[ContextChunk], List[str]]:
+    """Retire (en gardant le premier, donc le plus prioritaire) les doublons et les textes qui se recouvrent."""
+    kept: List[Tuple[ContextChunk, set]] = []
+    dropped = []
+    seen_sources = set()
+    for chunk in chunks:
+        shingles = _shingles(chunk.text)
+        duplicate = chunk.source in seen_sources or not shingles
+        for _, other in kept:
+            if duplicate:
+                break
+            duplicate = len(shingles & other) / min(len(shingles), len(other)) >= threshold
+        if duplicate:
+            dropped.append(chunk.source)
+            continue
+        seen_sources.add(chunk.source)
+        kept.append((chunk, shingles))
+    return [chunk for chunk, _ in kept], dropped
+
+
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+")
+
+
+def relevant_excerpt(text: str, terms: Sequence[str], max_tokens: int) -> str:
+    """Texte réduit à ses paragraphes les plus proches de la question, dans l'ordre d'origine."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    pieces: List[str] = []
+    for paragraph in (p.strip() for p in text.split("\n")):
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars // 2:
+            pieces.extend(s for s in _SENTENCE_RE.split(paragraph) if s.strip())
+        else:
+            pieces.append(paragraph)
+
+    def score(index: int) -> float:
+        normalized = _normalize(pieces[index])
+        hits = sum(normalized.count(term) for term in terms)
+        # Le titre (« Article 200 A », premier alinéa court) situe le reste de l'extrait
+        return hits + (0.5 if index == 0 and len(pieces[0]) < 300 else 0.0)
+
+    ranked = sorted(range(len(pieces)), key=lambda i: (-score(i), i))
+    selected = []
+    size = 0
+    for index in ranked:
+        cost = len(pieces[index]) + 6  # séparateur « […] » éventuel
+        if size + cost <= max_chars:
+            selected.append(index)
+            size += cost
+    if not selected:
+        best = pieces[ranked[0]]
+        return best[:max_chars - 1] + "…"
+    selected.sort()
+    out = []
+    for position, index in enumerate(selected):
+        if position and index != selected[position - 1] + 1:
+            out.append("[…]")
+        out.append(pieces[index])
+    if selected[-1] != len(pieces) - 1:
+        out.append("[…]")
+    return "\n".join(out)
+
+
+def _allocate(sizes: Sequence[int], total: int) -> List[int]:
+    """Répartition équitable (« remplissage par le bas ») : les courts gardent tout, les longs se partagent le reste."""
+    allocation = [0] * len(sizes)
+    remaining = total
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        smallest = pending[0]
+        if sizes[smallest] > share:
+            for index in pending:
+                allocation[index] = share
+            break
+        allocation[smallest] = sizes[smallest]
+        remaining -= sizes[smallest]
+        pending.pop(0)
+    return allocation
+
+
+# -------------------------
+# Historique
+# -------------------------
+
+_ROLE_LABELS = {"user": "Utilisateur", "assistant": "Francis"}
+
+
+def compress_history(history: Optional[Sequence[Dict]], max_tokens: int, keep_last: int = 2) -> Tuple[str, List[Dict]]:
+    """(résumé des anciens échanges, derniers messages tronqués) tenant dans `max_tokens`."""
+    messages = [m for m in (history or []) if m.get("role") and m.get("content")]
+    if not messages or max_tokens <= 0:
+        return "", []
+    recent, older = messages[-keep_last:], messages[:-keep_last]
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    recent_chars = int(max_chars * (0.6 if older else 1.0)) // len(recent)
+    recent = [{"role": m["role"], "content": m["content"][:recent_chars]} for m in recent]
+
+    summary_budget = max_chars - sum(len(m["content"]) for m in recent)
+    lines: List[str] = []
+    for message in reversed(older):  # les plus récents d'abord : ce sont les derniers à sacrifier
+        first_sentence = _SENTENCE_RE.split(message["content"].strip(), 1)[0][:160]
+        line = f"- {_ROLE_LABELS.get(message['role'], message['role'])} : {first_sentence}"
+        if len(line) + 1 > summary_budget:
+            break
+        lines.insert(0, line)
+        summary_budget -= len(line) + 1
+    summary = "Échanges précédents (résumé) :\n" + "\n".join(lines) if lines else ""
+    return summary, recent
+
+
+def render_history(summary: str, recent: Sequence[Dict]) -> str:
+    lines = [summary] if summary else []
+    lines.extend(f"{m['role'].upper()}: {m['content']}" for m in recent)
+    return "\n".join(lines)
+
+
+# -------------------------
+# Assemblage
+# -------------------------
+
+@dataclass
+class PromptUsage:
+    model: str
+    budget: int
+    parts: Dict[str, int] = field(default_factory=dict)
+    kept_sources: List[str] = field(default_factory=list)
+    excerpted_sources: List[str] = field(default_factory=list)
+    dropped_sources: List[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return sum(self.parts.values())
+
+    def as_dict(self) -> Dict:
+        return {"model": self.model, "budget": self.budget, "total": self.total, "parts": dict(self.parts),
+                "kept_sources": list(self.kept_sources), "excerpted_sources": list(self.excerpted_sources),
+                "dropped_sources": list(self.dropped_sources)}
+
+    def describe(self) -> str:
+        details = ", ".join(f"{name} {tokens}" for name, tokens in self.parts.items())
+        text = f"{self.total}/{self.budget} tokens ({details})"
+        if self.excerpted_sources:
+            text += f", extraits : {len(self.excerpted_sources)}"
+        if self.dropped_sources:
+            text += f", écartées : {len(self.dropped_sources)}"
+        return text
+
+
+@dataclass
+class BuiltPrompt:
+    context: str
+    history_summary: str
+    recent_history: List[Dict]
+    usage: PromptUsage
+
+    @property
+    def history_text(self) -> str:
+        return render_history(self.history_summary, self.recent_history)
+
+
+class PromptBuilder:
+    """Collecte les sources et l'historique puis les ajuste au budget du modèle dans `build`."""
+
+    def __init__(self, query: str, model: str = "mistral-large-latest", budget: Optional[int] = None,
+                 keywords: Sequence[str] = ()):
+        self.query = query
+        self.model = model
+        self.budget = budget if budget is not None else prompt_budget_for(model)
+        self.terms = query_terms(query, keywords)
+        self._sections: List[_Section] = []
+        self._history: List[Dict] = []
+        self._keep_last = 2
+
+    def add_section(self, title: str, chunks: Iterable[ContextChunk]) -> None:
+        chunks = [c for c in chunks if c.text and c.text.strip()]
+        if chunks:
+            self._sections.append(_Section(title, chunks))
+
+    def add_source(self, title: str, source: str, text: str) -> None:
+        """Ajoute une source à la section `title` (créée au besoin, à la suite des autres)."""
+        for section in self._sections:
+            if section.title == title:
+                if text and text.strip():
+                    section.chunks.append(ContextChunk(source, text))
+                return
+        self.add_section(title, [ContextChunk(source, text)])
+
+    def has_context(self) -> bool:
+        return bool(self._sections)
+
+    def set_history(self, history: Optional[Sequence[Dict]], keep_last: int = 2) -> None:
+        self._history = list(history or [])
+        self._keep_last = keep_last
+
+    def build(self, *fixed_parts: str) -> BuiltPrompt:
+        """`fixed_parts` : textes toujours envoyés en entier (prompt système, contexte utilisateur…)."""
+        usage = PromptUsage(model=self.model, budget=self.budget)
+        usage.parts["system"] = sum(estimate_tokens(part) for part in fixed_parts) + TEMPLATE_OVERHEAD_TOKENS
+        usage.parts["question"] = estimate_tokens(self.query)
+        available = max(0, self.budget - usage.parts["system"] - usage.parts["question"])
+
+        history_tokens = sum(estimate_tokens(m.get("content") or "") for m in self._history)
+        summary, recent = compress_history(self._history, min(history_tokens, int(available * HISTORY_SHARE)),
+                                           self._keep_last)
+        usage.parts["history"] = estimate_tokens(render_history(summary, recent))
+
+        context = self._fit_context(available - usage.parts["history"], usage)
+        usage.parts["context"] = estimate_tokens(context)
+        for part, tokens in usage.parts.items():
+            PROMPT_TOKENS.observe(tokens, model=self.model, part=part)
+        PROMPT_TOKENS.observe(usage.total, model=self.model, part="total")
+        return BuiltPrompt(context=context, history_summary=summary, recent_history=recent, usage=usage)
+
+    def _fit_context(self, budget: int, usage: PromptUsage) -> str:
+        chunks, dropped = dedupe_chunks([c for s in self._sections for c in s.chunks])
+        usage.dropped_sources.extend(dropped)
+        kept_ids = {id(c) for c in chunks}
+        sections = [_Section(s.title, [c for c in s.chunks if id(c) in kept_ids]) for s in self._sections]
+        sections = [s for s in sections if s.chunks]
+
+        while chunks:
+            overhead = sum(estimate_tokens(s.header + s.footer) for s in sections)
+            sizes = [estimate_tokens(c.render()) for c in chunks]
+            allocation = _allocate(sizes, max(0, budget - overhead))
+            if all(tokens >= min(MIN_SOURCE_TOKENS, size) for tokens, size in zip(allocation, sizes)):
+                break
+            # Budget trop juste : on écarte la source la moins prioritaire et on recommence
+            lowest = chunks.pop()
+            usage.dropped_sources.append(lowest.source)
+            sections = [_Section(s.title, [c for c in s.chunks if c is not lowest]) for s in sections]
+            sections = [s for s in sections if s.chunks]
+        if not chunks:
+            return ""
+
+        allotted = {id(c): tokens for c, tokens in zip(chunks, allocation)}
+        parts = []
+        for section in sections:
+            parts.append(section.header)
+            for chunk in section.chunks:
+                tokens = allotted[id(chunk)]
+                text = chunk.text
+                if estimate_tokens(chunk.render()) > tokens:
+                    label_tokens = estimate_tokens(f"{chunk.source}:\n\n\n")
+                    text = relevant_excerpt(chunk.text, self.terms, max(1, tokens - label_tokens))
+                    usage.excerpted_sources.append(chunk.source)
+                parts.append(chunk.render(text))
+                usage.kept_sources.append(chunk.source)
+            parts.append(section.footer)
+        return "".join(parts)
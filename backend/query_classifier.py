@@ -0,0 +1,245 @@
+"""Classification des questions par un automate multi-motifs partagé.
+
+Les vocabulaires des modules (profils, régimes, thèmes, juridictions, sujets
+CGI…) sont enregistrés par espace de noms puis compilés une seule fois en un
+automate d'Aho–Corasick. Une question est classée en une seule passe sur son
+texte en minuscules : chaque occurrence est rapportée avec toutes ses
+catégories, et le résultat est mis en cache pour les autres modules qui
+classent la même question.
+
+La sémantique des boucles d'origine est conservée : un mot-clé correspond
+dès qu'il apparaît comme sous-chaîne. Les motifs regex de la forme « a.*b »
+sont ramenés à une suite de fragments littéraux vérifiée sur les positions
+trouvées par l'automate ; les autres motifs regex sont évalués par re.search.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Hashable, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from tracing import traced
+
+CLASSIFICATION_CACHE_SIZE = 512
+
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+
+@dataclass(frozen=True)
+class Hit:
+    """Occurrence d'un mot-clé dans le texte : text[start:end] == keyword."""
+
+    start: int
+    end: int
+    keyword: str
+
+
+class AhoCorasick:
+    """Automate d'Aho–Corasick sur un ensemble de chaînes littérales."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = list(dict.fromkeys(k for k in keywords if k))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+
+        # Liens d'échec en largeur ; les sorties héritent de celles du plus long suffixe
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_hits(self, text: str) -> Iterator[Hit]:
+        """Toutes les occurrences (y compris imbriquées ou chevauchantes), en une passe."""
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in out[state]:
+                keyword = keywords[index]
+                yield Hit(position + 1 - len(keyword), position + 1, keyword)
+
+
+def _literal_fragments(pattern: str) -> Optional[List[str]]:
+    """Fragments d'un motif « a.*b.*c » ; None si le motif n'est pas de cette forme."""
+    fragments = pattern.split(".*")
+    if any(not fragment or _REGEX_META & set(fragment) for fragment in fragments):
+        return None
+    return fragments
+
+
+Label = Tuple[str, Hashable, int, str]  # (espace de noms, catégorie, rang dans le vocabulaire, motif)
+
+
+class Classification:
+    """Résultat d'une classification : occurrences et catégories touchées par espace de noms."""
+
+    def __init__(self, text: str, hits: List[Hit], matched: Dict[str, Dict[Hashable, List[Tuple[int, str]]]]):
+        self.text = text
+        self.hits = hits
+        self.keywords: FrozenSet[str] = frozenset(hit.keyword for hit in hits)
+        self._matched = matched
+
+    def categories(self, namespace: str) -> Dict[Hashable, List[str]]:
+        """Catégories touchées → motifs correspondants, dans l'ordre des vocabulaires."""
+        return {category: [pattern for _, pattern in entries]
+                for category, entries in self._matched.get(namespace, {}).items()}
+
+    def matched(self, namespace: str, category: Hashable) -> List[str]:
+        return [pattern for _, pattern in self._matched.get(namespace, {}).get(category, ())]
+
+    def has(self, namespace: str, category: Optional[Hashable] = None) -> bool:
+        entries = self._matched.get(namespace, {})
+        return bool(entries) if category is None else category in entries
+
+    def first(self, namespace: str) -> Optional[Hashable]:
+        """Première catégorie touchée dans l'ordre du vocabulaire."""
+        return next(iter(self._matched.get(namespace, {})), None)
+
+    def best(self, namespace: str) -> Optional[Hashable]:
+        """Catégorie ayant le plus de motifs correspondants (la première en cas d'égalité)."""
+        best, best_count = None, 0
+        for category, entries in self._matched.get(namespace, {}).items():
+            if len(entries) > best_count:
+                best, best_count = category, len(entries)
+        return best
+
+
+class _Compiled:
+    def __init__(self, vocabularies: Dict[str, Tuple[Dict[Hashable, List[str]], bool]]):
+        self.category_order: Dict[str, Dict[Hashable, int]] = {}
+        self.literals: Dict[str, List[Label]] = defaultdict(list)
+        self.sequences: List[Tuple[List[str], Label]] = []
+        self.regexes: List[Tuple[re.Pattern, Label]] = []
+        for namespace, (vocabulary, regex) in vocabularies.items():
+            self.category_order[namespace] = {category: i for i, category in enumerate(vocabulary)}
+            for category, patterns in vocabulary.items():
+                for rank, pattern in enumerate(patterns):
+                    label = (namespace, category, rank, pattern)
+                    fragments = _literal_fragments(pattern) if regex else [pattern]
+                    if fragments is None:
+                        self.regexes.append((re.compile(pattern), label))
+                    elif len(fragments) == 1:
+                        self.literals[fragments[0]].append(label)
+                    else:
+                        self.sequences.append((fragments, label))
+        keywords = list(self.literals) + [f for fragments, _ in self.sequences for f in fragments]
+        self.automaton = AhoCorasick(keywords)
+
+    def classify(self, text: str) -> Classification:
+        hits = list(self.automaton.iter_hits(text))
+        labels: List[Label] = []
+        starts: Dict[str, List[int]] = defaultdict(list)
+        for hit in hits:
+            starts[hit.keyword].append(hit.start)
+        for keyword in starts:
+            labels.extend(self.literals.get(keyword, ()))
+        for fragments, label in self.sequences:
+            if _sequence_matches(text, fragments, starts):
+                labels.append(label)
+        for regex, label in self.regexes:
+            if regex.search(text):
+                labels.append(label)
+
+        grouped: Dict[str, Dict[Hashable, List[Tuple[int, str]]]] = {}
+        for namespace, category, rank, pattern in labels:
+            grouped.setdefault(namespace, {}).setdefault(category, []).append((rank, pattern))
+        matched: Dict[str, Dict[Hashable, List[Tuple[int, str]]]] = {}
+        for namespace, categories in grouped.items():
+            order = self.category_order[namespace]
+            matched[namespace] = {
+                category: sorted(entries)
+                for category, entries in sorted(categories.items(), key=lambda item: order[item[0]])
+            }
+        return Classification(text, hits, matched)
+
+
+def _sequence_matches(text: str, fragments: List[str], starts: Dict[str, List[int]]) -> bool:
+    """Équivalent de re.search("f1.*f2…") : fragments dans l'ordre, sur une même ligne."""
+    if any(fragment not in starts for fragment in fragments):
+        return False
+    for first_start in starts[fragments[0]]:
+        cursor = first_start + len(fragments[0])
+        for fragment in fragments[1:]:
+            positions = starts[fragment]
+            i = bisect_left(positions, cursor)
+            if i == len(positions):
+                return False  # aucun départ plus tardif ne fera mieux
+            cursor = positions[i] + len(fragment)
+        if "\n" not in text[first_start:cursor]:
+            return True
+    return False
+
+
+class QueryClassifier:
+    """Registre de vocabulaires compilés en un seul automate, recompilé à la demande."""
+
+    def __init__(self, cache_size: int = CLASSIFICATION_CACHE_SIZE):
+        self._vocabularies: Dict[str, Tuple[Dict[Hashable, List[str]], bool]] = {}
+        self._compiled: Optional[_Compiled] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Classification]" = OrderedDict()
+        self._cache_size = cache_size
+
+    def register(self, namespace: str, vocabulary: Mapping[Hashable, Iterable[str]], regex: bool = False) -> None:
+        """Enregistre (ou remplace) le vocabulaire d'un espace de noms : catégorie → motifs.
+
+        `regex` : les motifs sont des expressions régulières (évaluées comme re.search).
+        """
+        entry = ({category: list(patterns) for category, patterns in vocabulary.items()}, regex)
+        with self._lock:
+            if self._vocabularies.get(namespace) == entry:
+                return
+            self._vocabularies[namespace] = entry
+            self._compiled = None
+            self._cache.clear()
+
+    def classify(self, text: str) -> Classification:
+        text = text.lower()
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+            if self._compiled is None:
+                self._compiled = _Compiled(dict(self._vocabularies))
+            compiled = self._compiled
+        result = compiled.classify(text)
+        with self._lock:
+            if self._compiled is compiled:
+                self._cache[text] = result
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+
+query_classifier = QueryClassifier()
+
+
+def register_vocabulary(namespace: str, vocabulary: Mapping[Hashable, Iterable[str]], regex: bool = False) -> None:
+    query_classifier.register(namespace, vocabulary, regex=regex)
+
+
+@traced("classification")
+def classify(text: str) -> Classification:
+    return query_classifier.classify(text)
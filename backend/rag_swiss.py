@@ -12,10 +12,36 @@ from pathlib import Path
 from mistralai.client import MistralClient
 from mistralai.models.chat_completion import ChatMessage
 
+from corpus_extraction import CORPUS_FILES, iter_corpus
+from packed_embeddings import load_corpus_bundle, load_embedding_matrix
+from query_classifier import classify, register_vocabulary
+from tracing import traced
+from ttl_cache import TTLCache
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Mots-clés d'une question relevant (au moins en partie) de la fiscalité suisse
+SWISS_RAG_KEYWORDS = [
+    'suisse', 'swiss', 'canton', 'cantonal', 'communal',
+    'pilier 3a', 'lpp', 'avs', 'ai', 'afc', 'chf',
+    'genève', 'zurich', 'vaud', 'valais', 'berne',
+    'fédéral', 'confédération', 'impôt à la source',
+    'prévoyance', 'cotisations sociales', 'frontalier',
+    # Mots-clés internationaux
+    'traités', 'accord fiscal', 'double imposition',
+    'frontaliers', 'résident', 'non domicilié',
+    'holding', 'société domiciliaire', 'imposition forfaitaire',
+    'france', 'allemagne', 'italie', 'autriche', 'états-unis',
+    'royaume-uni', 'fatca', 'crédit d\'impôt',
+    # Situations complexes
+    'optimisation', 'planification', 'succession',
+    'donation', 'plus-value', 'fortune', 'patrimoine',
+    'international', 'multinational', 'expatrié'
+]
+register_vocabulary("jurisdiction.swiss_rag", {"CH": SWISS_RAG_KEYWORDS})
+
 class SwissRAGSystem:
     """Système RAG spécialisé pour la fiscalité suisse"""
     
@@ -25,9 +51,13 @@ class SwissRAGSystem:
         self.embedding_model = "mistral-embed"
         self.chat_model = "mistral-large-latest"
         
-        # Cache pour les chunks et embeddings
+        # Base de connaissances chargée en entier : corpus fixe, borné par les fichiers
+        # chargés, sans éviction possible (la recherche parcourt tous les embeddings)
         self.chunks_cache = {}
         self.embeddings_cache = {}
+        # Embeddings des requêtes déjà posées : évite un appel API par question répétée
+        self.query_embeddings = TTLCache("swiss_query_embeddings", max_entries=512, ttl=24 * 3600,
+                                         max_bytes=4 * 1024 * 1024)
         
         # Charger la base de connaissances
         self.load_swiss_knowledge_base()
@@ -38,37 +68,50 @@ class SwissRAGSystem:
             chunks_dir = Path("data/swiss_chunks_text")
             embeddings_dir = Path("data/swiss_embeddings")
             
-            if not chunks_dir.exists():
+            corpus_path = Path(CORPUS_FILES["swiss"])
+            bundle = load_corpus_bundle(embeddings_dir)
+            if bundle is not None:
+                # Bundle : textes et embeddings dans un seul fichier
+                for record in bundle.iter_records():
+                    self.chunks_cache[record["id"]] = record["text"]
+            elif corpus_path.exists():
+                # Corpus JSONL unique produit par extract_swiss_tax_docs
+                for record in iter_corpus(corpus_path):
+                    self.chunks_cache[record["id"]] = record["text"]
+            elif not chunks_dir.exists():
                 logger.warning("Répertoire des chunks suisses non trouvé")
                 return
-            
-            # Charger les chunks de texte
-            chunk_files = sorted(chunks_dir.glob("swiss_chunk_*.txt"))
-            for chunk_file in chunk_files:
-                chunk_id = chunk_file.stem
-                with open(chunk_file, 'r', encoding='utf-8') as f:
-                    self.chunks_cache[chunk_id] = f.read()
+            else:
+                # Charger les chunks de texte
+                chunk_files = sorted(chunks_dir.glob("swiss_chunk_*.txt"))
+                for chunk_file in chunk_files:
+                    chunk_id = chunk_file.stem
+                    with open(chunk_file, 'r', encoding='utf-8') as f:
+                        self.chunks_cache[chunk_id] = f.read()
             
             # Charger les embeddings
             if embeddings_dir.exists():
-                embedding_files = sorted(embeddings_dir.glob("swiss_chunk_*.npy"))
-                for embedding_file in embedding_files:
-                    chunk_id = embedding_file.stem
-                    self.embeddings_cache[chunk_id] = np.load(embedding_file)
+                ids, matrix = load_embedding_matrix(embeddings_dir, "swiss_chunk_*.npy")
+                self.embeddings_cache = dict(zip(ids, matrix))
             
             logger.info(f"Base de connaissances suisse chargée: {len(self.chunks_cache)} chunks, {len(self.embeddings_cache)} embeddings")
             
         except Exception as e:
             logger.error(f"Erreur lors du chargement de la base de connaissances: {e}")
     
+    @traced("query_embedding")
     def generate_query_embedding(self, query: str) -> np.ndarray:
         """Génère l'embedding d'une requête"""
-        try:
+        def embed() -> np.ndarray:
             response = self.client.embeddings(
                 model=self.embedding_model,
                 input=query
             )
             return np.array(response.data[0].embedding)
+
+        try:
+            # Les échecs ne sont pas mis en cache : la question suivante retente l'API
+            return self.query_embeddings.get_or_compute(query.strip(), embed)
         except Exception as e:
             logger.error(f"Erreur lors de la génération d'embedding: {e}")
             return np.zeros(1024)  # Embedding par défaut
@@ -91,6 +134,7 @@ class SwissRAGSystem:
             logger.error(f"Erreur lors du calcul de similarité: {e}")
             return 0.0
     
+    @traced("swiss_scan")
     def search_relevant_chunks(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
         """Recherche les chunks les plus pertinents pour une requête"""
         try:
@@ -125,6 +169,7 @@ class SwissRAGSystem:
         
         return "\n\n---\n\n".join(context_parts)
     
+    @traced("llm_total")
     def generate_swiss_fiscal_response(self, query: str, context: str) -> str:
         """Génère une réponse fiscale suisse basée sur le contexte"""
         try:
@@ -235,26 +280,7 @@ Réponds de manière précise et professionnelle en te basant sur ce contexte.""
     
     def is_swiss_fiscal_question(self, query: str) -> bool:
         """Détermine si une question concerne la fiscalité suisse"""
-        swiss_keywords = [
-            'suisse', 'swiss', 'canton', 'cantonal', 'communal',
-            'pilier 3a', 'lpp', 'avs', 'ai', 'afc', 'chf',
-            'genève', 'zurich', 'vaud', 'valais', 'berne',
-            'fédéral', 'confédération', 'impôt à la source',
-            'prévoyance', 'cotisations sociales', 'frontalier',
-            # Mots-clés internationaux
-            'traités', 'accord fiscal', 'double imposition',
-            'frontaliers', 'résident', 'non domicilié',
-            'holding', 'société domiciliaire', 'imposition forfaitaire',
-            'france', 'allemagne', 'italie', 'autriche', 'états-unis',
-            'royaume-uni', 'fatca', 'crédit d\'impôt',
-            # Situations complexes
-            'optimisation', 'planification', 'succession',
-            'donation', 'plus-value', 'fortune', 'patrimoine',
-            'international', 'multinational', 'expatrié'
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in swiss_keywords)
+        return classify(query).has("jurisdiction.swiss_rag")
     
     def get_swiss_tax_suggestions(self, income_range: str = None) -> List[str]:
         """Retourne des suggestions d'optimisation fiscale suisse"""
@@ -0,0 +1,498 @@
+"""Compteurs partagés pour la limitation de débit et les quotas mensuels.
+
+Les mêmes backends rangent aussi de petits documents JSON à expiration
+(tâches d'analyse, sessions de conversation ou de réunion) : l'état qu'une
+requête suivante peut lire depuis n'importe quel worker.
+
+Trois implémentations de la même interface :
+- InMemoryCounterBackend : fenêtres glissantes par seaux (O(1) amorti) et
+  éviction par TTL, pour un seul processus ;
+- SQLiteCounterBackend : fichier SQLite partagé par tous les workers d'une
+  même machine (transactions BEGIN IMMEDIATE) ;
+- RedisCounterBackend : tout serveur compatible Redis, partagé entre instances.
+
+Le backend est choisi par RATE_LIMIT_BACKEND (memory | sqlite | redis). Par
+défaut, SQLite dès que plusieurs workers tournent (WEB_CONCURRENCY > 1, voir
+start.sh) : un compteur en mémoire serait propre à chaque worker et un
+particulier obtiendrait son quota mensuel une fois par worker.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND") or ("sqlite" if WEB_CONCURRENCY > 1 else "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/francis_rate_limits.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Nombre de seaux par fenêtre glissante (précision ~ fenêtre / N)
+WINDOW_BUCKETS = 10
+# Durée de conservation d'un quota mensuel après le dernier accès
+QUOTA_TTL_SECONDS = 40 * 24 * 3600
+
+
+def current_period() -> str:
+    """Période de quota courante (mois UTC), ex. '2025-06'."""
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def next_period_start(period: str) -> str:
+    """Début (ISO, UTC) de la période qui suit `period`, ex. '2025-06' -> '2025-07-01T00:00:00+00:00'."""
+    year, month = (int(part) for part in period.split("-"))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return datetime(year, month, 1, tzinfo=timezone.utc).isoformat()
+
+
+class CounterBackend:
+    """Interface commune. Les méthodes sont synchrones et atomiques."""
+
+    # True si les opérations font des E/S (à exécuter hors de la boucle d'évènements)
+    blocking = False
+
+    def hit_sliding_window(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        """Enregistre un appel et retourne (autorisé, nombre d'appels dans la fenêtre)."""
+        raise NotImplementedError
+
+    def consume_quota(self, key: str, period: str, limit: int) -> Tuple[bool, int]:
+        """Incrémente le quota si count < limit. Retourne (autorisé, count après l'opération)."""
+        raise NotImplementedError
+
+    def refund_quota(self, key: str, period: str) -> None:
+        """Annule une consommation (requête échouée après consume_quota)."""
+        raise NotImplementedError
+
+    def get_quota(self, key: str, period: str) -> Optional[int]:
+        """Valeur du compteur, ou None s'il n'a jamais été initialisé pour cette période."""
+        raise NotImplementedError
+
+    def seed_quota(self, key: str, period: str, value: int) -> None:
+        """Initialise le compteur (depuis la base) s'il n'existe pas encore."""
+        raise NotImplementedError
+
+    def get_document(self, key: str) -> Optional[Dict[str, Any]]:
+        """Document `key` s'il existe et n'a pas expiré."""
+        raise NotImplementedError
+
+    def put_document(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        """Écrit (ou remplace) le document, qui expire `ttl` secondes plus tard."""
+        raise NotImplementedError
+
+    def update_document(self, key: str, update: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]],
+                        ttl: float) -> Optional[Dict[str, Any]]:
+        """Lecture-modification-écriture atomique : `update(actuel)` renvoie le nouveau document,
+        ou None pour ne rien écrire. Retourne le document tel qu'il est rangé après l'opération.
+        `update` doit être rapide et ne pas rappeler le backend."""
+        raise NotImplementedError
+
+    def delete_document(self, key: str) -> bool:
+        raise NotImplementedError
+
+    # Variantes asynchrones : les backends bloquants passent par un thread
+    async def _call(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def ahit_sliding_window(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        return await self._call(self.hit_sliding_window, key, limit, window_seconds)
+
+    async def aconsume_quota(self, key: str, period: str, limit: int) -> Tuple[bool, int]:
+        return await self._call(self.consume_quota, key, period, limit)
+
+    async def arefund_quota(self, key: str, period: str) -> None:
+        await self._call(self.refund_quota, key, period)
+
+    async def aget_quota(self, key: str, period: str) -> Optional[int]:
+        return await self._call(self.get_quota, key, period)
+
+    async def aseed_quota(self, key: str, period: str, value: int) -> None:
+        await self._call(self.seed_quota, key, period, value)
+
+    async def aget_document(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.get_document, key)
+
+    async def aput_document(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        await self._call(self.put_document, key, value, ttl)
+
+    async def aupdate_document(self, key: str, update, ttl: float) -> Optional[Dict[str, Any]]:
+        return await self._call(self.update_document, key, update, ttl)
+
+    async def adelete_document(self, key: str) -> bool:
+        return await self._call(self.delete_document, key)
+
+
+# -------------------------
+# Mémoire (un processus)
+# -------------------------
+
+class _Window:
+    __slots__ = ("buckets", "total", "expires_at")
+
+    def __init__(self):
+        self.buckets = deque()  # [(id_seau, compte)]
+        self.total = 0
+        self.expires_at = 0.0
+
+
+class InMemoryCounterBackend(CounterBackend):
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._quotas: "OrderedDict[Tuple[str, str], list]" = OrderedDict()  # -> [count, expires_at]
+        self._documents: "OrderedDict[str, list]" = OrderedDict()  # -> [expires_at, JSON]
+        self._lock = threading.Lock()
+
+    def _evict(self, store: OrderedDict, now: float, expires_of) -> None:
+        while store:
+            key, value = next(iter(store.items()))
+            if expires_of(value) > now and len(store) <= self.max_keys:
+                break
+            del store[key]
+
+    def hit_sliding_window(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        now = time.time()
+        bucket_width = window_seconds / WINDOW_BUCKETS
+        current = int(now // bucket_width)
+        with self._lock:
+            window = self._windows.pop(key, None) or _Window()
+            while window.buckets and window.buckets[0][0] <= current - WINDOW_BUCKETS:
+                window.total -= window.buckets.popleft()[1]
+            if window.buckets and window.buckets[-1][0] == current:
+                window.buckets[-1][1] += 1
+            else:
+                window.buckets.append([current, 1])
+            window.total += 1
+            window.expires_at = now + window_seconds
+            self._windows[key] = window
+            self._evict(self._windows, now, lambda w: w.expires_at)
+            return window.total <= limit, window.total
+
+    def consume_quota(self, key: str, period: str, limit: int) -> Tuple[bool, int]:
+        now = time.time()
+        with self._lock:
+            entry = self._quotas.pop((key, period), None) or [0, 0.0]
+            entry[1] = now + QUOTA_TTL_SECONDS
+            self._quotas[(key, period)] = entry
+            self._evict(self._quotas, now, lambda e: e[1])
+            if entry[0] >= limit:
+                return False, entry[0]
+            entry[0] += 1
+            return True, entry[0]
+
+    def refund_quota(self, key: str, period: str) -> None:
+        with self._lock:
+            entry = self._quotas.get((key, period))
+            if entry and entry[0] > 0:
+                entry[0] -= 1
+
+    def get_quota(self, key: str, period: str) -> Optional[int]:
+        with self._lock:
+            entry = self._quotas.get((key, period))
+            return entry[0] if entry else None
+
+    def seed_quota(self, key: str, period: str, value: int) -> None:
+        with self._lock:
+            if (key, period) not in self._quotas:
+                self._quotas[(key, period)] = [value, time.time() + QUOTA_TTL_SECONDS]
+
+    # Documents sérialisés en JSON comme dans les backends partagés : chaque lecture est une copie
+
+    def _read_document(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._documents.get(key)
+        return json.loads(entry[1]) if entry and entry[0] > now else None
+
+    def _write_document(self, key: str, value: Dict[str, Any], ttl: float, now: float) -> None:
+        self._documents.pop(key, None)
+        self._documents[key] = [now + ttl, json.dumps(value)]
+        self._evict(self._documents, now, lambda e: e[0])
+
+    def get_document(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read_document(key, time.time())
+
+    def put_document(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            self._write_document(key, value, ttl, time.time())
+
+    def update_document(self, key: str, update: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]],
+                        ttl: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            current = self._read_document(key, now)
+            value = update(current)
+            if value is None:
+                return current
+            self._write_document(key, value, ttl, now)
+            return value
+
+    def delete_document(self, key: str) -> bool:
+        with self._lock:
+            return self._documents.pop(key, None) is not None
+
+
+# -------------------------
+# SQLite (workers d'une même machine)
+# -------------------------
+
+class SQLiteCounterBackend(CounterBackend):
+    blocking = True
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rl_buckets ("
+            "key TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (key, bucket))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rl_quotas ("
+            "key TEXT NOT NULL, period TEXT NOT NULL, count INTEGER NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (key, period))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rl_documents ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        self._ops += 1
+        if self._ops % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM rl_buckets WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM rl_quotas WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM rl_documents WHERE expires_at < ?", (now,))
+
+    def hit_sliding_window(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        now = time.time()
+        bucket_width = window_seconds / WINDOW_BUCKETS
+        current = int(now // bucket_width)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM rl_buckets WHERE key = ? AND bucket <= ?", (key, current - WINDOW_BUCKETS))
+            conn.execute(
+                "INSERT INTO rl_buckets (key, bucket, count, expires_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(key, bucket) DO UPDATE SET count = count + 1",
+                (key, current, now + window_seconds),
+            )
+            total = conn.execute("SELECT SUM(count) FROM rl_buckets WHERE key = ?", (key,)).fetchone()[0]
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return total <= limit, total
+
+    def consume_quota(self, key: str, period: str, limit: int) -> Tuple[bool, int]:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT count FROM rl_quotas WHERE key = ? AND period = ?", (key, period)).fetchone()
+            count = row[0] if row else 0
+            allowed = count < limit
+            if allowed:
+                count += 1
+                conn.execute(
+                    "INSERT INTO rl_quotas (key, period, count, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key, period) DO UPDATE SET count = excluded.count, expires_at = excluded.expires_at",
+                    (key, period, count, now + QUOTA_TTL_SECONDS),
+                )
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, count
+
+    def refund_quota(self, key: str, period: str) -> None:
+        self._conn().execute(
+            "UPDATE rl_quotas SET count = count - 1 WHERE key = ? AND period = ? AND count > 0", (key, period)
+        )
+
+    def get_quota(self, key: str, period: str) -> Optional[int]:
+        row = self._conn().execute("SELECT count FROM rl_quotas WHERE key = ? AND period = ?", (key, period)).fetchone()
+        return row[0] if row else None
+
+    def seed_quota(self, key: str, period: str, value: int) -> None:
+        self._conn().execute(
+            "INSERT OR IGNORE INTO rl_quotas (key, period, count, expires_at) VALUES (?, ?, ?, ?)",
+            (key, period, value, time.time() + QUOTA_TTL_SECONDS),
+        )
+
+    def _read_document(self, conn: sqlite3.Connection, key: str, now: float) -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT value FROM rl_documents WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write_document(self, conn: sqlite3.Connection, key: str, value: Dict[str, Any], ttl: float, now: float) -> None:
+        conn.execute(
+            "INSERT INTO rl_documents (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value), now + ttl),
+        )
+
+    def get_document(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._read_document(self._conn(), key, time.time())
+
+    def put_document(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._write_document(self._conn(), key, value, ttl, time.time())
+
+    def update_document(self, key: str, update: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]],
+                        ttl: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self._read_document(conn, key, now)
+            value = update(current)
+            if value is not None:
+                self._write_document(conn, key, value, ttl, now)
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return current if value is None else value
+
+    def delete_document(self, key: str) -> bool:
+        return self._conn().execute("DELETE FROM rl_documents WHERE key = ?", (key,)).rowcount > 0
+
+
+# -------------------------
+# Redis (plusieurs instances)
+# -------------------------
+
+_CONSUME_QUOTA_LUA = """
+local c = tonumber(redis.call('GET', KEYS[1]) or '0')
+if c >= tonumber(ARGV[1]) then return {0, c} end
+c = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {1, c}
+"""
+
+_REFUND_QUOTA_LUA = """
+local c = tonumber(redis.call('GET', KEYS[1]) or '0')
+if c > 0 then redis.call('DECR', KEYS[1]) end
+return 0
+"""
+
+
+class RedisCounterBackend(CounterBackend):
+    blocking = True
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = "francis:rl:"):
+        import redis  # dépendance optionnelle, seulement si ce backend est choisi
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._consume = self.client.register_script(_CONSUME_QUOTA_LUA)
+        self._refund = self.client.register_script(_REFUND_QUOTA_LUA)
+
+    def _quota_key(self, key: str, period: str) -> str:
+        return f"{self.prefix}quota:{key}:{period}"
+
+    def hit_sliding_window(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        bucket_width = window_seconds / WINDOW_BUCKETS
+        current = int(time.time() // bucket_width)
+        bucket_keys = [f"{self.prefix}win:{key}:{b}" for b in range(current - WINDOW_BUCKETS + 1, current + 1)]
+        pipe = self.client.pipeline()
+        pipe.incr(bucket_keys[-1])
+        pipe.expire(bucket_keys[-1], int(window_seconds + bucket_width) + 1)
+        pipe.mget(bucket_keys)
+        _, _, values = pipe.execute()
+        total = sum(int(v) for v in values if v is not None)
+        return total <= limit, total
+
+    def consume_quota(self, key: str, period: str, limit: int) -> Tuple[bool, int]:
+        allowed, count = self._consume(keys=[self._quota_key(key, period)], args=[limit, QUOTA_TTL_SECONDS])
+        return bool(allowed), int(count)
+
+    def refund_quota(self, key: str, period: str) -> None:
+        self._refund(keys=[self._quota_key(key, period)])
+
+    def get_quota(self, key: str, period: str) -> Optional[int]:
+        value = self.client.get(self._quota_key(key, period))
+        return int(value) if value is not None else None
+
+    def seed_quota(self, key: str, period: str, value: int) -> None:
+        self.client.set(self._quota_key(key, period), value, ex=QUOTA_TTL_SECONDS, nx=True)
+
+    def _document_key(self, key: str) -> str:
+        return f"{self.prefix}doc:{key}"
+
+    def get_document(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(self._document_key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def put_document(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self.client.set(self._document_key(key), json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def update_document(self, key: str, update: Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]],
+                        ttl: float) -> Optional[Dict[str, Any]]:
+        from redis.exceptions import WatchError
+
+        doc_key = self._document_key(key)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(doc_key)
+                    raw = pipe.get(doc_key)
+                    current = json.loads(raw) if raw is not None else None
+                    value = update(current)
+                    if value is None:
+                        pipe.unwatch()
+                        return current
+                    pipe.multi()
+                    pipe.set(doc_key, json.dumps(value), px=max(1, int(ttl * 1000)))
+                    pipe.execute()
+                    return value
+                except WatchError:
+                    continue  # modifié entre-temps par un autre worker : on recommence
+
+    def delete_document(self, key: str) -> bool:
+        return bool(self.client.delete(self._document_key(key)))
+
+
+# -------------------------
+# Sélection du backend
+# -------------------------
+
+_backend: Optional[CounterBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_counter_backend() -> CounterBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            try:
+                if RATE_LIMIT_BACKEND == "redis":
+                    _backend = RedisCounterBackend()
+                elif RATE_LIMIT_BACKEND == "sqlite":
+                    _backend = SQLiteCounterBackend()
+            except Exception as e:
+                print(f"[WARN] Backend de compteurs '{RATE_LIMIT_BACKEND}' indisponible ({e}), repli en mémoire")
+            if _backend is None:
+                if WEB_CONCURRENCY > 1:
+                    print(f"[WARN] Compteurs en mémoire avec {WEB_CONCURRENCY} workers : quotas et limites comptés par worker")
+                _backend = InMemoryCounterBackend()
+        return _backend
@@ -1,12 +1,9 @@
 
-import time
-from datetime import datetime, timedelta
 from fastapi import HTTPException, Request
-from typing import Dict, Optional
-import json
 
-# Stockage en mémoire des requêtes (en production, utilisez Redis)
-request_counts: Dict[str, Dict] = {}
+from rate_counters import get_counter_backend, current_period, next_period_start
+
+DEFAULT_REQUEST_LIMIT = 30
 
 def check_request_limit(user_id: str, plan_type: str, request_limit: int) -> bool:
     """
@@ -23,29 +20,9 @@ def check_request_limit(user_id: str, plan_type: str, request_limit: int) -> boo
     if plan_type == 'professionnel' or request_limit == -1:
         return True  # Pas de limitation pour les professionnels
     
-    now = datetime.now()
-    current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    if user_id not in request_counts:
-        request_counts[user_id] = {
-            'count': 0,
-            'reset_date': current_month
-        }
-    
-    user_data = request_counts[user_id]
-    
-    # Réinitialiser le compteur si on est dans un nouveau mois
-    if now >= user_data['reset_date'] + timedelta(days=32):
-        user_data['count'] = 0
-        user_data['reset_date'] = current_month
-    
-    # Vérifier la limite
-    if user_data['count'] >= request_limit:
-        return False
-    
-    # Incrémenter le compteur
-    user_data['count'] += 1
-    return True
+    # Vérification et incrément atomiques, compteur remis à zéro à chaque mois
+    allowed, _ = get_counter_backend().consume_quota(f"requests:{user_id}", current_period(), request_limit)
+    return allowed
 
 def get_remaining_requests(user_id: str) -> int:
     """
@@ -57,18 +34,20 @@ def get_remaining_requests(user_id: str) -> int:
     Returns:
         int: Nombre de requêtes restantes (-1 pour illimité)
     """
-    if user_id not in request_counts:
-        return 30  # Limite par défaut pour les particuliers
-    
-    user_data = request_counts[user_id]
-    now = datetime.now()
-    current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Réinitialiser si nouveau mois
-    if now >= user_data['reset_date'] + timedelta(days=32):
-        return 30
-    
-    return max(0, 30 - user_data['count'])
+    used = get_counter_backend().get_quota(f"requests:{user_id}", current_period()) or 0
+    return max(0, DEFAULT_REQUEST_LIMIT - used)
+
+async def acheck_request_limit(user_id: str, plan_type: str, request_limit: int) -> bool:
+    """Variante asynchrone de check_request_limit (compteur interrogé hors de la boucle d'évènements)."""
+    if plan_type == 'professionnel' or request_limit == -1:
+        return True
+    allowed, _ = await get_counter_backend().aconsume_quota(f"requests:{user_id}", current_period(), request_limit)
+    return allowed
+
+async def aget_remaining_requests(user_id: str) -> int:
+    """Variante asynchrone de get_remaining_requests."""
+    used = await get_counter_backend().aget_quota(f"requests:{user_id}", current_period()) or 0
+    return max(0, DEFAULT_REQUEST_LIMIT - used)
 
 async def request_limitation_middleware(request: Request, call_next):
     """
@@ -85,15 +64,15 @@ async def request_limitation_middleware(request: Request, call_next):
             plan_type = "particulier"  # À récupérer depuis la DB
             request_limit = 30  # À récupérer depuis la DB
             
-            if not check_request_limit(user_id, plan_type, request_limit):
-                remaining = get_remaining_requests(user_id)
+            if not await acheck_request_limit(user_id, plan_type, request_limit):
+                remaining = await aget_remaining_requests(user_id)
                 raise HTTPException(
                     status_code=429,
                     detail={
                         "error": "Limite de requêtes atteinte",
                         "message": f"Vous avez atteint votre limite de {request_limit} requêtes ce mois-ci.",
                         "remaining_requests": remaining,
-                        "reset_date": (datetime.now().replace(day=1) + timedelta(days=32)).isoformat()
+                        "reset_date": next_period_start(current_period())
                     }
                 )
     
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Any, Dict, Optional, Union, Literal
 import asyncio
 import json
+import time
 import uuid
 from datetime import datetime
 from fastapi.responses import StreamingResponse
@@ -16,62 +17,51 @@ from schemas_pro import (
     RendezVousCreate, RendezVousResponse, RendezVousUpdate,
     ClientProfileWithAnalysisResponse
 )
-from dependencies import supabase, verify_token
+from dependencies import get_user_context, supabase
+from user_context import UserContext
 from assistant_fiscal_simple import get_fiscal_response
-from pdf_report import generate_client_pdf_report
+from transcript_extraction import client_extractor, discovery_extractor
+from pdf_render_service import get_cached_report, iter_pdf_chunks, render_report
 from pydantic import BaseModel
 from decimal import Decimal
 from calculs_fiscaux import simulate_tax_scenario
+from portfolio_analysis import PORTFOLIO_COLUMNS, acreate_job, aget_job, run_portfolio_job
+from portfolio_export import iter_portfolio_csv, iter_portfolio_excel, iter_portfolio_pdf_zip
 
-try:
+
+def _pandas():
+    """pandas n'est importé qu'au premier export (import coûteux au démarrage du worker)"""
     import pandas as pd
-except ImportError:  # En environnement sans pandas (tests)
-    pd = None
+    return pd
 
 router = APIRouter(
     prefix="/api/pro",
     tags=["Pro - Gestion Clients"],
 )
 
-async def verify_professional_user(current_user_id: str = Depends(verify_token)) -> str:
+async def verify_professional_user(context: UserContext = Depends(get_user_context)) -> str:
     """
-    Vérifie si l'utilisateur courant est un professionnel en consultant la table profils_utilisateurs.
+    Vérifie si l'utilisateur courant est un professionnel (table profils_utilisateurs, via le cache de contexte).
     Retourne l'user_id du professionnel si c'est le cas, sinon lève une HTTPException.
     """
     if not supabase:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service Supabase non disponible")
-    try:
-        # print(f"Vérification du rôle pro pour user_id: {current_user_id}") # Log de débogage
-        response = (
-            supabase.table("profils_utilisateurs")
-            .select("user_id, taper")
-            .eq("user_id", current_user_id)
-            .single()
-            .execute()
+    if not context.available:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur lors de la vérification du profil professionnel: {context.error}"
         )
-        # print(f"Réponse de Supabase pour profils_utilisateurs: {response}") # Log de débogage
-        if response.data and response.data.get("taper") == "professionnel": # Assurez-vous que "professionnel" est la bonne valeur pour le rôle
-            return current_user_id
-        else:
-            # print(f"Utilisateur {current_user_id} n'est pas un professionnel ou profil non trouvé. Data: {response.data}") # Log de débogage
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Accès refusé : Réservé aux utilisateurs professionnels."
-            )
-    except Exception as e:
-        # print(f"Exception lors de la vérification du rôle pro: {str(e)}") # Log de débogage
-        # Cela peut inclure le cas où .single() ne trouve rien et lève une erreur si PostgREST retourne count=0
-        # Ou une erreur de connexion à Supabase etc.
-        # Gestion d'erreur améliorée si `single()` ne trouve rien (Supabase client lève une exception)
-        if "PGRST116" in str(e): # Code d'erreur PostgREST pour "requested resource not found"
-             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Profil professionnel non trouvé ou non configuré."
-            )
+    if not context.found:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Profil professionnel non trouvé ou non configuré."
+        )
+    if not context.is_professional:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, # Erreur serveur si autre chose
-            detail=f"Erreur lors de la vérification du profil professionnel: {str(e)}"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès refusé : Réservé aux utilisateurs professionnels."
         )
+    return context.user_id
 
 @router.post("/clients/", response_model=ClientProfileWithAnalysisResponse, status_code=status.HTTP_201_CREATED)
 async def create_client_profile(
@@ -287,7 +277,8 @@ async def analyze_client_profile(
     try:
         # Appel réel à Francis (via get_fiscal_response)
         # Le conversation_history est optionnel pour get_fiscal_response
-        ia_answer, _, _ = get_fiscal_response(query=detailed_prompt)
+        # Appel LLM bloquant : exécuté hors de la boucle d'évènements
+        ia_answer, _, _ = await asyncio.to_thread(get_fiscal_response, query=detailed_prompt)
     except Exception as e:
         print(f"Erreur lors de l'appel à get_fiscal_response: {e}")
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Erreur lors de la communication avec le service d'analyse IA.")
@@ -768,136 +759,28 @@ async def extract_client_data_from_transcript(
     professional_user_id: str = Depends(verify_professional_user)
 ):
     """
-    Extrait les informations client à partir d'un transcript vocal en utilisant l'IA.
+    Extrait les informations client d'un transcript vocal : règles déterministes,
+    puis LLM uniquement pour les champs restants (voir transcript_extraction).
     """
-    import time
     start_time = time.time()
-    
     try:
-        # Construire le prompt pour l'IA
-        system_prompt = """Tu es un assistant fiscal spécialisé dans l'extraction d'informations client à partir de conversations.
-        
-        Ta tâche est d'extraire les informations suivantes du transcript fourni :
-        
-        INFORMATIONS PERSONNELLES :
-        - nom_client : Nom de famille
-        - prenom_client : Prénom
-        - email_client : Adresse email
-        - telephone_principal_client : Numéro de téléphone principal
-        
-        INFORMATIONS PROFESSIONNELLES :
-        - profession_client1 : Profession ou métier
-        - revenu_net_annuel_client1 : Revenu net annuel (en euros, nombre uniquement)
-        
-        SITUATION FAMILIALE :
-        - situation_maritale_client : Célibataire, Marié(e), Pacsé(e), Divorcé(e), Veuf/Veuve
-        - nombre_enfants_a_charge_client : Nombre d'enfants à charge (nombre uniquement)
-        
-        ADRESSE :
-        - adresse_postale_client : Adresse complète
-        - code_postal_client : Code postal
-        - ville_client : Ville
-        
-        OBJECTIFS :
-        - objectifs_fiscaux_client : Objectifs fiscaux mentionnés
-        - objectifs_patrimoniaux_client : Objectifs patrimoniaux mentionnés
-        - notes_objectifs_projets_client : Notes et projets spécifiques
-        
-        RÈGLES IMPORTANTES :
-        1. Retourne UNIQUEMENT un objet JSON valide
-        2. Pour les champs non trouvés, utilise une chaîne vide ""
-        3. Pour les nombres, retourne des chaînes (ex: "50000" pour 50000€)
-        4. Sois précis mais ne devine pas si l'information n'est pas claire
-        5. Normalise les formats (téléphone, email, etc.)
-        
-        Format de réponse attendu :
-        {
-          "nom_client": "",
-          "prenom_client": "",
-          "email_client": "",
-          "telephone_principal_client": "",
-          "profession_client1": "",
-          "revenu_net_annuel_client1": "",
-          "situation_maritale_client": "",
-          "nombre_enfants_a_charge_client": "",
-          "adresse_postale_client": "",
-          "code_postal_client": "",
-          "ville_client": "",
-          "objectifs_fiscaux_client": "",
-          "objectifs_patrimoniaux_client": "",
-          "notes_objectifs_projets_client": ""
-        }
-        """
-        
-        user_prompt = f"""Transcript de la conversation client :
-        
-        {request.transcript}
-        
-        {request.instructions or ''}
-        
-        Extrais les informations client et retourne le JSON."""
-        
-        # Appeler l'IA pour extraire les données
-        response = await get_fiscal_response(
-            system_prompt=system_prompt,
-            user_message=user_prompt,
-            conversation_history=[]
-        )
-        
-        # Parser la réponse JSON
-        try:
-            # Essayer d'extraire le JSON de la réponse
-            response_text = response.get('response', '')
-            
-            # Chercher le JSON dans la réponse
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                extracted_data = json.loads(json_str)
-            else:
-                # Si pas de JSON trouvé, essayer de parser toute la réponse
-                extracted_data = json.loads(response_text)
-                
-        except json.JSONDecodeError as e:
-            # En cas d'erreur de parsing, retourner des données vides
-            extracted_data = {
-                "nom_client": "",
-                "prenom_client": "",
-                "email_client": "",
-                "telephone_principal_client": "",
-                "profession_client1": "",
-                "revenu_net_annuel_client1": "",
-                "situation_maritale_client": "",
-                "nombre_enfants_a_charge_client": "",
-                "adresse_postale_client": "",
-                "code_postal_client": "",
-                "ville_client": "",
-                "objectifs_fiscaux_client": "",
-                "objectifs_patrimoniaux_client": "",
-                "notes_objectifs_projets_client": ""
-            }
-        
-        processing_time = time.time() - start_time
-        
-        # Calculer un score de confiance basé sur la qualité des données extraites
-        confidence = 0.0
-        if extracted_data:
-            filled_fields = sum(1 for value in extracted_data.values() if value and str(value).strip())
-            total_fields = len(extracted_data)
-            confidence = min(1.0, filled_fields / total_fields * 1.5)  # Bonus pour les données bien extraites
-        
-        return ExtractClientDataResponse(
-            extracted_data=extracted_data,
-            confidence=confidence,
-            processing_time=processing_time
-        )
-        
+        result = await client_extractor.extract(request.transcript, request.instructions)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur lors de l'extraction des données : {str(e)}"
-        ) 
+        )
+
+    extracted_data = result.data
+    # Score de confiance basé sur la proportion de champs remplis
+    filled_fields = sum(1 for value in extracted_data.values() if value and str(value).strip())
+    confidence = min(1.0, filled_fields / len(extracted_data) * 1.5)
+
+    return ExtractClientDataResponse(
+        extracted_data=extracted_data,
+        confidence=confidence,
+        processing_time=time.time() - start_time
+    )
 
 class DiscoveryExtractionRequest(BaseModel):
     transcript: str
@@ -920,175 +803,30 @@ async def extract_discovery_data_from_transcript(
     de conversation entre un CGP et son client.
     """
     start_time = time.time()
-    
     try:
-        # Préparer le prompt pour l'extraction de découverte
-        system_prompt = """
-        Tu es un expert en extraction d'informations fiscales et patrimoniales.
-        
-        Tu dois extraire les informations suivantes d'une conversation entre un CGP et son client :
-        
-        INFORMATIONS PERSONNELLES :
-        - age: âge du client (nombre)
-        - situation_familiale: 'celibataire', 'marie', 'pacs', 'divorce', 'veuf'
-        - nombre_enfants: nombre d'enfants à charge
-        - residence_fiscale: pays de résidence fiscale
-        
-        REVENUS ET ACTIVITÉ :
-        - revenus_principaux: revenus annuels principaux (nombre)
-        - activite_principale: 'salarie', 'independant', 'retraite', 'chomeur', 'etudiant'
-        - revenus_complementaires: liste des revenus complémentaires
-        - charges_deductibles: charges déductibles annuelles (nombre)
-        
-        PATRIMOINE :
-        - residence_principale: true/false si propriétaire résidence principale
-        - residence_secondaire: true/false si propriétaire résidence secondaire
-        - epargne_totale: montant total de l'épargne (nombre)
-        - investissements: liste des types d'investissements
-        
-        OBJECTIFS ET PROJETS :
-        - objectifs_court_terme: objectifs à moins de 2 ans
-        - objectifs_moyen_terme: objectifs 2-5 ans
-        - objectifs_long_terme: objectifs plus de 5 ans
-        
-        NIVEAU DE CONNAISSANCE :
-        - niveau_connaissance_fiscale: 'debutant', 'intermediaire', 'avance', 'expert'
-        - experience_investissement: 'aucune', 'faible', 'moyenne', 'elevee'
-        - tolerance_risque: 'conservateur', 'equilibre', 'dynamique'
-        
-        BESOINS SPÉCIFIQUES :
-        - besoins_specifiques: besoins particuliers mentionnés
-        - questions_prioritaires: questions principales du client
-        
-        OPTIMISATIONS SOUHAITÉES :
-        - optimisations_souhaitees: types d'optimisations recherchées
-        
-        RÈGLES :
-        - Si une information n'est pas mentionnée, utilise des valeurs par défaut appropriées
-        - Pour les montants, extrais uniquement les nombres
-        - Pour les listes, sépare par des virgules
-        - Sois précis et conservateur dans tes estimations
-        """
-        
-        # Appeler Francis pour l'extraction
-        answer, sources, confidence = await get_fiscal_response(
-            query=f"""
-            Extrais toutes les informations de découverte client de cette transcription de conversation CGP-client :
-            
-            TRANSCRIPTION :
-            {request.transcript}
-            
-            Retourne uniquement un JSON valide avec toutes les informations extraites.
-            """,
-            conversation_history=None
-        )
-        
-        # Parser la réponse JSON
-        try:
-            # Essayer d'extraire le JSON de la réponse
-            json_start = answer.find('{')
-            json_end = answer.rfind('}') + 1
-            if json_start != -1 and json_end != 0:
-                json_str = answer[json_start:json_end]
-                extracted_data = json.loads(json_str)
-            else:
-                # Fallback : parsing manuel des informations clés
-                extracted_data = parse_discovery_data_manually(request.transcript)
-        except json.JSONDecodeError:
-            logger.warning("Erreur parsing JSON, utilisation du fallback manuel")
-            extracted_data = parse_discovery_data_manually(request.transcript)
-        
-        # Valider et compléter les données extraites
-        validated_data = validate_and_complete_discovery_data(extracted_data)
-        
-        # Calculer la confiance par champ
-        field_confidence = calculate_field_confidence(extracted_data, request.transcript)
-        
-        # Notes de validation
-        validation_notes = generate_validation_notes(extracted_data, validated_data)
-        
-        processing_time = time.time() - start_time
-        
-        return DiscoveryExtractionResponse(
-            extracted_data=validated_data,
-            confidence=confidence,
-            processing_time=processing_time,
-            validation_notes=validation_notes,
-            field_confidence=field_confidence
-        )
-        
+        result = await discovery_extractor.extract(request.transcript)
     except Exception as e:
-        logger.error(f"Erreur dans l'extraction de découverte: {e}")
+        print(f"[ERREUR] Extraction de découverte : {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur lors de l'extraction des données de découverte: {str(e)}"
         )
 
+    # Notes calculées sur les champs réellement trouvés, avant valeurs par défaut
+    extracted_data = {name: result.data[name] for name in result.filled_fields}
+    validated_data = validate_and_complete_discovery_data(dict(result.data))
+
+    return DiscoveryExtractionResponse(
+        extracted_data=validated_data,
+        confidence=result.confidence,
+        processing_time=time.time() - start_time,
+        validation_notes=generate_validation_notes(extracted_data, validated_data),
+        field_confidence=result.field_confidence()
+    )
+
 def parse_discovery_data_manually(transcript: str) -> Dict[str, Any]:
-    """Parse manuel des données de découverte en cas d'échec du JSON."""
-    data = {
-        "age": "",
-        "situation_familiale": "celibataire",
-        "nombre_enfants": 0,
-        "residence_fiscale": "france",
-        "revenus_principaux": "",
-        "activite_principale": "salarie",
-        "revenus_complementaires": [],
-        "charges_deductibles": "",
-        "residence_principale": False,
-        "residence_secondaire": False,
-        "epargne_totale": "",
-        "investissements": [],
-        "objectifs_court_terme": [],
-        "objectifs_moyen_terme": [],
-        "objectifs_long_terme": [],
-        "niveau_connaissance_fiscale": "debutant",
-        "experience_investissement": "aucune",
-        "tolerance_risque": "conservateur",
-        "besoins_specifiques": [],
-        "questions_prioritaires": "",
-        "optimisations_souhaitees": []
-    }
-    
-    # Extraction manuelle basique
-    transcript_lower = transcript.lower()
-    
-    # Âge
-    import re
-    age_match = re.search(r'(\d+)\s*(?:ans?|âge)', transcript_lower)
-    if age_match:
-        data["age"] = age_match.group(1)
-    
-    # Situation familiale
-    if any(word in transcript_lower for word in ['marié', 'mariée', 'couple']):
-        data["situation_familiale"] = "marie"
-    elif any(word in transcript_lower for word in ['pacs', 'pacsé']):
-        data["situation_familiale"] = "pacs"
-    elif any(word in transcript_lower for word in ['divorcé', 'divorcée']):
-        data["situation_familiale"] = "divorce"
-    elif any(word in transcript_lower for word in ['veuf', 'veuve']):
-        data["situation_familiale"] = "veuf"
-    
-    # Enfants
-    enfants_match = re.search(r'(\d+)\s*enfant', transcript_lower)
-    if enfants_match:
-        data["nombre_enfants"] = int(enfants_match.group(1))
-    
-    # Revenus
-    revenus_match = re.search(r'(\d+(?:\s*\d+)*)\s*(?:€|euros?|k|mille)', transcript_lower)
-    if revenus_match:
-        data["revenus_principaux"] = revenus_match.group(1).replace(' ', '')
-    
-    # Activité
-    if any(word in transcript_lower for word in ['indépendant', 'auto-entrepreneur', 'freelance']):
-        data["activite_principale"] = "independant"
-    elif any(word in transcript_lower for word in ['retraité', 'retraite']):
-        data["activite_principale"] = "retraite"
-    elif any(word in transcript_lower for word in ['chômeur', 'chômage']):
-        data["activite_principale"] = "chomeur"
-    elif any(word in transcript_lower for word in ['étudiant', 'étudiante']):
-        data["activite_principale"] = "etudiant"
-    
+    """Données de découverte issues des seules règles déterministes (sans LLM)."""
+    data, _ = discovery_extractor.apply_rules(transcript)
     return data
 
 def validate_and_complete_discovery_data(data: Dict[str, Any]) -> Dict[str, Any]:
@@ -1124,30 +862,6 @@ def validate_and_complete_discovery_data(data: Dict[str, Any]) -> Dict[str, Any]
     
     return data
 
-def calculate_field_confidence(extracted_data: Dict[str, Any], transcript: str) -> Dict[str, float]:
-    """Calcule la confiance pour chaque champ extrait."""
-    field_confidence = {}
-    transcript_lower = transcript.lower()
-    
-    # Logique de calcul de confiance basée sur la présence d'informations
-    for field, value in extracted_data.items():
-        confidence = 0.3  # Confiance de base
-        
-        if field == "age" and value:
-            confidence = 0.8
-        elif field == "situation_familiale" and value != "celibataire":
-            confidence = 0.9
-        elif field == "nombre_enfants" and value > 0:
-            confidence = 0.8
-        elif field == "revenus_principaux" and value:
-            confidence = 0.7
-        elif field == "activite_principale" and value != "salarie":
-            confidence = 0.8
-        
-        field_confidence[field] = min(confidence, 1.0)
-    
-    return field_confidence
-
 def generate_validation_notes(extracted_data: Dict[str, Any], validated_data: Dict[str, Any]) -> List[str]:
     """Génère des notes de validation pour les données extraites."""
     notes = []
@@ -1185,7 +899,7 @@ def _client_to_dataframe(client: ClientProfile):
             except Exception:
                 value = str(value)
         data[key] = value
-    return pd.DataFrame([data])
+    return _pandas().DataFrame([data])
 
 @router.get("/clients/{client_id}/export-csv")
 async def export_client_csv(
@@ -1227,7 +941,7 @@ async def export_client_excel(
 
     df = _client_to_dataframe(client)
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+    with _pandas().ExcelWriter(buffer, engine="openpyxl") as writer:
         df.to_excel(writer, sheet_name="Profil", index=False)
     buffer.seek(0)
     filename = f"profil_client_{client_id}.xlsx"
@@ -1235,6 +949,37 @@ async def export_client_excel(
         "Content-Disposition": f"attachment; filename={filename}"
     })
 
+# -------------------------
+# Export du portefeuille complet (flux, mémoire constante)
+# -------------------------
+
+@router.get("/portfolio/export-csv")
+async def export_portfolio_csv(professional_user_id: str = Depends(verify_professional_user)):
+    filename = f"portefeuille_clients_{datetime.now().strftime('%Y%m%d')}.csv"
+    return StreamingResponse(iter_portfolio_csv(professional_user_id), media_type="text/csv", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+@router.get("/portfolio/export-excel")
+async def export_portfolio_excel(professional_user_id: str = Depends(verify_professional_user)):
+    filename = f"portefeuille_clients_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    return StreamingResponse(iter_portfolio_excel(professional_user_id), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+@router.get("/portfolio/export-pdf-zip")
+async def export_portfolio_pdf_zip(professional_user_id: str = Depends(verify_professional_user)):
+    filename = f"fiches_clients_{datetime.now().strftime('%Y%m%d')}.zip"
+    return StreamingResponse(iter_portfolio_pdf_zip(professional_user_id), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+def _pdf_streaming_response(pdf_bytes: bytes, filename: str) -> StreamingResponse:
+    return StreamingResponse(iter_pdf_chunks(pdf_bytes), media_type="application/pdf", headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Content-Length": str(len(pdf_bytes)),
+    })
+
 @router.get("/clients/{client_id}/export-pdf")
 async def export_client_pdf(
     client_id: int,
@@ -1249,15 +994,11 @@ async def export_client_pdf(
     if client is None:
         raise HTTPException(status_code=404, detail="Client non trouvé ou accès refusé")
 
-    # Générer le PDF avec les données du client
-    buffer = io.BytesIO()
-    generate_client_pdf_report(buffer, client)
-    buffer.seek(0)
-    
+    # Rendu dans le pool de processus (ou depuis le cache si la fiche n'a pas changé)
+    pdf_bytes = await render_report("client", client)
+
     filename = f"fiche_client_{client_id}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    return StreamingResponse(buffer, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename={filename}"
-    })
+    return _pdf_streaming_response(pdf_bytes, filename)
 
 @router.get("/clients/{client_id}/export-analysis-pdf")
 async def export_analysis_pdf(
@@ -1273,25 +1014,21 @@ async def export_analysis_pdf(
     if client is None:
         raise HTTPException(status_code=404, detail="Client non trouvé ou accès refusé")
 
-    # Lancer l'analyse pour obtenir les résultats
-    try:
-        analysis_result = await analyze_client_profile(
-            client_id=client_id,
-            db=db,
-            professional_user_id=professional_user_id
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+    # Rapport déjà généré pour cette version de la fiche : pas de nouvel appel IA
+    pdf_bytes = get_cached_report(client, "analysis")
+    if pdf_bytes is None:
+        try:
+            analysis_result = await analyze_client_profile(
+                client_id=client_id,
+                db=db,
+                professional_user_id=professional_user_id
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+        pdf_bytes = await render_report("analysis", client, analysis_result.model_dump())
 
-    # Générer le PDF avec l'analyse
-    buffer = io.BytesIO()
-    generate_analysis_pdf_report(buffer, client, analysis_result)
-    buffer.seek(0)
-    
     filename = f"analyse_client_{client_id}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    return StreamingResponse(buffer, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename={filename}"
-    })
+    return _pdf_streaming_response(pdf_bytes, filename)
 
 @router.get("/clients/{client_id}/export-irpp-pdf")
 async def export_irpp_pdf(
@@ -1307,25 +1044,20 @@ async def export_irpp_pdf(
     if client is None:
         raise HTTPException(status_code=404, detail="Client non trouvé ou accès refusé")
 
-    # Lancer l'analyse IRPP pour obtenir les résultats
-    try:
-        irpp_result = await analyze_irpp_for_client(
-            client_id=client_id,
-            db=db,
-            professional_user_id=professional_user_id
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse IRPP: {str(e)}")
+    pdf_bytes = get_cached_report(client, "irpp")
+    if pdf_bytes is None:
+        try:
+            irpp_result = await analyze_irpp_for_client(
+                client_id=client_id,
+                db=db,
+                professional_user_id=professional_user_id
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse IRPP: {str(e)}")
+        pdf_bytes = await render_report("irpp", client, irpp_result.model_dump())
 
-    # Générer le PDF avec l'analyse IRPP
-    buffer = io.BytesIO()
-    generate_irpp_pdf_report(buffer, client, irpp_result)
-    buffer.seek(0)
-    
     filename = f"analyse_irpp_client_{client_id}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    return StreamingResponse(buffer, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename={filename}"
-    })
+    return _pdf_streaming_response(pdf_bytes, filename)
 
 class SimulationScenario(BaseModel):
     label: str = "Scenario"
@@ -1372,4 +1104,60 @@ async def simulate_scenarios(
             crypto_plus_value=scen.crypto_plus_value,
         )
         results.append(SimulationResult(label=scen.label, **values))
-    return results 
\ No newline at end of file
+    return results 
+
+# -------------------------
+# Analyse groupée du portefeuille (tâche en arrière-plan)
+# -------------------------
+
+class PortfolioScenario(BaseModel):
+    label: str
+    per_versement: float = 0.0
+    lmnp_revenus_brut: float = 0.0
+    pinel_investissement: float = 0.0
+
+class PortfolioAnalysisRequest(BaseModel):
+    scenarios: Optional[List[PortfolioScenario]] = None  # Scénarios standards si absent
+    top: int = 50
+
+class PortfolioJobResponse(BaseModel):
+    job_id: str
+    status: str
+    processed: int
+    total: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+@router.post("/portfolio/analyze", response_model=PortfolioJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def analyze_portfolio_job(
+    background_tasks: BackgroundTasks,
+    request: Optional[PortfolioAnalysisRequest] = None,
+    db: Session = Depends(get_db),
+    professional_user_id: str = Depends(verify_professional_user)
+):
+    """
+    Lance l'analyse IR / TMI / scénarios d'optimisation de tous les clients du professionnel.
+    Les fiches sont chargées en une seule requête ; le calcul tourne en arrière-plan.
+    Suivre l'avancement via GET /portfolio/jobs/{job_id}.
+    """
+    request = request or PortfolioAnalysisRequest()
+    rows = (
+        db.query(*[getattr(ClientProfile, col) for col in PORTFOLIO_COLUMNS])
+        .filter(ClientProfile.id_professionnel == professional_user_id)
+        .all()
+    )
+    scenarios = [scen.model_dump() for scen in request.scenarios] if request.scenarios else None
+
+    job = await acreate_job(professional_user_id, len(rows))
+    background_tasks.add_task(run_portfolio_job, job["job_id"], rows, scenarios, request.top)
+    return PortfolioJobResponse(**job)
+
+@router.get("/portfolio/jobs/{job_id}", response_model=PortfolioJobResponse)
+async def get_portfolio_job(
+    job_id: str,
+    professional_user_id: str = Depends(verify_professional_user)
+):
+    job = await aget_job(job_id)
+    if job is None or job["owner_id"] != professional_user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tâche d'analyse non trouvée ou accès non autorisé.")
+    return PortfolioJobResponse(**job)
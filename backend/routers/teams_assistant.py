@@ -9,6 +9,10 @@ from datetime import datetime
 from pydantic import BaseModel
 import asyncio
 
+from dependencies import get_user_context
+from meeting_sessions import meeting_sessions
+from user_context import UserContext
+
 # Import optionnel de Whisper
 try:
     import whisper
@@ -17,6 +21,14 @@ except ImportError:
 
 router = APIRouter(prefix="/api/pro/teams-assistant", tags=["teams-assistant"])
 
+async def verify_professional(context: UserContext = Depends(get_user_context)) -> str:
+    """user_id du professionnel authentifié : les sessions de réunion (données clients) lui sont rattachées"""
+    if not context.available:
+        raise HTTPException(status_code=503, detail=f"Vérification du profil impossible : {context.error}")
+    if not context.is_professional:
+        raise HTTPException(status_code=403, detail="Accès refusé : Réservé aux utilisateurs professionnels.")
+    return context.user_id
+
 # Modèle Whisper pour la transcription
 whisper_model = None
 
@@ -32,6 +44,7 @@ class TeamsAnalysisRequest(BaseModel):
     platform: str = "teams"
     meeting_topic: Optional[str] = None
     participants_count: Optional[int] = None
+    session_id: Optional[str] = None  # renvoyé par la première analyse de la réunion
 
 class TeamsSuggestion(BaseModel):
     type: str  # "question", "optimization", "risk", "action"
@@ -77,63 +90,65 @@ async def transcribe_teams_audio(
         raise HTTPException(status_code=500, detail=f"Erreur transcription Teams: {str(e)}")
 
 @router.post("/analyze")
-async def analyze_teams_conversation(request: TeamsAnalysisRequest):
-    """Analyse la conversation Teams et génère des suggestions spécialisées"""
+async def analyze_teams_conversation(request: TeamsAnalysisRequest,
+                                     professional_user_id: str = Depends(verify_professional)):
+    """Analyse la conversation Teams et génère des suggestions spécialisées.
+
+    Seuls les nouveaux échanges et le résumé glissant de la session sont envoyés au LLM.
+    """
     try:
-        # Analyser le contexte de la conversation Teams
-        analysis_prompt = f"""
-        Analyse cette transcription de réunion Microsoft Teams et génère des suggestions utiles pour le professionnel fiscal :
-        
-        Transcription : {request.transcription}
-        
+        async with meeting_sessions.open(request.session_id, professional_user_id,
+                                         topic=request.meeting_topic) as session:
+            new_text = session.ingest(request.transcription)
+            if new_text or not session.last_analysis:
+                await session.compact(meeting_sessions.completion)
+                analysis_prompt = f"""
+        Analyse cette réunion Microsoft Teams en cours et génère des suggestions utiles pour le professionnel fiscal :
+
+        {session.context_block()}
+
         Contexte : {request.context}
         Plateforme : {request.platform}
-        Sujet de réunion : {request.meeting_topic or "Non spécifié"}
+        Sujet de réunion : {session.topic or "Non spécifié"}
         Nombre de participants : {request.participants_count or "Non spécifié"}
-        
-        Génère des suggestions dans ces catégories :
-        
+
+        Génère des suggestions dans ces catégories, en priorité sur les échanges récents :
+
         1. QUESTIONS FISCALES À POSER :
         - Questions spécifiques pour clarifier la situation fiscale
         - Points à approfondir concernant les revenus, investissements, etc.
-        
+
         2. OPPORTUNITÉS D'OPTIMISATION :
         - Crédits d'impôt applicables
         - Stratégies de défiscalisation
         - Optimisations patrimoniales
-        
+
         3. RISQUES À IDENTIFIER :
         - Points de vigilance fiscale
         - Situations à clarifier
         - Dangers potentiels
-        
+
         4. ACTIONS PRIORITAIRES :
         - Prochaines étapes recommandées
         - Documents à demander
         - Analyses à effectuer
-        
+
         Format : Liste simple, phrases courtes et directes, maximum 3 suggestions par catégorie.
         """
-        
-        # Utiliser l'API Francis pour l'analyse
-        from backend.assistant_fiscal import ask_francis
-        
-        response = await ask_francis(
-            query=analysis_prompt,
-            conversation_history=[],
-            jurisdiction="FR"
-        )
-        
+                session.last_analysis = await meeting_sessions.completion(analysis_prompt, max_tokens=600)
+                session.llm_calls += 1
+
         # Parser la réponse pour extraire les suggestions par catégorie
-        suggestions = parse_teams_suggestions(response.get("answer", ""))
-        
+        suggestions = parse_teams_suggestions(session.last_analysis)
+
         return {
             "suggestions": suggestions,
             "context": request.context,
             "timestamp": datetime.now().isoformat(),
-            "meeting_topic": request.meeting_topic
+            "meeting_topic": session.topic,
+            "session_id": session.session_id
         }
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur analyse Teams: {str(e)}")
 
@@ -180,13 +195,17 @@ def parse_teams_suggestions(response_text: str) -> List[TeamsSuggestion]:
 async def teams_real_time_assist(
     current_topic: str,
     client_context: Optional[Dict[str, Any]] = None,
-    meeting_duration: Optional[int] = None
+    meeting_duration: Optional[int] = None,
+    session_id: Optional[str] = None,
+    professional_user_id: str = Depends(verify_professional)
 ):
     """Assistance en temps réel pendant la réunion Teams"""
     try:
+        session = await meeting_sessions.get(session_id, professional_user_id)
+        meeting_block = f"\n        {session.context_block()}\n" if session else ""
         prompt = f"""
         Le professionnel discute actuellement de : {current_topic}
-        
+        {meeting_block}
         Contexte client : {json.dumps(client_context, ensure_ascii=False) if client_context else "Non disponible"}
         Durée de réunion : {meeting_duration or 0} minutes
         
@@ -198,16 +217,10 @@ async def teams_real_time_assist(
         Réponse courte, directe et actionable.
         """
         
-        from backend.assistant_fiscal import ask_francis
-        
-        response = await ask_francis(
-            query=prompt,
-            conversation_history=[],
-            jurisdiction="FR"
-        )
+        answer = await meeting_sessions.completion(prompt, max_tokens=300)
         
         return {
-            "suggestions": response.get("answer", "").split('\n')[:3],
+            "suggestions": [line for line in answer.split('\n') if line.strip()][:3],
             "topic": current_topic,
             "timestamp": datetime.now().isoformat(),
             "meeting_duration": meeting_duration
@@ -218,21 +231,30 @@ async def teams_real_time_assist(
 
 @router.post("/meeting-summary")
 async def generate_teams_meeting_summary(
-    transcription: str,
     meeting_duration: int,
+    transcription: str = "",
     participants: List[str] = [],
-    meeting_topic: Optional[str] = None
+    meeting_topic: Optional[str] = None,
+    session_id: Optional[str] = None,
+    professional_user_id: str = Depends(verify_professional)
 ):
-    """Génère un résumé de la réunion Teams"""
+    """Génère un résumé de la réunion Teams à partir du résumé glissant de la session.
+
+    Sans session_id, la transcription fournie est repliée morceau par morceau.
+    """
     try:
-        summary_prompt = f"""
+        async with meeting_sessions.open(session_id, professional_user_id,
+                                         topic=meeting_topic, participants=participants) as session:
+            session.ingest(transcription)
+            await session.compact(meeting_sessions.completion)
+            summary_prompt = f"""
         Génère un résumé professionnel de cette réunion Teams :
         
-        Sujet : {meeting_topic or "Réunion client"}
+        Sujet : {session.topic or "Réunion client"}
         Durée : {meeting_duration} minutes
-        Participants : {', '.join(participants) if participants else "Non spécifiés"}
+        Participants : {', '.join(session.participants) if session.participants else "Non spécifiés"}
         
-        Transcription : {transcription}
+        {session.context_block()}
         
         Crée un résumé structuré avec :
         1. Points clés discutés
@@ -243,26 +265,27 @@ async def generate_teams_meeting_summary(
         
         Format : Professionnel et concis.
         """
-        
-        from backend.assistant_fiscal import ask_francis
-        
-        response = await ask_francis(
-            query=summary_prompt,
-            conversation_history=[],
-            jurisdiction="FR"
-        )
+            summary = await meeting_sessions.completion(summary_prompt, max_tokens=900)
+            session.llm_calls += 1
         
         return {
-            "summary": response.get("answer", ""),
-            "meeting_topic": meeting_topic,
+            "summary": summary,
+            "meeting_topic": session.topic,
             "duration": meeting_duration,
-            "participants": participants,
-            "timestamp": datetime.now().isoformat()
+            "participants": session.participants,
+            "timestamp": datetime.now().isoformat(),
+            "session_id": session.session_id
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur génération résumé Teams: {str(e)}")
 
+@router.delete("/sessions/{session_id}", status_code=204)
+async def close_teams_session(session_id: str, professional_user_id: str = Depends(verify_professional)):
+    """Libère la session de réunion (fin de réunion)"""
+    if not await meeting_sessions.close(session_id, professional_user_id):
+        raise HTTPException(status_code=404, detail="Session de réunion introuvable")
+
 @router.get("/health")
 async def teams_assistant_health():
     """Vérification de l'état de l'assistant Teams"""
@@ -1,13 +0,0 @@
-"""
-ROUTES API POUR FRANCIS PARTICULIER INDÉPENDANT
-===============================================
-
-DÉSACTIVÉ TEMPORAIREMENT - Flask non disponible sur Railway
-Ce fichier est temporairement désactivé pour éviter l'erreur:
-ModuleNotFoundError: No module named 'flask'
-
-Le backend utilise FastAPI uniquement.
-"""
-
-# Placeholder pour éviter erreur d'import dans main.py
-francis_particulier_bp = None
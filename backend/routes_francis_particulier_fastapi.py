@@ -3,16 +3,28 @@ ROUTES FASTAPI POUR FRANCIS PARTICULIER INDÉPENDANT
 ===================================================
 
 Routes FastAPI pour l'assistant fiscal européen indépendant.
-Intégration native avec le système FastAPI existant de Fiscal.ia.
+Intégration native (ASGI) avec le système FastAPI existant de Fiscal.ia : seule
+implémentation de Francis Particulier, sans passerelle WSGI.
+
+Pour un utilisateur authentifié, l'historique de conversation est rangé côté
+serveur, dans une session qui lui appartient (voir conversation_sessions) : le
+client renvoie le `conversation_id` reçu dans la réponse précédente. Sans
+authentification, aucune session n'est ouverte : le client renvoie
+`conversation_history` (reçu dans la réponse précédente), propre à la requête.
+L'historique renvoyé par un client authentifié amorce une nouvelle session.
 """
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import json
 import asyncio
 
+from conversation_sessions import conversation_sessions
+from dependencies import verify_token
+
 # Import de Francis Particulier Indépendant
 from francis_particulier_independent import (
     francis_particulier,
@@ -26,9 +38,52 @@ francis_particulier_router = APIRouter(
 )
 
 # Modèles Pydantic
+class ConversationEntry(BaseModel):
+    query: str
+    response_type: str = "unknown"
+    timestamp: float
+    analysis: Dict[str, Any] = {}
+
 class FrancisQuery(BaseModel):
     query: str
     user_profile: Optional[Dict[str, Any]] = None
+    conversation_id: Optional[str] = None
+    conversation_history: List[ConversationEntry] = []
+
+class ConversationPayload(BaseModel):
+    conversation_id: Optional[str] = None
+    conversation_history: List[ConversationEntry] = []
+    user_profile: Optional[Dict[str, Any]] = None
+
+def _conversation(entries: List[ConversationEntry]) -> List[Dict[str, Any]]:
+    """Historique fourni par le client, sous la forme attendue par Francis Particulier"""
+    return [entry.model_dump() for entry in entries]
+
+_optional_bearer = HTTPBearer(auto_error=False)
+
+def _current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_optional_bearer)) -> Optional[str]:
+    """user_id si la requête porte un jeton (invalide : 401), None pour un appel anonyme"""
+    return verify_token(credentials) if credentials else None
+
+async def _conversation_state(request: FrancisQuery, user_id: Optional[str]):
+    """(historique à compléter, profil à transmettre à Francis, session ou None)
+
+    Session de l'utilisateur authentifié (ouverte au besoin, à enregistrer après la réponse),
+    sinon historique de la requête.
+    """
+    if user_id is None:
+        return _conversation(request.conversation_history), request.user_profile, None
+    session = await conversation_sessions.get_or_create(request.conversation_id, owner=user_id)
+    session.seed(_conversation(request.conversation_history))
+    return session.exchanges, session.merge_profile(request.user_profile) or None, session
+
+async def _payload_conversation(request: ConversationPayload,
+                                user_id: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Historique et profil de la session désignée (si elle appartient à l'utilisateur), sinon ceux fournis"""
+    session = await conversation_sessions.get(request.conversation_id, owner=user_id) if user_id else None
+    if session is not None:
+        return session.history(), session.user_profile
+    return _conversation(request.conversation_history), request.user_profile
 
 class TaxCalculationRequest(BaseModel):
     country: str
@@ -47,16 +102,21 @@ class OptimizationRequest(BaseModel):
     age: Optional[int] = 30
 
 @francis_particulier_router.post("/query")
-async def francis_particulier_query(request: FrancisQuery):
+async def francis_particulier_query(request: FrancisQuery, user_id: Optional[str] = Depends(_current_user)):
     """
     Endpoint principal pour les questions fiscales particuliers
     """
     try:
-        # Génération de la réponse
-        response_data = francis_particulier.generate_response(
-            request.query, 
-            request.user_profile
+        # Génération de la réponse (analyse et LLM bloquants : hors de la boucle d'événements)
+        conversation, user_profile, session = await _conversation_state(request, user_id)
+        response_data = await asyncio.to_thread(
+            francis_particulier.generate_response,
+            request.query,
+            user_profile,
+            conversation=conversation
         )
+        if session is not None:
+            await conversation_sessions.save(session)
         
         return {
             "status": "success",
@@ -70,7 +130,9 @@ async def francis_particulier_query(request: FrancisQuery):
             "data": {
                 k: v for k, v in response_data.items() 
                 if k not in ["response", "type", "confidence"]
-            }
+            },
+            "conversation_id": session.session_id if session else None,
+            "conversation_history": list(conversation)
         }
         
     except Exception as e:
@@ -194,19 +256,27 @@ async def get_supported_countries():
         )
 
 @francis_particulier_router.post("/stream")
-async def francis_particulier_stream(request: FrancisQuery):
+async def francis_particulier_stream(request: FrancisQuery, user_id: Optional[str] = Depends(_current_user)):
     """
     Endpoint de streaming pour réponses en temps réel
     """
     try:
+        conversation, user_profile, session = await _conversation_state(request, user_id)
+
         async def generate_stream():
             """Générateur pour le streaming"""
             try:
                 async for chunk in francis_particulier.generate_response_stream(
                     request.query, 
-                    request.user_profile
+                    user_profile,
+                    conversation=conversation
                 ):
-                    yield f"data: {chunk}\n\n"
+                    yield f"data: {chunk.rstrip()}\n\n"
+                if session is not None:
+                    await conversation_sessions.save(session)
+                frame = {'type': 'conversation', 'conversation_id': session.session_id if session else None,
+                         'conversation_history': list(conversation)}
+                yield f"data: {json.dumps(frame)}\n\n"
                     
             except Exception as e:
                 yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
@@ -285,13 +355,14 @@ async def clear_cache():
             detail=str(e)
         )
 
-@francis_particulier_router.get("/conversation/summary")
-async def get_conversation_summary():
-    """Retourne un résumé de la conversation actuelle"""
+@francis_particulier_router.post("/conversation/summary")
+async def get_conversation_summary(request: ConversationPayload, user_id: Optional[str] = Depends(_current_user)):
+    """Retourne un résumé de la conversation (session désignée ou historique fourni par le client)"""
     try:
+        conversation, _ = await _payload_conversation(request, user_id)
         return {
             "status": "success",
-            "conversation": francis_particulier.get_conversation_summary()
+            "conversation": francis_particulier.get_conversation_summary(conversation)
         }
         
     except Exception as e:
@@ -300,11 +371,11 @@ async def get_conversation_summary():
             detail=str(e)
         )
 
-@francis_particulier_router.get("/conversation/export")
-async def export_conversation():
-    """Exporte la conversation au format JSON"""
+@francis_particulier_router.post("/conversation/export")
+async def export_conversation(request: ConversationPayload, user_id: str = Depends(verify_token)):
+    """Exporte la conversation (session désignée ou historique fourni par le client) au format JSON"""
     try:
-        export_data = francis_particulier.export_conversation()
+        export_data = francis_particulier.export_conversation(*await _payload_conversation(request, user_id))
         return {
             "status": "success",
             "export": export_data
@@ -316,6 +387,12 @@ async def export_conversation():
             detail=str(e)
         )
 
+@francis_particulier_router.delete("/conversation/{conversation_id}", status_code=204)
+async def close_conversation(conversation_id: str, user_id: str = Depends(verify_token)):
+    """Libère la session de conversation de l'utilisateur (fin de conversation, déconnexion)"""
+    if not await conversation_sessions.close(conversation_id, owner=user_id):
+        raise HTTPException(status_code=404, detail="Conversation introuvable")
+
 class ConfigUpdate(BaseModel):
     config: Dict[str, Any]
 
@@ -341,7 +418,7 @@ async def test_francis():
     """Test simple de Francis Particulier"""
     try:
         test_query = "Combien d'impôt je paie avec 50000€ en France ?"
-        response = get_francis_particulier_response(test_query)
+        response = await asyncio.to_thread(get_francis_particulier_response, test_query)
         
         return {
             "status": "success",
@@ -367,8 +444,8 @@ async def test_francis_particulier_compatibility(request: dict):
         if not query:
             raise HTTPException(status_code=400, detail="Message requis")
         
-        # Génération de la réponse avec Francis Particulier
-        response_data = francis_particulier.generate_response(query)
+        # Génération de la réponse avec Francis Particulier (question isolée, sans mémoire)
+        response_data = await asyncio.to_thread(francis_particulier.generate_response, query)
         
         # Format compatible avec l'interface existante
         return {
@@ -7,7 +7,8 @@ Routes FastAPI pour l'intégration GoCardless dans le dashboard particulier.
 
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import RedirectResponse
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+import asyncio
 import logging
 from datetime import datetime, timedelta
 
@@ -152,6 +153,83 @@ async def get_requisition_status(
         logger.error(f"❌ Erreur récupération statut: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération du statut: {str(e)}")
 
+def _linked_account_ids(user_id) -> List[str]:
+    """
+    Comptes des réquisitions liées (statut "LN") de l'utilisateur.
+    """
+    # TODO: Dans une vraie implémentation, récupérer les requisitions depuis la DB
+    # Pour l'instant, utiliser des données de démo qui simulent le flow GoCardless
+    demo_requisitions = [
+        {
+            "id": f"req_{user_id}_1",
+            "status": "LN",  # Linked status selon GoCardless
+            "accounts": [f"acc_{user_id}_1", f"acc_{user_id}_2"]
+        }
+    ]
+    return [
+        account_id
+        for requisition in demo_requisitions
+        if requisition["status"] == "LN"  # Status "Linked" selon GoCardless
+        for account_id in requisition["accounts"]
+    ]
+
+def _demo_accounts(user_id) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": f"DEMO_ACCOUNT_1_{user_id}",
+            "name": "Compte Courant",
+            "iban": "FR76 3000 3000 0000 0000 0000 001",
+            "balance": 5420.50,
+            "currency": "EUR",
+            "bank_name": "BNP Paribas",
+            "status": "connected",
+            "last_sync": datetime.now().isoformat()
+        },
+        {
+            "id": f"DEMO_ACCOUNT_2_{user_id}",
+            "name": "Livret A",
+            "iban": "FR76 3000 3000 0000 0000 0000 002",
+            "balance": 15000.00,
+            "currency": "EUR",
+            "bank_name": "BNP Paribas",
+            "status": "connected",
+            "last_sync": datetime.now().isoformat()
+        }
+    ]
+
+async def _load_accounts(user_id, date_from: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, List[Transaction]]]:
+    """
+    Comptes de l'utilisateur et leurs transactions, récupérés en un seul lot parallèle.
+    """
+    snapshots = await gocardless_service.get_accounts_snapshots(_linked_account_ids(user_id), date_from=date_from)
+    
+    accounts = []
+    transactions = {}
+    for snapshot in snapshots:
+        if not snapshot.details:
+            continue
+        accounts.append({
+            "id": snapshot.details.id,
+            "name": snapshot.details.name or "Compte bancaire",
+            "iban": snapshot.details.iban,
+            "balance": snapshot.balance or 0.0,
+            "currency": snapshot.details.currency,
+            "bank_name": "Banque connectée",
+            "status": "connected",
+            "last_sync": datetime.now().isoformat()
+        })
+        transactions[snapshot.details.id] = snapshot.transactions
+    
+    # Si aucun compte réel trouvé, utiliser les données de démo
+    if not accounts:
+        accounts = _demo_accounts(user_id)
+        fetched = await asyncio.gather(*(
+            gocardless_service.get_account_transactions(account["id"], date_from=date_from) for account in accounts
+        ))
+        transactions = {account["id"]: account_transactions for account, account_transactions in zip(accounts, fetched)}
+    
+    return accounts, transactions
+
 @router.get("/accounts", response_model=List[Dict[str, Any]])
 async def get_user_accounts(
     current_user: dict = Depends(get_current_user)
@@ -163,67 +241,7 @@ async def get_user_accounts(
         user_id = current_user.get('user_id')
         logger.info(f"🏦 Récupération comptes GoCardless pour User: {user_id}")
         
-        # TODO: Dans une vraie implémentation, récupérer les requisitions depuis la DB
-        # Pour l'instant, utiliser des données de démo qui simulent le flow GoCardless
-        
-        # Simule le processus GoCardless:
-        # 1. L'utilisateur a déjà des requisitions avec des account IDs
-        # 2. On récupère les détails de chaque compte via l'API GoCardless
-        
-        demo_requisitions = [
-            {
-                "id": f"req_{user_id}_1",
-                "status": "LN",  # Linked status selon GoCardless
-                "accounts": [f"acc_{user_id}_1", f"acc_{user_id}_2"]
-            }
-        ]
-        
-        accounts = []
-        
-        for requisition in demo_requisitions:
-            if requisition["status"] == "LN":  # Status "Linked" selon GoCardless
-                for account_id in requisition["accounts"]:
-                    # Dans une vraie implémentation, on appellerait gocardless_service.get_account_details(account_id)
-                    account_details = await gocardless_service.get_account_details(account_id)
-                    if account_details:
-                        # Récupérer aussi le solde
-                        balance = await gocardless_service.get_account_balances(account_id)
-                        
-                        accounts.append({
-                            "id": account_details.id,
-                            "name": account_details.name or "Compte bancaire",
-                            "iban": account_details.iban,
-                            "balance": balance or 0.0,
-                            "currency": account_details.currency,
-                            "bank_name": "Banque connectée",
-                            "status": "connected",
-                            "last_sync": datetime.now().isoformat()
-                        })
-        
-        # Si aucun compte réel trouvé, utiliser les données de démo
-        if not accounts:
-            accounts = [
-                {
-                    "id": f"DEMO_ACCOUNT_1_{user_id}",
-                    "name": "Compte Courant",
-                    "iban": "FR76 3000 3000 0000 0000 0000 001",
-                    "balance": 5420.50,
-                    "currency": "EUR",
-                    "bank_name": "BNP Paribas",
-                    "status": "connected",
-                    "last_sync": datetime.now().isoformat()
-                },
-                {
-                    "id": f"DEMO_ACCOUNT_2_{user_id}",
-                    "name": "Livret A",
-                    "iban": "FR76 3000 3000 0000 0000 0000 002",
-                    "balance": 15000.00,
-                    "currency": "EUR",
-                    "bank_name": "BNP Paribas",
-                    "status": "connected",
-                    "last_sync": datetime.now().isoformat()
-                }
-            ]
+        accounts, _ = await _load_accounts(user_id)
         
         logger.info(f"✅ {len(accounts)} comptes trouvés")
         return accounts
@@ -243,14 +261,15 @@ async def get_account_details(
     try:
         logger.info(f"📋 Récupération détails compte {account_id} - User: {current_user.get('user_id')}")
         
-        account = await gocardless_service.get_account_details(account_id)
+        # Détails et solde demandés en parallèle
+        account, balance = await asyncio.gather(
+            gocardless_service.get_account_details(account_id),
+            gocardless_service.get_account_balances(account_id)
+        )
         
         if not account:
             raise HTTPException(status_code=404, detail="Compte non trouvé")
         
-        # Récupérer également le solde
-        balance = await gocardless_service.get_account_balances(account_id)
-        
         account_data = {
             "id": account.id,
             "iban": account.iban,
@@ -299,25 +318,7 @@ async def get_account_transactions(
         # Limiter le nombre de transactions
         transactions = transactions[:limit]
         
-        transactions_data = []
-        for transaction in transactions:
-            # Déterminer le type de transaction et la catégorie
-            transaction_type = "credit" if transaction.amount > 0 else "debit"
-            category = _categorize_transaction(transaction.remittance_info or "", transaction.amount)
-            
-            transactions_data.append({
-                "id": transaction.transaction_id,
-                "date": transaction.booking_date,
-                "value_date": transaction.value_date,
-                "description": transaction.remittance_info or f"{transaction.creditor_name or transaction.debtor_name or 'Transaction'}",
-                "amount": transaction.amount,
-                "currency": transaction.currency,
-                "category": category,
-                "account_id": account_id,
-                "type": transaction_type,
-                "debtor_name": transaction.debtor_name,
-                "creditor_name": transaction.creditor_name
-            })
+        transactions_data = [_transaction_payload(transaction, account_id) for transaction in transactions]
         
         logger.info(f"✅ {len(transactions_data)} transactions récupérées")
         return transactions_data
@@ -337,8 +338,9 @@ async def get_user_financial_summary(
         user_id = current_user.get('user_id')
         logger.info(f"📊 Génération résumé financier pour User: {user_id}")
         
-        # Récupérer tous les comptes
-        accounts = await get_user_accounts(current_user)
+        # Comptes, soldes et transactions du mois : un seul lot d'appels parallèles (cache par compte)
+        date_from = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        accounts, transactions_by_account = await _load_accounts(user_id, date_from=date_from)
         
         total_balance = sum(account['balance'] for account in accounts)
         
@@ -346,18 +348,12 @@ async def get_user_financial_summary(
         monthly_income = 0
         monthly_expenses = 0
         
-        for account in accounts:
-            transactions = await get_account_transactions(
-                account_id=account['id'],
-                date_from=(datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d"),
-                current_user=current_user
-            )
-            
+        for transactions in transactions_by_account.values():
             for transaction in transactions:
-                if transaction['type'] == 'credit':
-                    monthly_income += transaction['amount']
+                if transaction.amount > 0:
+                    monthly_income += transaction.amount
                 else:
-                    monthly_expenses += abs(transaction['amount'])
+                    monthly_expenses += abs(transaction.amount)
         
         # Estimation fiscale simplifiée
         annual_income = monthly_income * 12
@@ -388,6 +384,25 @@ async def get_user_financial_summary(
         logger.error(f"❌ Erreur génération résumé: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du résumé: {str(e)}")
 
+def _transaction_payload(transaction: Transaction, account_id: str) -> Dict[str, Any]:
+    """
+    Transaction au format attendu par le dashboard.
+    """
+    return {
+        "id": transaction.transaction_id,
+        "date": transaction.booking_date,
+        "value_date": transaction.value_date,
+        "description": transaction.remittance_info or f"{transaction.creditor_name or transaction.debtor_name or 'Transaction'}",
+        "amount": transaction.amount,
+        "currency": transaction.currency,
+        "category": _categorize_transaction(transaction.remittance_info or "", transaction.amount),
+        "account_id": account_id,
+        # Déterminer le type de transaction
+        "type": "credit" if transaction.amount > 0 else "debit",
+        "debtor_name": transaction.debtor_name,
+        "creditor_name": transaction.creditor_name
+    }
+
 def _categorize_transaction(description: str, amount: float) -> str:
     """
     Catégorise une transaction basée sur sa description.
@@ -1,7 +1,7 @@
 from typing import Dict, List
 from .calculs_fiscaux import nombre_parts, impot_revenu_net, impot_ifi, calcul_plus_value_immobiliere, calcul_reduction_don_oeuvre, calcul_credit_impot_emploi_domicile
 from .questionnaire_schema import QuestionnaireCGP, Identite, RevenusCharges, PatrimoineImmobilier, Objectifs # Import du schéma Pydantic
-from .strategies_fiscales import REGISTRE_STRATEGIES, ScenarioOutputDetail, ImpactChiffre # Import du registre des stratégies et ScenarioOutputDetail, ImpactChiffre
+from .strategies_fiscales import REGISTRE_STRATEGIES, ScenarioOutputDetail, ImpactChiffre, evaluer_variantes_ir, resolve_rag_sources # Import du registre des stratégies et ScenarioOutputDetail, ImpactChiffre
 # Attempt to import RAG search function
 # This might require assistant_fiscal.py to be importable without side effects
 # or a refactoring of the search function into a more neutral module.
@@ -155,14 +155,24 @@ def build_advanced_scenarios(questionnaire_data_dict: Dict) -> List[Dict]:
         "ir_base_avant_opti": ir_base 
     }
 
-    for strategie_instance in REGISTRE_STRATEGIES:
-        if strategie_instance.est_applicable(client_profile, contexte_strategies):
-            # Correction de l'appel de méthode
-            scenario_genere_detail = strategie_instance.generer_scenario_detail(
-                client_profile, ir_base, parts_fiscales, contexte_strategies 
-            )
-            if scenario_genere_detail:
-                scenarios_details.append(scenario_genere_detail)
+    strategies_applicables = [
+        strategie for strategie in REGISTRE_STRATEGIES
+        if strategie.est_applicable(client_profile, contexte_strategies)
+    ]
+    # Une seule recherche RAG et un seul calcul d'IR vectorisé pour l'ensemble des stratégies
+    contexte_strategies["rag_sources"] = resolve_rag_sources(s.rag_keywords for s in strategies_applicables)
+    contexte_strategies["ir_variantes"] = evaluer_variantes_ir(
+        (revenu, parts_fiscales)
+        for strategie in strategies_applicables
+        for revenu in strategie.revenus_variantes(client_profile, contexte_strategies)
+    )
+
+    for strategie_instance in strategies_applicables:
+        scenario_genere_detail = strategie_instance.generer_scenario_detail(
+            client_profile, ir_base, parts_fiscales, contexte_strategies 
+        )
+        if scenario_genere_detail:
+            scenarios_details.append(scenario_genere_detail)
     
     # Convertir List[ScenarioOutputDetail] en List[Dict] pour la sortie et les tests actuels
     return [s.model_dump() for s in scenarios_details]
@@ -0,0 +1,213 @@
+"""Profilage du démarrage d'un worker : temps d'import par module et durée des initialisations.
+
+`install()` ajoute en tête de sys.meta_path un chercheur qui chronomètre le
+chargement de chaque module importé ensuite (temps propre et temps cumulé,
+comme `python -X importtime`). `timed(nom)` mesure une étape d'initialisation
+(chargement d'embeddings, préchauffage…). Le rapport est journalisé au
+démarrage et, si STARTUP_PROFILE_PATH est défini, écrit en JSON.
+
+Désactivé avec STARTUP_PROFILE=0. N'utilise que la bibliothèque standard pour
+pouvoir être installé avant tout autre import de main.py.
+"""
+import importlib.abc
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+STARTUP_PROFILE_ENABLED = os.getenv("STARTUP_PROFILE", "1") != "0"
+STARTUP_PROFILE_PATH = os.getenv("STARTUP_PROFILE_PATH")
+REPORT_TOP = 15
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Enveloppe le chargeur d'un module le temps de son exécution"""
+
+    def __init__(self, loader, profiler: "StartupProfiler", name: str):
+        self._loader = loader
+        self._origin = getattr(loader, "_origin", loader)  # profileurs imbriqués
+        self._profiler = profiler
+        self._name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        # __dict__ direct : l'objet peut être copié sans passer par __init__
+        loader = self.__dict__.get("_loader")
+        if loader is None:
+            raise AttributeError(attribute)
+        return getattr(loader, attribute)
+
+    def create_module(self, spec):
+        # Les modules d'extension sont initialisés dès create_module
+        with self._profiler._measure(self._name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        try:
+            with self._profiler._measure(self._name):
+                self._loader.exec_module(module)
+        finally:
+            # Le module retrouve son chargeur d'origine une fois exécuté
+            module.__loader__ = self._origin
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._origin
+
+
+class StartupProfiler(importlib.abc.MetaPathFinder):
+    """Temps d'import par module et durée des étapes d'initialisation d'un worker"""
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self.ready_at: Optional[float] = None
+        self.imports: Dict[str, Dict[str, float]] = {}
+        self.top_level: List[str] = []
+        self.initializers: List[Dict[str, Any]] = []
+
+    # --- imports ---
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    @property
+    def installed(self) -> bool:
+        return self in sys.meta_path
+
+    def find_spec(self, fullname, path, target=None):
+        # Garde de réentrance : un autre profileur installé nous rappellerait sinon indéfiniment
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in list(sys.meta_path):
+                if finder is self:
+                    continue
+                find_spec = getattr(finder, "find_spec", None)
+                if find_spec is None:
+                    continue
+                spec = find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    @contextmanager
+    def _measure(self, name: str) -> Iterator[None]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)  # temps des imports imbriqués
+        start = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                entry = self.imports.get(name)
+                if entry is None:
+                    entry = self.imports[name] = {"self": 0.0, "cumulative": 0.0}
+                    if not stack:
+                        self.top_level.append(name)
+                entry["self"] += elapsed - nested
+                entry["cumulative"] += elapsed
+
+    # --- initialisations ---
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Chronomètre une étape d'initialisation (enregistrée même si elle échoue)"""
+        start = self._clock()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            with self._lock:
+                self.initializers.append({
+                    "name": name,
+                    "seconds": round(self._clock() - start, 4),
+                    "thread": threading.current_thread().name,
+                    "error": error,
+                })
+
+    def mark_ready(self) -> None:
+        """Fin du démarrage synchrone : l'application peut servir des requêtes"""
+        if self.ready_at is None:
+            self.ready_at = self._clock()
+
+    # --- rapport ---
+
+    def report(self, top: int = REPORT_TOP) -> Dict[str, Any]:
+        with self._lock:
+            imports = dict(self.imports)
+            initializers = list(self.initializers)
+            top_level = list(self.top_level)
+
+        def rows(names, key):
+            ranked = sorted(names, key=lambda name: imports[name][key], reverse=True)[:top]
+            return [{"module": name, "self": round(imports[name]["self"], 4),
+                     "cumulative": round(imports[name]["cumulative"], 4)} for name in ranked]
+
+        return {
+            "pid": os.getpid(),
+            "boot_seconds": round(self.ready_at - self.started_at, 4) if self.ready_at is not None else None,
+            "modules_imported": len(imports),
+            "import_seconds": round(sum(imports[name]["cumulative"] for name in top_level), 4),
+            "top_level_imports": rows(top_level, "cumulative"),
+            "slowest_modules": rows(imports, "self"),
+            "initializers": initializers,
+        }
+
+    def log_summary(self, top: int = 5) -> None:
+        report = self.report(top)
+        print(f"⏱️  Démarrage : {report['boot_seconds']}s, {report['modules_imported']} modules "
+              f"importés en {report['import_seconds']}s")
+        for row in report["top_level_imports"]:
+            print(f"   import {row['module']} : {row['cumulative']}s")
+        for step in report["initializers"]:
+            status = "" if step["error"] is None else f" (échec : {step['error']})"
+            print(f"   init {step['name']} : {step['seconds']}s{status}")
+
+    def write_report(self, path: Optional[str] = STARTUP_PROFILE_PATH) -> Optional[Path]:
+        if not path:
+            return None
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(self.report(), indent=2, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            print(f"[WARN] Rapport de démarrage non écrit ({path}) : {e}")
+            return None
+        return path
+
+
+startup_profiler = StartupProfiler()
+
+
+def install() -> StartupProfiler:
+    """Active le chronométrage des imports (à appeler avant les imports de l'application)"""
+    if STARTUP_PROFILE_ENABLED:
+        startup_profiler.install()
+    return startup_profiler
+
+
+def timed(name: str):
+    return startup_profiler.timed(name)
@@ -1,7 +1,9 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from backend.calculs_fiscaux import (
-    nombre_parts, impot_revenu_net, impot_ifi,
+    nombre_parts, impot_revenu_net, impot_revenu_net_vectorise, impot_ifi,
     calcul_plus_value_immobiliere, calcul_reduction_don_oeuvre,
     calcul_credit_impot_emploi_domicile, _TAUX_FORFAIT_FRAIS_ACQUISITION_PVI, _TAUX_FORFAIT_TRAVAUX_PVI
 )
@@ -27,20 +29,79 @@ except ImportError:
 except Exception:
     pass  # Autres erreurs d'import
 
-def get_rag_sources_text_for_strategy(keywords: str, top_k: int = 1) -> str:
-    if not _RAG_SEARCH_ENABLED or not rag_search_function:
+# Table mots-clés -> citations CGI, précalculée avec l'index (python -m backend.strategies_fiscales)
+CITATIONS_TABLE_PATH = Path(__file__).resolve().parent / "data" / "strategy_citations.json"
+_citations_table: Optional[Dict[str, List[str]]] = None
+
+
+def _format_rag_sources(sources: List[str]) -> str:
+    if not sources:
         return ""
+    sources_list = [f"- {source} (Pertinence indicative)" for source in sources]
+    return "\n\nSources légales suggérées (CGI) :\n" + "\n".join(sources_list)
+
+
+def _load_citations_table() -> Dict[str, List[str]]:
+    global _citations_table
+    if _citations_table is None:
+        try:
+            _citations_table = json.loads(CITATIONS_TABLE_PATH.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            _citations_table = {}
+        except Exception as e:
+            print(f"[WARN] Table de citations des stratégies illisible ({CITATIONS_TABLE_PATH}) : {e}")
+            _citations_table = {}
+    return _citations_table
+
+
+def _search_sources(keywords_list: List[str], top_k: int) -> Dict[str, List[str]]:
+    """Sources CGI de chaque jeu de mots-clés : une recherche groupée si la fonction RAG en a une."""
+    if not _RAG_SEARCH_ENABLED or not rag_search_function or not keywords_list:
+        return {keywords: [] for keywords in keywords_list}
+    batch = getattr(rag_search_function, "batch", None)
     try:
-        articles = rag_search_function(keywords, top_k=top_k)
-        if articles:
-            sources_list = [
-                f"- {art.get('source', 'Article non trouvé')} (Pertinence indicative)"
-                for art in articles
-            ]
-            return "\n\nSources légales suggérées (CGI) :\n" + "\n".join(sources_list)
+        if batch is not None:
+            results = batch(keywords_list, top_k=top_k)
+        else:
+            results = [rag_search_function(keywords, top_k=top_k) for keywords in keywords_list]
     except Exception:  # Erreur silencieuse pour ne pas bloquer la génération
-        pass
-    return ""
+        return {keywords: [] for keywords in keywords_list}
+    return {
+        keywords: [art.get('source', 'Article non trouvé') for art in (articles or [])]
+        for keywords, articles in zip(keywords_list, results)
+    }
+
+
+def resolve_rag_sources(keywords_list: Iterable[str], top_k: int = 1) -> Dict[str, str]:
+    """Texte des sources pour plusieurs stratégies : table précalculée, puis une seule recherche pour le reste."""
+    keywords_list = list(dict.fromkeys(keywords for keywords in keywords_list if keywords))
+    table = _load_citations_table()
+    resolved = {keywords: _format_rag_sources(table[keywords][:top_k]) for keywords in keywords_list if keywords in table}
+    missing = [keywords for keywords in keywords_list if keywords not in resolved]
+    for keywords, sources in _search_sources(missing, top_k).items():
+        resolved[keywords] = _format_rag_sources(sources)
+    return resolved
+
+
+def get_rag_sources_text_for_strategy(keywords: str, top_k: int = 1) -> str:
+    return resolve_rag_sources([keywords], top_k=top_k).get(keywords, "")
+
+
+def impot_revenu_variante(contexte: Dict, revenu_imposable: float, parts: float) -> float:
+    """IR d'une variante, lu dans le calcul vectorisé fait pour toutes les stratégies (voir evaluer_variantes_ir)."""
+    precalcule = contexte.get("ir_variantes", {}).get((float(revenu_imposable), float(parts)))
+    if precalcule is not None:
+        return precalcule
+    return impot_revenu_net(revenu_imposable, parts)
+
+
+def evaluer_variantes_ir(variantes: Iterable[Tuple[float, float]]) -> Dict[Tuple[float, float], float]:
+    """IR de toutes les variantes (revenu imposable, parts) en un seul appel vectorisé."""
+    cles = list(dict.fromkeys((float(revenu), float(parts)) for revenu, parts in variantes))
+    if not cles:
+        return {}
+    revenus, parts = zip(*cles)
+    return dict(zip(cles, impot_revenu_net_vectorise(revenus, parts).tolist()))
 
 class StrategieOptimisation(ABC):
     nom: str = "Stratégie non définie"
@@ -57,6 +118,19 @@ class StrategieOptimisation(ABC):
         """Génère le titre et le contenu textuel du scénario si applicable."""
         pass
 
+    def revenus_variantes(self, client_data: QuestionnaireCGP, contexte: Dict) -> List[float]:
+        """Revenus imposables dont le scénario calculera l'IR (évalués d'avance, en une passe, pour toutes les stratégies)."""
+        return []
+
+    def sources_rag(self, contexte: Dict) -> Optional[str]:
+        """Sources CGI du scénario : résolues d'avance pour toutes les stratégies si le contexte les fournit."""
+        if not self.rag_keywords:
+            return None
+        prefetched = contexte.get("rag_sources", {})
+        if self.rag_keywords in prefetched:
+            return prefetched[self.rag_keywords]
+        return get_rag_sources_text_for_strategy(self.rag_keywords)
+
 class StrategiePER(StrategieOptimisation):
     nom = "Versement sur Plan d'Épargne Retraite (PER)"
     description_strategie = "Optimisation de l'impôt sur le revenu par déduction des versements effectués sur un Plan d'Épargne Retraite (PER)."
@@ -66,7 +140,8 @@ class StrategiePER(StrategieOptimisation):
         revenu_imposable_global = contexte.get("revenu_imposable_global", 0)
         return client_data.objectifs.retraite and revenu_imposable_global >= 0
 
-    def generer_scenario_detail(self, client_data: QuestionnaireCGP, ir_base: float, parts_fiscales: float, contexte: Dict) -> Optional[ScenarioOutputDetail]:
+    def _plafond_et_versement(self, client_data: QuestionnaireCGP, contexte: Dict) -> Tuple[float, str, float]:
+        """Plafond de déduction effectif, explication du calcul et versement simulé."""
         revenu_imposable_global_actuel = contexte.get("revenu_imposable_global", 0)
         revenu_pro_n1 = client_data.revenus_charges.revenu_professionnel_n1
         disponible_fiscal_avis = client_data.revenus_charges.disponible_fiscal_per_n
@@ -93,6 +168,17 @@ class StrategiePER(StrategieOptimisation):
 
         versement_per_envisage = min(round(revenu_imposable_global_actuel * 0.10, 2), plafond_final_deduction_per)
         versement_per_envisage = round(max(0, versement_per_envisage), 2)
+        return plafond_final_deduction_per, texte_calcul_plafond, versement_per_envisage
+
+    def revenus_variantes(self, client_data: QuestionnaireCGP, contexte: Dict) -> List[float]:
+        versement_per_envisage = self._plafond_et_versement(client_data, contexte)[2]
+        if versement_per_envisage == 0:
+            return []
+        return [round(contexte.get("revenu_imposable_global", 0) - versement_per_envisage, 2)]
+
+    def generer_scenario_detail(self, client_data: QuestionnaireCGP, ir_base: float, parts_fiscales: float, contexte: Dict) -> Optional[ScenarioOutputDetail]:
+        revenu_imposable_global_actuel = contexte.get("revenu_imposable_global", 0)
+        plafond_final_deduction_per, texte_calcul_plafond, versement_per_envisage = self._plafond_et_versement(client_data, contexte)
 
         if versement_per_envisage == 0:
             if plafond_final_deduction_per > 0:
@@ -111,12 +197,12 @@ class StrategiePER(StrategieOptimisation):
                     texte_explicatif_complementaire=texte_explicatif_aucun_versement,
                     avantages=["Information sur le plafond de déduction PER disponible pour les versements en 2024 (impactant l'impôt 2025)."],
                     inconvenients_ou_points_attention=["Aucun versement n'est simulé dans ce scénario basé sur 10% du revenu imposable 2024."],
-                    sources_rag_text=get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+                    sources_rag_text=self.sources_rag(contexte)
                 )
             return None # Pas de versement et pas de plafond, donc pas de scénario pertinent
 
         rev_apres_per = round(revenu_imposable_global_actuel - versement_per_envisage, 2)
-        ir_apres_per = impot_revenu_net(rev_apres_per, parts_fiscales)
+        ir_apres_per = impot_revenu_variante(contexte, rev_apres_per, parts_fiscales)
         economie_ir = round(ir_base - ir_apres_per, 2)
             
         impacts = [
@@ -142,7 +228,7 @@ class StrategiePER(StrategieOptimisation):
             "Il est crucial de vérifier le montant exact de votre 'Plafond Épargne Retraite' indiqué sur votre dernier avis d'imposition (généralement celui des revenus 2023, reçu en 2024) pour confirmer le maximum déductible pour vos versements en 2024. "
             "Les sommes issues des versements volontaires déduits du revenu imposable seront fiscalisées à la sortie du PER (imposition du capital ou de la rente selon les modalités choisies)."
         )
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
         return ScenarioOutputDetail(
             titre_strategie=self.nom,
             description_breve=self.description_strategie,
@@ -162,14 +248,23 @@ class StrategieLMNP(StrategieOptimisation):
         return (client_data.revenus_charges.revenus_locatifs > 0 and
                 (client_data.objectifs.revenus_complementaires or client_data.objectifs.reduction_ir))
 
+    @staticmethod
+    def _revenu_global_apres_lmnp(client_data: QuestionnaireCGP, contexte: Dict) -> float:
+        revenus_locatifs_bruts = client_data.revenus_charges.revenus_locatifs
+        revenus_locatifs_imposables_micro = revenus_locatifs_bruts - revenus_locatifs_bruts * 0.50
+        return contexte.get("revenu_imposable_global", 0) - revenus_locatifs_bruts + revenus_locatifs_imposables_micro
+
+    def revenus_variantes(self, client_data: QuestionnaireCGP, contexte: Dict) -> List[float]:
+        return [self._revenu_global_apres_lmnp(client_data, contexte)]
+
     def generer_scenario_detail(self, client_data: QuestionnaireCGP, ir_base: float, parts_fiscales: float, contexte: Dict) -> Optional[ScenarioOutputDetail]:
         revenus_locatifs_bruts = client_data.revenus_charges.revenus_locatifs
         revenu_imposable_global_contexte = contexte.get("revenu_imposable_global", 0)
         
         abattement_micro_bic = revenus_locatifs_bruts * 0.50
         revenus_locatifs_imposables_micro = revenus_locatifs_bruts - abattement_micro_bic
-        rev_global_apres_lmnp = revenu_imposable_global_contexte - revenus_locatifs_bruts + revenus_locatifs_imposables_micro
-        ir_apres_lmnp = impot_revenu_net(rev_global_apres_lmnp, parts_fiscales)
+        rev_global_apres_lmnp = self._revenu_global_apres_lmnp(client_data, contexte)
+        ir_apres_lmnp = impot_revenu_variante(contexte, rev_global_apres_lmnp, parts_fiscales)
         economie_ir = ir_base - ir_apres_lmnp 
 
         impacts = [
@@ -201,7 +296,7 @@ class StrategieLMNP(StrategieOptimisation):
             "Ce calcul suppose que les revenus LMNP n'étaient pas encore inclus dans le revenu global fourni, ou qu'ils sont optimisés via ce régime."
         )
         
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
 
         return ScenarioOutputDetail(
             titre_strategie=self.nom,
@@ -279,7 +374,7 @@ class StrategieDonationIFI(StrategieOptimisation):
             "Cette stratégie est particulièrement adaptée si vous souhaitez aider un enfant ou un autre proche en lui transférant les revenus ou l'usage d'un bien tout en optimisant votre IFI. "
             f"Le barème IFI utilisé pour cette simulation est celui de 2024, applicable pour l'IFI 2025 (sur le patrimoine au 1er janvier 2025). L'IFI est dû si le patrimoine net taxable excède 1,3 M€, avec un calcul dès 800 000 €."
         )
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
         return ScenarioOutputDetail(
             titre_strategie=self.nom,
             description_breve=self.description_strategie,
@@ -337,7 +432,7 @@ class StrategiePVI(StrategieOptimisation):
                     avantages=["Exonération totale de l'impôt sur la plus-value grâce à la durée de détention."],
                     inconvenients_ou_points_attention=["Vérifier les conditions exactes d'exonération.", "Les calculs sont basés sur les dates et montants fournis."],
                     texte_explicatif_complementaire=texte_explicatif_nopvi,
-                    sources_rag_text=get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+                    sources_rag_text=self.sources_rag(contexte)
                 )
              return None
 
@@ -393,7 +488,7 @@ class StrategiePVI(StrategieOptimisation):
             f"L'impôt total sur cette plus-value immobilière serait d'environ {resultat_pvi.impot_total_pvi:,.2f} €. Le prix de cession net d'impôt PVI serait de {details_cession.prix_cession_estime - resultat_pvi.impot_total_pvi:,.2f} €.\\n"
             f"Ces calculs sont basés sur la législation fiscale actuelle pour une cession en {details_cession.date_cession_envisagee.year} et ne concernent pas la résidence principale (qui est exonérée)."
         )
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
         return ScenarioOutputDetail(
             titre_strategie=self.nom,
             description_breve=self.description_strategie,
@@ -487,7 +582,7 @@ class StrategieDonsOeuvres(StrategieOptimisation):
             f"{texte_explicatif_specificites} {plafond_specifique} "
             "Les taux et plafonds mentionnés sont ceux applicables pour les dons effectués en 2024 (imposition 2025)."
         )
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
         return ScenarioOutputDetail(
             titre_strategie=titre,
             description_breve=self.description_strategie,
@@ -559,7 +654,7 @@ class StrategieCESU(StrategieOptimisation):
         if client_data.depenses_credits_impots.depenses_service_personne_annuel is None or client_data.depenses_credits_impots.depenses_service_personne_annuel == 0:
              texte_explicatif += "La simulation est basée sur une dépense indicative de 3000€. Renseignez vos dépenses réelles pour une estimation personnalisée."
 
-        rag_text = get_rag_sources_text_for_strategy(self.rag_keywords) if self.rag_keywords else None
+        rag_text = self.sources_rag(contexte)
         return ScenarioOutputDetail(
             titre_strategie=self.nom,
             description_breve=self.description_strategie,
@@ -572,4 +667,16 @@ class StrategieCESU(StrategieOptimisation):
 
 # Registre des stratégies à instancier et à utiliser
 REGISTRE_STRATEGIES: List[StrategieOptimisation] = []
- 
\ No newline at end of file
+ 
+
+def build_citations_table(path: Path = CITATIONS_TABLE_PATH, top_k: int = 3) -> Dict[str, List[str]]:
+    """Précalcule les citations CGI de chaque stratégie (à relancer quand l'index CGI est régénéré)."""
+    strategies = REGISTRE_STRATEGIES or [cls() for cls in StrategieOptimisation.__subclasses__()]
+    table = _search_sources([s.rag_keywords for s in strategies if s.rag_keywords], top_k)
+    path.write_text(json.dumps(table, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    return table
+
+
+if __name__ == "__main__":
+    table = build_citations_table()
+    print(f"✅ {len(table)} jeux de mots-clés résolus : {CITATIONS_TABLE_PATH}")
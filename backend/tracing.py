@@ -0,0 +1,336 @@
+"""Traces par étape du pipeline de question et métriques au format Prometheus.
+
+Chaque étape (classification, embedding de la requête, parcours CGI/BOFiP,
+construction du prompt, LLM…) est mesurée par `span(nom)` ou `@traced(nom)` :
+
+- la durée alimente l'histogramme `fiscal_stage_duration_seconds{stage=…}` ;
+- si une trace de requête est active (TracingMiddleware), l'étape y est
+  ajoutée : en mode debug, la réponse porte un en-tête `Server-Timing`
+  avec le détail (`cgi_scan;dur=41.2, llm_total;dur=1830.5, …`).
+
+La trace courante vit dans une ContextVar : elle suit les `await` et
+`asyncio.to_thread`, pas les threads lancés à la main (les étapes y restent
+comptées dans les histogrammes). Les métriques sont propres à chaque worker,
+comme pour un client Prometheus sans mode multiprocessus. Bibliothèque
+standard uniquement.
+"""
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TIMING_HEADER = "Server-Timing"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Compteur monotone, une série par combinaison d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.label_names), 0.0)
+
+    def series(self) -> Dict[Tuple[str, ...], float]:
+        """Copie des valeurs, par tuple d'étiquettes."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge:
+    """Valeur instantanée (taille d'un cache…), une série par combinaison d'étiquettes."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.label_names), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Histogramme à seaux cumulés (`_bucket`, `_sum`, `_count`), une série par étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = STAGE_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # [compte par seau…, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.label_names))
+        return int(series[-1]) if series else 0
+
+    def sum(self, **labels: str) -> float:
+        series = self._series.get(tuple(str(labels.get(name, "")) for name in self.label_names))
+        return series[-2] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0.0
+            for bound, observed in zip(self.buckets, values):
+                cumulative += observed
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {_format_value(values[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrique {name} déjà déclarée comme {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = STAGE_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets)
+
+    def render(self) -> str:
+        """Format texte d'exposition Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "fiscal_stage_duration_seconds", "Durée des étapes du pipeline de question", ("stage",))
+STAGE_ERRORS = registry.counter(
+    "fiscal_stage_errors_total", "Étapes terminées par une exception", ("stage",))
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route", ("method", "route", "status"))
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "Requêtes HTTP par route et statut", ("method", "route", "status"))
+
+
+# -------------------------
+# Traces de requête
+# -------------------------
+
+@dataclass(slots=True)
+class SpanRecord:
+    name: str
+    start: float  # secondes depuis le début de la trace
+    duration: float
+    parent: Optional[str]
+    error: bool = False
+
+
+class Trace:
+    """Étapes mesurées pendant une requête (ajouts possibles depuis des threads via to_thread)."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self.started_at = clock()
+        self.spans: List[SpanRecord] = []
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return self._clock() - self.started_at
+
+    def add(self, name: str, started_at: float, duration: float, parent: Optional[str], error: bool = False) -> None:
+        with self._lock:
+            self.spans.append(SpanRecord(name, started_at - self.started_at, duration, parent, error))
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Durée totale et nombre d'occurrences par étape, dans l'ordre de première apparition."""
+        totals: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            entry = totals.setdefault(record.name, {"seconds": 0.0, "count": 0})
+            entry["seconds"] += record.duration
+            entry["count"] += 1
+        return totals
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, entry in self.breakdown().items():
+            part = f"{name};dur={entry['seconds'] * 1000:.1f}"
+            if entry["count"] > 1:
+                part += f';desc="x{entry["count"]}"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("fiscal_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("fiscal_span", default=None)
+
+
+def start_trace() -> Tuple[Trace, object]:
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token) -> None:
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record(name: str, seconds: float, started_at: Optional[float] = None, error: bool = False) -> None:
+    """Enregistre une durée mesurée à la main (ex. délai avant le premier token)."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if error:
+        STAGE_ERRORS.inc(stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        start = started_at if started_at is not None else time.perf_counter() - seconds
+        trace.add(name, start, seconds, _current_span.get(), error)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Mesure le bloc comme étape `name` (histogramme + trace de la requête courante)."""
+    started_at = time.perf_counter()
+    token = _current_span.set(name)
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _current_span.reset(token)
+        record(name, time.perf_counter() - started_at, started_at, error)
+
+
+def traced(name: str):
+    """Décorateur : `span(name)` autour de la fonction (synchrone ou coroutine)."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_SECONDS.observe(seconds, method=method, route=route, status=str(status))
+    HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+def timing_header_enabled() -> bool:
+    """En-tête Server-Timing : TRACE_TIMING_HEADER=1/0, sinon seulement en développement."""
+    setting = os.getenv("TRACE_TIMING_HEADER")
+    if setting is not None:
+        return setting == "1"
+    return os.getenv("APP_ENV", "production") == "development"
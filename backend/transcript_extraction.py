@@ -0,0 +1,555 @@
+"""Extraction de données structurées depuis une transcription (entretien CGP, texte dicté).
+
+Deux passes :
+1. des règles déterministes (expressions régulières compilées, listes de
+   termes) remplissent les champs qui s'y prêtent : email, téléphone, code
+   postal et ville, montants, nombre d'enfants, situation familiale, âge,
+   activité… ;
+2. le LLM ne reçoit que les champs restants, sous forme de schéma compact
+   (`{"champ": "description"}`), et seulement si la transcription contient
+   un terme qui les concerne. Une longue transcription est découpée en
+   morceaux interrogés en parallèle, puis les réponses sont fusionnées.
+
+Une transcription simple ne fait donc aucun appel au LLM.
+"""
+import asyncio
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+CHUNK_CHARS = int(os.getenv("TRANSCRIPT_CHUNK_CHARS", "6000"))
+CHUNK_OVERLAP_CHARS = 400
+LLM_CONCURRENCY = int(os.getenv("TRANSCRIPT_LLM_CONCURRENCY", "4"))
+LLM_MAX_TOKENS = 700
+
+Completion = Callable[..., Awaitable[str]]
+
+
+# -------------------------
+# Règles déterministes
+# -------------------------
+
+_WORD_NUMBERS = {
+    "un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4, "cinq": 5,
+    "six": 6, "sept": 7, "huit": 8, "neuf": 9, "dix": 10,
+}
+_NUMBER = r"\d{1,3}(?:[   .]\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?"
+_UNIT = r"(?P<mult>k\s?€|k\b|K\b|mille|millions?|M€)?\s*(?P<cur>€|euros?\b|eur\b)?"
+_PERIOD = r"(?:\s*(?:nets?|bruts?))?(?P<period>\s*(?:par mois|mensuels?|mensuellement|/\s?mois|par an|annuels?|annuellement|/\s?an))?"
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?<![\d+])(?:(?:\+|00)33[\s.-]?(?:\(0\))?|0)[1-9](?:[\s.-]?\d{2}){4}(?!\d)")
+ADDRESS_RE = re.compile(
+    r"\b(\d{1,4}(?:\s?(?:bis|ter))?,?\s+(?:rue|avenue|av\.|boulevard|bd|place|allée|impasse|chemin|route|quai|cours)"
+    r"\s+[^,.\n\d]+?)(?=\s*(?:,|\.|\n|\d{5}|$))",
+    re.IGNORECASE,
+)
+_CITY = r"[A-ZÉÈÊÎÔÂ][\w'’]+(?:-[\w'’]+)*"
+POSTAL_CITY_RE = re.compile(rf"(?<!\d)((?:0[1-9]|[1-8]\d|9[0-8])\d{{3}})(?!\d)[ ,]+({_CITY})")
+POSTAL_RE = re.compile(r"code postal\s*(?:est\s*|:\s*)?((?:0[1-9]|[1-8]\d|9[0-8])\d{3})(?!\d)", re.IGNORECASE)
+CITY_RE = re.compile(rf"\b(?:habite|habitons|vis|vivons|réside|résidons|domiciliée?s?|installée?s?)\s+(?:à|a)\s+({_CITY})")
+INCOME_RE = re.compile(
+    rf"\b(?:gagne|gagnons|revenus?|salaires?|touche|touchons|rémunération|perçois|percevons)\b[^.\d\n]{{0,40}}?"
+    rf"(?P<amount>{_NUMBER})\s*{_UNIT}{_PERIOD}",
+    re.IGNORECASE,
+)
+SAVINGS_RE = re.compile(
+    rf"\b(?:épargne|économies|de côté|placements?)\b[^.\d\n]{{0,40}}?(?P<amount>{_NUMBER})\s*{_UNIT}",
+    re.IGNORECASE,
+)
+# Montant suivi de sa nature : « 20 000 euros d'épargne », « 5 k€ de côté »
+SAVINGS_AMOUNT_FIRST_RE = re.compile(
+    rf"(?<![\d.,])(?P<amount>{_NUMBER})\s*{_UNIT}\s*(?:d['’]\s?(?:épargne|économies)|de côté|(?:en|de) placements?)\b",
+    re.IGNORECASE,
+)
+# « deux petits enfants » / « petits-enfants » : des petits-enfants, pas des enfants à charge
+CHILDREN_RE = re.compile(r"\b(\d{1,2}|un|une|deux|trois|quatre|cinq|six|sept|huit|neuf|dix)\s+enfants?\b", re.IGNORECASE)
+NO_CHILDREN_RE = re.compile(r"\b(?:pas d'enfants?|pas d’enfants?|sans enfants?|aucun enfant)\b", re.IGNORECASE)
+AGE_RE = re.compile(r"\b(?:j'ai|j’ai|âgée? de|age de|âge\s*:?)\s*(\d{2})\s*ans\b", re.IGNORECASE)
+NAME_RE = re.compile(r"\b(?i:je m(?:'|’|e )appelle)\s+([A-ZÉÈ][a-zéèëêïîôç]+(?:-[A-ZÉÈ][a-zéèëêïîôç]+)?)\s+([A-ZÉÈ][A-Za-zéèëêïîôç'’-]+)")
+CIVILITY_RE = re.compile(r"\b(Monsieur|Madame|Mademoiselle)\s+[A-ZÉÈ]")
+
+# Listes de termes : (valeur canonique, motif) dans l'ordre de priorité
+MARITAL_TERMS: Sequence[Tuple[str, "re.Pattern[str]"]] = [
+    ("pacs", re.compile(r"\b(?:pacsée?s?|pacs)\b", re.IGNORECASE)),
+    ("divorce", re.compile(r"\bdivorcée?s?\b", re.IGNORECASE)),
+    ("veuf", re.compile(r"\b(?:veuf|veuve)\b", re.IGNORECASE)),
+    ("marie", re.compile(r"\b(?:mariée?s?|ma femme|mon mari|mon épouse|mon époux)\b", re.IGNORECASE)),
+    ("celibataire", re.compile(r"\bcélibataire\b", re.IGNORECASE)),
+]
+ACTIVITY_TERMS: Sequence[Tuple[str, "re.Pattern[str]"]] = [
+    ("retraite", re.compile(r"\bretraitée?s?\b|\bà la retraite\b", re.IGNORECASE)),
+    ("independant", re.compile(r"\b(?:indépendante?s?|auto-entrepreneur|micro-entrepreneur|freelance|profession libérale|libérale?|chef d'entreprise|gérante?)\b", re.IGNORECASE)),
+    ("chomeur", re.compile(r"\b(?:chômage|chômeur|chômeuse|demandeur d'emploi|demandeuse d'emploi)\b", re.IGNORECASE)),
+    ("etudiant", re.compile(r"\bétudiante?s?\b", re.IGNORECASE)),
+    ("salarie", re.compile(r"\b(?:salariée?s?|en cdi|en cdd|fonctionnaire|employée?)\b", re.IGNORECASE)),
+]
+STATUS_TERMS: Sequence[Tuple[str, "re.Pattern[str]"]] = [
+    ("CDI", re.compile(r"\bcdi\b", re.IGNORECASE)),
+    ("CDD", re.compile(r"\bcdd\b", re.IGNORECASE)),
+    ("Fonctionnaire", re.compile(r"\bfonctionnaire\b", re.IGNORECASE)),
+    ("Indépendant", ACTIVITY_TERMS[1][1]),
+    ("Retraité", ACTIVITY_TERMS[0][1]),
+]
+RISK_TERMS: Sequence[Tuple[str, "re.Pattern[str]"]] = [
+    ("dynamique", re.compile(r"\b(?:dynamique|agressif|risque élevé|prendre des risques)\b", re.IGNORECASE)),
+    ("equilibre", re.compile(r"\béquilibrée?\b", re.IGNORECASE)),
+    ("conservateur", re.compile(r"\b(?:prudente?|sécuritaire|sans risque|pas de risque|conservateur)\b", re.IGNORECASE)),
+]
+COUNTRY_TERMS = {
+    "suisse": "suisse", "belgique": "belgique", "luxembourg": "luxembourg", "espagne": "espagne",
+    "andorre": "andorre", "monaco": "monaco", "portugal": "portugal", "allemagne": "allemagne",
+    "italie": "italie", "royaume-uni": "royaume-uni", "france": "france",
+}
+RESIDENCE_RE = re.compile(
+    r"\b(?:résidente?s?|domiciliée?s?)\s+(?:fiscale?s?\s+)?(?:en|au|à)\s+(" + "|".join(COUNTRY_TERMS) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def parse_amount(number: str, multiplier: Optional[str] = None) -> Optional[float]:
+    """'45 000' → 45000.0, '1,5' + 'millions' → 1500000.0, '60' + 'k' → 60000.0."""
+    raw = re.sub(r"[   ]", "", number)
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", raw):
+        raw = raw.replace(".", "")
+    try:
+        value = float(raw.replace(",", "."))
+    except ValueError:
+        return None
+    mult = (multiplier or "").lower().replace(" ", "")
+    if mult.startswith("k") or mult == "mille":
+        value *= 1_000
+    elif mult.startswith("million") or mult == "m€":
+        value *= 1_000_000
+    return value
+
+
+def _first_term(text: str, terms: Sequence[Tuple[str, "re.Pattern[str]"]]) -> Optional[str]:
+    for value, pattern in terms:
+        if pattern.search(text):
+            return value
+    return None
+
+
+def _amount(match: "re.Match[str]") -> Optional[float]:
+    # Un nombre sans unité ni multiplicateur (« 2 enfants », « depuis 10 ans ») n'est pas un montant
+    if not (match.group("mult") or match.group("cur")):
+        return None
+    return parse_amount(match.group("amount"), match.group("mult"))
+
+
+def normalize_phone(raw: str) -> str:
+    digits = re.sub(r"\D", "", raw)
+    if digits.startswith("0033"):
+        digits = "0" + digits[4:]
+    elif digits.startswith("33") and len(digits) == 11:
+        digits = "0" + digits[2:]
+    digits = digits[-10:]
+    return " ".join(digits[i:i + 2] for i in range(0, 10, 2))
+
+
+def extract_rule_facts(text: str) -> Dict[str, Any]:
+    """Faits déterministes trouvés dans le texte (valeurs canoniques, clé absente si non trouvé)."""
+    facts: Dict[str, Any] = {}
+    if match := EMAIL_RE.search(text):
+        facts["email"] = match.group().lower().rstrip(".")
+    if match := PHONE_RE.search(text):
+        facts["telephone"] = normalize_phone(match.group())
+    if match := ADDRESS_RE.search(text):
+        facts["adresse"] = " ".join(match.group(1).split())
+    if match := POSTAL_CITY_RE.search(text):
+        facts["code_postal"], facts["ville"] = match.group(1), match.group(2)
+    elif match := POSTAL_RE.search(text):
+        facts["code_postal"] = match.group(1)
+    if "ville" not in facts and (match := CITY_RE.search(text)):
+        facts["ville"] = match.group(1)
+
+    for match in INCOME_RE.finditer(text):
+        value = _amount(match)
+        if value:
+            period = (match.group("period") or "").lower()
+            facts["revenu_annuel"] = round(value * 12 if "mois" in period or "mensuel" in period else value, 2)
+            break
+    savings = sorted([*SAVINGS_RE.finditer(text), *SAVINGS_AMOUNT_FIRST_RE.finditer(text)], key=lambda m: m.start())
+    for match in savings:
+        value = _amount(match)
+        if value:
+            facts["epargne"] = round(value, 2)
+            break
+
+    if NO_CHILDREN_RE.search(text):
+        facts["nombre_enfants"] = 0
+    elif match := CHILDREN_RE.search(text):
+        word = match.group(1).lower()
+        facts["nombre_enfants"] = int(word) if word.isdigit() else _WORD_NUMBERS[word]
+    if match := AGE_RE.search(text):
+        facts["age"] = int(match.group(1))
+    if match := NAME_RE.search(text):
+        facts["prenom"], facts["nom"] = match.group(1), match.group(2)
+    if match := CIVILITY_RE.search(text):
+        facts["civilite"] = {"Monsieur": "M.", "Madame": "Mme", "Mademoiselle": "Mlle"}[match.group(1)]
+    if match := RESIDENCE_RE.search(text):
+        facts["residence_fiscale"] = COUNTRY_TERMS[match.group(1).lower()]
+
+    for key, terms in (("situation_familiale", MARITAL_TERMS), ("activite", ACTIVITY_TERMS),
+                       ("statut_professionnel", STATUS_TERMS), ("tolerance_risque", RISK_TERMS)):
+        value = _first_term(text, terms)
+        if value is not None:
+            facts[key] = value
+    return facts
+
+
+# -------------------------
+# Schémas
+# -------------------------
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    description: str  # envoyée au LLM dans le schéma compact
+    rule: Optional[str] = None  # clé de extract_rule_facts
+    kind: str = "text"  # text | number | integer | boolean | list
+    hints: Tuple[str, ...] = ()  # termes justifiant d'interroger le LLM ; vide = toujours
+    default: Any = ""
+    formatter: Optional[Callable[[Any], Any]] = None
+    accumulate: bool = False  # texte : concaténer les morceaux au lieu de garder le premier
+
+    def format(self, value: Any) -> Any:
+        return self.formatter(value) if self.formatter else value
+
+    def worth_asking(self, normalized_text: str) -> bool:
+        return not self.hints or any(hint in normalized_text for hint in self.hints)
+
+
+@dataclass(frozen=True)
+class ExtractionSchema:
+    name: str
+    fields: Tuple[Field, ...]
+    context: str = "un entretien entre un conseiller en gestion de patrimoine et son client"
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+
+
+def _normalize(text: str) -> str:
+    return _strip_accents(text.lower())
+
+
+def _number_str(value: Any) -> str:
+    number = float(value)
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+_OBJECTIVE_HINTS = ("objectif", "projet", "souhait", "voudrais", "aimerai", "reduire", "optimis", "defiscal",
+                    "transmettre", "transmission", "retraite", "investir", "acheter", "preparer", "proteger")
+_PROFESSION_HINTS = ("travaille", "profession", "metier", "poste", "ingenieur", "medecin", "avocat", "cadre",
+                     "commercial", "enseignant", "professeur", "infirmi", "artisan", "employe", "directeur",
+                     "chef", "consultant", "gerant", "comptable", "retraite", "salarie", "independant")
+
+_CLIENT_MARITAL = {"celibataire": "Célibataire", "marie": "Marié(e)", "pacs": "Pacsé(e)",
+                   "divorce": "Divorcé(e)", "veuf": "Veuf/Veuve"}
+_PROFILE_MARITAL = {"celibataire": "Célibataire", "marie": "Marié", "pacs": "PACS",
+                    "divorce": "Divorcé", "veuf": "Veuf"}
+
+CLIENT_SCHEMA = ExtractionSchema("client", (
+    Field("nom_client", "nom de famille", rule="nom", hints=("appelle", "nom", "monsieur", "madame")),
+    Field("prenom_client", "prénom", rule="prenom", hints=("appelle", "prenom", "monsieur", "madame")),
+    Field("email_client", "adresse email", rule="email", hints=("@", "mail", "arobase")),
+    Field("telephone_principal_client", "téléphone principal", rule="telephone", hints=("telephone", "portable", "numero")),
+    Field("profession_client1", "profession ou métier", hints=_PROFESSION_HINTS),
+    Field("revenu_net_annuel_client1", "revenu net annuel en euros (nombre)", rule="revenu_annuel",
+          hints=("revenu", "salaire", "gagne", "euros", "€", "touche"), formatter=_number_str),
+    Field("situation_maritale_client", "Célibataire, Marié(e), Pacsé(e), Divorcé(e) ou Veuf/Veuve",
+          rule="situation_familiale", hints=("mari", "pacs", "divorc", "veu", "celibataire", "couple", "conjoint", "compagn"),
+          formatter=_CLIENT_MARITAL.get),
+    Field("nombre_enfants_a_charge_client", "nombre d'enfants à charge", rule="nombre_enfants",
+          hints=("enfant", "fils", "fille"), formatter=str),
+    Field("adresse_postale_client", "adresse (numéro et voie)", rule="adresse",
+          hints=("rue", "avenue", "boulevard", "adresse", "chemin", "place")),
+    Field("code_postal_client", "code postal", rule="code_postal", hints=("code postal",)),
+    Field("ville_client", "ville", rule="ville", hints=("habite", "ville", "vis a", "reside")),
+    Field("objectifs_fiscaux_client", "objectifs fiscaux mentionnés", hints=_OBJECTIVE_HINTS, accumulate=True),
+    Field("objectifs_patrimoniaux_client", "objectifs patrimoniaux mentionnés", hints=_OBJECTIVE_HINTS, accumulate=True),
+    Field("notes_objectifs_projets_client", "projets et points particuliers", hints=_OBJECTIVE_HINTS, accumulate=True),
+))
+
+DISCOVERY_SCHEMA = ExtractionSchema("discovery", (
+    Field("age", "âge du client (nombre)", rule="age", hints=("ans", "age", "ne en", "nee en"), formatter=str),
+    Field("situation_familiale", "celibataire|marie|pacs|divorce|veuf", rule="situation_familiale",
+          hints=("mari", "pacs", "divorc", "veu", "celibataire", "couple", "conjoint", "compagn"), default="celibataire"),
+    Field("nombre_enfants", "nombre d'enfants à charge", rule="nombre_enfants", kind="integer",
+          hints=("enfant", "fils", "fille"), default=0),
+    Field("residence_fiscale", "pays de résidence fiscale", rule="residence_fiscale",
+          hints=("resid", "domicil", "etranger", "expatri"), default="france"),
+    Field("revenus_principaux", "revenus annuels principaux (nombre)", rule="revenu_annuel",
+          hints=("revenu", "salaire", "gagne", "euros", "€", "touche"), formatter=_number_str),
+    Field("activite_principale", "salarie|independant|retraite|chomeur|etudiant", rule="activite",
+          hints=_PROFESSION_HINTS, default="salarie"),
+    Field("revenus_complementaires", "revenus complémentaires", kind="list",
+          hints=("loyer", "locati", "dividende", "complement", "pension", "rente"), default=[]),
+    Field("charges_deductibles", "charges déductibles annuelles (nombre)", kind="number",
+          hints=("charge", "deduct", "pension alimentaire", "dons"), formatter=_number_str),
+    Field("residence_principale", "propriétaire de sa résidence principale (true/false)", kind="boolean",
+          hints=("proprietaire", "residence principale", "credit immobilier", "pret immobilier"), default=False),
+    Field("residence_secondaire", "propriétaire d'une résidence secondaire (true/false)", kind="boolean",
+          hints=("residence secondaire", "maison de vacances"), default=False),
+    Field("epargne_totale", "montant total de l'épargne (nombre)", rule="epargne",
+          hints=("epargne", "economies", "de cote", "placement"), formatter=_number_str),
+    Field("investissements", "types d'investissements détenus", kind="list",
+          hints=("assurance vie", "assurance-vie", "pea", "actions", "scpi", "crypto", "livret", "per", "immobilier locatif", "compte titre"),
+          default=[]),
+    Field("objectifs_court_terme", "objectifs à moins de 2 ans", kind="list", hints=_OBJECTIVE_HINTS, default=[]),
+    Field("objectifs_moyen_terme", "objectifs entre 2 et 5 ans", kind="list", hints=_OBJECTIVE_HINTS, default=[]),
+    Field("objectifs_long_terme", "objectifs à plus de 5 ans", kind="list", hints=_OBJECTIVE_HINTS, default=[]),
+    Field("niveau_connaissance_fiscale", "debutant|intermediaire|avance|expert",
+          hints=("connai", "maitrise", "fiscalite", "notion"), default="debutant"),
+    Field("experience_investissement", "aucune|faible|moyenne|elevee",
+          hints=("experience", "investi", "bourse", "placement"), default="aucune"),
+    Field("tolerance_risque", "conservateur|equilibre|dynamique", rule="tolerance_risque",
+          hints=("risque", "prudent", "securi", "dynamique"), default="conservateur"),
+    Field("besoins_specifiques", "besoins particuliers mentionnés", kind="list", hints=("besoin", "souhait", "important"), default=[]),
+    Field("questions_prioritaires", "questions principales du client", hints=("?", "question", "savoir", "comment"), accumulate=True),
+    Field("optimisations_souhaitees", "optimisations recherchées", kind="list",
+          hints=("optimis", "reduire", "defiscal", "economiser", "impot"), default=[]),
+))
+
+PROFILE_SCHEMA = ExtractionSchema("profile", (
+    Field("civilite_client", "M., Mme ou Mlle", rule="civilite", hints=("monsieur", "madame", "mademoiselle"), default=None),
+    Field("nom_client", "nom de famille", rule="nom", hints=("appelle", "nom"), default=None),
+    Field("prenom_client", "prénom", rule="prenom", hints=("appelle", "prenom"), default=None),
+    Field("nom_usage_client", "nom d'usage", hints=("nom d'usage", "nom de jeune fille", "nee "), default=None),
+    Field("date_naissance_client", "date de naissance YYYY-MM-DD", hints=("ne le", "nee le", "naissance"), default=None),
+    Field("lieu_naissance_client", "ville de naissance", hints=("ne a", "nee a", "naissance"), default=None),
+    Field("nationalite_client", "nationalité", hints=("nationalit", "francais", "francaise", "citoyen"), default=None),
+    Field("numero_fiscal_client", "numéro fiscal", hints=("numero fiscal", "fiscal"), default=None),
+    Field("adresse_postale_client", "adresse (numéro et voie)", rule="adresse",
+          hints=("rue", "avenue", "boulevard", "adresse", "chemin", "place"), default=None),
+    Field("code_postal_client", "code postal", rule="code_postal", hints=("code postal",), default=None),
+    Field("ville_client", "ville", rule="ville", hints=("habite", "ville", "vis a", "reside", "suis a"), default=None),
+    Field("pays_residence_fiscale_client", "pays de résidence fiscale", rule="residence_fiscale",
+          hints=("resid", "domicil", "pays", "habite", "suis a", "vis a"), default=None, formatter=str.capitalize),
+    Field("email_client", "adresse email", rule="email", hints=("@", "mail", "arobase"), default=None),
+    Field("telephone_principal_client", "téléphone principal", rule="telephone", hints=("telephone", "portable", "numero"), default=None),
+    Field("telephone_secondaire_client", "téléphone secondaire", hints=("second numero", "autre numero", "fixe"), default=None),
+    Field("situation_maritale_client", "Célibataire, Marié, PACS, Divorcé ou Veuf", rule="situation_familiale",
+          hints=("mari", "pacs", "divorc", "veu", "celibataire", "couple", "conjoint"), default=None, formatter=_PROFILE_MARITAL.get),
+    Field("date_mariage_pacs_client", "date du mariage ou du PACS YYYY-MM-DD", hints=("marie le", "mariee le", "pacse le", "pacses le", "mariage"), default=None),
+    Field("regime_matrimonial_client", "régime matrimonial", hints=("regime", "communaute", "separation de biens", "contrat de mariage"), default=None),
+    Field("nombre_enfants_a_charge_client", "nombre d'enfants à charge", rule="nombre_enfants", kind="integer",
+          hints=("enfant", "fils", "fille"), default=None),
+    Field("personnes_dependantes_client", "autres personnes à charge", hints=("a charge", "dependant", "parent age"), default=None),
+    Field("profession_client1", "profession", hints=_PROFESSION_HINTS, default=None),
+    Field("statut_professionnel_client1", "CDI, CDD, Fonctionnaire, Indépendant ou Retraité", rule="statut_professionnel",
+          hints=_PROFESSION_HINTS, default=None),
+    Field("nom_employeur_entreprise_client1", "employeur", hints=("chez ", "employeur", "entreprise", "societe"), default=None),
+    Field("type_contrat_client1", "type de contrat", hints=("contrat", "cdi", "cdd", "interim"), default=None),
+    Field("revenu_net_annuel_client1", "revenu net annuel en euros (nombre)", rule="revenu_annuel", kind="number",
+          hints=("revenu", "salaire", "gagne", "euros", "€", "touche"), default=None),
+    Field("profession_client2", "profession du conjoint", hints=("conjoint", "femme", "mari", "epou", "compagn"), default=None),
+    Field("statut_professionnel_client2", "statut professionnel du conjoint", hints=("conjoint", "femme", "mari", "epou", "compagn"), default=None),
+    Field("nom_employeur_entreprise_client2", "employeur du conjoint", hints=("conjoint", "femme", "mari", "epou", "compagn"), default=None),
+    Field("type_contrat_client2", "type de contrat du conjoint", hints=("conjoint", "femme", "mari", "epou", "compagn"), default=None),
+    Field("revenu_net_annuel_client2", "revenu net annuel du conjoint (nombre)", kind="number",
+          hints=("conjoint", "femme", "mari", "epou", "compagn"), default=None),
+    Field("objectifs_fiscaux_client", "objectifs fiscaux", hints=_OBJECTIVE_HINTS, default=None, accumulate=True),
+    Field("objectifs_patrimoniaux_client", "objectifs patrimoniaux", hints=_OBJECTIVE_HINTS, default=None, accumulate=True),
+    Field("notes_objectifs_projets_client", "notes et projets", hints=_OBJECTIVE_HINTS, default=None, accumulate=True),
+), context="un texte dicté par un utilisateur qui décrit sa situation")
+
+
+# -------------------------
+# Passe LLM
+# -------------------------
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_transcript(text: str, max_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """Morceaux d'au plus ~max_chars coupés entre deux phrases ; chaque morceau reprend la fin du précédent."""
+    if len(text) <= max_chars:
+        return [text]
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in filter(None, (s.strip() for s in _SENTENCE_SPLIT_RE.split(text))):
+        if current and size + len(sentence) > max_chars:
+            chunks.append(" ".join(current))
+            tail: List[str] = []
+            tail_size = 0
+            for previous in reversed(current):
+                if tail_size + len(previous) > overlap:
+                    break
+                tail.insert(0, previous)
+                tail_size += len(previous) + 1
+            current, size = tail, tail_size
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Premier objet JSON d'une réponse de LLM (avec ou sans bloc ```json)."""
+    if not text:
+        return None
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _coerce(field_spec: Field, value: Any) -> Any:
+    """Valeur du LLM convertie au type du champ ; None si absente ou inexploitable."""
+    if value is None or (isinstance(value, str) and value.strip().lower() in ("", "null", "none", "n/a", "inconnu")):
+        return None
+    if field_spec.kind in ("number", "integer"):
+        if isinstance(value, str):
+            match = re.search(rf"({_NUMBER})\s*{_UNIT}", value)
+            value = parse_amount(match.group(1), match.group("mult")) if match else None
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return None
+        return int(value) if field_spec.kind == "integer" else float(value)
+    if field_spec.kind == "boolean":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "oui", "yes", "vrai")
+        return bool(value)
+    if field_spec.kind == "list":
+        items = value if isinstance(value, list) else str(value).split(",")
+        items = [str(item).strip() for item in items if str(item).strip()]
+        return items or None
+    return " ".join(value) if isinstance(value, list) else str(value).strip()
+
+
+def merge_chunk_values(fields: Sequence[Field], chunk_values: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fusion dans l'ordre des morceaux : listes réunies, textes cumulés si demandé, sinon première valeur."""
+    merged: Dict[str, Any] = {}
+    for field_spec in fields:
+        for values in chunk_values:
+            value = _coerce(field_spec, values.get(field_spec.name))
+            if value is None:
+                continue
+            current = merged.get(field_spec.name)
+            if current is None:
+                merged[field_spec.name] = value
+            elif field_spec.kind == "list":
+                merged[field_spec.name] = current + [item for item in value if item not in current]
+            elif field_spec.accumulate and value not in current:
+                merged[field_spec.name] = f"{current} ; {value}"
+    return merged
+
+
+@dataclass
+class ExtractionResult:
+    data: Dict[str, Any]
+    rule_fields: List[str] = field(default_factory=list)
+    llm_fields: List[str] = field(default_factory=list)  # champs demandés au LLM
+    llm_calls: int = 0
+    chunks: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def filled_fields(self) -> List[str]:
+        return [name for name in self.rule_fields + self.llm_fields if self.data.get(name) not in (None, "", [])]
+
+    def field_confidence(self) -> Dict[str, float]:
+        """0.9 pour une règle, 0.7 pour le LLM, 0.3 pour une valeur par défaut."""
+        filled = set(self.filled_fields)
+        return {name: 0.9 if name in self.rule_fields else 0.7 if name in filled else 0.3 for name in self.data}
+
+    @property
+    def confidence(self) -> float:
+        scores = self.field_confidence()
+        return round(sum(scores.values()) / len(scores), 2) if scores else 0.0
+
+
+async def _default_completion(prompt: str, system: str = "", max_tokens: int = LLM_MAX_TOKENS) -> str:
+    from llm_completion import complete
+    return await complete(prompt, system, max_tokens=max_tokens, temperature=0.0)
+
+
+class TranscriptExtractor:
+    """Règles déterministes puis, pour les champs restants seulement, le LLM morceau par morceau."""
+
+    def __init__(self, schema: ExtractionSchema, completion: Optional[Completion] = None,
+                 chunk_chars: int = CHUNK_CHARS, chunk_overlap: int = CHUNK_OVERLAP_CHARS,
+                 concurrency: int = LLM_CONCURRENCY):
+        self.schema = schema
+        self.completion = completion or _default_completion
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self.concurrency = concurrency
+
+    def apply_rules(self, transcript: str) -> Tuple[Dict[str, Any], List[str]]:
+        """Première passe seule (sans LLM) : données avec valeurs par défaut et champs trouvés."""
+        facts = extract_rule_facts(transcript)
+        data = {f.name: (list(f.default) if isinstance(f.default, list) else f.default) for f in self.schema.fields}
+        found = []
+        for f in self.schema.fields:
+            if f.rule and facts.get(f.rule) is not None:
+                value = f.format(facts[f.rule])
+                if value is not None:
+                    data[f.name] = value
+                    found.append(f.name)
+        return data, found
+
+    def _prompt(self, fields: Sequence[Field], chunk: str, part: str, instructions: Optional[str]) -> Tuple[str, str]:
+        system = (
+            f"Tu extrais des informations de {self.schema.context}. Réponds UNIQUEMENT par un objet JSON "
+            "avec les clés demandées ; null si l'information n'apparaît pas. N'invente rien."
+        )
+        compact_schema = json.dumps({f.name: f.description for f in fields}, ensure_ascii=False)
+        extra = f"\n{instructions.strip()}\n" if instructions and instructions.strip() else ""
+        return f"Clés : {compact_schema}\n{extra}\nTranscription{part} :\n{chunk}", system
+
+    async def extract(self, transcript: str, instructions: Optional[str] = None) -> ExtractionResult:
+        data, rule_fields = self.apply_rules(transcript)
+        result = ExtractionResult(data=data, rule_fields=rule_fields)
+        normalized = _normalize(transcript)
+        residual = [f for f in self.schema.fields if f.name not in rule_fields and f.worth_asking(normalized)]
+        if not residual:
+            return result
+
+        chunks = split_transcript(transcript, self.chunk_chars, self.chunk_overlap)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def ask(index: int, chunk: str) -> Dict[str, Any]:
+            part = f" (partie {index + 1}/{len(chunks)})" if len(chunks) > 1 else ""
+            prompt, system = self._prompt(residual, chunk, part, instructions)
+            async with semaphore:
+                answer = await self.completion(prompt, system=system, max_tokens=LLM_MAX_TOKENS)
+            parsed = parse_json_object(answer)
+            if parsed is None:
+                raise ValueError(f"réponse sans JSON exploitable ({answer[:80]!r})")
+            return parsed
+
+        responses = await asyncio.gather(*(ask(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+        chunk_values = []
+        for response in responses:
+            if isinstance(response, BaseException):
+                result.errors.append(str(response))
+            else:
+                chunk_values.append(response)
+        if result.errors:
+            print(f"[WARN] Extraction {self.schema.name} : {len(result.errors)} morceau(x) sans réponse du LLM : {result.errors[0]}")
+
+        result.llm_fields = [f.name for f in residual]
+        result.llm_calls = len(chunks)
+        result.chunks = len(chunks)
+        for name, value in merge_chunk_values(residual, chunk_values).items():
+            field_spec = next(f for f in residual if f.name == name)
+            data[name] = field_spec.format(value) if field_spec.kind in ("number", "integer") and field_spec.formatter else value
+        return result
+
+
+client_extractor = TranscriptExtractor(CLIENT_SCHEMA)
+discovery_extractor = TranscriptExtractor(DISCOVERY_SCHEMA)
+profile_extractor = TranscriptExtractor(PROFILE_SCHEMA)
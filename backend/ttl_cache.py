@@ -0,0 +1,278 @@
+"""Cache LRU à expiration, borné en entrées et en octets, instrumenté.
+
+Remplace les caches écrits à la main : dictionnaires sans limite, éviction
+par tri de tous les horodatages ou en FIFO, `functools.lru_cache` sur des
+méthodes (qui retient `self` et ignore toute expiration).
+
+- LRU en O(1) (OrderedDict) et TTL par cache ou par entrée ; avec
+  `sliding=True`, chaque lecture repousse l'expiration (sessions).
+- Taille estimée de chaque valeur (`sizeof`) et plafond `max_bytes`.
+- Métriques par cache, exposées sur /metrics :
+  `fiscal_cache_events_total{cache, event=hit|miss|eviction|expired}`,
+  `fiscal_cache_entries{cache}` et `fiscal_cache_bytes{cache}`. Les jauges
+  additionnent toutes les instances d'un même nom (un cache par instance
+  avec `cached_method`) ; une instance collectée en retire sa part.
+- Sûr entre threads : le verrou n'est jamais tenu pendant un calcul.
+  `get_or_compute` / `aget_or_compute` ne lancent qu'un calcul à la fois
+  par clé manquante ; les autres appelants attendent son résultat.
+
+`cached_method` remplace `lru_cache` sur les méthodes : le cache est rangé
+sur l'instance, qui n'est donc pas retenue par le décorateur.
+"""
+import asyncio
+import functools
+import math
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from tracing import registry
+
+CACHE_EVENTS = registry.counter(
+    "fiscal_cache_events_total", "Lectures et évictions par cache", ("cache", "event"))
+CACHE_ENTRIES = registry.gauge("fiscal_cache_entries", "Entrées présentes par cache", ("cache",))
+CACHE_BYTES = registry.gauge("fiscal_cache_bytes", "Taille estimée des valeurs par cache (octets)", ("cache",))
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Taille approximative en octets (tableaux numpy : nbytes ; conteneurs : contenu compris)."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes + 112
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """LRU à expiration ; `None` comme valeur est accepté par `set` mais jamais mis en cache par les calculs."""
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sliding: bool = False,
+                 sizeof: Callable[[Any], int] = estimate_size, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sliding = sliding
+        self._sizeof = sizeof
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()  # (expiration, taille, valeur)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._computing: Dict[Hashable, threading.Event] = {}
+        self._acomputing: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._published = [0, 0]  # part de ce cache dans les jauges (entrées, octets)
+        weakref.finalize(self, _withdraw, name, self._published)
+
+    # -- accès -----------------------------------------------------------
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        size = self._sizeof(value)
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._count("evictions", "eviction")  # valeur plus grande que tout le cache
+                self._publish()
+                return
+            expires_at = self._clock() + ttl if ttl is not None else math.inf
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            self._shrink()
+            self._publish()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+            self._publish()
+        return default if entry is None else entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._publish()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Copie des entrées non expirées, de la moins à la plus récemment utilisée (sans effet sur le LRU)."""
+        now = self._clock()
+        with self._lock:
+            return iter([(key, entry[2]) for key, entry in self._entries.items() if entry[0] > now])
+
+    def info(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    # -- calcul à la demande -----------------------------------------------
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Valeur en cache, sinon `compute()` (un seul calcul par clé, même entre threads)."""
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    return value
+                waiting = self._computing.get(key)
+                if waiting is None:
+                    done = self._computing[key] = threading.Event()
+                    break
+            waiting.wait()
+            with self._lock:
+                value = self._lookup(key, count=False)
+            if value is not _MISSING:
+                return value
+            # Le calcul concurrent a échoué ou renvoyé None : on recommence
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._computing.pop(key, None)
+            done.set()
+
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                              ttl: Optional[float] = None) -> Any:
+        """Comme `get_or_compute` pour une coroutine ; les requêtes concurrentes partagent le calcul."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                return value
+            pending = self._acomputing.get(key)
+            if pending is None:
+                future = self._acomputing[key] = asyncio.get_running_loop().create_future()
+        if pending is not None:
+            return await asyncio.shield(pending)
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # consommée ici si personne n'attendait
+            raise
+        else:
+            if value is not None:
+                self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._acomputing.pop(key, None)
+
+    # -- interne (verrou tenu) ------------------------------------------------
+
+    def _count(self, stat: str, event: str, amount: int = 1) -> None:
+        self.stats[stat] += amount
+        CACHE_EVENTS.inc(amount, cache=self.name, event=event)
+
+    def _lookup(self, key: Hashable, count: bool = True) -> Any:
+        entry = self._entries.get(key)
+        now = self._clock()
+        if entry is not None and entry[0] <= now:
+            self._remove(key)
+            self._count("expired", "expired")
+            self._publish()
+            entry = None
+        if entry is None:
+            if count:
+                self._count("misses", "miss")
+            return _MISSING
+        if self.sliding and self.ttl is not None:
+            self._entries[key] = (now + self.ttl, entry[1], entry[2])
+        self._entries.move_to_end(key)
+        if count:
+            self._count("hits", "hit")
+        return entry[2]
+
+    def _remove(self, key: Hashable) -> Optional[Tuple[float, int, Any]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+        return entry
+
+    def _shrink(self) -> None:
+        now = self._clock()
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            key, (expires_at, _, _) = next(iter(self._entries.items()))
+            self._remove(key)
+            if expires_at <= now:
+                self._count("expired", "expired")
+            else:
+                self._count("evictions", "eviction")
+
+    def _publish(self) -> None:
+        entries, size = len(self._entries), self._bytes
+        CACHE_ENTRIES.inc(entries - self._published[0], cache=self.name)
+        CACHE_BYTES.inc(size - self._published[1], cache=self.name)
+        self._published[:] = [entries, size]
+
+
+def _withdraw(name: str, published: list) -> None:
+    """Retire des jauges la part d'un cache collecté."""
+    CACHE_ENTRIES.inc(-published[0], cache=name)
+    CACHE_BYTES.inc(-published[1], cache=name)
+
+
+def cached_method(max_entries: int = 128, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                  name: Optional[str] = None):
+    """Mémoïse une méthode dans un TTLCache propre à l'instance (arguments hashables)."""
+
+    def decorator(func):
+        attribute = f"_cache_{func.__name__}"
+        cache_name = name or func.__qualname__
+
+        def cache_of(instance) -> TTLCache:
+            cache = instance.__dict__.get(attribute)
+            if cache is None:
+                cache = instance.__dict__.setdefault(attribute, TTLCache(cache_name, max_entries, ttl, max_bytes))
+            return cache
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items())) if kwargs else args
+            return cache_of(self).get_or_compute(key, lambda: func(self, *args, **kwargs))
+
+        wrapper.cache_of = cache_of
+        return wrapper
+
+    return decorator
@@ -0,0 +1,169 @@
+"""Contexte utilisateur (profil et type de compte) mis en cache par processus.
+
+Les routes authentifiées lisaient chacune `profils_utilisateurs` (/auth/me,
+quota de /ask, vérification du rôle pro sur chaque endpoint /api/pro). Le
+profil est désormais lu une fois par requête via une dépendance FastAPI
+(partagée par toutes les vérifications de la requête) et conservé
+USER_CONTEXT_TTL_SECONDS secondes.
+
+Toute écriture du profil (inscription, connexion, compte Andorre, webhooks
+Stripe) doit appeler `user_contexts.invalidate(...)`. Le cache est propre à
+chaque worker : une modification faite par un autre worker est vue au plus
+tard à l'expiration du TTL, d'où une valeur courte.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+USER_CONTEXT_TTL_SECONDS = float(os.getenv("USER_CONTEXT_TTL_SECONDS", "60"))
+USER_CONTEXT_MAX_ENTRIES = int(os.getenv("USER_CONTEXT_MAX_ENTRIES", "10000"))
+PROFILE_COLUMNS = "user_id, email, taper, full_name"
+
+
+@dataclass(slots=True)
+class UserContext:
+    user_id: str
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    taper: str = "particulier"
+    found: bool = True  # False : aucune ligne dans profils_utilisateurs
+    error: Optional[str] = None  # lecture impossible (Supabase absent ou en erreur), jamais mis en cache
+    profile: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def available(self) -> bool:
+        return self.error is None
+
+    @property
+    def is_professional(self) -> bool:
+        return self.taper == "professionnel"
+
+    @classmethod
+    def from_row(cls, user_id: str, row: Optional[Dict[str, Any]]) -> "UserContext":
+        if not row:
+            return cls(user_id=user_id, found=False)
+        return cls(user_id=user_id, email=row.get("email"), full_name=row.get("full_name"),
+                   taper=row.get("taper") or "particulier", profile=dict(row))
+
+    @classmethod
+    def unavailable(cls, user_id: str, error: str) -> "UserContext":
+        return cls(user_id=user_id, found=False, error=error)
+
+
+def fetch_profile(client, user_id: str) -> Optional[Dict[str, Any]]:
+    """Ligne de profils_utilisateurs, ou None si l'utilisateur n'en a pas."""
+    response = (
+        client.table("profils_utilisateurs")
+        .select(PROFILE_COLUMNS)
+        .eq("user_id", user_id)
+        .maybe_single()
+        .execute()
+    )
+    # maybe_single() renvoie None (et non une réponse vide) selon les versions du client
+    return getattr(response, "data", None) if response is not None else None
+
+
+class UserContextCache:
+    """LRU à expiration, indexé par user_id (et par email pour les webhooks Stripe)."""
+
+    def __init__(self, ttl: float = USER_CONTEXT_TTL_SECONDS, max_entries: int = USER_CONTEXT_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, UserContext]]" = OrderedDict()
+        self._by_email: Dict[str, str] = {}
+        # Lectures Supabase en cours : user_id -> [version, lecteurs]. La version est incrémentée à
+        # chaque invalidation (une lecture commencée avant n'est pas mise en cache) ; l'entrée
+        # disparaît avec le dernier lecteur, la table reste bornée par les lectures simultanées.
+        self._reads: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, user_id: str) -> Optional[UserContext]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    self._drop(user_id)
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, context: UserContext, version: Optional[int] = None) -> None:
+        """Met `context` en cache ; avec `version` (voir `version`), termine la lecture et
+        ignore un résultat antérieur à une invalidation."""
+        with self._lock:
+            if version is not None and not self._finish_read(context.user_id, version):
+                return
+            if not context.available:
+                return
+            self._drop(context.user_id)
+            self._entries[context.user_id] = (self._clock() + self.ttl, context)
+            if context.email:
+                self._by_email[context.email.lower()] = context.user_id
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def version(self, user_id: str) -> int:
+        """Ouvre une lecture de `user_id` ; à terminer par `put(context, version)`."""
+        with self._lock:
+            read = self._reads.setdefault(user_id, [0, 0])
+            read[1] += 1
+            return read[0]
+
+    def invalidate(self, user_id: Optional[str] = None, email: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None and email:
+                user_id = self._by_email.get(email.lower())
+            if user_id is None:
+                return
+            if user_id in self._reads:
+                self._reads[user_id][0] += 1
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            for read in self._reads.values():
+                read[0] += 1
+            self._entries.clear()
+            self._by_email.clear()
+
+    def _finish_read(self, user_id: str, version: int) -> bool:
+        """Termine une lecture ; True si aucune invalidation n'est survenue depuis son début."""
+        read = self._reads.get(user_id)
+        if read is None:
+            return False
+        read[1] -= 1
+        if read[1] <= 0:
+            del self._reads[user_id]
+        return read[0] == version
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None and entry[1].email:
+            self._by_email.pop(entry[1].email.lower(), None)
+
+    def load(self, client, user_id: str) -> UserContext:
+        """Contexte en cache, sinon lu dans Supabase. Ne lève pas : voir `UserContext.error`."""
+        context = self.get(user_id)
+        if context is not None:
+            return context
+        if client is None:
+            return UserContext.unavailable(user_id, "Service Supabase non disponible")
+        version = self.version(user_id)
+        try:
+            context = UserContext.from_row(user_id, fetch_profile(client, user_id))
+        except Exception as e:
+            print(f"[WARN] Profil de {user_id} illisible : {e}")
+            context = UserContext.unavailable(user_id, str(e))
+        self.put(context, version)
+        return context
+
+
+user_contexts = UserContextCache()
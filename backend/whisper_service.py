@@ -4,9 +4,14 @@ import tempfile
 import os
 import time
 from typing import Dict, Any, Optional, List, Generator
-from faster_whisper import WhisperModel
 import logging
-from functools import lru_cache
+
+from tracing import traced
+from ttl_cache import TTLCache
+
+TRANSCRIPTION_CACHE_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_ENTRIES", "200"))
+TRANSCRIPTION_CACHE_TTL_SECONDS = float(os.getenv("TRANSCRIPTION_CACHE_TTL_SECONDS", "3600"))
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -29,8 +34,11 @@ class WhisperTranscriptionService:
         
         # Optimisations pour Railway
         self._model_cache = {}
-        self._transcription_cache = {}
+        # Transcriptions réussies, indexées par empreinte du contenu audio
+        self._transcription_cache = TTLCache("whisper_transcriptions", TRANSCRIPTION_CACHE_ENTRIES,
+                                             TRANSCRIPTION_CACHE_TTL_SECONDS, TRANSCRIPTION_CACHE_MAX_BYTES)
     
+    @traced("whisper_model_load")
     def _load_model(self):
         """Charge le modèle Whisper avec optimisations."""
         if self._is_loading:
@@ -42,6 +50,9 @@ class WhisperTranscriptionService:
             self._load_start_time = time.time()
             logger.info(f"Chargement du modèle Whisper {self.model_size}...")
             
+            # Import différé : faster-whisper n'est chargé qu'avec le modèle
+            from faster_whisper import WhisperModel
+            
             # Optimisations ultra-rapides pour Railway
             self.model = WhisperModel(
                 self.model_size,
@@ -78,11 +89,7 @@ class WhisperTranscriptionService:
         import hashlib
         return hashlib.md5(audio_data).hexdigest()
     
-    @lru_cache(maxsize=200)  # Cache plus grand
-    def _cached_transcribe(self, cache_key: str, audio_path: str) -> Dict[str, Any]:
-        """Transcription avec cache ultra-optimisé."""
-        return self._transcribe_audio_file_internal(audio_path)
-    
+    @traced("transcription")
     def _transcribe_audio_file_internal(self, audio_path: str) -> Dict[str, Any]:
         """
         Transcription interne ultra-robuste avec paramètres optimaux.
@@ -229,21 +236,17 @@ class WhisperTranscriptionService:
             cache_key = self._get_cache_key(audio_data)
             
             # Utiliser le cache si disponible
-            if cache_key in self._transcription_cache:
+            cached = self._transcription_cache.get(cache_key)
+            if cached is not None:
                 logger.info("Utilisation du cache pour la transcription")
-                return self._transcription_cache[cache_key]
+                return cached
             
             # Transcription normale
             result = self._transcribe_audio_file_internal(audio_path)
             
             # Mettre en cache si succès
             if not result.get("error") and result.get("text"):
-                self._transcription_cache[cache_key] = result
-                # Limiter la taille du cache
-                if len(self._transcription_cache) > 50:
-                    # Supprimer les plus anciens
-                    oldest_key = next(iter(self._transcription_cache))
-                    del self._transcription_cache[oldest_key]
+                self._transcription_cache.set(cache_key, result)
             
             return result
             
@@ -276,9 +279,10 @@ class WhisperTranscriptionService:
             
             # Vérifier le cache
             cache_key = self._get_cache_key(audio_data)
-            if cache_key in self._transcription_cache:
+            cached = self._transcription_cache.get(cache_key)
+            if cached is not None:
                 logger.info("Utilisation du cache pour la transcription base64")
-                return self._transcription_cache[cache_key]
+                return cached
             
             # Création d'un fichier temporaire
             with tempfile.NamedTemporaryFile(suffix=f".{audio_format}", delete=False) as temp_file:
@@ -291,11 +295,7 @@ class WhisperTranscriptionService:
                 
                 # Mettre en cache si succès
                 if not result.get("error") and result.get("text"):
-                    self._transcription_cache[cache_key] = result
-                    # Limiter la taille du cache
-                    if len(self._transcription_cache) > 50:
-                        oldest_key = next(iter(self._transcription_cache))
-                        del self._transcription_cache[oldest_key]
+                    self._transcription_cache.set(cache_key, result)
                 
                 return result
             finally:
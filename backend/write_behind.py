@@ -0,0 +1,159 @@
+"""File d'écriture différée (write-behind) pour les insertions non critiques.
+
+Les enregistrements (historique des questions, analytics) sont déposés dans
+une file en O(1) sur le chemin de la requête ; un thread de fond les insère
+par lots dès que BATCH_SIZE enregistrements sont en attente ou toutes les
+FLUSH_INTERVAL_MS millisecondes. Un lot en échec est réessayé avec un délai
+croissant, et la file est vidée à l'arrêt de l'application (drain_all).
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from tracing import span
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "2000"))
+WRITE_BEHIND_MAX_RETRIES = 3
+WRITE_BEHIND_MAX_PENDING = 10_000
+
+FlushFn = Callable[[List[Dict[str, Any]]], Any]
+
+
+class WriteBehindQueue:
+    """File bornée vidée par lots dans `flush_fn` par un thread dédié."""
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: FlushFn,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_ms: int = WRITE_BEHIND_FLUSH_INTERVAL_MS,
+        max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self._pending: deque = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"enqueued": 0, "flushed": 0, "batches": 0, "dropped": 0}
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, record: Dict[str, Any]) -> None:
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                if len(self._pending) == self._pending.maxlen:
+                    self.stats["dropped"] += 1  # le plus ancien est évincé par la deque
+                self._pending.append(record)
+                self.stats["enqueued"] += 1
+                self._ensure_started()
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify()
+        if closed:
+            # Après l'arrêt : écriture directe plutôt que perte silencieuse
+            self._flush_batch([record])
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            batch.append(self._pending.popleft())
+        return batch
+
+    def _flush_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        delay = 0.2
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.flush_fn(batch)
+                self.stats["flushed"] += len(batch)
+                self.stats["batches"] += 1
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"[WARN] write-behind {self.name}: lot de {len(batch)} abandonné ({e})")
+                    self.stats["dropped"] += len(batch)
+                    return False
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size and not self._closed:
+                    self._cond.wait(timeout=self.flush_interval)
+                if self._closed and not self._pending:
+                    return
+                batch = self._take_batch()
+            if batch:
+                self._flush_batch(batch)
+
+    def flush(self) -> None:
+        """Vide la file de façon synchrone (tests, arrêt)."""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._flush_batch(batch)
+
+    def drain(self, timeout: float = 10.0) -> None:
+        """Ferme la file et attend que tous les enregistrements soient écrits."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self.flush()
+
+
+# -------------------------
+# Registre des files nommées
+# -------------------------
+
+_queues: Dict[str, WriteBehindQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def register_queue(name: str, flush_fn: FlushFn, **kwargs) -> WriteBehindQueue:
+    with _queues_lock:
+        queue = _queues.get(name)
+        if queue is None:
+            queue = WriteBehindQueue(name, flush_fn, **kwargs)
+            _queues[name] = queue
+        return queue
+
+
+def enqueue(name: str, record: Dict[str, Any]) -> bool:
+    """Dépose un enregistrement ; retourne False si aucune file n'est enregistrée sous ce nom."""
+    queue = _queues.get(name)
+    if queue is None:
+        return False
+    queue.enqueue(record)
+    return True
+
+
+def drain_all(timeout: float = 10.0) -> None:
+    with _queues_lock:
+        queues = list(_queues.values())
+    for queue in queues:
+        queue.drain(timeout=timeout)
+
+
+def supabase_insert_sink(client: Any, table: str) -> FlushFn:
+    """Insertion groupée Supabase : un seul appel HTTP par lot."""
+    def _flush(records: List[Dict[str, Any]]) -> None:
+        with span("supabase_insert"):
+            client.table(table).insert(records).execute()
+    return _flush
@@ -0,0 +1 @@
+"""Benchmarks hors ligne du backend (voir benchmarks/run.py)."""
@@ -0,0 +1,117 @@
+"""Mesure de latence : percentiles, débit, rapport JSON et comparaison entre versions."""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_samples: Sequence[float], p: float) -> float:
+    """Percentile par rang le plus proche sur des échantillons déjà triés."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples: Sequence[float], wall_seconds: float, errors: int = 0) -> Dict[str, Any]:
+    """Statistiques (en millisecondes) d'une série de durées exprimées en secondes."""
+    ordered = sorted(samples)
+    summary = {"samples": len(ordered), "errors": errors}
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(percentile(ordered, p) * 1000, 4)
+    summary.update({
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "min_ms": round(ordered[0] * 1000, 4) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+        "throughput_per_s": round(len(ordered) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    })
+    return summary
+
+
+def measure(fn: Callable[[Any], Any], inputs: Sequence[Any], iterations: int, warmup: int = 1,
+            clock: Callable[[], float] = time.perf_counter) -> Dict[str, Any]:
+    """Appelle fn sur les entrées à tour de rôle ; `warmup` passes complètes non mesurées.
+
+    Un appel qui échoue (préchauffage compris) est compté dans `errors` et la
+    première erreur est conservée dans `first_error` ; la mesure continue.
+    """
+    errors = 0
+    first_error: Optional[str] = None
+
+    def call(item: Any) -> bool:
+        nonlocal errors, first_error
+        try:
+            fn(item)
+            return True
+        except Exception as e:
+            errors += 1
+            if first_error is None:
+                first_error = str(e)[:200]
+                print(f"[WARN] {getattr(fn, '__name__', fn)} : {e}")
+            return False
+
+    for _ in range(warmup):
+        for item in inputs:
+            call(item)
+    samples: List[float] = []
+    started = clock()
+    for i in range(iterations):
+        start = clock()
+        if call(inputs[i % len(inputs)]):
+            samples.append(clock() - start)
+    summary = summarize(samples, clock() - started, errors)
+    if first_error is not None:
+        summary["first_error"] = first_error
+    return summary
+
+
+def _git_commit(cwd: Path) -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(cases: Dict[str, Dict[str, Any]], replay: Dict[str, int], iterations: int,
+                 root: Path) -> Dict[str, Any]:
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(root),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "iterations": iterations,
+        "replay": replay,
+        "cases": cases,
+    }
+
+
+def write_report(report: Dict[str, Any], path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    return path
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], metric: str = "p95_ms",
+            tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """Cas dont `metric` dépasse celui de la version de référence de plus de `tolerance`."""
+    regressions = []
+    for name, stats in current.get("cases", {}).items():
+        before = baseline.get("cases", {}).get(name, {}).get(metric)
+        after = stats.get(metric)
+        if not before or after is None:
+            continue
+        ratio = after / before
+        if ratio > 1 + tolerance:
+            regressions.append({"case": name, "metric": metric, "baseline": before,
+                                "current": after, "ratio": round(ratio, 3)})
+    return regressions
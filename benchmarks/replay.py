@@ -0,0 +1,176 @@
+"""Rejeu des réponses Mistral (embeddings) et du LLM local enregistrées dans les fixtures.
+
+Chaque entrée est indexée par l'empreinte du texte envoyé. En mode rejeu, un
+embedding absent est remplacé par un vecteur synthétique déterministe (même
+dimension, même coût de calcul de similarité) et une réponse de chat absente
+par la réponse par défaut des fixtures ; ces remplacements sont comptés dans
+le rapport. En mode enregistrement (`--record`, clés API et réseau requis),
+les absents sont demandés au vrai service puis ajoutés aux fixtures.
+"""
+import base64
+import hashlib
+import ipaddress
+import json
+import socket
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+FIXTURES_PATH = Path(__file__).resolve().parent / "fixtures" / "recorded_responses.json"
+EMBEDDING_DIM = 1024  # mistral-embed
+
+
+def _key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _encode(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode(blob: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(blob), dtype=np.float32)
+
+
+def synthetic_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Vecteur unitaire pseudo-aléatoire, toujours le même pour un texte donné."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class RecordedResponses:
+    """Réponses enregistrées d'un fichier de fixtures, avec compteurs de rejeu."""
+
+    def __init__(self, path: Path = FIXTURES_PATH, record: bool = False):
+        self.path = Path(path)
+        self.record = record
+        data = json.loads(self.path.read_text(encoding="utf-8")) if self.path.exists() else {}
+        self.queries: Dict[str, list] = data.get("queries", {})
+        self.embeddings: Dict[str, str] = data.get("embeddings", {})
+        self.chat: Dict[str, str] = data.get("chat", {})
+        self.default_chat: str = data.get("default_chat", "")
+        self.stats = {"embedding_hits": 0, "embedding_synthetic": 0, "chat_hits": 0, "chat_default": 0, "recorded": 0}
+        self._dirty = False
+
+    def embedding(self, text: str, fetch: Optional[Callable[[], Any]] = None) -> np.ndarray:
+        key = _key(text)
+        blob = self.embeddings.get(key)
+        if blob is not None:
+            self.stats["embedding_hits"] += 1
+            return _decode(blob)
+        if self.record and fetch is not None:
+            vector = np.asarray(fetch(), dtype=np.float32)
+            self.embeddings[key] = _encode(vector)
+            self.stats["recorded"] += 1
+            self._dirty = True
+            return vector
+        self.stats["embedding_synthetic"] += 1
+        return synthetic_embedding(text)
+
+    def completion(self, prompt: str, system: str = "", fetch: Optional[Callable[[], str]] = None) -> str:
+        key = _key(system, prompt)
+        if key in self.chat:
+            self.stats["chat_hits"] += 1
+            return self.chat[key]
+        if self.record and fetch is not None:
+            text = fetch()
+            self.chat[key] = text
+            self.stats["recorded"] += 1
+            self._dirty = True
+            return text
+        self.stats["chat_default"] += 1
+        return self.default_chat
+
+    def save(self) -> bool:
+        """Réécrit les fixtures si de nouvelles réponses ont été enregistrées."""
+        if not self._dirty:
+            return False
+        data = {"queries": self.queries, "default_chat": self.default_chat,
+                "chat": self.chat, "embeddings": self.embeddings}
+        self.path.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        self._dirty = False
+        return True
+
+
+class RecordedMistralClient:
+    """Remplace un MistralClient : `embeddings()` rejoue les vecteurs enregistrés."""
+
+    def __init__(self, responses: RecordedResponses, client=None):
+        self._responses = responses
+        self._client = client
+
+    def embeddings(self, model: str, input):
+        text = input if isinstance(input, str) else input[0]
+        fetch = (lambda: self._client.embeddings(model=model, input=input).data[0].embedding) if self._client else None
+        vector = self._responses.embedding(text, fetch)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vector.tolist())])
+
+
+class RecordedLocalLLM:
+    """Remplace le client LLM local partagé (ollama_client.LocalLLMClient) : disponible, réponses rejouées."""
+
+    def __init__(self, responses: RecordedResponses, llm=None):
+        self._responses = responses
+        self._llm = llm
+        self.breaker = SimpleNamespace(state="closed")
+        self.models: Dict[str, dict] = {}
+        self.last_check = 0.0
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, system: str = "", options=None, model=None, timeout=None) -> str:
+        fetch = (lambda: self._llm.generate(prompt, system, options, model)) if self._llm else None
+        return self._responses.completion(prompt, system, fetch)
+
+    async def stream(self, prompt: str, system: str = "", options=None, model=None):
+        yield self.generate(prompt, system, options, model)
+
+
+def _is_local(address) -> bool:
+    if not isinstance(address, tuple):
+        return True  # socket Unix
+    host = address[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _is_ip(host) -> bool:
+    try:
+        ipaddress.ip_address(host.decode() if isinstance(host, bytes) else host)
+    except ValueError:
+        return False
+    return True
+
+
+@contextmanager
+def offline() -> Iterator[None]:
+    """Refuse toute connexion hors de la machine : un appel réseau oublié fait échouer la mesure."""
+    connect, getaddrinfo = socket.socket.connect, socket.getaddrinfo
+
+    def guarded_connect(sock, address):
+        if not _is_local(address):
+            raise ConnectionRefusedError(f"Réseau interdit pendant les benchmarks : {address}")
+        return connect(sock, address)
+
+    def guarded_getaddrinfo(host, *args, **kwargs):
+        # Une adresse IP ne demande pas de résolution DNS : c'est connect qui la refuse
+        if host not in (None, "localhost") and not _is_ip(host):
+            raise socket.gaierror(f"Résolution interdite pendant les benchmarks : {host}")
+        return getaddrinfo(host, *args, **kwargs)
+
+    socket.socket.connect = guarded_connect
+    socket.getaddrinfo = guarded_getaddrinfo
+    try:
+        yield
+    finally:
+        socket.socket.connect = connect
+        socket.getaddrinfo = getaddrinfo
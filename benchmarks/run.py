@@ -0,0 +1,219 @@
+"""Suite de benchmarks hors ligne : recherche, moteurs de calcul et pipeline /ask.
+
+    python -m benchmarks.run                         # tous les cas, rapport benchmarks/results/latest.json
+    python -m benchmarks.run --only irpp,ask -n 500
+    python -m benchmarks.run --baseline benchmarks/results/v2.3.json   # code 1 si régression du p95
+    python -m benchmarks.run --record                # complète les fixtures (clés API et réseau requis)
+
+Les appels Mistral (embeddings) et au LLM local sont rejoués depuis
+benchmarks/fixtures (voir replay.py) ; toute connexion hors de la machine est
+refusée pendant la mesure.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from contextlib import ExitStack, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_DIR = ROOT / "backend"
+RESULTS_PATH = Path(__file__).resolve().parent / "results" / "latest.json"
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.harness import build_report, compare, measure, write_report
+from benchmarks.replay import FIXTURES_PATH, RecordedLocalLLM, RecordedMistralClient, RecordedResponses, offline
+
+Case = Callable[[RecordedResponses, ExitStack], Tuple[Callable[[Any], Any], Sequence[Any]]]
+
+
+def _prepare_environment(record: bool) -> None:
+    # Les modules du backend lisent leurs données en chemins relatifs à backend/
+    os.chdir(BACKEND_DIR)
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    if not record:
+        # Valeur factice : plusieurs modules refusent de s'importer sans clé
+        os.environ.setdefault("MISTRAL_API_KEY", "offline-benchmark")
+    os.environ.setdefault("STARTUP_PROFILE", "0")
+
+
+def _embedding_patch(responses: RecordedResponses, original: Callable[[str], Any], as_list: bool = False):
+    def replay(text: str):
+        vector = responses.embedding(text, lambda: original(text))
+        return vector.tolist() if as_list else vector
+    return replay
+
+
+# --- cas mesurés ---
+
+def cgi_search(responses: RecordedResponses, stack: ExitStack):
+    import mistral_cgi_embeddings
+    import assistant_fiscal_simple
+
+    stack.enter_context(mock.patch.object(
+        mistral_cgi_embeddings, "get_query_embedding",
+        _embedding_patch(responses, mistral_cgi_embeddings.get_query_embedding, as_list=True)))
+    return (lambda query: assistant_fiscal_simple.search_cgi_embeddings(query, max_results=3)), responses.queries["retrieval"]
+
+
+def bofip_search(responses: RecordedResponses, stack: ExitStack):
+    import mistral_embeddings
+
+    stack.enter_context(mock.patch.object(
+        mistral_embeddings, "get_embedding", _embedding_patch(responses, mistral_embeddings.get_embedding)))
+    return (lambda query: mistral_embeddings.search_similar_bofip_chunks(query, top_k=3)), responses.queries["retrieval"]
+
+
+def swiss_rag_search(responses: RecordedResponses, stack: ExitStack):
+    from rag_swiss import SwissRAGSystem
+
+    rag = SwissRAGSystem()
+    rag.client = RecordedMistralClient(responses, rag.client)
+    return (lambda query: rag.search_relevant_chunks(query, top_k=5)), responses.queries["swiss"]
+
+
+def multi_profile_search(responses: RecordedResponses, stack: ExitStack):
+    from multi_profile_search import MultiProfileSearch
+
+    search = MultiProfileSearch()
+    search._get_embedding = _embedding_patch(responses, search._get_embedding)
+    return (lambda query: search.search_knowledge(query, max_results=5)), responses.queries["retrieval"]
+
+
+def irpp(responses: RecordedResponses, stack: ExitStack):
+    from calculs_fiscaux import compute_irpp_simple
+
+    inputs = [(revenu, parts) for revenu in range(5_000, 400_001, 15_000) for parts in (1, 1.5, 2, 2.5, 3, 4)]
+    return (lambda args: compute_irpp_simple(*args)), inputs
+
+
+def cantons(responses: RecordedResponses, stack: ExitStack):
+    from calculs_fiscaux_suisse import SwissTaxCalculator
+
+    calculator = SwissTaxCalculator()
+    situations = [
+        {"gross_income": income, "canton": "geneva", "marital_status": status, "children": children,
+         "pillar_3a": 5000, "insurance_premiums": 1500, "employment_type": "employed"}
+        for income in (60_000, 100_000, 180_000, 350_000)
+        for status, children in (("single", 0), ("married", 2))
+    ]
+    return calculator.compare_cantons, situations
+
+
+def ask(responses: RecordedResponses, stack: ExitStack):
+    from fastapi.testclient import TestClient
+    import main
+    from francis_particulier_independent import francis_particulier as francis
+
+    ollama = francis.ollama_client
+    stack.enter_context(mock.patch.object(ollama, "llm", RecordedLocalLLM(responses, ollama.llm)))
+    # Le cache de réponses masquerait le pipeline complet
+    stack.enter_context(mock.patch.dict(francis.config, {"enable_cache": False}))
+    main.app.dependency_overrides[main.verify_token] = lambda: "benchmark-user"
+    stack.callback(main.app.dependency_overrides.pop, main.verify_token, None)
+    client = TestClient(main.app)  # sans `with` : pas d'événements de démarrage (préchauffage, files)
+
+    def post(question: str):
+        response = client.post("/api/ask", json={"question": question})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/ask {response.status_code} : {response.text[:200]}")
+        return response
+
+    return post, responses.queries["ask"]
+
+
+CASES: Dict[str, Case] = {
+    "search_cgi_embeddings": cgi_search,
+    "search_similar_bofip_chunks": bofip_search,
+    "swiss_rag.search_relevant_chunks": swiss_rag_search,
+    "multi_profile.search_knowledge": multi_profile_search,
+    "compute_irpp_simple": irpp,
+    "compare_cantons": cantons,
+    "ask": ask,
+}
+
+
+def run(names: Sequence[str], iterations: int, warmup: int, responses: RecordedResponses) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name in names:
+        with ExitStack() as stack:
+            try:
+                fn, inputs = CASES[name](responses, stack)
+            except Exception as e:
+                print(f"[WARN] Benchmark {name} ignoré : {e}")
+                results[name] = {"skipped": str(e)}
+                continue
+            try:
+                results[name] = measure(fn, list(inputs), iterations, warmup)
+            except Exception as e:
+                # Un cas en échec figure dans le rapport sans interrompre les suivants
+                print(f"[WARN] Benchmark {name} en échec : {e}")
+                results[name] = {"failed": str(e)[:200]}
+                continue
+        stats = results[name]
+        if not stats["samples"]:
+            print(f"[WARN] Benchmark {name} : aucun appel réussi ({stats['errors']} erreurs)")
+            continue
+        print(f"{name:<36} p50 {stats['p50_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms   "
+              f"p99 {stats['p99_ms']:>10.3f} ms   {stats['throughput_per_s']:>10.1f}/s")
+    return results
+
+
+def _select(only: str) -> List[str]:
+    if not only:
+        return list(CASES)
+    names = [name.strip() for name in only.split(",") if name.strip()]
+    selected = [case for case in CASES if any(name == case or name in case for name in names)]
+    if not selected:
+        raise SystemExit(f"Aucun benchmark ne correspond à {only!r} (disponibles : {', '.join(CASES)})")
+    return selected
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help="cas à exécuter, séparés par des virgules")
+    parser.add_argument("-n", "--iterations", type=int, default=100, help="appels mesurés par cas")
+    parser.add_argument("--warmup", type=int, default=1, help="passes de préchauffage sur les entrées")
+    parser.add_argument("--output", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline", type=Path, help="rapport d'une version précédente à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="hausse du p95 tolérée (0.2 = +20 %%)")
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_PATH)
+    parser.add_argument("--record", action="store_true", help="enregistre les réponses manquantes (réseau requis)")
+    args = parser.parse_args(argv)
+
+    names = _select(args.only)
+    output = args.output.resolve()
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    responses = RecordedResponses(args.fixtures.resolve(), record=args.record)
+    _prepare_environment(args.record)
+
+    logging.disable(logging.INFO)  # journaux par requête des modules mesurés
+    try:
+        with nullcontext() if args.record else offline():
+            cases = run(names, args.iterations, args.warmup, responses)
+    finally:
+        logging.disable(logging.NOTSET)
+    if responses.save():
+        print(f"✅ Fixtures mises à jour : {responses.path}")
+
+    report = build_report(cases, responses.stats, args.iterations, ROOT)
+    print(f"📄 Rapport : {write_report(report, output)}")
+    if responses.stats["embedding_synthetic"] or responses.stats["chat_default"]:
+        print(f"[WARN] Réponses non enregistrées remplacées : {responses.stats}")
+
+    if baseline is not None:
+        regressions = compare(baseline, report, tolerance=args.tolerance)
+        for row in regressions:
+            print(f"❌ Régression {row['case']} : {row['metric']} {row['baseline']} → {row['current']} (x{row['ratio']})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
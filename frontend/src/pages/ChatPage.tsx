@@ -3,7 +3,7 @@ import { Send, Bot, User as UserIcon, ArrowRight, MessageSquare, Euro, UserCog,
 import { useNavigate, Link } from 'react-router-dom';
 import { useAuth } from '../contexts/AuthContext';
 import { Logo } from '../components/ui/Logo';
-import apiClient from '../services/apiClient';
+import apiClient, { apiStream } from '../services/apiClient';
 import { ErrorHandler } from '../utils/errorHandler';
 
 import { useCountry, Country } from '../contexts/CountryContext';
@@ -33,6 +33,8 @@ export function ChatPage() {
 
   const { country: jurisdiction, setCountry: setJurisdiction } = useCountry();
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Session de conversation côté serveur (mémoire de Francis), renvoyée avec chaque réponse
+  const conversationIdRef = useRef<string | undefined>(undefined);
   const navigate = useNavigate();
   const { user, isAuthenticated, isProfessional } = useAuth();
   const [initDone, setInitDone] = useState(false);
@@ -74,6 +76,7 @@ export function ChatPage() {
       const payload: any = {
         question: currentInput,
         conversation_history: historyForApi,
+        conversation_id: conversationIdRef.current,
         jurisdiction,
       };
 
@@ -81,16 +84,28 @@ export function ChatPage() {
         payload.user_profile_context = userProfileContext;
       }
 
-      const responseData = await apiClient<any>('/api/ask', {
-        method: 'POST',
-        data: payload,
+      // Réponse en flux : le message de Francis se remplit dès le premier token
+      let started = false;
+      const answer = await apiStream('/api/ask', payload, (chunk) => {
+        if (!started) {
+          started = true;
+          setIsLoading(false);
+          setMessages(prev => [...prev, { role: 'assistant', content: chunk }]);
+          return;
+        }
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + chunk }];
+        });
       });
+      conversationIdRef.current = answer.conversationId ?? conversationIdRef.current;
 
-        const assistantMessage: Message = {
+      if (!started) {
+        setMessages(prev => [...prev, {
           role: 'assistant',
-          content: responseData.response || responseData.answer || 'Je n\'ai pas pu traiter votre demande.'
-        };
-        setMessages(prev => [...prev, assistantMessage]);
+          content: answer.text || 'Je n\'ai pas pu traiter votre demande.'
+        }]);
+      }
     } catch (error: any) {
       ErrorHandler.handle(error, { 
         logInDev: true, 
@@ -104,6 +104,77 @@ async function apiClient<T = any>(endpoint: string, { data, headers: customHeade
   }
 }
 
+export interface StreamedAnswer {
+  text: string;
+  sources: string[];
+  confidence: number | null;
+  conversationId?: string;
+}
+
+/**
+ * Réponse Francis en flux (NDJSON : trames "token", puis "sources" en fin de flux).
+ * `onToken` reçoit chaque morceau de texte dès son arrivée.
+ */
+export async function apiStream(endpoint: string, data: any, onToken: (text: string) => void): Promise<StreamedAnswer> {
+  const token = localStorage.getItem('authToken');
+  const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+  if (token) {
+    headers['Authorization'] = `Bearer ${token}`;
+  }
+
+  const response = await fetch(buildUrl(endpoint), {
+    method: 'POST',
+    headers,
+    body: JSON.stringify({ ...data, stream: true }),
+  });
+  if (!response.ok || !response.body) {
+    let errorData;
+    try {
+      errorData = await response.json();
+    } catch (e) {
+      errorData = { detail: response.statusText };
+    }
+    const error = new Error(errorData.detail || 'Une erreur API est survenue') as any;
+    error.response = response;
+    error.data = errorData;
+    error.status = response.status;
+    throw error;
+  }
+
+  const result: StreamedAnswer = { text: '', sources: [], confidence: null };
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const handleLine = (line: string) => {
+    if (!line.trim()) return;
+    const frame = JSON.parse(line);
+    if (frame.type === 'token') {
+      result.text += frame.content;
+      onToken(frame.content);
+    } else if (frame.type === 'sources') {
+      result.sources = frame.sources || [];
+      result.confidence = frame.confidence ?? null;
+      result.conversationId = frame.conversation_id;
+    } else if (frame.type === 'error') {
+      const error = new Error(frame.message) as any;
+      error.status = 500;
+      throw error;
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() || '';
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+  return result;
+}
+
 // Exemples d'utilisation (peuvent être exportés directement ou via des fonctions spécifiques)
 // apiClient.get = <T = any>(endpoint: string, options?: ApiClientOptions) => apiClient<T>(endpoint, { ...options, method: 'GET' });
 // apiClient.post = <T = any>(endpoint: string, data: any, options?: ApiClientOptions) => apiClient<T>(endpoint, { ...options, method: 'POST', data });
@@ -54,7 +54,9 @@ export PYTHONPATH=$PYTHONPATH:/app
 # Démarrer le backend en arrière-plan
 echo "=== Démarrage du backend ==="
 # NE PAS se déplacer dans le répertoire backend. Lancer depuis la racine /app.
-python -m uvicorn backend.main:app --host 127.0.0.1 --port 8000 --log-level debug --workers 2 --timeout-keep-alive 300 > /app/backend.log 2>&1 &
+# Exporté : avec plusieurs workers, les quotas passent par un backend de compteurs partagé (rate_counters)
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-2}
+python -m uvicorn backend.main:app --host 127.0.0.1 --port 8000 --log-level debug --workers $WEB_CONCURRENCY --timeout-keep-alive 300 > /app/backend.log 2>&1 &
 BACKEND_PID=$!
 
 # Attendre que le backend soit prêt
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import random
+
+from backend.answer_stream import AnswerStream, ResponseFormatter, format_francis_response
+
+ANSWER = """  Bonjour, voici le barème applicable.
+## Barème 2025
+Le barème est progressif. Par exemple un revenu de 30 000 €.
+
+
+
+┌───────────────────┬──────┐
+│ Tranche de revenu │ Taux │
+├───────────────────┼──────┤
+│ 0 - 11 294 €      │ 0 %  │
+│ 11 295 - 28 797 € │ 11 % │
+└───────────────────┴──────┘
+Voici un exemple chiffré :
+- revenu net : 30 000 €
+
+"""
+
+
+def _chunks(text, seed):
+    rnd = random.Random(seed)
+    i = 0
+    while i < len(text):
+        n = rnd.randint(1, 7)
+        yield text[i:i + n]
+        i += n
+
+
+def test_batch_formatting():
+    assert format_francis_response(ANSWER) == (
+        "Bonjour, voici le barème applicable.\n\n"
+        "## Barème 2025\n\n"
+        "Le barème est progressif.\nPar exemple un revenu de 30 000 €.\n\n"
+        "| Tranche de revenu | Taux |\n| --- | --- |\n"
+        "| 0 - 11 294 € | 0 % |\n"
+        "| 11 295 - 28 797 € | 11 % |\n\n"
+        "Voici un exemple chiffré :\n"
+        "- revenu net : 30 000 €"
+    )
+
+
+def test_result_does_not_depend_on_token_boundaries():
+    expected = format_francis_response(ANSWER)
+    for seed in range(300):
+        formatter = ResponseFormatter()
+        streamed = "".join(formatter.feed(chunk) for chunk in _chunks(ANSWER, seed)) + formatter.close()
+        assert streamed == expected
+
+
+def test_plain_text_is_emitted_without_waiting_for_the_line_end():
+    formatter = ResponseFormatter()
+    assert formatter.feed("Bonjour") == "Bonjour"
+    assert formatter.feed(", votre TMI est de 30 %") == ", votre TMI est de 30 %"
+    assert formatter.feed("│ Tranche") == "│ Tranche"  # pas en début de ligne : texte ordinaire
+    assert formatter.feed("\n│ A │ B") == ""  # ligne de tableau : retenue jusqu'à sa fin
+    assert formatter.feed("\n") == "\n\n| A | B |\n| --- | --- |"
+
+
+def test_answer_stream_sends_sources_last():
+    async def tokens():
+        for token in ["Votre ", "TMI ", "est de 30 %.  ", "\n"]:
+            yield token
+
+    done = []
+    stream = AnswerStream(tokens(), ["CGI Article 197"], 0.8, on_complete=done.append)
+
+    async def run():
+        return [json.loads(line) async for line in stream.frames()]
+
+    frames = asyncio.run(run())
+    assert [f["type"] for f in frames] == ["token", "token", "token", "sources"]
+    assert "".join(f["content"] for f in frames[:-1]) == "Votre TMI est de 30 %."
+    assert frames[-1] == {"type": "sources", "sources": ["CGI Article 197"], "confidence": 0.8}
+    assert done == [stream] and stream.text == "Votre TMI est de 30 %."
+
+
+def test_error_mid_stream_becomes_an_error_frame():
+    async def tokens():
+        yield "Début de réponse"
+        raise RuntimeError("LLM coupé")
+
+    errors = []
+    stream = AnswerStream(tokens(), ["CGI"], on_error=errors.append)
+
+    async def run():
+        return [json.loads(line) async for line in stream.frames()]
+
+    frames = asyncio.run(run())
+    assert [f["type"] for f in frames] == ["token", "error"]
+    assert len(errors) == 1
@@ -0,0 +1,60 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.user_context import UserContext
+
+QUESTION = "Combien d'impôt avec 50000€ en France ?"
+
+
+def _client(monkeypatch):
+    from francis_particulier_independent import francis_particulier  # module utilisé par /ask
+    monkeypatch.setattr(francis_particulier.ollama_client, "is_available", lambda: False)
+    monkeypatch.setitem(francis_particulier.config, "enable_cache", False)
+    monkeypatch.setattr(main, "MISTRAL_API_KEY", "test")
+    monkeypatch.setattr(main, "supabase", None)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_user_context, lambda: UserContext(user_id="u1"))
+    return TestClient(main.app)
+
+
+def test_ask_answers_when_the_calculation_is_unavailable(monkeypatch):
+    client = _client(monkeypatch)
+    response = client.post("/api/ask", json={"question": QUESTION})
+    assert response.status_code == 200
+    assert "Calcul de l'impôt sur le revenu" in response.json()["response"]
+
+    streamed = client.post("/api/ask", json={"question": QUESTION, "stream": True})
+    frames = [json.loads(line) for line in streamed.text.splitlines() if line]
+    assert frames[-1]["type"] == "sources" and frames[0]["type"] == "token"
+
+
+def test_ask_falls_back_on_engine_failure(monkeypatch):
+    client = _client(monkeypatch)
+    from francis_particulier_independent import francis_particulier
+
+    def broken(*args, **kwargs):
+        raise KeyError("country")
+
+    monkeypatch.setattr(francis_particulier, "generate_response", broken)
+    response = client.post("/api/ask", json={"question": QUESTION})
+    assert response.status_code == 200
+    assert "Erreur dans le traitement de votre question" in response.json()["response"]
+
+    streamed = client.post("/api/ask", json={"question": QUESTION, "stream": True})
+    frames = [json.loads(line) for line in streamed.text.splitlines() if line]
+    assert [frame["type"] for frame in frames][-1] == "sources"
+    assert "Erreur dans le traitement" in "".join(f.get("content", "") for f in frames)
+
+
+def test_ask_keeps_the_conversation_of_the_authenticated_user(monkeypatch):
+    client = _client(monkeypatch)
+    first = client.post("/api/ask", json={"question": "Quel est le taux de TVA en Allemagne ?"}).json()
+    second = client.post("/api/ask", json={"question": "Et en France ?",
+                                           "conversation_id": first["conversation_id"]}).json()
+    assert second["conversation_id"] == first["conversation_id"]
+
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_user_context, lambda: UserContext(user_id="u2"))
+    other = client.post("/api/ask", json={"question": "Et en France ?",
+                                          "conversation_id": first["conversation_id"]}).json()
+    assert other["conversation_id"] != first["conversation_id"]
@@ -0,0 +1,50 @@
+import socket
+
+import numpy as np
+import pytest
+
+from benchmarks.harness import compare, measure, percentile
+from benchmarks.replay import RecordedLocalLLM, RecordedResponses, offline
+
+
+def test_percentiles_and_regression_comparison():
+    samples = [i / 1000 for i in range(1, 101)]
+    assert percentile(samples, 50) == 0.05 and percentile(samples, 99) == 0.099
+
+    ticks = iter(range(100))
+    stats = measure(lambda x: x, [1, 2], iterations=4, warmup=0, clock=lambda: next(ticks))
+    assert stats["samples"] == 4 and stats["p50_ms"] == 1000.0
+
+    baseline = {"cases": {"ask": {"p95_ms": 10.0}, "irpp": {"p95_ms": 1.0}}}
+    current = {"cases": {"ask": {"p95_ms": 13.0}, "irpp": {"p95_ms": 1.1}}}
+    assert [row["case"] for row in compare(baseline, current)] == ["ask"]
+
+
+def test_measure_counts_failures_including_warmup():
+    def flaky(x):
+        if x == 2:
+            raise RuntimeError("/api/ask 500")
+
+    stats = measure(flaky, [1, 2], iterations=4, warmup=1)
+    assert stats["samples"] == 2 and stats["errors"] == 3
+    assert stats["first_error"] == "/api/ask 500"
+
+
+def test_replay_without_network(tmp_path):
+    responses = RecordedResponses(tmp_path / "fixtures.json")
+    first = responses.embedding("barème IR")
+    assert np.array_equal(first, responses.embedding("barème IR")) and first.shape == (1024,)
+    assert responses.stats["embedding_synthetic"] == 2
+
+    responses.record = True
+    responses.embedding("TVA", fetch=lambda: [0.5, 0.5])
+    assert RecordedLocalLLM(responses, llm=None).generate("question") == ""
+    assert responses.save()
+    reloaded = RecordedResponses(tmp_path / "fixtures.json")
+    assert reloaded.embedding("TVA").tolist() == [0.5, 0.5] and reloaded.stats["embedding_hits"] == 1
+
+    with offline():
+        with pytest.raises(ConnectionRefusedError):
+            socket.create_connection(("192.0.2.1", 443), timeout=1)
+        with pytest.raises(socket.gaierror):
+            socket.getaddrinfo("api.mistral.ai", 443)
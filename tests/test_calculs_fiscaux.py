@@ -3,6 +3,7 @@ import pytest
 from backend.calculs_fiscaux import (
     nombre_parts,
     impot_revenu_net,
+    impot_revenu_net_vectorise,
     impot_ifi,
     montant_tva,
     calcul_plus_value_immobiliere,
@@ -124,4 +125,14 @@ def test_calcul_credit_impot_emploi_domicile():
     assert math.isclose(cesu3["credit_impot_emploi_domicile"], 0)
 
     with pytest.raises(ValueError):
-        calcul_credit_impot_emploi_domicile(-100) 
\ No newline at end of file
+        calcul_credit_impot_emploi_domicile(-100) 
+
+
+def test_impot_revenu_net_vectorise_egal_au_calcul_unitaire():
+    revenus = [0, 9000, 25000, 55600.8, 60000, 150000, 400000]
+    for parts in (1, 2.5):
+        attendu = [impot_revenu_net(r, parts) for r in revenus]
+        assert impot_revenu_net_vectorise(revenus, parts).tolist() == attendu
+    assert impot_revenu_net_vectorise([60000, 60000], [1, 2]).tolist() == [impot_revenu_net(60000, 1), impot_revenu_net(60000, 2)]
+    with pytest.raises(ValueError):
+        impot_revenu_net_vectorise([1000], [0])
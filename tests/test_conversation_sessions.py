@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from backend.conversation_sessions import CONVERSATION_MAX_EXCHANGES, ConversationSessionStore, remember
+from backend.rate_counters import InMemoryCounterBackend, SQLiteCounterBackend
+
+
+def _store(**kwargs):
+    return ConversationSessionStore(backend=InMemoryCounterBackend(), **kwargs)
+
+
+def test_sessions_are_isolated_and_expire_after_inactivity(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store = _store(ttl=60)
+
+    async def scenario():
+        alice = await store.get_or_create(None, owner="alice")
+        bob = await store.get_or_create(None, owner="bob")
+        alice.merge_profile({"country": "FR", "annual_income": 80000})
+        remember(alice.exchanges, "Quelle est ma TMI ?", "income_tax", {"query_type": "income_tax"})
+        await store.save(alice)
+        await store.save(bob)
+
+        again = await store.get_or_create(alice.session_id, owner="alice")
+        assert again.session_id == alice.session_id and again.history() == alice.history()
+        assert again.user_profile == {"country": "FR", "annual_income": 80000}
+        assert (await store.get(bob.session_id, owner="bob")).user_profile == {}
+
+        now[0] += 50
+        remember(again.exchanges, "Et la CSG ?", "income_tax", {})
+        await store.save(again)  # le nouvel échange repousse l'expiration
+        now[0] += 50
+        assert len((await store.get(alice.session_id, owner="alice")).history()) == 2
+        assert await store.get(bob.session_id, owner="bob") is None
+
+    asyncio.run(scenario())
+
+
+def test_ids_are_issued_by_the_server_and_bound_to_their_owner():
+    store = _store()
+
+    async def scenario():
+        alice = await store.get_or_create(None, owner="alice")
+        await store.save(alice)
+        assert await store.get(alice.session_id, owner="mallory") is None
+        assert (await store.get_or_create(alice.session_id, owner="mallory")).session_id != alice.session_id
+        assert (await store.get_or_create("choisi-par-le-client", owner="mallory")).session_id != "choisi-par-le-client"
+        assert not await store.close(alice.session_id, owner="mallory")
+        assert await store.close(alice.session_id, owner="alice")
+        assert await store.get(alice.session_id, owner="alice") is None
+
+    asyncio.run(scenario())
+
+
+def test_history_is_a_compact_ring_buffer():
+    store = _store()
+
+    async def scenario():
+        session = await store.get_or_create(None, owner="alice")
+        analysis = {"query_type": "vat", "countries_mentioned": ["DE"], "smart_suggestions": ["…"] * 10,
+                    "conversation_context": list(session.exchanges)}
+        for i in range(CONVERSATION_MAX_EXCHANGES + 5):
+            remember(session.exchanges, f"question {i} " + "x" * 2000, "vat_info", analysis)
+        await store.save(session)
+
+        history = (await store.get(session.session_id, owner="alice")).history()
+        assert len(history) == CONVERSATION_MAX_EXCHANGES
+        assert history[0]["query"].startswith("question 5 ")
+        assert len(history[-1]["query"]) == 500
+        assert history[-1]["analysis"] == {"query_type": "vat", "countries_mentioned": ["DE"]}
+
+        session.seed([{"query": "ignorée", "timestamp": 0.0}])  # session déjà commencée
+        assert len(session.history()) == CONVERSATION_MAX_EXCHANGES
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_append_without_overwriting():
+    store = _store()
+
+    async def scenario():
+        first = await store.get_or_create(None, owner="alice")
+        await store.save(first)
+        second = await store.get(first.session_id, owner="alice")
+        remember(first.exchanges, "question A", "income_tax", {})
+        remember(second.exchanges, "question B", "vat_info", {})
+        second.merge_profile({"country": "DE"})
+        await store.save(first)
+        await store.save(second)
+        stored = await store.get(first.session_id, owner="alice")
+        assert [entry["query"] for entry in stored.history()] == ["question A", "question B"]
+        assert stored.user_profile == {"country": "DE"}
+        assert second.history() == stored.history()  # la copie est rechargée après l'enregistrement
+
+    asyncio.run(scenario())
+
+
+def test_sessions_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "counters.db")
+    first = ConversationSessionStore(backend=SQLiteCounterBackend(path))
+    second = ConversationSessionStore(backend=SQLiteCounterBackend(path))
+
+    async def scenario():
+        session = await first.get_or_create(None, owner="alice")
+        remember(session.exchanges, "Quelle est ma TMI ?", "income_tax", {})
+        await first.save(session)
+        resumed = await second.get_or_create(session.session_id, owner="alice")
+        assert resumed.session_id == session.session_id
+        assert [entry["query"] for entry in resumed.history()] == ["Quelle est ma TMI ?"]
+        assert await second.close(session.session_id, owner="alice")
+        assert await first.get(session.session_id, owner="alice") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import backend.embedding_pipeline as pipeline
+from backend.corpus_bundle import CorpusBundle, open_bundle, write_bundle
+from backend.packed_embeddings import load_corpus_bundle, load_embedding_matrix, load_index
+
+
+def test_bundle_roundtrip_random_access(tmp_path):
+    matrix = np.arange(12, dtype=np.float32).reshape(4, 3)
+    records = [{"id": f"c{i}", "text": f"texte {i} " * i} for i in range(3)] + [None]
+    path = write_bundle(tmp_path / "corpus.bundle", ["c0", "c1", "c2", "c3"], matrix, records, hashes=list("abcd"))
+
+    bundle = open_bundle(path)
+    assert len(bundle) == 4 and bundle.hashes == list("abcd")
+    np.testing.assert_array_equal(bundle.embeddings, matrix)
+    assert bundle.get("c2")["text"] == "texte 2 texte 2 "
+    assert bundle.text(1) == "texte 1 "
+    assert bundle.get("c3") is None and bundle.get("absent", {}) == {}
+    assert [r["id"] for r in bundle.iter_records()] == ["c0", "c1", "c2"]
+    assert not (tmp_path / "corpus.bundle.tmp").exists()
+
+
+def test_bundle_float16_and_bad_magic(tmp_path):
+    matrix = np.random.default_rng(0).random((5, 8), dtype=np.float32)
+    path = write_bundle(tmp_path / "half.bundle", [str(i) for i in range(5)], matrix, dtype="float16")
+    bundle = CorpusBundle(path)
+    assert bundle.embeddings.dtype == np.float16
+    np.testing.assert_allclose(bundle.embeddings, matrix, atol=1e-3)
+
+    (tmp_path / "bad.bundle").write_bytes(b"not a bundle at all")
+    with pytest.raises(ValueError):
+        CorpusBundle(tmp_path / "bad.bundle")
+
+
+def test_convert_legacy_directory(tmp_path, monkeypatch):
+    chunks_dir, emb_dir = tmp_path / "chunks", tmp_path / "emb"
+    chunks_dir.mkdir()
+    emb_dir.mkdir()
+    for i in range(3):
+        (chunks_dir / f"test_chunk_{i:04d}.txt").write_text(f"chunk {i}", encoding="utf-8")
+        np.save(emb_dir / f"test_chunk_{i:04d}.npy", np.full(4, i, dtype=np.float32))
+    spec = pipeline.CorpusSpec("test", str(emb_dir), pipeline._text_dir_loader(str(chunks_dir), "*.txt"))
+    monkeypatch.setitem(pipeline.CORPORA, "test", spec)
+
+    stats = pipeline.convert_corpus("test", remove_legacy=True)
+    assert stats["converted"] == 3
+    assert not list(emb_dir.glob("*.npy"))
+
+    bundle = load_corpus_bundle(emb_dir)
+    assert bundle.get("test_chunk_0002")["text"] == "chunk 2"
+    ids, matrix = load_embedding_matrix(emb_dir, "test_chunk_*.npy")
+    assert ids == ["test_chunk_0000", "test_chunk_0001", "test_chunk_0002"]
+    assert matrix[2, 0] == 2.0
+    # Les empreintes calculées à la conversion évitent tout recalcul ensuite
+    assert load_index(emb_dir)[2] is not None
+    assert pipeline.embed_corpus("test", embed_fn=lambda texts: 1 / 0, model="fake")["added"] == 0
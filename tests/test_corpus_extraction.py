@@ -0,0 +1,55 @@
+import backend.corpus_extraction as corpus_extraction
+import backend.extract_cgi_articles as extract_cgi
+from backend.corpus_extraction import CorpusWriter, iter_corpus, load_corpus_index, page_ranges
+
+
+def test_page_ranges_cover_all_pages():
+    assert page_ranges(45, 20) == [(0, 20), (20, 40), (40, 45)]
+    assert page_ranges(0, 20) == []
+
+
+def test_articles_spanning_ranges_are_stitched(monkeypatch):
+    pages = [
+        "Article 1\nPremier alinéa",
+        "suite de l'article 1",
+        "Article 2\nTexte du deux",
+        "Article 3\nTexte du trois",
+    ]
+    monkeypatch.setattr(extract_cgi, "extract_pages", lambda path, start, end: pages[start:end])
+    monkeypatch.setattr(corpus_extraction, "count_pages", lambda path: len(pages))
+    real_iter = corpus_extraction.iter_range_results
+    # Une page par plage, en série : chaque article suivant commence dans une nouvelle plage
+    monkeypatch.setattr(extract_cgi, "iter_range_results",
+                        lambda path, fn, workers=None: real_iter(path, fn, 1, pages_per_range=1))
+    articles = list(extract_cgi.iter_articles_from_pdf("CGI.pdf"))
+
+    assert [a.number for a in articles] == ["1", "2", "3"]
+    assert "suite de l'article 1" in articles[0].full_text
+    assert "Texte du deux" not in articles[0].full_text
+
+
+def test_corpus_writer_roundtrip_and_append(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    with CorpusWriter(path) as writer:
+        writer.write_all({"id": f"c{i}", "text": f"texte {i}"} for i in range(3))
+    assert writer.count == 3
+    assert not (tmp_path / "corpus.jsonl.tmp").exists()
+
+    with CorpusWriter(path, mode="a") as writer:
+        writer.write({"id": "c1", "text": "remplacé"})
+
+    assert [r["id"] for r in iter_corpus(path)] == ["c0", "c1", "c2", "c1"]
+    assert load_corpus_index(path)["c1"]["text"] == "remplacé"
+
+
+def test_corpus_writer_keeps_previous_file_on_error(tmp_path):
+    path = tmp_path / "corpus.jsonl"
+    with CorpusWriter(path) as writer:
+        writer.write({"id": "a", "text": "ancien"})
+    try:
+        with CorpusWriter(path) as writer:
+            writer.write({"id": "b", "text": "nouveau"})
+            raise RuntimeError("extraction interrompue")
+    except RuntimeError:
+        pass
+    assert [r["id"] for r in iter_corpus(path)] == ["a"]
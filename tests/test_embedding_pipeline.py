@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+import backend.embedding_pipeline as pipeline
+from backend.packed_embeddings import cosine_scores, load_embedding_matrix, top_k_indices
+
+
+def _fake_embed(texts):
+    return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    chunks_dir = tmp_path / "chunks"
+    chunks_dir.mkdir()
+    for i in range(30):
+        (chunks_dir / f"test_chunk_{i:04d}.txt").write_text("x" * (10 + i), encoding="utf-8")
+    spec = pipeline.CorpusSpec("test", str(tmp_path / "emb"), pipeline._text_dir_loader(str(chunks_dir), "*.txt"))
+    monkeypatch.setitem(pipeline.CORPORA, "test", spec)
+    return tmp_path / "emb"
+
+
+def test_pack_batches_respects_token_budget():
+    chunks = [(str(i), "a" * 3000) for i in range(10)]
+    batches = pipeline.pack_batches(chunks, max_tokens=3500, max_items=100)
+    assert [len(b) for b in batches] == [3, 3, 3, 1]
+    assert [c for b in batches for c in b] == chunks
+
+
+def test_embed_corpus_writes_packed_matrix(corpus):
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return _fake_embed(texts)
+
+    stats = pipeline.embed_corpus("test", embed_fn=embed, model="fake")
+    assert stats["missing"] == 0
+    assert len(calls) == 1  # 30 petits textes dans un seul lot
+    ids, matrix = load_embedding_matrix(corpus)
+    assert ids[0] == "test_chunk_0000" and matrix.shape == (30, 3)
+    assert matrix[5, 0] == 15.0
+    assert not (corpus / pipeline.WORK_DIR_NAME).exists()
+
+
+def test_embed_corpus_resumes_from_manifest(corpus, monkeypatch):
+    monkeypatch.setattr(pipeline, "MAX_BATCH_ITEMS", 10)
+    monkeypatch.setattr(pipeline, "MAX_RETRIES", 1)
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts[0])
+        if len(calls) == 2:
+            raise RuntimeError("coupure réseau")
+        return _fake_embed(texts)
+
+    first = pipeline.embed_corpus("test", concurrency=1, embed_fn=flaky, model="fake")
+    assert first["missing"] == 10
+    assert (corpus / pipeline.WORK_DIR_NAME / pipeline.MANIFEST_FILE).exists()
+
+    calls.clear()
+    second = pipeline.embed_corpus("test", concurrency=1, embed_fn=_fake_embed_recording(calls), model="fake")
+    assert second["missing"] == 0
+    assert len(calls) == 1  # seul le lot manquant est recalculé
+    ids, matrix = load_embedding_matrix(corpus)
+    assert len(ids) == 30
+
+
+def _fake_embed_recording(calls):
+    def embed(texts):
+        calls.append(texts[0])
+        return _fake_embed(texts)
+    return embed
+
+
+def test_top_k_on_packed_matrix():
+    matrix = np.array([[1, 0], [0, 1], [1, 1]], dtype=np.float32)
+    scores = cosine_scores(np.array([1, 0.1]), matrix)
+    assert top_k_indices(scores, 2) == [0, 2]
+
+
+def test_incremental_update_embeds_only_delta(corpus):
+    pipeline.embed_corpus("test", embed_fn=_fake_embed, model="fake")
+    chunks_dir = corpus.parent / "chunks"
+    # Modification d'un chunk et insertion en tête (décale tous les identifiants existants)
+    texts = [p.read_text(encoding="utf-8") for p in sorted(chunks_dir.glob("*.txt"))]
+    texts[3] = "contenu modifié"
+    texts.insert(0, "nouvel article")
+    for p in chunks_dir.glob("*.txt"):
+        p.unlink()
+    for i, text in enumerate(texts):
+        (chunks_dir / f"test_chunk_{i:04d}.txt").write_text(text, encoding="utf-8")
+
+    embedded = []
+    stats = pipeline.embed_corpus("test", embed_fn=_fake_embed_recording(embedded), model="fake")
+    assert stats["added"] == 2 and stats["removed"] == 1 and stats["unchanged"] == 29
+    assert embedded == ["nouvel article"]  # un seul lot contenant les 2 textes nouveaux
+    ids, matrix = load_embedding_matrix(corpus)
+    assert len(ids) == 31
+    assert matrix[0, 0] == len("nouvel article")
+    assert matrix[31 - 1, 0] == 39.0
+
+    again = pipeline.embed_corpus("test", embed_fn=_fake_embed_recording(embedded), model="fake")
+    assert again["added"] == 0 and len(embedded) == 1
+
+
+def test_bofip_texts_are_published_with_the_index(tmp_path, monkeypatch):
+    import generate_bofip_embeddings as bofip
+    from backend.packed_embeddings import load_corpus_bundle
+
+    source = tmp_path / "bofip.txt"
+    source.write_text("\n\n".join(f"Paragraphe BOFiP n°{i} " + "texte " * 30 for i in range(5)), encoding="utf-8")
+    text_dir = tmp_path / "bofip_chunks_text"
+    text_dir.mkdir()
+    (text_dir / "bofip_chunk_0000.txt").write_text("texte de l'index courant", encoding="utf-8")
+    monkeypatch.setattr(bofip, "SOURCE_TEXT_FILE", str(source))
+    monkeypatch.setattr(bofip, "BOFIP_CHUNKS_TEXT_DIR", str(text_dir))
+    monkeypatch.setitem(pipeline.CORPORA, "bofip", pipeline.CorpusSpec(
+        "bofip", str(tmp_path / "emb"), pipeline._load_bofip_chunks))
+
+    pipeline.embed_corpus("bofip", embed_fn=_fake_embed, model="fake", dry_run=True)
+    assert not (tmp_path / "emb").exists()
+    pipeline.embed_corpus("bofip", embed_fn=_fake_embed, model="fake")
+
+    # Le texte de l'index courant n'est jamais réécrit : le nouveau voyage dans le bundle
+    assert [p.name for p in text_dir.iterdir()] == ["bofip_chunk_0000.txt"]
+    assert (text_dir / "bofip_chunk_0000.txt").read_text(encoding="utf-8") == "texte de l'index courant"
+    bundle = load_corpus_bundle(tmp_path / "emb")
+    assert bundle.get("bofip_chunk_0000")["text"].startswith("Paragraphe BOFiP n°0")
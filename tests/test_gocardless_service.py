@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+
+from backend.gocardless_service import GoCardlessService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _booked(transaction_id, date, amount):
+    return {"transactionId": transaction_id, "bookingDate": date, "valueDate": date,
+            "transactionAmount": {"amount": str(amount), "currency": "EUR"}}
+
+
+def _service(monkeypatch, transactions):
+    monkeypatch.setenv("GOCARDLESS_SECRET_ID", "id")
+    monkeypatch.setenv("GOCARDLESS_SECRET_KEY", "key")
+    calls = []
+
+    def handler(request):
+        path = request.url.path
+        calls.append((path, dict(request.url.params)))
+        if path.endswith("/token/new/"):
+            return httpx.Response(200, json={"access": "tok", "access_expires": 86400})
+        account_id = path.split("/")[-3]
+        if path.endswith("/details/"):
+            return httpx.Response(200, json={"account": {"iban": f"FR76{account_id}", "currency": "EUR"}})
+        if path.endswith("/balances/"):
+            return httpx.Response(200, json={"balances": [
+                {"balanceType": "expected", "balanceAmount": {"amount": "100.5", "currency": "EUR"}}]})
+        return httpx.Response(200, json={"transactions": {"booked": transactions[account_id], "pending": []}})
+
+    clock = FakeClock()
+    service = GoCardlessService(transport=httpx.MockTransport(handler), transactions_ttl=60, clock=clock)
+    return service, calls, clock
+
+
+def test_accounts_fetched_in_one_batch_with_single_token(monkeypatch):
+    transactions = {"acc1": [_booked("t1", "2024-01-02", 10)], "acc2": [_booked("t2", "2024-01-03", -5)]}
+    service, calls, _ = _service(monkeypatch, transactions)
+
+    snapshots = asyncio.run(service.get_accounts_snapshots(["acc1", "acc2"], date_from="2024-01-01"))
+
+    assert [s.account_id for s in snapshots] == ["acc1", "acc2"]
+    assert snapshots[0].details.iban == "FR76acc1" and snapshots[1].balance == 100.5
+    assert [t.transaction_id for t in snapshots[1].transactions] == ["t2"]
+    assert sum(path.endswith("/token/new/") for path, _ in calls) == 1
+    assert len(calls) == 7
+
+
+def test_transaction_cache_is_incremental_after_ttl(monkeypatch):
+    transactions = {"acc1": [_booked("t1", "2024-01-02", 10), _booked("t2", "2024-01-05", -3)]}
+    service, calls, clock = _service(monkeypatch, transactions)
+
+    async def scenario():
+        first = await service.get_account_transactions("acc1", date_from="2024-01-01")
+        cached = await service.get_account_transactions("acc1", date_from="2024-01-03")
+        transactions["acc1"] = [_booked("t2", "2024-01-05", -3), _booked("t3", "2024-01-06", 7)]
+        clock.now = 61
+        refreshed = await service.get_account_transactions("acc1", date_from="2024-01-01")
+        return first, cached, refreshed
+
+    first, cached, refreshed = asyncio.run(scenario())
+    fetches = [params for path, params in calls if path.endswith("/transactions/")]
+
+    assert [t.transaction_id for t in first] == ["t2", "t1"]
+    assert [t.transaction_id for t in cached] == ["t2"]
+    # Deuxième appel à l'API uniquement depuis la dernière date comptabilisée, sans doublon
+    assert fetches == [{"date_from": "2024-01-01"}, {"date_from": "2024-01-05"}]
+    assert [t.transaction_id for t in refreshed] == ["t3", "t2", "t1"]
+
+
+def test_transaction_cache_is_bounded(monkeypatch):
+    import backend.gocardless_service as gocardless
+
+    monkeypatch.setattr(gocardless, "TRANSACTIONS_CACHE_MAX_ACCOUNTS", 2)
+    transactions = {f"acc{i}": [_booked(f"t{i}", "2024-01-02", i)] for i in range(3)}
+    service, calls, _ = _service(monkeypatch, transactions)
+
+    async def scenario():
+        for account_id in ("acc0", "acc1", "acc2", "acc0"):
+            await service.get_account_transactions(account_id, date_from="2024-01-01")
+
+    asyncio.run(scenario())
+    fetches = [path.split("/")[-3] for path, _ in calls if path.endswith("/transactions/")]
+
+    assert len(service.transactions_cache) == 2
+    assert fetches == ["acc0", "acc1", "acc2", "acc0"]  # acc0 évincé par acc2, donc redemandé
+
+
+def test_identical_transactions_without_id_are_kept(monkeypatch):
+    coffee = {"bookingDate": "2024-01-05", "valueDate": "2024-01-05",
+              "transactionAmount": {"amount": "-2.5", "currency": "EUR"}, "remittanceInformationUnstructured": "Café"}
+    transactions = {"acc1": [_booked("t1", "2024-01-02", 10), dict(coffee), dict(coffee)]}
+    service, _, clock = _service(monkeypatch, transactions)
+
+    async def scenario():
+        cached = await service.get_account_transactions("acc1", date_from="2024-01-01")
+        clock.now = 61  # resynchronisation depuis le 05/01 : la fenêtre est remplacée, pas dédoublée
+        refreshed = await service.get_account_transactions("acc1", date_from="2024-01-01")
+        direct = await service.get_account_transactions("acc1", date_from="2024-01-01", use_cache=False)
+        return cached, refreshed, direct
+
+    cached, refreshed, direct = asyncio.run(scenario())
+
+    assert len(cached) == len(refreshed) == len(direct) == 3
+    assert not service._account_locks
@@ -0,0 +1,45 @@
+from backend import european_tax_knowledge_base as eu
+from backend import knowledge_base_multi_profiles as multi
+from backend.knowledge_store import KnowledgeStore, write_store
+
+
+def test_store_decodes_sections_on_demand(tmp_path):
+    path = write_store(tmp_path / "kb.kb", [("a", {"x": [1, 2]}), ("country:FR", {"name": "France"})], "abc")
+    store = KnowledgeStore(path)
+    assert store.source == "abc" and "a" in store and list(store.names("country:")) == ["country:FR"]
+    assert store.section("country:FR") == {"name": "France"}
+    assert store.section("a") is store.section("a")
+
+
+def test_european_kb_lazy_matches_source(tmp_path):
+    path = eu.build_knowledge_file(tmp_path / "european.kb")
+    eager = eu.EuropeanTaxKnowledgeBase(store_path=None)
+    lazy = eu.EuropeanTaxKnowledgeBase(store_path=path)
+    assert "inheritance_tax_rules" not in vars(lazy)
+    assert lazy.inheritance_tax_rules == eager.inheritance_tax_rules
+    assert lazy.get_withholding_rate("FR", "DE", "dividends") == eager.get_withholding_rate("FR", "DE", "dividends")
+    assert list(lazy.countries_data) == list(eager.countries_data)
+
+
+def test_european_kb_country_sections(tmp_path):
+    bracket = eu.TaxBracket(0, float("inf"), 10.0)
+    country = eu.CountryTaxData("XX", "Testland", "EUR", [bracket], 1000, 20.0, [5.0], 10.0, 20.0)
+    write_store(tmp_path / "european.kb", [("country:XX", eu.asdict(country))], eu.source_hash(eu.__file__))
+    lazy = eu.EuropeanTaxKnowledgeBase(store_path=tmp_path / "european.kb")
+    assert "XX" in lazy.countries_data and len(lazy.countries_data) == 1
+    assert lazy.countries_data["XX"] == country
+    assert lazy.calculate_income_tax("XX", 11000)["income_tax"] == 1000
+
+
+def test_stale_store_falls_back_to_source(tmp_path):
+    write_store(tmp_path / "european.kb", [("crypto_taxation", {})], "ancienne-version")
+    kb = eu.EuropeanTaxKnowledgeBase(store_path=tmp_path / "european.kb")
+    assert kb.crypto_taxation == eu.EuropeanTaxKnowledgeBase(store_path=None).crypto_taxation
+
+
+def test_multi_profile_chunks_round_trip(tmp_path):
+    path = multi.build_knowledge_file(tmp_path / "multi.kb")
+    eager = multi.MultiProfileKnowledgeBase(store_path=None).knowledge_chunks
+    lazy = multi.MultiProfileKnowledgeBase(store_path=path)
+    assert lazy._knowledge_chunks is None
+    assert lazy.knowledge_chunks == eager
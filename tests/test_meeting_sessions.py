@@ -0,0 +1,133 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.meeting_sessions import MeetingSession, MeetingSessionStore
+
+
+class FakeCompletion:
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, prompt, system="", max_tokens=512):
+        self.prompts.append(prompt)
+        if system:  # repli du tampon dans le résumé
+            return f"résumé n°{len(self.prompts)}"
+        return "QUESTIONS FISCALES À POSER :\n- Quel est le montant des loyers perçus ?"
+
+
+def test_cumulative_and_delta_transcriptions():
+    session = MeetingSession("s1")
+    assert session.ingest("Bonjour, je suis marié.") == "Bonjour, je suis marié."
+    assert session.ingest("Bonjour, je suis marié. J'ai deux enfants.") == "J'ai deux enfants."
+    assert session.ingest("Bonjour, je suis marié. J'ai deux enfants.") == ""
+    assert session.ingest("Nous louons un appartement.") == "Nous louons un appartement."
+    assert session.pending == "Bonjour, je suis marié.\nJ'ai deux enfants.\nNous louons un appartement."
+
+
+def test_prompt_size_stays_flat_over_a_long_meeting():
+    completion = FakeCompletion()
+    session = MeetingSession("s2")
+    transcript = ""
+    sizes = []
+
+    async def meeting():
+        nonlocal transcript
+        for minute in range(60):
+            transcript += f" Minute {minute} : le client parle de ses revenus fonciers et de son PER. " * 10
+            session.ingest(transcript)
+            await session.compact(completion, fold_chars=2000)
+            sizes.append(len(session.context_block()))
+
+    asyncio.run(meeting())
+    assert len(transcript) > 40_000
+    assert max(sizes) < 2_500
+    assert session.folds > 10
+    assert all(len(prompt) < 3_000 for prompt in completion.prompts)
+
+
+def _client(monkeypatch, teams_assistant, completion):
+    monkeypatch.setattr(teams_assistant, "meeting_sessions", MeetingSessionStore(completion=completion))
+    app = FastAPI()
+    app.include_router(teams_assistant.router)
+    app.dependency_overrides[teams_assistant.get_user_context] = lambda: teams_assistant.UserContext(
+        user_id="pro-1", taper="professionnel")
+    return TestClient(app)
+
+
+def test_router_sends_only_new_utterances(monkeypatch):
+    from backend.routers import teams_assistant
+
+    completion = FakeCompletion()
+    client = _client(monkeypatch, teams_assistant, completion)
+
+    first = client.post("/api/pro/teams-assistant/analyze", json={"transcription": "Je perçois des loyers."})
+    assert first.status_code == 200
+    session_id = first.json()["session_id"]
+    assert first.json()["suggestions"][0]["type"] == "questions"
+
+    client.post("/api/pro/teams-assistant/analyze",
+                json={"transcription": "Je perçois des loyers. J'ai ouvert un PER.", "session_id": session_id})
+    assert len(completion.prompts) == 2
+    assert "Je perçois des loyers.\nJ'ai ouvert un PER." in completion.prompts[1]
+
+    # Rien de nouveau : la dernière analyse est réutilisée sans appel au LLM
+    client.post("/api/pro/teams-assistant/analyze",
+                json={"transcription": "Je perçois des loyers. J'ai ouvert un PER.", "session_id": session_id})
+    assert len(completion.prompts) == 2
+
+    summary = client.post("/api/pro/teams-assistant/meeting-summary",
+                          params={"meeting_duration": 30, "session_id": session_id})
+    assert summary.status_code == 200
+    assert "J'ai ouvert un PER." in completion.prompts[-1]
+
+
+def test_sessions_belong_to_the_professional_who_opened_them(monkeypatch):
+    from backend.routers import teams_assistant
+
+    completion = FakeCompletion()
+    client = _client(monkeypatch, teams_assistant, completion)
+    first = client.post("/api/pro/teams-assistant/analyze",
+                        json={"transcription": "Mon client Dupont perçoit 80 000 € de loyers.", "session_id": "choisi"})
+    session_id = first.json()["session_id"]
+    assert session_id != "choisi"  # identifiant émis par le serveur
+
+    client.app.dependency_overrides[teams_assistant.get_user_context] = lambda: teams_assistant.UserContext(
+        user_id="pro-2", taper="professionnel")
+    other = client.post("/api/pro/teams-assistant/analyze",
+                        json={"transcription": "Nouvelle réunion.", "session_id": session_id})
+    assert other.json()["session_id"] != session_id
+    assert "Dupont" not in completion.prompts[-1]
+    summary = client.post("/api/pro/teams-assistant/meeting-summary",
+                          params={"meeting_duration": 30, "session_id": session_id})
+    assert "Dupont" not in completion.prompts[-1] and summary.json()["session_id"] != session_id
+    assert client.delete(f"/api/pro/teams-assistant/sessions/{session_id}").status_code == 404
+
+    client.app.dependency_overrides[teams_assistant.get_user_context] = lambda: teams_assistant.UserContext(
+        user_id="particulier-1")
+    assert client.post("/api/pro/teams-assistant/analyze",
+                       json={"transcription": "Bonjour."}).status_code == 403
+
+
+def test_sessions_are_shared_between_workers(tmp_path):
+    from backend.rate_counters import SQLiteCounterBackend
+
+    path = str(tmp_path / "counters.db")
+    completion = FakeCompletion()
+    # Deux workers : chacun son store et sa connexion au même fichier
+    first = MeetingSessionStore(completion=completion, backend=SQLiteCounterBackend(path))
+    second = MeetingSessionStore(completion=completion, backend=SQLiteCounterBackend(path))
+
+    async def meeting():
+        async with first.open(None, "pro-1", topic="Loyers") as session:
+            session.ingest("Je perçois des loyers.")
+        async with second.open(session.session_id, "pro-1") as resumed:
+            resumed.ingest("Je perçois des loyers. J'ai ouvert un PER.")
+        return session.session_id, resumed
+
+    session_id, resumed = asyncio.run(meeting())
+    assert resumed.session_id == session_id and resumed.topic == "Loyers"
+    assert resumed.pending == "Je perçois des loyers.\nJ'ai ouvert un PER."
+    assert asyncio.run(first.get(session_id, "pro-2")) is None
+    assert asyncio.run(first.close(session_id, "pro-1")) and asyncio.run(second.get(session_id, "pro-1")) is None
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.ollama_client import CircuitBreaker, LLMUnavailable, LocalLLMClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_then_allows_single_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open() and not breaker.allow()
+
+    clock.now = 11
+    assert not breaker.is_open()
+    assert breaker.allow()  # requête de test
+    assert not breaker.allow() and breaker.is_open()
+    breaker.record_failure()  # le test échoue : réouverture immédiate
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_is_available_uses_cached_state(monkeypatch):
+    client = LocalLLMClient("http://ollama.test")
+    monkeypatch.setattr(client, "start_monitor", lambda: None)
+    monkeypatch.setattr(client._session, "get", lambda *a, **k: pytest.fail("appel réseau sur le chemin de requête"))
+    assert client.is_available() is False
+    client.available = True
+    assert client.is_available() is True
+    for _ in range(3):
+        client.breaker.record_failure()
+    assert client.is_available() is False
+
+
+def _ollama_stream(request):
+    payload = json.loads(request.content)
+    assert payload["stream"] is True and payload["keep_alive"] == "5m"
+    lines = [{"response": "Bon", "done": False}, {"response": "jour", "done": False}, {"response": "", "done": True}]
+    return httpx.Response(200, content="\n".join(json.dumps(line) for line in lines).encode())
+
+
+def test_stream_yields_tokens_and_breaker_records_failures():
+    client = LocalLLMClient("http://ollama.test", keep_alive="5m", transport=httpx.MockTransport(_ollama_stream))
+
+    async def collect():
+        return [token async for token in client.stream("question")]
+
+    assert asyncio.run(collect()) == ["Bon", "jour"]
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+    failing = LocalLLMClient("http://ollama.test", transport=httpx.MockTransport(lambda r: httpx.Response(503)))
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(failing.agenerate("question"))
+    with pytest.raises(LLMUnavailable, match="disjoncteur"):
+        asyncio.run(failing.agenerate("question"))
@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from backend.models_pro import ClientProfile
+from backend import pdf_render_service as service
+
+
+def _client(updated_at, id=7):
+    return ClientProfile(id=id, nom_client="Durand", prenom_client="Alice", revenu_net_annuel_client1=52000, updated_at=updated_at)
+
+
+def test_render_report_is_cached_per_client_version():
+    service.clear_report_cache()
+
+    async def scenario():
+        first = await service.render_report("client", _client(datetime(2025, 1, 1)))
+        again = await service.render_report("client", _client(datetime(2025, 1, 1)))
+        updated = await service.render_report("client", _client(datetime(2025, 2, 1)))
+        return first, again, updated
+
+    try:
+        first, again, updated = asyncio.run(scenario())
+    finally:
+        service.shutdown_render_pool()
+
+    assert first.startswith(b"%PDF")
+    assert again is first
+    assert updated is not first
+
+
+def test_iter_pdf_chunks_reassembles():
+    data = bytes(range(256)) * 1000
+    chunks = list(service.iter_pdf_chunks(data, chunk_size=4096))
+    assert b"".join(chunks) == data
+    assert max(len(c) for c in chunks) == 4096
+
+
+def test_iter_rendered_reports_falls_back_when_the_pool_breaks(monkeypatch):
+    class BrokenPool:
+        def __init__(self):
+            self.submitted = 0
+
+        def submit(self, *args):
+            self.submitted += 1
+            if self.submitted > 1:
+                raise BrokenProcessPool("worker tué")
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker tué"))
+            return future
+
+    service.clear_report_cache()
+    monkeypatch.setattr(service, "_get_pool", BrokenPool)
+    monkeypatch.setattr(service, "_render", lambda report_type, client, payload: f"pdf-{client.id}".encode())
+    clients = [_client(datetime(2025, 1, 1), id=i) for i in range(1, 6)]
+
+    rendered = list(service.iter_rendered_reports("client", clients))
+
+    assert [(client.id, data) for client, data in rendered] == [(i, f"pdf-{i}".encode()) for i in range(1, 6)]
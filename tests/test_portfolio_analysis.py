@@ -0,0 +1,74 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.calculs_fiscaux import (
+    compute_irpp_simple,
+    _apply_plafond_qf,
+    _apply_decote,
+    impot_revenu_vectorise,
+    simulate_tax_scenario_vectorise,
+    simulate_tax_scenario,
+)
+from backend.portfolio_analysis import analyze_portfolio, portfolio_arrays, create_job, get_job, run_portfolio_job
+
+
+def _client(id, revenu, situation="Célibataire", enfants=0):
+    return SimpleNamespace(
+        id=id,
+        nom_client=f"Client{id}",
+        prenom_client="Test",
+        situation_maritale_client=situation,
+        nombre_enfants_a_charge_client=enfants,
+        revenu_net_annuel_client1=revenu,
+        revenu_net_annuel_client2=None,
+        revenus_fonciers_annuels_bruts_foyer=None,
+        charges_foncieres_deductibles_foyer=None,
+    )
+
+
+def test_impot_revenu_vectorise_matches_scalar():
+    revenus = np.array([0, 15000, 42000, 90000, 250000, 60000])
+    parts = np.array([1, 1, 2, 3, 2.5, 4])
+    res = impot_revenu_vectorise(revenus, parts)
+    for r, p, ir in zip(revenus, parts, res["impot_net"]):
+        brut = compute_irpp_simple(float(r), float(p))
+        attendu = _apply_decote(_apply_plafond_qf(float(r), float(p), brut), float(p))
+        assert math.isclose(ir, attendu, abs_tol=1e-6)
+
+
+def test_simulate_vectorise_matches_scalar_ir_apres():
+    revenus = np.array([30000, 75000, 180000])
+    parts = np.array([1, 2, 3])
+    res = simulate_tax_scenario_vectorise(revenus, parts, per_versement=4000, pinel_investissement=100000)
+    for r, p, ir in zip(revenus, parts, res["ir_apres"]):
+        scalaire = simulate_tax_scenario(float(r), float(p), per_versement=4000, pinel_investissement=100000)
+        assert math.isclose(ir, scalaire["ir_apres"], abs_tol=0.01)
+
+
+def test_portfolio_arrays_parts():
+    rows = [_client(1, 50000, "Marié(e)", 3), _client(2, 20000, "Célibataire", 1)]
+    arrays = portfolio_arrays(rows)
+    assert list(arrays["parts"]) == [4.0, 1.5]
+    assert math.isclose(arrays["revenus"][0], 45000)
+
+
+def test_analyze_portfolio_ranks_by_savings():
+    rows = [_client(1, 20000), _client(2, 120000), _client(3, 60000)]
+    result = analyze_portfolio(rows)
+    assert result["nombre_clients"] == 3
+    economies = [o["economie_max"] for o in result["opportunites"]]
+    assert economies == sorted(economies, reverse=True)
+    assert result["opportunites"][0]["client_id"] == 2
+
+
+def test_portfolio_job_lifecycle():
+    rows = [_client(i, 30000 + i * 1000) for i in range(10)]
+    job_id = create_job("pro-1", len(rows))
+    assert get_job(job_id)["status"] == "pending"
+    run_portfolio_job(job_id, rows)
+    job = get_job(job_id)
+    assert job["status"] == "completed"
+    assert job["processed"] == 10
+    assert len(job["result"]["opportunites"]) == 10
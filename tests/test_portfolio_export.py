@@ -0,0 +1,61 @@
+import csv
+import io
+import zipfile
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import portfolio_export
+from backend.models_pro import ClientProfile
+
+
+@pytest.fixture
+def sqlite_session(monkeypatch):
+    engine = create_engine("sqlite://")
+    ClientProfile.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    for i in range(3):
+        db.add(ClientProfile(
+            id_professionnel="pro-1",
+            nom_client=f"Nom{i}",
+            prenom_client="Prénom",
+            revenu_net_annuel_client1=Decimal("45000.50"),
+            details_enfants_client=[{"prenom": "Léa"}],
+        ))
+    db.add(ClientProfile(id_professionnel="pro-2", nom_client="Autre", prenom_client="Pro"))
+    db.commit()
+    db.close()
+    monkeypatch.setattr(portfolio_export, "SessionLocal", Session)
+    return Session
+
+
+def test_portfolio_csv_streams_only_own_clients(sqlite_session):
+    content = "".join(portfolio_export.iter_portfolio_csv("pro-1"))
+    rows = list(csv.DictReader(io.StringIO(content)))
+    assert len(rows) == 3
+    assert rows[0]["revenu_net_annuel_client1"] == "45000.5"
+    assert rows[0]["details_enfants_client"] == '[{"prenom": "Léa"}]'
+
+
+def test_portfolio_excel_is_valid_workbook(sqlite_session):
+    from openpyxl import load_workbook
+
+    data = b"".join(portfolio_export.iter_portfolio_excel("pro-1"))
+    sheet = load_workbook(io.BytesIO(data)).active
+    assert sheet.max_row == 4
+
+
+def test_portfolio_pdf_zip(sqlite_session):
+    from backend import pdf_render_service
+
+    try:
+        data = b"".join(portfolio_export.iter_portfolio_pdf_zip("pro-1"))
+    finally:
+        pdf_render_service.shutdown_render_pool()
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    names = archive.namelist()
+    assert len(names) == 3
+    assert archive.read(names[0]).startswith(b"%PDF")
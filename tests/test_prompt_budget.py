@@ -0,0 +1,79 @@
+from backend.prompt_budget import (
+    ContextChunk,
+    PromptBuilder,
+    compress_history,
+    dedupe_chunks,
+    estimate_tokens,
+    relevant_excerpt,
+)
+
+FILLER = "Les dispositions du présent alinéa s'appliquent aux exercices ouverts à compter du 1er janvier. "
+
+
+def _long_article(relevant: str, paragraphs: int = 300) -> str:
+    body = [f"{i}. {FILLER * 3}" for i in range(paragraphs)]
+    body.insert(paragraphs // 2, relevant)
+    return "Article 150-0 A\n" + "\n".join(body)
+
+
+def test_long_article_is_reduced_to_relevant_paragraphs():
+    relevant = "Les plus-values de cession de valeurs mobilières sont soumises au prélèvement forfaitaire unique."
+    excerpt = relevant_excerpt(_long_article(relevant), ["plus-values", "cession", "mobilieres"], max_tokens=200)
+    assert relevant in excerpt
+    assert excerpt.startswith("Article 150-0 A")
+    assert "[…]" in excerpt
+    assert len(excerpt) <= 200 * 3
+
+
+def test_overlapping_chunks_are_deduplicated():
+    text = "Le taux du prélèvement forfaitaire unique est fixé à 12,8 % pour l'impôt sur le revenu des capitaux mobiliers."
+    chunks, dropped = dedupe_chunks([
+        ContextChunk("CGI Article 200 A", text),
+        ContextChunk("BOFiP - RPPM", "Rappel : " + text),
+        ContextChunk("CGI Article 200 A", "autre extrait du même article"),
+        ContextChunk("CGI Article 158", "Les revenus de capitaux mobiliers comprennent les dividendes."),
+    ])
+    assert [c.source for c in chunks] == ["CGI Article 200 A", "CGI Article 158"]
+    assert dropped == ["BOFiP - RPPM", "CGI Article 200 A"]
+
+
+def test_history_keeps_last_messages_and_summarizes_older_ones():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}. " + "détail " * 200}
+               for i in range(10)]
+    summary, recent = compress_history(history, max_tokens=400, keep_last=2)
+    assert [m["content"][:10] for m in recent] == ["Message 8.", "Message 9."]
+    assert summary.startswith("Échanges précédents")
+    assert "Message 7." in summary
+    assert estimate_tokens(summary) + sum(estimate_tokens(m["content"]) for m in recent) <= 400 + 3
+
+
+def test_prompt_respects_model_budget_and_reports_usage():
+    builder = PromptBuilder("Comment sont imposées les plus-values de cession de valeurs mobilières ?", budget=2000)
+    relevant = "Les plus-values de cession de valeurs mobilières sont imposées au taux forfaitaire."
+    builder.add_section("CODE GÉNÉRAL DES IMPÔTS (CGI)", [
+        ContextChunk("CGI Article 150-0 A", _long_article(relevant)),
+        ContextChunk("CGI Article 200 A", "Taux forfaitaire de 12,8 %."),
+    ])
+    bofip = "\n".join(f"§ {i} : le barème progressif s'applique sur option globale, cas numéro {i} détaillé." for i in range(400))
+    builder.add_source("BULLETIN OFFICIEL DES FINANCES PUBLIQUES (BOFiP)", "BOFiP - RPPM", bofip)
+    builder.set_history([{"role": "user", "content": "Bonjour"}, {"role": "assistant", "content": "Bonjour, que puis-je faire ?"}])
+
+    built = builder.build("Tu es Francis, assistant fiscal.")
+    usage = built.usage
+    assert usage.total <= 2000
+    assert relevant in built.context
+    assert "Taux forfaitaire de 12,8 %." in built.context
+    assert usage.excerpted_sources == ["CGI Article 150-0 A", "BOFiP - RPPM"]
+    assert usage.kept_sources == ["CGI Article 150-0 A", "CGI Article 200 A", "BOFiP - RPPM"]
+    assert [m["role"] for m in built.recent_history] == ["user", "assistant"]
+    assert set(usage.as_dict()["parts"]) == {"system", "question", "history", "context"}
+
+
+def test_sources_that_cannot_fit_are_dropped_lowest_priority_first():
+    builder = PromptBuilder("question", budget=500)
+    builder.add_section("CGI", [ContextChunk(f"CGI Article {i}", f"Texte propre à l'article {i}, alinéa {i} numéro {i}. " * 40)
+                                for i in range(6)])
+    built = builder.build()
+    assert built.usage.kept_sources[0] == "CGI Article 0"
+    assert built.usage.dropped_sources[0] == "CGI Article 5"
+    assert built.usage.total <= 500
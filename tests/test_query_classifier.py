@@ -0,0 +1,58 @@
+import re
+
+import pytest
+
+from backend.query_classifier import AhoCorasick, QueryClassifier
+
+
+QUESTIONS = [
+    "Quel est mon taux marginal d'impôt sur le revenu ?",
+    "Je suis président de SASU : dividendes ou salaire, flat tax et urssaf ?",
+    "Comment récupérer la TVA sur une vente d'actions\net réduire mon impôt ?",
+    "Plus-value immobilière après cession, abattement pour durée de détention",
+    "",
+]
+
+
+def test_automaton_reports_overlapping_hits():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    hits = sorted((hit.start, hit.keyword) for hit in automaton.iter_hits("ushers"))
+    assert hits == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+def test_literal_vocabulary_matches_substring_semantics():
+    vocabulary = {"tva": ["tva", "taxe valeur ajoutée"], "is": ["is", "impôt société"], "ir": ["ir", "impôt"]}
+    classifier = QueryClassifier()
+    classifier.register("topic", vocabulary)
+    for question in QUESTIONS:
+        result = classifier.classify(question)
+        lowered = question.lower()
+        for category, keywords in vocabulary.items():
+            assert result.matched("topic", category) == [k for k in keywords if k in lowered]
+        assert list(result.categories("topic")) == [c for c, ks in vocabulary.items() if any(k in lowered for k in ks)]
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_regex_vocabulary_matches_re_search(question):
+    patterns = {
+        "income_tax": [r"impôt.*revenu", r"taux.*marginal"],
+        "capital_gains": [r"plus.*value", r"vente.*actions", r"abattement.*durée"],
+        "vat": [r"tva", r"récupération.*tva"],
+        "amounts": [r"\d+\s*€"],
+    }
+    classifier = QueryClassifier()
+    classifier.register("tax", patterns, regex=True)
+    result = classifier.classify(question)
+    for category, regexes in patterns.items():
+        assert result.matched("tax", category) == [p for p in regexes if re.search(p, question.lower())]
+
+
+def test_best_first_and_reregistration_invalidate_cache():
+    classifier = QueryClassifier()
+    classifier.register("theme", {"a": ["x"], "b": ["y", "z"]})
+    result = classifier.classify("x y z")
+    assert result.first("theme") == "a" and result.best("theme") == "b"
+    assert classifier.classify("X Y Z") is result  # même texte en minuscules : résultat en cache
+
+    classifier.register("theme", {"a": ["w"]})
+    assert not classifier.classify("x y z").has("theme")
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.rate_counters import InMemoryCounterBackend, SQLiteCounterBackend, next_period_start
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryCounterBackend()
+    return SQLiteCounterBackend(str(tmp_path / "counters.db"))
+
+
+def test_sliding_window_limit(backend):
+    results = [backend.hit_sliding_window("ip:1", 3, 60) for _ in range(5)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False, False]
+    assert backend.hit_sliding_window("ip:2", 3, 60) == (True, 1)
+
+
+def test_sliding_window_expires(backend, monkeypatch):
+    import backend.rate_counters as rc
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(rc.time, "time", lambda: now[0])
+    for _ in range(3):
+        backend.hit_sliding_window("ip:1", 3, 60)
+    assert backend.hit_sliding_window("ip:1", 3, 60)[0] is False
+    now[0] += 61
+    assert backend.hit_sliding_window("ip:1", 3, 60) == (True, 1)
+
+
+def test_quota_consume_refund_and_seed(backend):
+    assert backend.get_quota("questions:u", "2025-06") is None
+    backend.seed_quota("questions:u", "2025-06", 28)
+    backend.seed_quota("questions:u", "2025-06", 0)  # déjà initialisé : ignoré
+    assert backend.consume_quota("questions:u", "2025-06", 30) == (True, 29)
+    assert backend.consume_quota("questions:u", "2025-06", 30) == (True, 30)
+    assert backend.consume_quota("questions:u", "2025-06", 30) == (False, 30)
+    backend.refund_quota("questions:u", "2025-06")
+    assert backend.get_quota("questions:u", "2025-06") == 29
+    # Nouvelle période : compteur indépendant
+    assert backend.consume_quota("questions:u", "2025-07", 30) == (True, 1)
+
+
+def test_quota_is_atomic_under_concurrency(backend):
+    allowed = []
+
+    def worker():
+        for _ in range(20):
+            ok, _ = backend.consume_quota("questions:c", "2025-06", 50)
+            allowed.append(ok)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(allowed) == 50
+    assert backend.get_quota("questions:c", "2025-06") == 50
+
+
+def test_async_quota_wrappers(backend):
+    async def scenario():
+        assert await backend.aget_quota("questions:u", "2025-06") is None
+        await backend.aseed_quota("questions:u", "2025-06", 29)
+        assert await backend.aconsume_quota("questions:u", "2025-06", 30) == (True, 30)
+        assert await backend.aconsume_quota("questions:u", "2025-06", 30) == (False, 30)
+        await backend.arefund_quota("questions:u", "2025-06")
+        return await backend.aget_quota("questions:u", "2025-06")
+
+    assert asyncio.run(scenario()) == 29
+
+
+def test_next_period_start():
+    assert next_period_start("2025-06") == "2025-07-01T00:00:00+00:00"
+    assert next_period_start("2025-12") == "2026-01-01T00:00:00+00:00"
+
+
+def test_documents_expire_and_update_atomically(backend, monkeypatch):
+    import backend.rate_counters as rc
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(rc.time, "time", lambda: now[0])
+    backend.put_document("job:1", {"status": "pending", "processed": 0}, ttl=60)
+    assert backend.update_document("job:1", lambda job: {**job, "processed": 5}, ttl=60) == {"status": "pending", "processed": 5}
+    assert backend.update_document("job:2", lambda job: {**job, "processed": 5} if job else None, ttl=60) is None
+    assert backend.get_document("job:2") is None
+    now[0] += 61
+    assert backend.get_document("job:1") is None
+    backend.put_document("job:1", {"status": "done"}, ttl=60)
+    assert backend.delete_document("job:1") and backend.get_document("job:1") is None
+
+
+def test_documents_are_shared_between_sqlite_workers(tmp_path):
+    path = str(tmp_path / "counters.db")
+    first, second = SQLiteCounterBackend(path), SQLiteCounterBackend(path)
+    first.put_document("session:abc", {"owner": "u1", "exchanges": []}, ttl=60)
+    second.update_document("session:abc", lambda s: {**s, "exchanges": s["exchanges"] + ["q"]}, ttl=60)
+    assert first.get_document("session:abc") == {"owner": "u1", "exchanges": ["q"]}
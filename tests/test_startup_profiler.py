@@ -0,0 +1,43 @@
+import importlib
+import sys
+
+import pytest
+
+from backend.startup_profiler import StartupProfiler
+
+
+def test_import_times_are_recorded_with_nesting(tmp_path, monkeypatch):
+    (tmp_path / "boot_child_mod.py").write_text("VALUE = 1\n")
+    (tmp_path / "boot_parent_mod.py").write_text("import boot_child_mod\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = StartupProfiler()
+    profiler.install()
+    try:
+        module = importlib.import_module("boot_parent_mod")
+    finally:
+        profiler.uninstall()
+        sys.modules.pop("boot_parent_mod", None)
+        sys.modules.pop("boot_child_mod", None)
+
+    assert profiler.top_level == ["boot_parent_mod"]
+    parent, child = profiler.imports["boot_parent_mod"], profiler.imports["boot_child_mod"]
+    assert parent["cumulative"] >= child["cumulative"] and parent["self"] <= parent["cumulative"]
+    # Le module retrouve son chargeur d'origine
+    assert type(module.__spec__.loader).__name__ == "SourceFileLoader"
+    assert profiler not in sys.meta_path
+
+
+def test_initializers_and_report(tmp_path):
+    profiler = StartupProfiler()
+    with profiler.timed("embeddings"):
+        pass
+    with pytest.raises(RuntimeError):
+        with profiler.timed("warm_up"):
+            raise RuntimeError("indisponible")
+    profiler.mark_ready()
+
+    report = profiler.report()
+    assert [step["name"] for step in report["initializers"]] == ["embeddings", "warm_up"]
+    assert report["initializers"][1]["error"] == "RuntimeError('indisponible')"
+    assert report["boot_seconds"] is not None
+    assert profiler.write_report(str(tmp_path / "boot.json")).exists()
@@ -500,4 +500,45 @@ class TestStrategieCESU:
         assert scenario_output is None
 
 # TODO: Ajouter des classes de Test pour chaque autre stratégie (LMNP, DonationIFI, PVI, DonsOeuvres, CESU)
-# en suivant un modèle similaire: fixtures pour données client spécifiques, tests pour est_applicable, tests pour generer_scenario_detail (nominal, limites, RAG). 
\ No newline at end of file
+# en suivant un modèle similaire: fixtures pour données client spécifiques, tests pour est_applicable, tests pour generer_scenario_detail (nominal, limites, RAG). 
+
+
+# --- Résolution groupée des sources et des variantes d'IR ---
+
+def test_resolve_rag_sources_une_seule_recherche_groupee(monkeypatch):
+    import backend.strategies_fiscales as sf
+
+    appels = []
+
+    def recherche(keywords, top_k=1):
+        raise AssertionError("la recherche unitaire ne doit pas être appelée")
+
+    def recherche_groupee(keywords_list, top_k=1):
+        appels.append(list(keywords_list))
+        return [[{"source": f"CGI Article {i}"}] for i, _ in enumerate(keywords_list)]
+
+    recherche.batch = recherche_groupee
+    monkeypatch.setattr(sf, "_RAG_SEARCH_ENABLED", True)
+    monkeypatch.setattr(sf, "rag_search_function", recherche)
+    monkeypatch.setattr(sf, "_citations_table", {StrategieCESU.rag_keywords: ["CGI Article 199 sexdecies"]})
+
+    sources = sf.resolve_rag_sources([StrategiePER.rag_keywords, StrategieLMNP.rag_keywords,
+                                      StrategiePER.rag_keywords, StrategieCESU.rag_keywords])
+    assert appels == [[StrategiePER.rag_keywords, StrategieLMNP.rag_keywords]]
+    assert "CGI Article 0" in sources[StrategiePER.rag_keywords]
+    assert "CGI Article 1" in sources[StrategieLMNP.rag_keywords]
+    assert "CGI Article 199 sexdecies" in sources[StrategieCESU.rag_keywords]
+
+
+def test_variantes_ir_precalculees(client_data_base, monkeypatch):
+    import backend.strategies_fiscales as sf
+
+    client = client_data_base.model_copy(deep=True)
+    client.revenus_charges.revenus_locatifs = 15000
+    contexte = {"revenu_imposable_global": 75000}
+    strategie = StrategieLMNP()
+    contexte["ir_variantes"] = sf.evaluer_variantes_ir((r, 1.0) for r in strategie.revenus_variantes(client, contexte))
+    assert contexte["ir_variantes"] == {(67500.0, 1.0): impot_revenu_net(67500, 1.0)}
+
+    monkeypatch.setattr(sf, "impot_revenu_net", lambda *a: pytest.fail("IR déjà calculé"))
+    assert sf.impot_revenu_variante(contexte, 67500, 1.0) == impot_revenu_net(67500, 1.0)
@@ -0,0 +1,84 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.middleware.tracing import TracingMiddleware
+from backend.tracing import Histogram, MetricsRegistry, end_trace, span, start_trace, traced
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Durée", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 2.0):
+        histogram.observe(value, stage="llm")
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="llm",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="llm"} 3' in text
+    assert histogram.count(stage="llm") == 3
+    assert isinstance(histogram, Histogram)
+
+
+def test_spans_are_collected_in_current_trace():
+    @traced("cgi_scan")
+    def scan():
+        with span("query_embedding"):
+            pass
+
+    trace, token = start_trace()
+    try:
+        scan()
+        scan()
+        with span("llm_total"):
+            pass
+    finally:
+        end_trace(token)
+
+    breakdown = trace.breakdown()
+    assert list(breakdown) == ["query_embedding", "cgi_scan", "llm_total"]
+    assert breakdown["cgi_scan"]["count"] == 2
+    assert [s.parent for s in trace.spans if s.name == "query_embedding"] == ["cgi_scan", "cgi_scan"]
+    header = trace.server_timing()
+    assert header.startswith("query_embedding;dur=")
+    assert 'cgi_scan;dur=' in header and 'desc="x2"' in header
+    assert "total;dur=" in header
+
+
+def test_middleware_adds_server_timing_and_route_template():
+    import tracing as runtime  # le module que le middleware importe depuis backend/
+
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, timing_header=True)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with runtime.span("prompt_build"):
+            return {"id": item_id}
+
+    response = TestClient(app).get("/items/42")
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("prompt_build;dur=")
+    assert runtime.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200") >= 1
+    assert 'route="/items/42"' not in runtime.render_metrics()
+
+
+def test_middleware_resolves_each_path_once(monkeypatch):
+    import backend.middleware.tracing as tracing_middleware
+
+    resolved = []
+    original = tracing_middleware._route_template
+    monkeypatch.setattr(tracing_middleware, "_route_template",
+                        lambda request: resolved.append(request.url.path) or original(request))
+
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    for path in ("/items/1", "/items/1", "/items/2", "/missing", "/missing"):
+        client.get(path)
+    assert resolved == ["/items/1", "/items/2", "/missing"]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from backend.transcript_extraction import (
+    CLIENT_SCHEMA,
+    DISCOVERY_SCHEMA,
+    TranscriptExtractor,
+    extract_rule_facts,
+    split_transcript,
+)
+
+
+class FakeCompletion:
+    """Enregistre les prompts et renvoie les réponses fournies, dans l'ordre."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    async def __call__(self, prompt, system="", max_tokens=512):
+        self.prompts.append(prompt)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def test_rule_facts_normalize_phone_amounts_and_family():
+    facts = extract_rule_facts(
+        "Je m'appelle Julie Martin, j'ai 42 ans, mariée avec deux enfants. "
+        "Mon numéro : +33 6.12.34.56.78, mail julie.martin@exemple.fr. "
+        "J'habite 12 rue des Lilas, 69003 Lyon. Je gagne 3 500 € nets par mois en CDI."
+    )
+    assert facts["telephone"] == "06 12 34 56 78"
+    assert facts["email"] == "julie.martin@exemple.fr"
+    assert facts["revenu_annuel"] == 42000
+    assert facts["nombre_enfants"] == 2
+    assert facts["situation_familiale"] == "marie"
+    assert (facts["code_postal"], facts["ville"]) == ("69003", "Lyon")
+    assert facts["adresse"] == "12 rue des Lilas"
+    assert (facts["prenom"], facts["nom"], facts["age"]) == ("Julie", "Martin", 42)
+    assert facts["statut_professionnel"] == "CDI"
+
+
+def test_numbers_without_unit_are_not_amounts():
+    facts = extract_rule_facts("Mon salaire a augmenté il y a 3 ans. Pas d'enfant.")
+    assert "revenu_annuel" not in facts
+    assert facts["nombre_enfants"] == 0
+
+
+def test_grandchildren_and_amount_first_savings():
+    facts = extract_rule_facts("Nous avons trois enfants et deux petits enfants. Nous avons 20 000 euros d'épargne.")
+    assert facts["nombre_enfants"] == 3
+    assert facts["epargne"] == 20000
+    facts = extract_rule_facts("Veuf, quatre petits-enfants, environ 15 k€ de côté.")
+    assert "nombre_enfants" not in facts
+    assert facts["epargne"] == 15000
+
+
+def test_simple_transcript_needs_no_llm_call():
+    completion = FakeCompletion()
+    extractor = TranscriptExtractor(CLIENT_SCHEMA, completion=completion)
+    result = asyncio.run(extractor.extract(
+        "Je m'appelle Paul Durand, téléphone 06 11 22 33 44, deux enfants, marié. J'habite à Nantes."
+    ))
+    assert completion.prompts == []
+    assert result.llm_calls == 0
+    assert result.data["nombre_enfants_a_charge_client"] == "2"
+    assert result.data["situation_maritale_client"] == "Marié(e)"
+    assert result.data["ville_client"] == "Nantes"
+
+
+def test_only_residual_fields_are_sent_to_llm():
+    completion = FakeCompletion('```json\n{"profession_client1": "ingénieure", "objectifs_fiscaux_client": "réduire l\'IR"}\n```')
+    extractor = TranscriptExtractor(CLIENT_SCHEMA, completion=completion)
+    result = asyncio.run(extractor.extract(
+        "Je m'appelle Anne Petit, je travaille comme ingénieure, je gagne 60k € par an. "
+        "Mon objectif est de réduire mes impôts."
+    ))
+    assert len(completion.prompts) == 1
+    schema = json.loads(completion.prompts[0].split("\n", 1)[0].removeprefix("Clés : "))
+    assert "profession_client1" in schema and "objectifs_fiscaux_client" in schema
+    assert not {"nom_client", "revenu_net_annuel_client1", "email_client"} & set(schema)
+    assert result.data["revenu_net_annuel_client1"] == "60000"
+    assert result.data["profession_client1"] == "ingénieure"
+
+
+def test_chunks_are_merged_and_failures_keep_rule_results():
+    transcript = " ".join(["Nous avons un PEA et une assurance vie."] * 5 + ["Nous avons aussi des SCPI, j'ai 50 ans."] * 5)
+    assert len(split_transcript(transcript, max_chars=200, overlap=40)) > 1
+    completion = FakeCompletion(
+        '{"investissements": ["PEA", "assurance vie"]}',
+        '{"investissements": ["assurance vie", "SCPI"]}',
+        RuntimeError("timeout"),
+    )
+    extractor = TranscriptExtractor(DISCOVERY_SCHEMA, completion=completion, chunk_chars=200, chunk_overlap=40)
+    result = asyncio.run(extractor.extract(transcript))
+    assert result.chunks == 3
+    assert result.data["investissements"] == ["PEA", "assurance vie", "SCPI"]
+    assert result.data["age"] == "50"
+    assert result.errors == ["timeout"]
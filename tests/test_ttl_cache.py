@@ -0,0 +1,124 @@
+import asyncio
+import gc
+import threading
+import time
+import weakref
+
+from backend.ttl_cache import CACHE_ENTRIES, CACHE_EVENTS, TTLCache, cached_method
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = TTLCache("test_lru", max_entries=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" devient le plus récent
+    cache.set("c", 3)
+    assert "b" not in cache and cache.get("a") == 1 and cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.info()["expired"] == 1
+    assert cache.info()["evictions"] == 1
+    assert CACHE_EVENTS.value(cache="test_lru", event="hit") == 3
+
+
+def test_sliding_ttl_keeps_active_entries():
+    clock = FakeClock()
+    cache = TTLCache("test_sliding", ttl=10, sliding=True, clock=clock)
+    cache.set("session", {"id": 1})
+    for now in (8, 16, 24):
+        clock.now = now
+        assert cache.get("session") == {"id": 1}
+    clock.now = 35
+    assert cache.get("session") is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = TTLCache("test_bytes", max_entries=100, max_bytes=3000, sizeof=len)
+    for key in "abc":
+        cache.set(key, "x" * 1000)
+    cache.get("a")
+    cache.set("d", "x" * 1000)
+    assert [key for key, _ in cache.items()] == ["c", "a", "d"]
+    assert cache.bytes == 3000
+    cache.set("huge", "x" * 5000)  # plus grand que tout le cache : ignoré
+    assert "huge" not in cache and len(cache) == 3
+
+
+def test_concurrent_misses_compute_once():
+    cache = TTLCache("test_single_flight")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "valeur"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["valeur"] * 8 and len(calls) == 1
+
+    async def acompute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "async"
+
+    async def run():
+        return await asyncio.gather(*(cache.aget_or_compute("ak", acompute) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["async"] * 5
+    assert len(calls) == 2
+
+
+def test_cached_method_does_not_pin_instances_and_skips_failures():
+    class Embedder:
+        def __init__(self):
+            self.calls = 0
+
+        @cached_method(max_entries=4)
+        def embed(self, text):
+            self.calls += 1
+            return None if text == "erreur" else [len(text)]
+
+    embedder = Embedder()
+    assert embedder.embed("bonjour") == [7]
+    assert embedder.embed("bonjour") == [7]
+    embedder.embed("erreur")
+    embedder.embed("erreur")
+    assert embedder.calls == 3  # None (échec) n'est pas mis en cache
+    assert Embedder.embed.cache_of(embedder).info()["hits"] == 1
+
+    ref = weakref.ref(embedder)
+    del embedder
+    gc.collect()
+    assert ref() is None
+
+
+def test_cached_method_gauges_add_up_across_instances():
+    class Engine:
+        @cached_method(max_entries=4, name="test_gauges_per_instance")
+        def square(self, x):
+            return x * x
+
+    first, second = Engine(), Engine()
+    first.square(1)
+    first.square(2)
+    second.square(3)
+    assert CACHE_ENTRIES.value(cache="test_gauges_per_instance") == 3
+    del first
+    gc.collect()
+    assert CACHE_ENTRIES.value(cache="test_gauges_per_instance") == 1
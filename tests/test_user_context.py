@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+from backend.user_context import UserContextCache
+
+
+class FakeSupabase:
+    """Imite la chaîne table().select().eq().maybe_single().execute() en comptant les lectures."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+        self.fail = False
+
+    def table(self, name):
+        assert name == "profils_utilisateurs"
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self._user_id = value
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def execute(self):
+        self.reads += 1
+        if self.fail:
+            raise RuntimeError("connexion perdue")
+        return SimpleNamespace(data=self.rows.get(self._user_id))
+
+
+def test_profile_is_read_once_until_expiry():
+    now = [0.0]
+    client = FakeSupabase({"u1": {"user_id": "u1", "email": "pro@example.com", "taper": "professionnel"}})
+    cache = UserContextCache(ttl=60, clock=lambda: now[0])
+
+    first = cache.load(client, "u1")
+    assert first.is_professional and first.email == "pro@example.com"
+    assert cache.load(client, "u1") is first
+    assert client.reads == 1
+
+    now[0] += 61
+    cache.load(client, "u1")
+    assert client.reads == 2
+
+
+def test_invalidation_by_user_and_by_email():
+    rows = {"u1": {"user_id": "u1", "email": "Client@Example.com", "taper": "particulier"}}
+    client = FakeSupabase(rows)
+    cache = UserContextCache(ttl=60)
+    assert cache.load(client, "u1").taper == "particulier"
+
+    rows["u1"] = dict(rows["u1"], taper="professionnel")
+    cache.invalidate(email="client@example.com")  # webhook Stripe : seul l'email est connu
+    assert cache.load(client, "u1").is_professional
+
+    rows["u1"] = dict(rows["u1"], taper="particulier")
+    cache.invalidate("u1")
+    assert not cache.load(client, "u1").is_professional
+    assert client.reads == 3
+
+
+def test_errors_are_not_cached_and_missing_profiles_are():
+    client = FakeSupabase({})
+    cache = UserContextCache(ttl=60)
+
+    client.fail = True
+    context = cache.load(client, "u2")
+    assert not context.available and "connexion perdue" in context.error
+
+    client.fail = False
+    missing = cache.load(client, "u2")
+    assert missing.available and not missing.found and missing.taper == "particulier"
+    cache.load(client, "u2")
+    assert client.reads == 2
+
+
+def test_read_started_before_invalidation_is_not_stored():
+    cache = UserContextCache(ttl=60)
+    client = FakeSupabase({"u1": {"user_id": "u1", "taper": "particulier"}})
+    version = cache.version("u1")
+    cache.invalidate("u1")
+    stale = cache.load(client, "u1")
+    cache.put(stale, version)  # écriture concurrente plus ancienne que l'invalidation : ignorée
+    assert cache.get("u1") is stale  # la lecture postérieure à l'invalidation reste en cache
+
+
+def test_invalidations_do_not_accumulate_state():
+    cache = UserContextCache(ttl=60, max_entries=2)
+    client = FakeSupabase({f"u{i}": {"user_id": f"u{i}"} for i in range(50)})
+    for i in range(50):
+        cache.load(client, f"u{i}")
+        cache.invalidate(f"u{i}")  # connexion, webhook Stripe…
+    client.fail = True
+    cache.load(client, "u0")
+    assert not cache._reads and len(cache._entries) <= 2
+
+
+def test_lru_eviction():
+    client = FakeSupabase({f"u{i}": {"user_id": f"u{i}"} for i in range(3)})
+    cache = UserContextCache(ttl=60, max_entries=2)
+    for user_id in ("u0", "u1", "u2"):
+        cache.load(client, user_id)
+    assert cache.get("u0") is None
+    assert cache.get("u2") is not None
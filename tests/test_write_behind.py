@@ -0,0 +1,49 @@
+import threading
+import time
+
+from backend.write_behind import WriteBehindQueue
+
+
+def test_flushes_by_batch_size():
+    batches = []
+    done = threading.Event()
+
+    def sink(records):
+        batches.append(list(records))
+        if sum(len(b) for b in batches) >= 10:
+            done.set()
+
+    queue = WriteBehindQueue("test", sink, batch_size=5, flush_interval_ms=60_000)
+    for i in range(10):
+        queue.enqueue({"i": i})
+    assert done.wait(2)
+    assert [len(b) for b in batches] == [5, 5]
+    queue.drain()
+
+
+def test_flushes_on_interval():
+    batches = []
+    queue = WriteBehindQueue("test", batches.append, batch_size=100, flush_interval_ms=50)
+    queue.enqueue({"i": 1})
+    deadline = time.time() + 2
+    while not batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert batches == [[{"i": 1}]]
+    queue.drain()
+
+
+def test_retries_then_drains_on_shutdown():
+    calls = []
+
+    def flaky(records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise RuntimeError("supabase indisponible")
+
+    queue = WriteBehindQueue("test", flaky, batch_size=100, flush_interval_ms=60_000)
+    for i in range(3):
+        queue.enqueue({"i": i})
+    queue.drain()
+    assert calls == [3, 3]
+    assert queue.stats["flushed"] == 3
+    assert queue.stats["dropped"] == 0